@@ -0,0 +1,77 @@
+"""
+Generadores de datos sintéticos para los benchmarks de Bibliotech.
+Los catálogos son deterministas (misma semilla -> mismos libros) para que las
+mediciones sean comparables entre ejecuciones y máquinas.
+"""
+
+import os
+import random
+
+NOMBRES = ["Gabriel", "Isabel", "Jorge Luis", "Julio", "Mario", "Laura", "Octavio", "Elena",
+           "Carlos", "Rosa", "Miguel", "Ana María", "José", "Clarice", "Horacio", "Silvina"]
+APELLIDOS = ["García Márquez", "Allende", "Borges", "Cortázar", "Vargas Llosa", "Esquivel", "Paz",
+             "Poniatowska", "Fuentes", "Montero", "de Unamuno", "Matute", "Saramago", "Lispector",
+             "Quiroga", "Ocampo"]
+EDITORIALES = ["Alfaguara", "Anagrama", "Planeta", "Tusquets", "Seix Barral", "Cátedra", "Siruela",
+               "Salamandra", "Destino", "Debolsillo", "Sudamericana", "Random House"]
+PALABRAS = ["cien", "años", "soledad", "casa", "espíritus", "ficciones", "rayuela", "ciudad", "perros",
+            "agua", "chocolate", "laberinto", "amor", "tiempos", "cólera", "sombra", "viento", "noche",
+            "tarde", "mar", "historia", "memoria", "jardín", "senderos", "crónica", "muerte", "anunciada"]
+
+
+def isbn13(n):
+    """ISBN-13 válido (978 + número + dígito de control) a partir de un entero."""
+    cuerpo = f"978{n % 10**9:09d}"
+    suma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(cuerpo))
+    return cuerpo + str((10 - suma % 10) % 10)
+
+
+def generar_catalogo(n, semilla=1234, con_pdf=False):
+    """Devuelve un dict {isbn: registro} con 'n' libros sintéticos."""
+    rnd = random.Random(semilla)
+    catalogo = {}
+    for i in range(n):
+        titulo = " ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(2, 5))).capitalize()
+        registro = {
+            "Título": titulo,
+            "Autor": f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}",
+            "Editorial": rnd.choice(EDITORIALES),
+            "Fecha de Publicación": f"{rnd.randint(1900, 2024)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+        }
+        if con_pdf:
+            registro["Archivo PDF"] = f"/biblioteca/pdf/{i:07d}.pdf"
+            registro["Portada"] = f"/biblioteca/cache/{i:07d}_preview.jpg"
+        catalogo[isbn13(i)] = registro
+    return catalogo
+
+
+def generar_pdfs(carpeta, n, paginas=3, semilla=1234):
+    """
+    Crea 'n' PDFs con PyMuPDF: metadatos, un ISBN en la primera página y texto de relleno.
+    Devuelve la lista de rutas creadas.
+    """
+    import fitz
+
+    os.makedirs(carpeta, exist_ok=True)
+    rnd = random.Random(semilla)
+    rutas = []
+    for i in range(n):
+        doc = fitz.open()
+        titulo = " ".join(rnd.choice(PALABRAS) for _ in range(3)).capitalize()
+        for p in range(paginas):
+            page = doc.new_page()
+            page.draw_rect(fitz.Rect(50, 50, 545, 300), color=(0.1, 0.2, 0.5), fill=(rnd.random(), rnd.random(), 0.6))
+            texto = titulo if p else f"{titulo}\n\nISBN {isbn13(i)}"
+            texto += "\n" + " ".join(rnd.choice(PALABRAS) for _ in range(200))
+            page.insert_textbox(fitz.Rect(50, 320, 545, 790), texto, fontsize=10)
+        doc.set_metadata({
+            "title": titulo,
+            "author": f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}",
+            "producer": rnd.choice(EDITORIALES),
+            "creationDate": f"D:{rnd.randint(1990, 2024)}0101000000",
+        })
+        ruta = os.path.join(carpeta, f"libro_{i:05d}.pdf")
+        doc.save(ruta)
+        doc.close()
+        rutas.append(ruta)
+    return rutas
@@ -0,0 +1,214 @@
+"""
+Benchmarks de los caminos críticos de Bibliotech.
+
+Mide, con catálogos sintéticos de distintos tamaños:
+  - database.guardar_biblioteca / database.cargar_biblioteca
+  - BibliotecaWindow._on_search_text_changed (filtro de la búsqueda)
+  - BibliotecaWindow._actualizar_tabla (llenado de la tabla, Qt en modo offscreen)
+  - pdf_reader.procesar_lote (PDFs por segundo) y la generación de miniaturas
+
+Los resultados se escriben en JSON y se comparan con una línea base guardada;
+si algún caso empeora más que el umbral el proceso termina con código 1.
+
+Uso:
+    python benchmarks/run.py                                  # tamaños 1k y 10k
+    python benchmarks/run.py --tamanos 1000,100000,1000000 --pdfs 50
+    python benchmarks/run.py --guardar-baseline               # fija la línea base actual
+    python benchmarks/run.py --solo almacenamiento
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "core"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generadores
+
+BASELINE_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SALIDA_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados.json")
+GRUPOS = ("almacenamiento", "busqueda", "tabla", "pdf")
+
+
+def medir(funcion, repeticiones=5, preparar=None):
+    """Ejecuta 'funcion' varias veces y devuelve mínimo y mediana en segundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return {"min_s": min(tiempos), "mediana_s": statistics.median(tiempos), "repeticiones": repeticiones}
+
+
+def _repeticiones(tamano):
+    return 5 if tamano <= 10_000 else 3 if tamano <= 100_000 else 1
+
+
+# Casos
+def bench_almacenamiento(tamano, resultados):
+    import database
+
+    catalogo = generadores.generar_catalogo(tamano)
+    rep = _repeticiones(tamano)
+    resultados[f"guardar_biblioteca[{tamano}]"] = medir(
+        lambda: database.guardar_biblioteca(catalogo, global_file=True), rep)
+    resultados[f"cargar_biblioteca[{tamano}]"] = medir(
+        lambda: database.cargar_biblioteca(global_file=True), rep)
+    for nombre in os.listdir(database.BACKUP_DIR):
+        os.remove(os.path.join(database.BACKUP_DIR, nombre))
+
+
+def _ventana():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    from ui import BibliotecaWindow
+    return app, BibliotecaWindow()
+
+
+def bench_busqueda(tamano, resultados):
+    app, ventana = _ventana()
+    ventana.biblioteca = generadores.generar_catalogo(tamano)
+    rep = _repeticiones(tamano)
+    # una consulta frecuente (muchos resultados) y una rara (pocos): el coste se reparte distinto
+    resultados[f"busqueda_amplia[{tamano}]"] = medir(lambda: ventana._on_search_text_changed("a"), rep)
+    resultados[f"busqueda_estrecha[{tamano}]"] = medir(lambda: ventana._on_search_text_changed("garcía márquez cien"), rep)
+    # índice de trigramas ya construido: sólo se mide la consulta con errores de tipeo
+    ventana.indice_difuso.sincronizar(ventana.biblioteca)
+    resultados[f"busqueda_difusa[{tamano}]"] = medir(lambda: ventana.indice_difuso.buscar("garsia marques"), rep)
+    import facetas
+    # filtros por facetas con el índice ya construido: conteos de las cinco facetas con una selección activa
+    ventana.indice_facetas.sincronizar(ventana.biblioteca)
+    ventana._seleccion_facetas = {"pdf": {"no"}}
+    resultados[f"facetas[{tamano}]"] = medir(
+        lambda: [ventana.indice_facetas.conteos(f, ventana._seleccion_facetas) for f in facetas.FACETAS], rep)
+    ventana.close()
+
+
+def bench_tabla(tamano, resultados):
+    app, ventana = _ventana()
+    ventana.biblioteca = generadores.generar_catalogo(tamano)
+    resultados[f"actualizar_tabla[{tamano}]"] = medir(ventana._actualizar_tabla, _repeticiones(tamano))
+    ventana.close()
+
+
+def bench_pdf(n_pdfs, resultados):
+    import ingesta
+    import pdf_reader
+
+    carpeta = os.path.join(os.getcwd(), "pdfs")
+    rutas = generadores.generar_pdfs(carpeta, n_pdfs)
+
+    resultados[f"miniaturas[{n_pdfs}]"] = medir(
+        lambda: [ingesta.generar_miniatura(r) for r in rutas], 3)
+
+    app, ventana = _ventana()
+    # procesar_lote pide la carpeta y muestra un aviso al terminar: se responden sin diálogo
+    pdf_reader.QFileDialog.getExistingDirectory = staticmethod(lambda *a, **k: carpeta)
+    pdf_reader.QMessageBox.information = staticmethod(lambda *a, **k: None)
+
+    def preparar():
+        ventana.biblioteca = {}
+
+    res = medir(lambda: pdf_reader.procesar_lote(ventana), 3, preparar=preparar)
+    res["pdfs_por_segundo"] = n_pdfs / res["mediana_s"] if res["mediana_s"] else None
+    resultados[f"procesar_lote[{n_pdfs}]"] = res
+    ventana.close()
+
+
+# Comparación
+def comparar(resultados, baseline, umbral):
+    """Devuelve (caso, actual_s, base_s, razón, es_regresión) para los casos presentes en ambos."""
+    filas = []
+    for caso, actual in resultados.items():
+        base = baseline.get(caso)
+        if not base:
+            continue
+        # se compara el mínimo: es el valor menos afectado por el ruido de la máquina
+        razon = actual["min_s"] / base["min_s"] if base["min_s"] else float("inf")
+        filas.append((caso, actual["min_s"], base["min_s"], razon, razon > umbral))
+    return filas
+
+
+def entorno():
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de Bibliotech")
+    parser.add_argument("--tamanos", default="1000,10000", help="tamaños de catálogo separados por coma")
+    parser.add_argument("--pdfs", type=int, default=20, help="cantidad de PDFs sintéticos para procesar_lote")
+    parser.add_argument("--solo", choices=GRUPOS, action="append", help="ejecutar sólo estos grupos")
+    parser.add_argument("--salida", default=SALIDA_DEFAULT)
+    parser.add_argument("--baseline", default=BASELINE_DEFAULT)
+    parser.add_argument("--umbral", type=float, default=1.25, help="razón actual/base a partir de la cual hay regresión")
+    parser.add_argument("--guardar-baseline", action="store_true", help="guardar estos resultados como línea base")
+    args = parser.parse_args(argv)
+
+    tamanos = [int(t) for t in args.tamanos.split(",") if t.strip()]
+    grupos = args.solo or GRUPOS
+    resultados, omitidos = {}, {}
+
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bibliotech_bench_") as tmp:
+        # database usa rutas relativas (data/, cache/): se trabaja dentro de un directorio temporal
+        os.chdir(tmp)
+        try:
+            for grupo in grupos:
+                casos = [args.pdfs] if grupo == "pdf" else tamanos
+                for tamano in casos:
+                    print(f"▶ {grupo} [{tamano}]...", file=sys.stderr)
+                    try:
+                        globals()[f"bench_{grupo}"](tamano, resultados)
+                    except ImportError as e:
+                        omitidos[grupo] = f"dependencia no disponible: {e.name}"
+                        print(f"   omitido ({omitidos[grupo]})", file=sys.stderr)
+                        break
+        finally:
+            os.chdir(directorio_original)
+
+    informe = {"entorno": entorno(), "resultados": resultados, "omitidos": omitidos}
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+
+    for caso, r in resultados.items():
+        print(f"{caso:<40} mediana {r['mediana_s'] * 1000:10.1f} ms   min {r['min_s'] * 1000:10.1f} ms")
+
+    if args.guardar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sin línea base: ejecute con --guardar-baseline para crearla.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("resultados", {})
+    regresiones = 0
+    print(f"\nComparación con {os.path.basename(args.baseline)} (umbral x{args.umbral}):")
+    for caso, actual, base, razon, regresion in comparar(resultados, baseline, args.umbral):
+        regresiones += regresion
+        marca = "❌ REGRESIÓN" if regresion else "✅"
+        print(f"{caso:<40} {base * 1000:9.1f} -> {actual * 1000:9.1f} ms  x{razon:5.2f}  {marca}")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
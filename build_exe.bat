@@ -28,6 +28,7 @@ python -m pip install PySide6==6.10.0
 echo ⚙️ Compilando ejecutable con PyInstaller...
 python -m PyInstaller --noconsole --onefile --name "Bibliotech" ^
 --icon="assets/icon.ico" ^
+--paths "core" ^
 --collect-all PySide6 ^
 --add-data "assets;assets" ^
 --add-data "ui.py;." ^
@@ -0,0 +1,553 @@
+"""
+Modo por línea de comandos de Bibliotech (sin interfaz gráfica).
+Pensado para tareas programadas en un servidor: no crea QApplication y reparte
+el trabajo pesado (lectura de PDFs, portadas) entre varios procesos.
+
+Cada línea de la salida estándar es un objeto JSON (eventos de progreso y resumen final),
+los mensajes para personas van a la salida de errores.
+
+Ejemplos:
+    python cli.py ingerir /srv/pdfs --recursivo --procesos 8
+    python cli.py exportar catalogo.csv --global
+    python cli.py reindexar
+    python cli.py podar-backups --conservar 10 --dias 30
+    python cli.py verificar
+    python cli.py verificar --rapido
+    python cli.py recuperar
+    python cli.py enlaces --raiz /srv/pdfs --aplicar --global
+    python cli.py duplicados --global
+    python cli.py buscar 'autor:borges año:1940..1960 -editorial:sur' --global
+    python cli.py servir --puerto 8765 --global
+    python cli.py usuarios agregar ana --rol administrador
+    python cli.py servir --autenticar --global
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import date
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core")
+if os.path.isdir(_CORE_DIR) and _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import compresion
+import database
+import esquema
+import isbn_canonico
+import metricas
+import registro
+
+# stdout queda reservado para los eventos JSON; el registro (logging) y cualquier print() van a stderr
+_SALIDA_JSON = sys.stdout
+log = registro.obtener("cli")
+
+
+def emitir(evento, **datos):
+    """Escribe un evento JSON por línea en stdout (legible por otros programas)."""
+    datos["evento"] = evento
+    datos["ts"] = round(time.time(), 3)
+    _SALIDA_JSON.write(json.dumps(datos, ensure_ascii=False) + "\n")
+    _SALIDA_JSON.flush()
+
+
+def _reportador(tarea, cada=1.0):
+    """Devuelve un callback progreso(hecho, total) que emite como mucho un evento por 'cada' segundos."""
+    ultimo = [0.0]
+
+    def progreso(hecho, total=0):
+        ahora = time.monotonic()
+        if hecho == total or ahora - ultimo[0] >= cada:
+            ultimo[0] = ahora
+            emitir("progreso", tarea=tarea, hecho=hecho, total=total)
+    return progreso
+
+
+def _fecha_arg(valor):
+    return date.fromisoformat(valor)
+
+
+def _destino(args):
+    return {"fecha": args.fecha, "global_file": args.global_file}
+
+
+# Comandos
+def cmd_ingerir(args):
+    import duplicados
+    import ingesta
+
+    rutas = ingesta.listar_pdfs(args.carpeta, recursivo=args.recursivo)
+    emitir("inicio", tarea="ingerir", archivos=len(rutas))
+    biblioteca = database.cargar_biblioteca(**_destino(args))
+    pdfs_conocidos = {libro.get(esquema.PDF) for libro in biblioteca.values() if isinstance(libro, dict)}
+    pendientes = [r for r in rutas if r not in pdfs_conocidos]
+    indice = duplicados.IndiceDuplicados()
+    indice.sincronizar(biblioteca, procesos=args.procesos)
+    indice_isbn = isbn_canonico.IndiceISBN()
+    indice_isbn.sincronizar(biblioteca)
+
+    # cada archivo termina en exactamente un contador: nuevos + omitidos + existentes + repetidos + errores = archivos
+    errores = repetidos = existentes = 0
+    with database.transaccion(biblioteca, **_destino(args)) as tx:
+        for ruta, isbn, libro, error in ingesta.extraer_en_paralelo(
+                pendientes, procesos=args.procesos, progreso=_reportador("ingerir")):
+            if error:
+                errores += 1
+                emitir("error", archivo=ruta, detalle=error)
+                continue
+            # ISBN ya catalogado (otro PDF del mismo libro)
+            if isbn in indice_isbn:
+                existentes += 1
+                continue
+            # mismo contenido que un libro ya ingresado (copia del PDF con otro nombre o sin ISBN)
+            if any(c.motivo == "contenido" for c in indice.buscar(libro)):
+                repetidos += 1
+                continue
+            tx.upsert(isbn, libro)
+            indice.agregar(isbn, libro)
+            indice_isbn.agregar(isbn)
+    nuevos = len(tx.cambios())
+    emitir("fin", tarea="ingerir", archivos=len(rutas), nuevos=nuevos, omitidos=len(rutas) - len(pendientes),
+           existentes=existentes, repetidos=repetidos, errores=errores)
+    return 1 if errores and not nuevos else 0
+
+
+def cmd_exportar(args):
+    import exportador
+
+    biblioteca = database.cargar_biblioteca(**_destino(args))
+    emitir("inicio", tarea="exportar", registros=len(biblioteca))
+    escritos = exportador.exportar(args.salida, biblioteca, formato=args.formato,
+                                   progreso=_reportador("exportar"))
+    emitir("fin", tarea="exportar", escritos=escritos, archivo=os.path.abspath(args.salida))
+    return 0
+
+
+def cmd_reindexar(args):
+    """
+    Regenera las portadas que falten en todos los archivos de data/ (al cargarlos, los archivos de
+    esquemas anteriores se migran y se guardan con el actual).
+    También completa las huellas de contenido y de portada de los libros ingresados antes de que existieran.
+    """
+    import duplicados
+    import ingesta
+    import portadas
+
+    huellas = (duplicados.CAMPO_HUELLA_PDF, portadas.CAMPO_HUELLA_PORTADA)
+
+    archivos = database.listar_archivos_datos()
+    emitir("inicio", tarea="reindexar", archivos=len(archivos))
+    total_cambios = 0
+    for ruta in archivos:
+        try:
+            biblioteca = database.cargar_biblioteca(path=ruta)
+        except Exception as e:
+            emitir("error", archivo=os.path.basename(ruta), detalle=f"JSON ilegible: {e}")
+            continue
+        cambios = 0
+
+        incompletos = [isbn for isbn, d in biblioteca.items()
+                       if isinstance(d, dict) and d.get(esquema.PDF) and os.path.exists(d[esquema.PDF])
+                       and (not (d.get(esquema.PORTADA) and os.path.exists(d[esquema.PORTADA]))
+                            or any(campo not in d for campo in huellas))]
+        por_ruta = {biblioteca[isbn][esquema.PDF]: isbn for isbn in incompletos}
+        for pdf, _, extraido, error in ingesta.extraer_en_paralelo(
+                list(por_ruta), procesos=args.procesos, progreso=_reportador(f"portadas:{os.path.basename(ruta)}")):
+            if error:
+                continue
+            destino = biblioteca[por_ruta[pdf]]
+            if extraido.get(esquema.PORTADA) and not (destino.get(esquema.PORTADA) and os.path.exists(destino[esquema.PORTADA])):
+                destino[esquema.PORTADA] = extraido[esquema.PORTADA]
+            for campo in huellas:
+                if campo not in destino:
+                    destino[campo] = extraido.get(campo, "")
+            cambios += 1
+
+        if cambios:
+            _guardar_en(ruta, biblioteca)
+        total_cambios += cambios
+        emitir("archivo", tarea="reindexar", archivo=os.path.basename(ruta), cambios=cambios)
+    emitir("fin", tarea="reindexar", cambios=total_cambios)
+    return 0
+
+
+def _destino_de_ruta(ruta):
+    """fecha/global_file del archivo de data/ indicado por ruta (diario o global)."""
+    nombre = os.path.basename(ruta)
+    if nombre == database.GLOBAL_FILENAME:
+        return {"global_file": True}
+    return {"fecha": nombre[len(database.DAILY_PREFIX):-5]}
+
+
+def _guardar_en(ruta, biblioteca):
+    """Guarda en el archivo de data/ indicado por ruta (diario o global)."""
+    database.guardar_biblioteca(biblioteca, **_destino_de_ruta(ruta))
+
+
+def cmd_migrar_isbn(args):
+    import duplicados
+
+    archivos = database.listar_archivos_datos()
+    emitir("inicio", tarea="migrar-isbn", archivos=len(archivos))
+    total_renombrados = total_fusionados = 0
+    for ruta in archivos:
+        try:
+            biblioteca = database.cargar_biblioteca(path=ruta)
+        except Exception as e:
+            emitir("error", archivo=os.path.basename(ruta), detalle=f"JSON ilegible: {e}")
+            continue
+        renombres, repetidos = isbn_canonico.plan_migracion(biblioteca)
+        if args.simular:
+            for canonica, claves in repetidos.items():
+                emitir("repetido", archivo=os.path.basename(ruta), isbn=canonica, claves=claves)
+            renombrados, fusionados = len(renombres), sum(len(c) - 1 for c in repetidos.values())
+        else:
+            # un solo guardado por archivo; si falla, el archivo queda como estaba
+            with database.transaccion(biblioteca, **_destino_de_ruta(ruta)) as tx:
+                renombrados, fusionados = isbn_canonico.migrar(tx, duplicados.fusionar_registros)
+        total_renombrados += renombrados
+        total_fusionados += fusionados
+        emitir("archivo", tarea="migrar-isbn", archivo=os.path.basename(ruta),
+               renombrados=renombrados, fusionados=fusionados)
+    emitir("fin", tarea="migrar-isbn", renombrados=total_renombrados, fusionados=total_fusionados,
+           simulado=args.simular)
+    return 0
+
+
+def cmd_compactar(args):
+    compresion.usar(args.codec)
+    archivos = database.listar_archivos_datos()
+    emitir("inicio", tarea="compactar", archivos=len(archivos), codec=compresion.actual())
+    total_antes = total_despues = 0
+    for ruta in archivos:
+        antes = os.path.getsize(ruta)
+        try:
+            biblioteca = database.cargar_biblioteca(path=ruta)
+        except Exception as e:
+            emitir("error", archivo=os.path.basename(ruta), detalle=f"JSON ilegible: {e}")
+            continue
+        t0 = time.perf_counter()
+        _guardar_en(ruta, biblioteca)
+        ms = (time.perf_counter() - t0) * 1000
+        despues = os.path.getsize(ruta)
+        total_antes += antes
+        total_despues += despues
+        emitir("archivo", tarea="compactar", archivo=os.path.basename(ruta), bytes_antes=antes,
+               bytes_despues=despues, proporcion=round(antes / max(despues, 1), 2), ms=round(ms, 1))
+    emitir("fin", tarea="compactar", bytes_antes=total_antes, bytes_despues=total_despues,
+           proporcion=round(total_antes / max(total_despues, 1), 2))
+    return 0
+
+
+def cmd_podar_backups(args):
+    eliminados = database.podar_backups(conservar=args.conservar, dias=args.dias)
+    for ruta in eliminados:
+        emitir("eliminado", archivo=ruta)
+    emitir("fin", tarea="podar-backups", eliminados=len(eliminados))
+    return 0
+
+
+def verificar_archivo(ruta):
+    """Comprueba un archivo de biblioteca. Devuelve un dict con los problemas encontrados."""
+    res = {"archivo": os.path.basename(ruta), "registros": 0, "errores": [], "pdf_faltantes": 0,
+           "portadas_faltantes": 0}
+    try:
+        # sólo lectura: verificar informa, no restaura (para eso está 'recuperar')
+        datos = database.validar_archivo(ruta)
+    except Exception as e:
+        res["errores"].append(f"JSON ilegible: {e}")
+        return res
+    if not isinstance(datos, dict):
+        res["errores"].append("el contenido no es un objeto JSON")
+        return res
+    res["registros"] = len(datos)
+    for isbn, libro in datos.items():
+        if not isinstance(libro, dict):
+            res["errores"].append(f"{isbn}: el registro no es un objeto")
+            continue
+        if not libro.get(esquema.TITULO):
+            res["errores"].append(f"{isbn}: sin título")
+        pdf = libro.get(esquema.PDF)
+        if pdf and not os.path.exists(pdf):
+            res["pdf_faltantes"] += 1
+        portada = libro.get(esquema.PORTADA)
+        if portada and not os.path.exists(portada):
+            res["portadas_faltantes"] += 1
+    return res
+
+
+def cmd_verificar(args):
+    from concurrent.futures import ProcessPoolExecutor
+
+    archivos = database.listar_archivos_datos()
+    emitir("inicio", tarea="verificar", archivos=len(archivos), rapido=args.rapido)
+    con_errores = 0
+    if args.rapido:
+        import recuperacion
+
+        # sólo sumas (CRC-32 contra lo anotado al guardar), en hilos; se decodifica lo que no tenga suma
+        t0 = time.perf_counter()
+        for res in recuperacion.verificar_todos(archivos, anotar=False):
+            con_errores += not res.valido
+            emitir("archivo", tarea="verificar", **res.como_dict())
+        emitir("fin", tarea="verificar", archivos=len(archivos), con_errores=con_errores,
+               ms=round((time.perf_counter() - t0) * 1000, 1))
+        return 1 if con_errores else 0
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        for res in pool.map(verificar_archivo, archivos):
+            con_errores += bool(res["errores"])
+            res["errores"] = res["errores"][:20]
+            emitir("archivo", tarea="verificar", **res)
+    emitir("fin", tarea="verificar", archivos=len(archivos), con_errores=con_errores)
+    return 1 if con_errores else 0
+
+
+def cmd_recuperar(args):
+    import recuperacion
+
+    emitir("inicio", tarea="recuperar")
+    informe = recuperacion.recuperar(progreso=_reportador("recuperar"))
+    for archivo, copia in informe.restaurados:
+        emitir("restaurado", archivo=archivo, copia=copia)
+    for archivo in informe.sin_copia:
+        emitir("error", archivo=archivo, detalle="dañado y sin copia válida para restaurarlo")
+    emitir("fin", tarea="recuperar", verificados=len(informe.verificados), restaurados=len(informe.restaurados),
+           sin_copia=len(informe.sin_copia), temporales=len(informe.temporales))
+    return 1 if informe.sin_copia else 0
+
+
+def cmd_enlaces(args):
+    import enlaces
+
+    biblioteca = database.cargar_biblioteca(**_destino(args))
+    revisor = enlaces.RevisorEnlaces()
+    emitir("inicio", tarea="enlaces", registros=len(biblioteca))
+    informe = enlaces.escanear(dict(biblioteca), revisor, raices=args.raices or None,
+                               progreso=_reportador("enlaces"))
+    for campo, faltantes in informe.faltantes.items():
+        for isbn, ruta in faltantes:
+            if isbn not in informe.reubicados or campo != esquema.PDF:
+                emitir("faltante", isbn=isbn, campo=campo, ruta=ruta)
+    for isbn, (vieja, nueva) in informe.reubicados.items():
+        emitir("reubicado", isbn=isbn, anterior=vieja, nueva=nueva)
+    if args.aplicar and informe.reubicados:
+        with database.transaccion(biblioteca, **_destino(args)) as tx:
+            for isbn, (_, nueva) in informe.reubicados.items():
+                tx.actualizar(isbn, {esquema.PDF: nueva})
+    emitir("fin", tarea="enlaces", revisados=informe.revisados,
+           pdf_faltantes=len(informe.faltantes[esquema.PDF]), portadas_faltantes=len(informe.faltantes[esquema.PORTADA]),
+           reubicados=len(informe.reubicados), aplicado=bool(args.aplicar and informe.reubicados),
+           segundos=round(informe.segundos, 2))
+    return 0
+
+
+def cmd_duplicados(args):
+    import duplicados
+
+    biblioteca = database.cargar_biblioteca(**_destino(args))
+    emitir("inicio", tarea="duplicados", registros=len(biblioteca))
+    indice = duplicados.IndiceDuplicados(umbral=args.umbral)
+    indice.sincronizar(biblioteca, procesos=args.procesos, progreso=_reportador("duplicados"))
+    grupos = indice.grupos()
+    for grupo in grupos:
+        emitir("grupo", isbns=grupo, titulos=[biblioteca[i].get(esquema.TITULO, "") for i in grupo])
+    emitir("fin", tarea="duplicados", grupos=len(grupos), libros=sum(len(g) for g in grupos))
+    return 0
+
+
+def cmd_buscar(args):
+    import consulta
+
+    biblioteca = database.cargar_biblioteca(**_destino(args))
+    indice = consulta.IndiceConsulta()
+    indice.sincronizar(biblioteca)
+    t0 = time.perf_counter()
+    isbns = indice.buscar(args.consulta)
+    ms = (time.perf_counter() - t0) * 1000
+    for isbn in isbns[:args.limite] if args.limite else isbns:
+        emitir("libro", isbn=isbn, **biblioteca[isbn])
+    emitir("fin", tarea="buscar", encontrados=len(isbns), ms=round(ms, 2))
+    return 0
+
+
+def cmd_estadisticas(args):
+    import estadisticas
+
+    servicio = estadisticas.servicio()
+    emitir("inicio", tarea="estadisticas", pendientes=len(servicio.pendientes()))
+    resumen = servicio.actualizar(progreso=_reportador("estadisticas"))
+    emitir("fin", tarea="estadisticas", **resumen.como_dict())
+    return 0
+
+
+def cmd_servir(args):
+    import servidor
+
+    path = database.ruta_para(**_destino(args))
+    autenticacion = None
+    if args.autenticar:
+        import autenticacion as modulo_autenticacion
+        autenticacion = modulo_autenticacion.servicio()
+        if not autenticacion.usuarios():
+            raise RuntimeError("No hay cuentas: cree una con 'cli.py usuarios agregar NOMBRE'")
+    emitir("inicio", tarea="servir", archivo=os.path.basename(path), host=args.host, puerto=args.puerto,
+           autenticacion=bool(autenticacion))
+    servidor.servir(path, host=args.host, puerto=args.puerto, autenticacion=autenticacion)
+    emitir("fin", tarea="servir")
+    return 0
+
+
+def _pedir_contrasena():
+    import getpass
+
+    if not sys.stdin.isatty():
+        # para scripts: la contraseña llega por la entrada estándar, nunca como argumento
+        return sys.stdin.readline().rstrip("\r\n")
+    contrasena = getpass.getpass("Contraseña: ")
+    if getpass.getpass("Repita la contraseña: ") != contrasena:
+        raise ValueError("Las contraseñas no coinciden")
+    return contrasena
+
+
+def cmd_usuarios(args):
+    import autenticacion
+
+    servicio = autenticacion.servicio()
+    if args.accion == "listar":
+        for usuario, rol in servicio.usuarios():
+            emitir("usuario", usuario=usuario, rol=rol)
+    elif args.accion == "agregar":
+        servicio.agregar(args.usuario, _pedir_contrasena(), rol=args.rol)
+    elif args.accion == "contrasena":
+        servicio.cambiar_contrasena(args.usuario, _pedir_contrasena())
+    else:
+        servicio.eliminar(args.usuario)
+    emitir("fin", tarea="usuarios", accion=args.accion, usuarios=len(servicio.usuarios()))
+    return 0
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(prog="bibliotech", description="Bibliotech en modo por lotes (sin interfaz).")
+    parser.add_argument("--log", dest="niveles_log", default=None, metavar="NIVELES",
+                        help="niveles de registro, ej. 'INFO' o 'WARNING,ingesta=DEBUG'")
+    parser.add_argument("--metricas", action="store_true",
+                        help="registrar tiempos y contadores y guardarlos en data/metricas al terminar")
+    parser.add_argument("--compresion", choices=["gzip", "zstd", "ninguna"], default=None,
+                        help="comprimir los archivos que se guarden (por defecto BIBLIOTECH_COMPRESION o ninguna)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def destino(p):
+        grupo = p.add_mutually_exclusive_group()
+        grupo.add_argument("--fecha", type=_fecha_arg, default=None, help="archivo diario YYYY-MM-DD (por defecto hoy)")
+        grupo.add_argument("--global", dest="global_file", action="store_true", help="usar biblioteca_global.json")
+
+    p = sub.add_parser("ingerir", help="procesar todos los PDFs de una carpeta")
+    p.add_argument("carpeta")
+    p.add_argument("--recursivo", action="store_true", help="incluir subcarpetas")
+    p.add_argument("--procesos", type=int, default=None, help="procesos en paralelo (por defecto, uno por CPU)")
+    destino(p)
+    p.set_defaults(func=cmd_ingerir)
+
+    p = sub.add_parser("exportar", help="exportar la biblioteca a CSV, JSON Lines, Parquet o XLSX")
+    p.add_argument("salida")
+    p.add_argument("--formato", choices=["csv", "jsonl", "parquet", "xlsx"], default=None)
+    destino(p)
+    p.set_defaults(func=cmd_exportar)
+
+    p = sub.add_parser("reindexar", help="migrar archivos antiguos y regenerar portadas faltantes")
+    p.add_argument("--procesos", type=int, default=None)
+    p.set_defaults(func=cmd_reindexar)
+
+    p = sub.add_parser("migrar-isbn", help="guardar los libros con su ISBN-13 canónico y unir las formas repetidas")
+    p.add_argument("--simular", action="store_true", help="sólo informar qué cambiaría")
+    p.set_defaults(func=cmd_migrar_isbn)
+
+    p = sub.add_parser("compactar", help="volver a guardar todos los archivos de data/ con otra compresión")
+    p.add_argument("codec", choices=["gzip", "zstd", "ninguna"])
+    p.set_defaults(func=cmd_compactar)
+
+    p = sub.add_parser("podar-backups", help="eliminar copias de seguridad antiguas")
+    p.add_argument("--conservar", type=int, default=20, help="copias a conservar por archivo")
+    p.add_argument("--dias", type=int, default=None, help="eliminar además las más viejas que N días")
+    p.set_defaults(func=cmd_podar_backups)
+
+    p = sub.add_parser("verificar", help="comprobar la integridad de los archivos de data/")
+    p.add_argument("--procesos", type=int, default=None)
+    p.add_argument("--rapido", action="store_true",
+                   help="sólo comprobar las sumas de control (sin revisar registros, PDFs ni portadas)")
+    p.set_defaults(func=cmd_verificar)
+
+    p = sub.add_parser("recuperar", help="restaurar archivos dañados desde su copia válida y borrar temporales huérfanos")
+    p.set_defaults(func=cmd_recuperar)
+
+    p = sub.add_parser("enlaces", help="revisar que existan los PDFs y portadas y buscar los PDFs movidos")
+    p.add_argument("--raiz", dest="raices", action="append", default=[], metavar="CARPETA",
+                   help="carpeta donde buscar PDFs movidos (se puede repetir; por defecto BIBLIOTECH_RAICES_PDF)")
+    p.add_argument("--aplicar", action="store_true", help="guardar las rutas nuevas de los PDFs reubicados")
+    destino(p)
+    p.set_defaults(func=cmd_enlaces)
+
+    p = sub.add_parser("duplicados", help="listar grupos de libros duplicados (mismo PDF o título/autor parecidos)")
+    p.add_argument("--umbral", type=float, default=0.7, help="similitud mínima de título/autor (0-1)")
+    p.add_argument("--procesos", type=int, default=None)
+    destino(p)
+    p.set_defaults(func=cmd_duplicados)
+
+    p = sub.add_parser("buscar", help="buscar con el lenguaje de consulta (autor:, titulo:, editorial:, isbn:, año:)")
+    p.add_argument("consulta")
+    p.add_argument("--limite", type=int, default=0, help="máximo de libros a listar (0 = todos)")
+    destino(p)
+    p.set_defaults(func=cmd_buscar)
+
+    p = sub.add_parser("estadisticas", help="libros por día, editoriales principales y libros por década")
+    p.set_defaults(func=cmd_estadisticas)
+
+    p = sub.add_parser("servir", help="servir el catálogo por HTTP/JSON de sólo lectura (búsqueda, ISBN, portadas)")
+    p.add_argument("--host", default="127.0.0.1", help="dirección donde escuchar (por defecto sólo este equipo)")
+    p.add_argument("--puerto", type=int, default=8765)
+    p.add_argument("--autenticar", action="store_true",
+                   help="pedir un token de sesión (cuentas de 'cli.py usuarios') en todas las rutas")
+    destino(p)
+    p.set_defaults(func=cmd_servir)
+
+    p = sub.add_parser("usuarios", help="cuentas del personal para el inicio de sesión")
+    acciones = p.add_subparsers(dest="accion", required=True)
+    acciones.add_parser("listar", help="listar las cuentas y sus roles")
+    a = acciones.add_parser("agregar", help="crear una cuenta (la contraseña se pide o se lee de stdin)")
+    a.add_argument("usuario")
+    a.add_argument("--rol", choices=["personal", "administrador"], default="personal")
+    for accion, ayuda in (("contrasena", "cambiar la contraseña (invalida los tokens emitidos)"),
+                          ("eliminar", "eliminar una cuenta")):
+        acciones.add_parser(accion, help=ayuda).add_argument("usuario")
+    p.set_defaults(func=cmd_usuarios)
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    database.asegurar_directorios()
+    nivel, por_modulo = registro.interpretar_niveles(args.niveles_log)
+    registro.configurar(nivel=nivel, por_modulo=por_modulo)
+    if args.metricas:
+        metricas.activar()
+    if args.compresion:
+        compresion.usar(args.compresion)
+    try:
+        with contextlib.redirect_stdout(sys.stderr), registro.correlacion(args.comando):
+            return args.func(args)
+    except Exception as e:
+        emitir("error", detalle=str(e))
+        log.exception("El comando '%s' falló", args.comando)
+        return 2
+    finally:
+        if args.metricas:
+            emitir("metricas", archivo=metricas.volcar(), **metricas.instantanea())
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
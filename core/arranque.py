@@ -0,0 +1,60 @@
+"""
+Medición del arranque de Bibliotech.
+Registra cuánto tarda cada etapa (importaciones, estilos QSS, construcción de la UI,
+carga de datos) y genera un informe al terminar.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class InformeArranque:
+    """Acumula los tiempos de cada etapa del arranque en orden de ejecución."""
+
+    def __init__(self, inicio=None):
+        self.inicio = inicio if inicio is not None else time.perf_counter()
+        self.etapas = []
+        self.hitos = []
+        self.completo = False
+
+    @contextmanager
+    def medir(self, etapa):
+        """Mide el bloque 'with' y lo registra con el nombre indicado."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - t0)
+
+    def registrar(self, etapa, segundos):
+        self.etapas.append((etapa, segundos))
+
+    def marcar(self, hito):
+        """Registra un hito como tiempo acumulado desde el inicio (ej. 'ventana visible')."""
+        self.hitos.append((hito, time.perf_counter() - self.inicio))
+
+    def total(self):
+        """Tiempo transcurrido desde el inicio del proceso hasta ahora (o hasta el cierre del informe)."""
+        return self._fin - self.inicio if self.completo else time.perf_counter() - self.inicio
+
+    def cerrar(self):
+        """Marca el arranque como terminado (se llama cuando la biblioteca ya está cargada)."""
+        if not self.completo:
+            self._fin = time.perf_counter()
+            self.completo = True
+
+    def como_dict(self):
+        return {
+            "etapas": {nombre: round(seg * 1000, 1) for nombre, seg in self.etapas},
+            "hitos": {nombre: round(seg * 1000, 1) for nombre, seg in self.hitos},
+            "total_ms": round(self.total() * 1000, 1),
+        }
+
+    def resumen(self):
+        lineas = ["⏱️ Informe de arranque:"]
+        for nombre, seg in self.etapas:
+            lineas.append(f"   - {nombre:<24} {seg * 1000:8.1f} ms")
+        for nombre, seg in self.hitos:
+            lineas.append(f"   @ {nombre:<24} {seg * 1000:8.1f} ms")
+        lineas.append(f"   = {'total':<24} {self.total() * 1000:8.1f} ms")
+        return "\n".join(lineas)
@@ -0,0 +1,314 @@
+"""
+Cuentas del personal e inicio de sesión (sólo biblioteca estándar).
+- Las cuentas se guardan en data/usuarios.json con la contraseña derivada con scrypt (sal aleatoria
+  por cuenta); nunca se guarda ni se compara la contraseña en texto plano.
+- scrypt es deliberadamente lento y usa memoria: se calcula en un pool de hilos (hashlib.scrypt libera
+  el GIL), así un inicio de sesión no congela la interfaz ni el bucle del servidor.
+- Los tokens son JWT HS256 firmados con HMAC-SHA256. El secreto sale de BIBLIOTECH_SECRETO o, si no
+  está definida, de data/secreto.key (se genera la primera vez); cambiarlo invalida todos los tokens.
+- Los tokens ya verificados se guardan en una LRU acotada: una comprobación repetida cuesta un
+  acceso a diccionario. Cambiar la contraseña o eliminar una cuenta invalida sus tokens (también
+  cuando lo hace otra estación: el archivo de cuentas se revisa con un stat a lo sumo una vez por segundo).
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import bloqueo
+import database
+import metricas
+import registro
+
+log = registro.obtener(__name__)
+
+ARCHIVO_USUARIOS = os.path.join(database.DATA_DIR, "usuarios.json")
+ARCHIVO_SECRETO = os.path.join(database.DATA_DIR, "secreto.key")
+VARIABLE_SECRETO = "BIBLIOTECH_SECRETO"
+
+# parámetros de scrypt: 16 MiB y ~50 ms por cálculo; se guardan con cada cuenta, así se pueden subir después
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+LARGO_SAL = 16
+LARGO_CLAVE = 32
+
+DURACION_TOKEN = 8 * 3600
+MAX_TOKENS_CACHE = 4096
+INTERVALO_REVISION = 1.0
+HILOS = min(4, os.cpu_count() or 1)
+ROLES = ("personal", "administrador")
+
+
+class ErrorAutenticacion(ValueError):
+    """Operación inválida sobre las cuentas (usuario repetido o inexistente, contraseña vacía)."""
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def derivar(contrasena):
+    """Hash guardable de 'contrasena': 'scrypt$N$r$p$sal$clave' (sal y clave en base64)."""
+    sal = secrets.token_bytes(LARGO_SAL)
+    clave = hashlib.scrypt(contrasena.encode("utf-8"), salt=sal, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                           dklen=LARGO_CLAVE, maxmem=256 * SCRYPT_N * SCRYPT_R)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(clave)}"
+
+
+def comprobar(contrasena, guardado):
+    """True si 'contrasena' corresponde al hash 'guardado' (comparación en tiempo constante)."""
+    try:
+        algoritmo, n, r, p, sal, clave = guardado.split("$")
+        n, r, p = int(n), int(r), int(p)
+        esperada = _desde_b64(clave)
+        sal = _desde_b64(sal)
+    except (AttributeError, ValueError):
+        return False
+    if algoritmo != "scrypt":
+        return False
+    obtenida = hashlib.scrypt(contrasena.encode("utf-8"), salt=sal, n=n, r=r, p=p,
+                              dklen=len(esperada), maxmem=256 * n * r)
+    return hmac.compare_digest(obtenida, esperada)
+
+
+def _leer_secreto(ruta):
+    valor = os.environ.get(VARIABLE_SECRETO, "").strip()
+    if valor:
+        return valor.encode("utf-8")
+    try:
+        with open(ruta, "r", encoding="ascii") as f:
+            return f.read().strip().encode("ascii")
+    except FileNotFoundError:
+        pass
+    database.asegurar_directorios()
+    nuevo = secrets.token_hex(32)
+    try:
+        # O_EXCL: si dos estaciones lo crean a la vez, gana una y la otra lee el suyo
+        fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(ruta, "r", encoding="ascii") as f:
+            return f.read().strip().encode("ascii")
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(nuevo)
+    log.info("Secreto de sesión nuevo generado en %s", ruta)
+    return nuevo.encode("ascii")
+
+
+class ServicioAutenticacion:
+    """Cuentas en data/usuarios.json, inicio de sesión en un pool de hilos y tokens con LRU de verificados."""
+
+    def __init__(self, ruta=None, secreto=None, duracion=DURACION_TOKEN, hilos=HILOS):
+        self.ruta = ruta or ARCHIVO_USUARIOS
+        self.secreto = secreto.encode("utf-8") if isinstance(secreto, str) else secreto
+        self.duracion = duracion
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="scrypt")
+        self._lock = threading.Lock()
+        self._usuarios = {}
+        self._firma = None
+        self._revisado = 0.0
+        self._tokens = OrderedDict()   # token -> datos del token, del menos al más recientemente usado
+        # para usuarios inexistentes se calcula igual un scrypt: el tiempo no revela qué cuentas existen
+        self._senuelo = derivar(secrets.token_hex(8))
+        self._recargar()
+
+    # Archivo de cuentas
+    def _firma_archivo(self):
+        try:
+            st = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _leer(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                return json.load(f).get("usuarios", {})
+        except FileNotFoundError:
+            return {}
+
+    def _recargar(self):
+        firma = self._firma_archivo()
+        usuarios = self._leer()
+        with self._lock:
+            self._usuarios, self._firma = usuarios, firma
+            self._revisado = time.monotonic()
+            self._tokens.clear()
+
+    def _al_dia(self):
+        """Relee las cuentas si otra estación las cambió (un stat, como mucho una vez por INTERVALO_REVISION)."""
+        if time.monotonic() - self._revisado < INTERVALO_REVISION:
+            return
+        self._revisado = time.monotonic()
+        if self._firma_archivo() != self._firma:
+            try:
+                self._recargar()
+            except (OSError, ValueError) as e:
+                # archivo a medio escribir por otra estación: se sigue con lo último leído
+                log.warning("No se pudo releer %s: %s", self.ruta, e)
+
+    def _escribir(self, usuarios):
+        directorio = os.path.dirname(self.ruta) or "."
+        os.makedirs(directorio, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix="tmp_usuarios_", dir=directorio, suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"usuarios": usuarios}, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.ruta)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _modificar(self, cambio):
+        """Aplica cambio(usuarios) sobre la versión del disco con el bloqueo tomado y la guarda."""
+        with bloqueo.BloqueoArchivo(self.ruta):
+            usuarios = self._leer()
+            cambio(usuarios)
+            self._escribir(usuarios)
+        self._recargar()
+
+    # Administración (bloqueante: scrypt corre en el hilo que llama)
+    def agregar(self, usuario, contrasena, rol=ROLES[0]):
+        usuario = usuario.strip()
+        if not usuario or not contrasena:
+            raise ErrorAutenticacion("El usuario y la contraseña no pueden estar vacíos")
+        if rol not in ROLES:
+            raise ErrorAutenticacion(f"Rol desconocido '{rol}' (use {', '.join(ROLES)})")
+        guardado = derivar(contrasena)
+
+        def cambio(usuarios):
+            if usuario in usuarios:
+                raise ErrorAutenticacion(f"Ya existe el usuario '{usuario}'")
+            usuarios[usuario] = {"hash": guardado, "rol": rol, "version": 1}
+        self._modificar(cambio)
+        log.info("Cuenta '%s' creada (%s)", usuario, rol)
+
+    def cambiar_contrasena(self, usuario, contrasena):
+        if not contrasena:
+            raise ErrorAutenticacion("La contraseña no puede estar vacía")
+        guardado = derivar(contrasena)
+
+        def cambio(usuarios):
+            if usuario not in usuarios:
+                raise ErrorAutenticacion(f"No existe el usuario '{usuario}'")
+            # la versión nueva invalida los tokens emitidos con la contraseña anterior
+            cuenta = usuarios[usuario]
+            cuenta.update(hash=guardado, version=cuenta.get("version", 1) + 1)
+        self._modificar(cambio)
+        log.info("Contraseña de '%s' cambiada", usuario)
+
+    def eliminar(self, usuario):
+        def cambio(usuarios):
+            if usuarios.pop(usuario, None) is None:
+                raise ErrorAutenticacion(f"No existe el usuario '{usuario}'")
+        self._modificar(cambio)
+        log.info("Cuenta '%s' eliminada", usuario)
+
+    def usuarios(self):
+        """[(usuario, rol)] ordenados por nombre."""
+        self._al_dia()
+        return sorted((u, c.get("rol", ROLES[0])) for u, c in self._usuarios.items())
+
+    # Inicio de sesión
+    def _secreto(self):
+        if self.secreto is None:
+            self.secreto = _leer_secreto(ARCHIVO_SECRETO)
+        return self.secreto
+
+    def _emitir(self, usuario, cuenta):
+        ahora = int(time.time())
+        cabecera = _b64(b'{"alg":"HS256","typ":"JWT"}')
+        datos = _b64(json.dumps({"sub": usuario, "rol": cuenta.get("rol", ROLES[0]),
+                                 "ver": cuenta.get("version", 1), "iat": ahora,
+                                 "exp": ahora + self.duracion}, separators=(",", ":")).encode("utf-8"))
+        firma = hmac.new(self._secreto(), f"{cabecera}.{datos}".encode("ascii"), hashlib.sha256).digest()
+        return f"{cabecera}.{datos}.{_b64(firma)}"
+
+    def _iniciar_sesion(self, usuario, contrasena):
+        self._al_dia()
+        cuenta = self._usuarios.get(usuario)
+        with metricas.medir("autenticacion.scrypt"):
+            valida = comprobar(contrasena, cuenta["hash"] if cuenta else self._senuelo)
+        if not (cuenta and valida):
+            metricas.contar("autenticacion.rechazos")
+            log.warning("Inicio de sesión rechazado para '%s'", usuario)
+            return None
+        log.info("Sesión iniciada: '%s'", usuario)
+        return self._emitir(usuario, cuenta)
+
+    def iniciar_sesion(self, usuario, contrasena):
+        """
+        Comprueba la contraseña en el pool de hilos. Devuelve un concurrent.futures.Future con el token,
+        o con None si el usuario o la contraseña no son válidos. Desde asyncio: asyncio.wrap_future(...).
+        """
+        return self._pool.submit(self._iniciar_sesion, usuario, contrasena)
+
+    # Autorización
+    def verificar(self, token):
+        """Datos del token ({'sub', 'rol', 'exp', ...}) si es válido y vigente; si no, None."""
+        self._al_dia()
+        ahora = time.time()
+        with self._lock:
+            datos = self._tokens.get(token)
+            if datos is not None:
+                if datos["exp"] > ahora:
+                    self._tokens.move_to_end(token)
+                    metricas.contar("autenticacion.tokens_en_cache")
+                    return datos
+                del self._tokens[token]
+        datos = self._validar(token, ahora)
+        if datos is not None:
+            with self._lock:
+                self._tokens[token] = datos
+                if len(self._tokens) > MAX_TOKENS_CACHE:
+                    self._tokens.popitem(last=False)
+        return datos
+
+    def _validar(self, token, ahora):
+        try:
+            cabecera, datos, firma = token.split(".")
+            esperada = hmac.new(self._secreto(), f"{cabecera}.{datos}".encode("ascii"), hashlib.sha256).digest()
+            if not hmac.compare_digest(_desde_b64(firma), esperada):
+                return None
+            if json.loads(_desde_b64(cabecera)).get("alg") != "HS256":
+                return None
+            datos = json.loads(_desde_b64(datos))
+        except (AttributeError, ValueError, UnicodeError):
+            return None
+        cuenta = self._usuarios.get(datos.get("sub"))
+        if not isinstance(datos.get("exp"), (int, float)) or datos["exp"] <= ahora:
+            return None
+        if cuenta is None or cuenta.get("version", 1) != datos.get("ver"):
+            return None
+        return datos
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False)
+
+
+_servicio = None
+_servicio_lock = threading.Lock()
+
+
+def servicio():
+    """Instancia compartida sobre data/usuarios.json."""
+    global _servicio
+    with _servicio_lock:
+        if _servicio is None:
+            _servicio = ServicioAutenticacion()
+        return _servicio
@@ -0,0 +1,123 @@
+"""
+Bloqueo entre procesos para los archivos de data/.
+Varias estaciones pueden compartir la misma carpeta data/ (unidad de red): antes de escribir
+un archivo de biblioteca se toma un bloqueo exclusivo sobre '<archivo>.lock'
+(fcntl.flock en Linux/macOS, msvcrt.locking en Windows). Es un bloqueo consultivo:
+sólo protege frente a otros procesos que también lo usan (todas las instancias de Bibliotech).
+
+Dentro de un mismo proceso el bloqueo es reentrante y también excluye a otros hilos
+(por ejemplo, una importación en segundo plano y el autoguardado).
+"""
+
+import os
+import socket
+import threading
+import time
+
+SUFIJO_BLOQUEO = ".lock"
+ESPERA_MAXIMA = 15.0
+INTERVALO_REINTENTO = 0.05
+
+if os.name == "nt":
+    import msvcrt
+
+    def _bloquear(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _desbloquear(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _bloquear(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _desbloquear(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ArchivoBloqueado(TimeoutError):
+    """Otro proceso mantiene el bloqueo más tiempo del que se está dispuesto a esperar."""
+
+
+_registro_lock = threading.Lock()
+_locales = {}   # ruta -> [threading.RLock, contador, archivo abierto]
+
+
+def _estado_local(ruta):
+    with _registro_lock:
+        estado = _locales.get(ruta)
+        if estado is None:
+            estado = _locales[ruta] = [threading.RLock(), 0, None]
+        return estado
+
+
+class BloqueoArchivo:
+    """
+    with BloqueoArchivo(ruta): ...  — bloqueo exclusivo de escritura sobre 'ruta'.
+    Lanza ArchivoBloqueado si no se obtiene en 'espera' segundos.
+    """
+
+    def __init__(self, ruta, espera=ESPERA_MAXIMA):
+        self.ruta = os.path.abspath(ruta)
+        self.espera = espera
+
+    def __enter__(self):
+        estado = _estado_local(self.ruta)
+        limite = time.monotonic() + self.espera
+        if not estado[0].acquire(timeout=self.espera):
+            raise ArchivoBloqueado(f"El archivo {os.path.basename(self.ruta)} está ocupado por otra tarea.")
+        if estado[1] == 0:
+            try:
+                estado[2] = self._bloquear_proceso(limite)
+            except BaseException:
+                estado[0].release()
+                raise
+        estado[1] += 1
+        return self
+
+    def __exit__(self, *exc):
+        estado = _estado_local(self.ruta)
+        estado[1] -= 1
+        if estado[1] == 0:
+            archivo, estado[2] = estado[2], None
+            try:
+                _desbloquear(archivo)
+            finally:
+                archivo.close()
+        estado[0].release()
+        return False
+
+    def _bloquear_proceso(self, limite):
+        f = open(self.ruta + SUFIJO_BLOQUEO, "a+")
+        while True:
+            try:
+                _bloquear(f)
+                break
+            except OSError:
+                if time.monotonic() >= limite:
+                    titular = _leer_titular(f)
+                    f.close()
+                    raise ArchivoBloqueado(
+                        f"El archivo {os.path.basename(self.ruta)} está siendo guardado por otra estación"
+                        f"{f' ({titular})' if titular else ''}. Intente nuevamente en unos segundos.")
+                time.sleep(INTERVALO_REINTENTO)
+        # quién tiene el bloqueo, para los mensajes de las otras estaciones (el byte 0 queda libre en Windows)
+        try:
+            f.seek(0)
+            f.truncate()
+            f.write(f"\n{socket.gethostname()}:{os.getpid()}")
+            f.flush()
+        except OSError:
+            pass
+        return f
+
+
+def _leer_titular(f):
+    try:
+        f.seek(0)
+        return f.read().strip()
+    except OSError:
+        return ""
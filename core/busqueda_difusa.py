@@ -0,0 +1,172 @@
+"""
+Búsqueda tolerante a errores de tipeo ("borjes" encuentra "Borges", "garsia marques" a "García Márquez").
+- Vocabulario: cada palabra plegada de título, autor y editorial -> ISBN que la contienen.
+- Índice de trigramas sobre el vocabulario (no sobre los libros): una palabra de la consulta sólo se
+  compara con las palabras que comparten trigramas con ella, y la distancia de edición se calcula
+  sólo para esos candidatos, con corte temprano. El vocabulario crece mucho más lento que el catálogo.
+- Cada libro debe coincidir con todas las palabras de la consulta; el orden es por similitud.
+
+El índice se mantiene al día con sincronizar(): sólo se reindexan los registros cuyo dict cambió.
+"""
+
+import esquema
+from normalizacion import ClavesNormalizadas, plegar
+
+CAMPOS = (esquema.TITULO, esquema.AUTOR, esquema.EDITORIAL)
+MAX_RESULTADOS = 1000
+
+
+def trigramas(palabra):
+    """Trigramas de la palabra con bordes marcados: 'sol' -> {'$so', 'sol', 'ol$'}."""
+    p = f"${palabra}$"
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def errores_permitidos(palabra):
+    """Errores de tipeo tolerados según el largo de la palabra buscada."""
+    if len(palabra) <= 3:
+        return 0
+    return 1 if len(palabra) <= 6 else 2
+
+
+def distancia_edicion(a, b, maximo):
+    """
+    Distancia de Levenshtein entre a y b, o maximo + 1 si es mayor que 'maximo'
+    (deja de calcular en cuanto una fila entera supera el máximo).
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+
+class IndiceDifuso:
+    """Vocabulario con trigramas y listas de ISBN por palabra, incremental por registro."""
+
+    def __init__(self, claves=None):
+        """claves: ClavesNormalizadas compartida con la búsqueda normal (no se pliega dos veces)."""
+        self.claves = claves or ClavesNormalizadas()
+        self._registros = {}    # isbn -> (dict indexado, palabras)
+        self._postings = {}     # palabra -> set(isbn)
+        self._trigramas = {}    # trigrama -> set(palabra)
+
+    def __len__(self):
+        return len(self._registros)
+
+    def _palabras(self, isbn, registro):
+        return frozenset(p for campo in CAMPOS for p in self.claves.clave(isbn, registro, campo).split())
+
+    def agregar(self, isbn, registro):
+        self.quitar(isbn)
+        palabras = self._palabras(isbn, registro)
+        self._registros[isbn] = (registro, palabras)
+        for palabra in palabras:
+            isbns = self._postings.get(palabra)
+            if isbns is None:
+                isbns = self._postings[palabra] = set()
+                for t in trigramas(palabra):
+                    self._trigramas.setdefault(t, set()).add(palabra)
+            isbns.add(isbn)
+
+    def quitar(self, isbn):
+        anterior = self._registros.pop(isbn, None)
+        if anterior is None:
+            return
+        for palabra in anterior[1]:
+            isbns = self._postings.get(palabra)
+            if isbns is None:
+                continue
+            isbns.discard(isbn)
+            if not isbns:
+                # la palabra ya no aparece en ningún libro: sale del vocabulario
+                del self._postings[palabra]
+                for t in trigramas(palabra):
+                    grupo = self._trigramas.get(t)
+                    if grupo is not None:
+                        grupo.discard(palabra)
+                        if not grupo:
+                            del self._trigramas[t]
+
+    def sincronizar(self, biblioteca):
+        """
+        Reindexa sólo lo que cambió desde la última vez (altas, bajas y registros reemplazados,
+        por identidad del dict como en ClavesNormalizadas).
+        """
+        for isbn in [i for i in self._registros if i not in biblioteca]:
+            self.quitar(isbn)
+        registros = self._registros
+        for isbn, registro in biblioteca.items():
+            actual = registros.get(isbn)
+            if (actual is None or actual[0] is not registro) and isinstance(registro, dict):
+                self.agregar(isbn, registro)
+
+    def actualizar(self, biblioteca, isbns):
+        """Igual que sincronizar, limitado a los ISBN que se sabe que cambiaron."""
+        registros = self._registros
+        for isbn in isbns:
+            registro = biblioteca.get(isbn)
+            if not isinstance(registro, dict):
+                self.quitar(isbn)
+                continue
+            actual = registros.get(isbn)
+            if actual is None or actual[0] is not registro:
+                self.agregar(isbn, registro)
+
+    def palabras_parecidas(self, palabra, prefijo=False):
+        """
+        {palabra del vocabulario: similitud 0-1} para una palabra de la consulta.
+        Con prefijo=True también valen las palabras que empiezan así (la última palabra mientras se escribe).
+        """
+        maximo = errores_permitidos(palabra)
+        res = {}
+        if palabra in self._postings:
+            res[palabra] = 1.0
+        # candidatos: palabras que comparten suficientes trigramas (cada error de tipeo rompe hasta 3)
+        propios = trigramas(palabra)
+        conteo = {}
+        for t in propios:
+            for candidata in self._trigramas.get(t, ()):
+                conteo[candidata] = conteo.get(candidata, 0) + 1
+        minimo_prefijo = len(propios) - 1
+        minimo = max(1, len(propios) - 3 * maximo) if maximo else len(propios)
+        for candidata, comunes in conteo.items():
+            if candidata in res:
+                continue
+            if prefijo and comunes >= minimo_prefijo and candidata.startswith(palabra):
+                res[candidata] = 0.9 * len(palabra) / len(candidata) + 0.1
+                continue
+            if comunes < minimo:
+                continue
+            d = distancia_edicion(palabra, candidata, maximo)
+            if d <= maximo:
+                res[candidata] = 1 - d / max(len(palabra), len(candidata))
+        return res
+
+    def buscar(self, consulta, limite=MAX_RESULTADOS):
+        """ISBN que coinciden con todas las palabras de la consulta, del más parecido al menos."""
+        palabras = plegar(consulta).split()
+        if not palabras:
+            return []
+        puntajes = None
+        for n, palabra in enumerate(palabras):
+            parecidas = self.palabras_parecidas(palabra, prefijo=(n == len(palabras) - 1))
+            mejores = {}
+            for candidata, similitud in parecidas.items():
+                for isbn in self._postings[candidata]:
+                    if similitud > mejores.get(isbn, 0):
+                        mejores[isbn] = similitud
+            if puntajes is None:
+                puntajes = mejores
+            else:
+                puntajes = {isbn: p + mejores[isbn] for isbn, p in puntajes.items() if isbn in mejores}
+            if not puntajes:
+                return []
+        orden = sorted(puntajes.items(), key=lambda item: (-item[1], item[0]))
+        return [isbn for isbn, _ in orden[:limite]]
@@ -0,0 +1,225 @@
+"""
+Compresión transparente de los archivos de biblioteca, del historial de cambios y de los backups.
+- gzip (biblioteca estándar) o zstd (paquete opcional 'zstandard': más rápido y más compacto).
+- Al leer, el formato se reconoce por los primeros bytes: un archivo comprimido conserva su nombre
+  (biblioteca_<fecha>.json) y los JSON planos de versiones anteriores se siguen leyendo igual.
+- Todo es por flujo: el JSON se codifica directamente dentro del compresor y se descomprime por
+  bloques, sin una segunda copia completa del archivo en memoria.
+
+Desactivada por defecto (los archivos quedan legibles a mano). Se activa con la variable de
+entorno BIBLIOTECH_COMPRESION=gzip|zstd, con usar() o con 'cli.py --compresion'.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import zlib
+
+import registro
+
+log = registro.obtener(__name__)
+
+GZIP = "gzip"
+ZSTD = "zstd"
+CODECS = (GZIP, ZSTD)
+NIVEL_GZIP = 6
+NIVEL_ZSTD = 3
+TAMANO_BLOQUE = 1024 * 1024
+_MAGIA = ((b"\x1f\x8b", GZIP), (b"\x28\xb5\x2f\xfd", ZSTD))
+
+
+class ErrorDescompresion(ValueError):
+    """Archivo comprimido truncado o dañado (guardado interrumpido, disco dañado)."""
+
+    def __init__(self, ruta, codec, detalle):
+        super().__init__(f"{ruta}: {codec} dañado o incompleto ({detalle})")
+        self.ruta = ruta
+        self.codec = codec
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("La compresión zstd requiere el paquete 'zstandard' (pip install zstandard).")
+    return zstandard
+
+
+def _normalizar(codec):
+    codec = (codec or "").strip().lower()
+    if codec in ("", "0", "no", "ninguna", "none"):
+        return None
+    if codec == "gz":
+        codec = GZIP
+    if codec not in CODECS:
+        raise ValueError(f"Compresión desconocida: {codec!r} (use {', '.join(CODECS)} o 'ninguna')")
+    return codec
+
+
+try:
+    _codec = _normalizar(os.environ.get("BIBLIOTECH_COMPRESION"))
+except ValueError as e:
+    log.warning("%s: se guarda sin comprimir", e)
+    _codec = None
+
+
+def usar(codec):
+    """Compresión para los próximos guardados: 'gzip', 'zstd' o None (sin comprimir)."""
+    global _codec
+    codec = _normalizar(codec)
+    if codec == ZSTD:
+        _zstd()
+    _codec = codec
+
+
+def actual():
+    return _codec
+
+
+def detectar(ruta):
+    """Compresión de un archivo según sus primeros bytes (None si es texto plano o no existe)."""
+    try:
+        with open(ruta, "rb") as f:
+            inicio = f.read(4)
+    except OSError:
+        return None
+    return next((codec for magia, codec in _MAGIA if inicio.startswith(magia)), None)
+
+
+class _Contador(io.RawIOBase):
+    """Cuenta los bytes que pasan (leídos de 'origen' o escritos en 'destino')."""
+
+    def __init__(self, origen=None, destino=None):
+        self._origen = origen
+        self._destino = destino
+        self.bytes = 0
+
+    def readable(self):
+        return self._origen is not None
+
+    def writable(self):
+        return self._destino is not None
+
+    def readinto(self, buffer):
+        n = self._origen.readinto(buffer)
+        self.bytes += n or 0
+        return n
+
+    def write(self, datos):
+        n = self._destino.write(datos)
+        n = len(datos) if n is None else n
+        self.bytes += n
+        return n
+
+
+class Escritura:
+    """
+    Capa de texto (UTF-8) que comprime hacia un archivo binario ya abierto, sin cerrarlo (quien
+    lo abrió hace flush/fsync). Al salir, 'sin_comprimir' tiene los bytes de texto escritos.
+
+        with open(tmp, "wb") as crudo:
+            with compresion.Escritura(crudo, compresion.actual()) as texto:
+                json.dump(datos, texto)
+            os.fsync(crudo.fileno())
+    """
+
+    def __init__(self, crudo, codec=None):
+        self.crudo = crudo
+        self.codec = _normalizar(codec)
+        self.sin_comprimir = 0
+        self._capa = None
+        self._contador = None
+        self._texto = None
+
+    def __enter__(self):
+        if self.codec == GZIP:
+            self._capa = gzip.GzipFile(fileobj=self.crudo, mode="wb", compresslevel=NIVEL_GZIP, mtime=0)
+        elif self.codec == ZSTD:
+            self._capa = _zstd().ZstdCompressor(level=NIVEL_ZSTD).stream_writer(self.crudo, closefd=False)
+        else:
+            self._capa = self.crudo
+        self._contador = _Contador(destino=self._capa)
+        # bloques grandes hacia el compresor: rinde mucho más que muchas escrituras chicas de json.dump
+        self._texto = io.TextIOWrapper(io.BufferedWriter(self._contador, TAMANO_BLOQUE), encoding="utf-8")
+        return self._texto
+
+    def __exit__(self, tipo, valor, tb):
+        try:
+            self._texto.flush()
+        finally:
+            self._texto.detach().detach()
+            self.sin_comprimir = self._contador.bytes
+            if self._capa is not self.crudo:
+                # cierra el flujo comprimido (escribe el final de gzip/zstd); el archivo crudo sigue abierto
+                self._capa.close()
+            self.crudo.flush()
+        return False
+
+
+class Lectura:
+    """
+    Archivo binario descomprimido (según lo que detecte en los primeros bytes).
+    'leidos' son los bytes leídos del disco (comprimidos), útiles para informar el progreso.
+    Un archivo comprimido truncado o dañado lanza ErrorDescompresion al salir del bloque.
+
+        with compresion.Lectura(ruta) as f:
+            datos = json.load(f)
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.codec = None
+        self.total = 0
+        self._crudo = None
+        self._contador = None
+        self._flujo = None
+
+    @property
+    def leidos(self):
+        return self._contador.bytes if self._contador is not None else 0
+
+    def __enter__(self):
+        self._crudo = open(self.ruta, "rb")
+        try:
+            self.total = os.fstat(self._crudo.fileno()).st_size
+            inicio = self._crudo.read(4)
+            self._crudo.seek(0)
+            self.codec = next((codec for magia, codec in _MAGIA if inicio.startswith(magia)), None)
+            self._contador = _Contador(origen=self._crudo)
+            origen = io.BufferedReader(self._contador, TAMANO_BLOQUE)
+            if self.codec == GZIP:
+                self._flujo = gzip.GzipFile(fileobj=origen, mode="rb")
+            elif self.codec == ZSTD:
+                self._flujo = _zstd().ZstdDecompressor().stream_reader(origen, read_across_frames=True)
+            else:
+                self._flujo = origen
+        except Exception:
+            self._crudo.close()
+            raise
+        return self._flujo
+
+    def _errores(self):
+        errores = (EOFError, gzip.BadGzipFile, zlib.error)
+        if self.codec == ZSTD:
+            errores += (_zstd().ZstdError,)
+        return errores
+
+    def __exit__(self, tipo, valor, tb):
+        self._crudo.close()
+        if self.codec is not None and valor is not None and isinstance(valor, self._errores()):
+            # cada códec falla con su propia excepción: quien lee sólo tiene que conocer ésta
+            raise ErrorDescompresion(self.ruta, self.codec, valor) from valor
+        return False
+
+
+def comprimir_archivo(origen, destino, codec):
+    """Copia 'origen' en 'destino' comprimiéndolo por bloques. Devuelve (bytes originales, bytes escritos)."""
+    with open(origen, "rb") as entrada, open(destino, "wb") as salida:
+        if codec == GZIP:
+            with gzip.GzipFile(fileobj=salida, mode="wb", compresslevel=NIVEL_GZIP, mtime=0) as capa:
+                shutil.copyfileobj(entrada, capa, TAMANO_BLOQUE)
+        else:
+            with _zstd().ZstdCompressor(level=NIVEL_ZSTD).stream_writer(salida, closefd=False) as capa:
+                shutil.copyfileobj(entrada, capa, TAMANO_BLOQUE)
+        return entrada.tell(), salida.tell()
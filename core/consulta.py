@@ -0,0 +1,458 @@
+"""
+Lenguaje de consulta del buscador y su planificador.
+
+    autor:borges editorial:"Alfaguara" año:1990..2000 isbn:978*
+    (autor:cortazar OR autor:borges) NOT editorial:sur
+    rayuela -autor:desconocido
+
+- Campos: autor, titulo (título), editorial, isbn, año (ano/anio). Un término sin campo busca en título y autor.
+- Texto: cada palabra debe ser el comienzo de una palabra del campo ("borg" -> "Borges"), sin
+  tildes ni mayúsculas. Entre comillas además debe aparecer la frase completa.
+- isbn:978* es un prefijo de la clave canónica (ISBN-13 sin guiones); año:1990..2000, año:1990.. y año:..2000 son rangos.
+- Operadores: AND (implícito entre términos), OR, NOT o '-' delante, y paréntesis.
+
+El planificador estima cuántos libros devuelve cada condición con los índices (listas por palabra,
+ISBN ordenados, libros por año) y empieza por la más selectiva. Las demás condiciones se aplican
+sobre esos candidatos: si una condición es mucho más amplia que los candidatos, se verifica libro a
+libro en lugar de armar su conjunto completo. Así una consulta compleja no recorre todo el catálogo.
+"""
+
+import bisect
+import re
+
+import esquema
+import isbn_canonico
+from normalizacion import ClavesNormalizadas, plegar
+
+CAMPOS_TEXTO = {"titulo": esquema.TITULO, "autor": esquema.AUTOR, "editorial": esquema.EDITORIAL}
+ALIAS_CAMPOS = {
+    "titulo": "titulo", "título": "titulo", "title": "titulo",
+    "autor": "autor", "author": "autor",
+    "editorial": "editorial", "publisher": "editorial",
+    "isbn": "isbn",
+    "año": "año", "ano": "año", "anio": "año", "year": "año",
+}
+# un término sin campo se busca aquí (igual que la búsqueda simple)
+CAMPOS_LIBRES = ("titulo", "autor")
+# verificar libro a libro conviene si la condición es este número de veces más grande que los candidatos
+FACTOR_VERIFICAR = 4
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|(-)(?=\S)|([^\s():"]+):(?:"([^"]*)"|([^\s()"]*))|"([^"]*)"|([^\s()"]+))')
+_ANIO = re.compile(r"^\s*(\d{4})")
+
+
+class ErrorConsulta(ValueError):
+    """La consulta no se puede interpretar (campo desconocido, paréntesis sin cerrar...)."""
+
+
+_PREFIJO_CAMPO = re.compile(r'(?:^|[\s(\-])([^\s():"]+):')
+
+
+def campo_conocido(nombre):
+    """Nombre canónico del campo ('autor', 'isbn'...) o None si no es un campo del lenguaje."""
+    return ALIAS_CAMPOS.get(nombre.lower()) or ALIAS_CAMPOS.get(plegar(nombre))
+
+
+def es_consulta(texto):
+    """
+    True si el texto usa al menos un campo conocido (autor:borges, isbn:978*). Un título con dos
+    puntos, paréntesis o guiones ("Harry Potter: la piedra") sigue siendo una búsqueda simple.
+    """
+    return any(campo_conocido(m.group(1)) for m in _PREFIJO_CAMPO.finditer(texto or ""))
+
+
+# Árbol de la consulta
+class Condicion:
+    """Predicado sobre un campo. modo: 'texto', 'frase', 'prefijo_isbn', 'isbn' o 'rango'."""
+
+    def __init__(self, campo, modo, valor):
+        self.campo = campo
+        self.modo = modo
+        self.valor = valor
+
+    def __repr__(self):
+        return f"{self.campo}:{self.valor!r}"
+
+
+class Y:
+    def __init__(self, hijos):
+        self.hijos = hijos
+
+    def __repr__(self):
+        return "(" + " AND ".join(map(repr, self.hijos)) + ")"
+
+
+class O:
+    def __init__(self, hijos):
+        self.hijos = hijos
+
+    def __repr__(self):
+        return "(" + " OR ".join(map(repr, self.hijos)) + ")"
+
+
+class No:
+    def __init__(self, hijo):
+        self.hijo = hijo
+
+    def __repr__(self):
+        return f"NOT {self.hijo!r}"
+
+
+def _tokenizar(texto):
+    tokens, pos = [], 0
+    texto = texto.strip()
+    while pos < len(texto):
+        m = _TOKEN.match(texto, pos)
+        if not m or m.end() == pos:
+            raise ErrorConsulta(f"No se entiende la consulta cerca de: {texto[pos:pos + 15]!r}")
+        pos = m.end()
+        abre, cierra, menos, campo, campo_frase, campo_valor, frase, palabra = m.groups()
+        if abre:
+            tokens.append(("(", None))
+        elif cierra:
+            tokens.append((")", None))
+        elif menos:
+            tokens.append(("NOT", None))
+        elif campo is not None:
+            valor = campo_frase if campo_frase is not None else campo_valor
+            tokens.append(("campo", (campo, valor, campo_frase is not None)))
+        elif frase is not None:
+            tokens.append(("campo", (None, frase, True)))
+        elif palabra in ("AND", "OR", "NOT"):
+            tokens.append((palabra, None))
+        else:
+            tokens.append(("campo", (None, palabra, False)))
+    return tokens
+
+
+def _condicion(campo, valor, es_frase):
+    if campo is None:
+        nombre = None
+    else:
+        nombre = campo_conocido(campo)
+        if nombre is None:
+            raise ErrorConsulta(f"Campo desconocido: {campo!r} (use autor, titulo, editorial, isbn o año)")
+    if not valor:
+        raise ErrorConsulta(f"Falta el valor de {campo}:")
+
+    if nombre == "isbn":
+        limpio = valor.replace("-", "").replace(" ", "").upper()
+        if limpio.endswith("*"):
+            return Condicion("isbn", "prefijo_isbn", limpio.rstrip("*"))
+        # exacto: cualquier forma del ISBN (con guiones, ISBN-10) se compara con la clave canónica
+        return Condicion("isbn", "isbn", isbn_canonico.clave(limpio))
+    if nombre == "año":
+        m = re.fullmatch(r"(\d{4})?\s*(\.\.)?\s*(\d{4})?", valor.strip())
+        if not m or not (m.group(1) or m.group(3)) or (not m.group(2) and m.group(3)):
+            raise ErrorConsulta(f"Año inválido: {valor!r} (use 1995, 1990..2000, 1990.. o ..2000)")
+        desde = int(m.group(1)) if m.group(1) else 0
+        hasta = int(m.group(3)) if m.group(3) else (9999 if m.group(2) else desde)
+        return Condicion("año", "rango", (desde, hasta))
+
+    palabras = tuple(plegar(valor).split())
+    if not palabras:
+        raise ErrorConsulta(f"Valor vacío en la consulta: {valor!r}")
+    campos = (nombre,) if nombre else CAMPOS_LIBRES
+    condiciones = [Condicion(c, "frase" if es_frase and len(palabras) > 1 else "texto", palabras) for c in campos]
+    return condiciones[0] if len(condiciones) == 1 else O(condiciones)
+
+
+class _Parser:
+    """Descenso recursivo: o := y (OR y)* ; y := unario+ ; unario := NOT unario | '(' o ')' | condición."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _ver(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def analizar(self):
+        if not self.tokens:
+            raise ErrorConsulta("Consulta vacía")
+        nodo = self._o()
+        if self.pos != len(self.tokens):
+            raise ErrorConsulta("Paréntesis ')' sin abrir")
+        return nodo
+
+    def _o(self):
+        hijos = [self._y()]
+        while self._ver() == "OR":
+            self.pos += 1
+            hijos.append(self._y())
+        return hijos[0] if len(hijos) == 1 else O(hijos)
+
+    def _y(self):
+        hijos = [self._unario()]
+        while self._ver() not in (None, ")", "OR"):
+            if self._ver() == "AND":
+                self.pos += 1
+            hijos.append(self._unario())
+        return hijos[0] if len(hijos) == 1 else Y(hijos)
+
+    def _unario(self):
+        tipo = self._ver()
+        if tipo is None:
+            raise ErrorConsulta("La consulta termina de forma incompleta")
+        if tipo == "NOT":
+            self.pos += 1
+            return No(self._unario())
+        if tipo == "(":
+            self.pos += 1
+            nodo = self._o()
+            if self._ver() != ")":
+                raise ErrorConsulta("Falta cerrar un paréntesis")
+            self.pos += 1
+            return nodo
+        if tipo == "campo":
+            self.pos += 1
+            return _condicion(*self.tokens[self.pos - 1][1])
+        raise ErrorConsulta(f"Operador {tipo} fuera de lugar")
+
+
+def analizar(texto):
+    """Texto de la consulta -> árbol (Condicion, Y, O, No). Lanza ErrorConsulta si no es válida."""
+    return _Parser(_tokenizar(texto)).analizar()
+
+
+# Índices y ejecución
+def _anio(registro):
+    m = _ANIO.match(registro.get(esquema.FECHA, "") or "")
+    return int(m.group(1)) if m else None
+
+
+class IndiceConsulta:
+    """
+    Índices por campo para el planificador, incrementales por registro:
+    - listas de ISBN por palabra plegada de título, autor y editorial (con vocabulario ordenado para prefijos)
+    - ISBN ordenados por su clave canónica (prefijos con bisect)
+    - ISBN por año de publicación
+    """
+
+    def __init__(self, claves=None):
+        self.claves = claves or ClavesNormalizadas()
+        self._registros = {}     # isbn -> (dict indexado, {campo: palabras}, año)
+        self._postings = {c: {} for c in CAMPOS_TEXTO}
+        self._vocabulario = {c: None for c in CAMPOS_TEXTO}   # lista ordenada, None si hay que rehacerla
+        self._por_anio = {}
+        self._isbns = None
+        self._ordinal = {}       # isbn -> posición de alta (los resultados salen en el orden de la biblioteca)
+        # isbn: exacto encuentra el libro aunque el archivo no haya pasado por migrar-isbn (guardado como ISBN-10)
+        self._por_isbn = isbn_canonico.IndiceISBN()
+        self._siguiente = 0
+
+    def __len__(self):
+        return len(self._registros)
+
+    # Mantenimiento
+    def agregar(self, isbn, registro):
+        ordinal = self._ordinal.get(isbn)
+        self.quitar(isbn)
+        if ordinal is None:
+            ordinal, self._siguiente = self._siguiente, self._siguiente + 1
+        self._ordinal[isbn] = ordinal
+        palabras = {c: frozenset(self.claves.clave(isbn, registro, campo).split())
+                    for c, campo in CAMPOS_TEXTO.items()}
+        anio = _anio(registro)
+        self._registros[isbn] = (registro, palabras, anio)
+        self._por_isbn.agregar(isbn)
+        for c, conjunto in palabras.items():
+            postings = self._postings[c]
+            for p in conjunto:
+                if p not in postings:
+                    postings[p] = set()
+                    self._vocabulario[c] = None
+                postings[p].add(isbn)
+        if anio is not None:
+            self._por_anio.setdefault(anio, set()).add(isbn)
+        self._isbns = None
+
+    def quitar(self, isbn):
+        anterior = self._registros.pop(isbn, None)
+        if anterior is None:
+            return
+        del self._ordinal[isbn]
+        self._por_isbn.quitar(isbn)
+        _, palabras, anio = anterior
+        for c, conjunto in palabras.items():
+            postings = self._postings[c]
+            for p in conjunto:
+                isbns = postings.get(p)
+                if isbns is not None:
+                    isbns.discard(isbn)
+                    if not isbns:
+                        del postings[p]
+                        self._vocabulario[c] = None
+        if anio is not None:
+            grupo = self._por_anio.get(anio)
+            if grupo is not None:
+                grupo.discard(isbn)
+                if not grupo:
+                    del self._por_anio[anio]
+        self._isbns = None
+
+    def sincronizar(self, biblioteca):
+        """
+        Reindexa sólo lo que cambió (altas, bajas y registros reemplazados).
+        Un registro cambiado se reconoce porque su dict es otro (ver ClavesNormalizadas): las ediciones,
+        el deshacer y la fusión reemplazan el dict en lugar de modificarlo.
+        """
+        for isbn in [i for i in self._registros if i not in biblioteca]:
+            self.quitar(isbn)
+        registros = self._registros
+        for isbn, registro in biblioteca.items():
+            actual = registros.get(isbn)
+            if (actual is None or actual[0] is not registro) and isinstance(registro, dict):
+                self.agregar(isbn, registro)
+
+    def actualizar(self, biblioteca, isbns):
+        """
+        Como sincronizar, pero revisando sólo 'isbns': los que cambió una transacción, un deshacer o
+        una recarga (tx.cambios(), ResultadoFusion.isbns()). No recorre la biblioteca.
+        """
+        registros = self._registros
+        for isbn in isbns:
+            registro = biblioteca.get(isbn)
+            if not isinstance(registro, dict):
+                self.quitar(isbn)
+                continue
+            actual = registros.get(isbn)
+            if actual is None or actual[0] is not registro:
+                self.agregar(isbn, registro)
+
+    # Acceso a los índices
+    def _palabras_con_prefijo(self, campo, prefijo):
+        vocabulario = self._vocabulario[campo]
+        if vocabulario is None:
+            vocabulario = self._vocabulario[campo] = sorted(self._postings[campo])
+        i = bisect.bisect_left(vocabulario, prefijo)
+        j = bisect.bisect_left(vocabulario, prefijo + "\U0010ffff")
+        return vocabulario[i:j]
+
+    def _isbns_con_prefijo(self, prefijo):
+        # ordenados por clave canónica: isbn:978* también encuentra los guardados como ISBN-10 o con guiones
+        if self._isbns is None:
+            self._isbns = sorted((isbn_canonico.clave(isbn), isbn) for isbn in self._registros)
+        i = bisect.bisect_left(self._isbns, (prefijo,))
+        j = bisect.bisect_left(self._isbns, (prefijo + "\U0010ffff",))
+        return [isbn for _, isbn in self._isbns[i:j]]
+
+    def _anios_en(self, desde, hasta):
+        if hasta - desde < len(self._por_anio):
+            return [a for a in range(desde, hasta + 1) if a in self._por_anio]
+        return [a for a in self._por_anio if desde <= a <= hasta]
+
+    # Estimación de tamaño (sin construir conjuntos)
+    def estimar(self, nodo):
+        total = len(self._registros)
+        if isinstance(nodo, Condicion):
+            if nodo.modo == "isbn":
+                return len(self._por_isbn.claves(nodo.valor))
+            if nodo.modo == "prefijo_isbn":
+                return len(self._isbns_con_prefijo(nodo.valor))
+            if nodo.modo == "rango":
+                return sum(len(self._por_anio[a]) for a in self._anios_en(*nodo.valor))
+            postings = self._postings[nodo.campo]
+            # la palabra más rara acota el resultado de todo el término
+            return min(sum(len(postings[p]) for p in self._palabras_con_prefijo(nodo.campo, palabra))
+                       for palabra in nodo.valor)
+        if isinstance(nodo, Y):
+            return min(self.estimar(h) for h in nodo.hijos)
+        if isinstance(nodo, O):
+            return min(total, sum(self.estimar(h) for h in nodo.hijos))
+        return total - self.estimar(nodo.hijo)
+
+    # Evaluación
+    def conjunto(self, nodo):
+        """Conjunto de ISBN que cumplen 'nodo', usando los índices."""
+        if isinstance(nodo, Condicion):
+            return self._conjunto_condicion(nodo)
+        if isinstance(nodo, O):
+            res = set()
+            for hijo in nodo.hijos:
+                res |= self.conjunto(hijo)
+            return res
+        if isinstance(nodo, No):
+            return set(self._registros) - self.conjunto(nodo.hijo)
+        return self._conjunto_y(nodo)
+
+    def _conjunto_condicion(self, c):
+        if c.modo == "isbn":
+            return set(self._por_isbn.claves(c.valor))
+        if c.modo == "prefijo_isbn":
+            return set(self._isbns_con_prefijo(c.valor))
+        if c.modo == "rango":
+            res = set()
+            for a in self._anios_en(*c.valor):
+                res |= self._por_anio[a]
+            return res
+        postings = self._postings[c.campo]
+        # primero la palabra más rara; las demás sólo achican ese conjunto
+        grupos = sorted(([postings[p] for p in self._palabras_con_prefijo(c.campo, palabra)] for palabra in c.valor),
+                        key=lambda g: sum(map(len, g)))
+        res = set().union(*grupos[0]) if grupos[0] else set()
+        for grupo in grupos[1:]:
+            if not res:
+                break
+            res = {isbn for isbn in res if any(isbn in s for s in grupo)}
+        if c.modo == "frase":
+            frase = " ".join(c.valor)
+            campo = CAMPOS_TEXTO[c.campo]
+            res = {isbn for isbn in res
+                   if frase in self.claves.clave(isbn, self._registros[isbn][0], campo)}
+        return res
+
+    def _conjunto_y(self, nodo):
+        positivos = [h for h in nodo.hijos if not isinstance(h, No)]
+        negativos = [h.hijo for h in nodo.hijos if isinstance(h, No)]
+        if not positivos:
+            candidatos = set(self._registros)
+        else:
+            # plan: de la condición más selectiva a la menos
+            positivos.sort(key=self.estimar)
+            candidatos = self.conjunto(positivos[0])
+            for hijo in positivos[1:]:
+                if not candidatos:
+                    return candidatos
+                if self.estimar(hijo) > FACTOR_VERIFICAR * len(candidatos):
+                    candidatos = {isbn for isbn in candidatos if self.cumple(hijo, isbn)}
+                else:
+                    candidatos &= self.conjunto(hijo)
+        for hijo in negativos:
+            if not candidatos:
+                break
+            if self.estimar(hijo) > FACTOR_VERIFICAR * len(candidatos):
+                candidatos = {isbn for isbn in candidatos if not self.cumple(hijo, isbn)}
+            else:
+                candidatos -= self.conjunto(hijo)
+        return candidatos
+
+    def cumple(self, nodo, isbn):
+        """Verifica 'nodo' para un solo libro (sin recorrer los índices)."""
+        if isinstance(nodo, Y):
+            return all(self.cumple(h, isbn) for h in nodo.hijos)
+        if isinstance(nodo, O):
+            return any(self.cumple(h, isbn) for h in nodo.hijos)
+        if isinstance(nodo, No):
+            return not self.cumple(nodo.hijo, isbn)
+        registro, palabras, anio = self._registros[isbn]
+        if nodo.modo == "isbn":
+            return isbn_canonico.clave(isbn) == nodo.valor
+        if nodo.modo == "prefijo_isbn":
+            return isbn_canonico.clave(isbn).startswith(nodo.valor)
+        if nodo.modo == "rango":
+            return anio is not None and nodo.valor[0] <= anio <= nodo.valor[1]
+        propias = palabras[nodo.campo]
+        if not all(any(p.startswith(q) for p in propias) for q in nodo.valor):
+            return False
+        if nodo.modo == "frase":
+            return " ".join(nodo.valor) in self.claves.clave(isbn, registro, CAMPOS_TEXTO[nodo.campo])
+        return True
+
+    def buscar(self, texto):
+        """
+        ISBN que cumplen la consulta, en el orden en que se agregaron al índice. No revisa la
+        biblioteca: quien la modifica pone el índice al día con sincronizar (carga) o actualizar (cambios).
+        """
+        arbol = analizar(texto)
+        return sorted(self.conjunto(arbol), key=self._ordinal.__getitem__)
@@ -1,13 +1,46 @@
 import json
 import os
 import tempfile
+import time
+import zlib
 from shutil import copy2
 from datetime import date, datetime
 
+import bloqueo
+import compresion
+import esquema
+import metricas
+import registro
+
+log = registro.obtener(__name__)
+
 DATA_DIR = "data"
 BACKUP_DIR = os.path.join(DATA_DIR, "backups")
 GLOBAL_FILENAME = "biblioteca_global.json"
 DAILY_PREFIX = "biblioteca_"
+# temporales de guardado: tmp_bibl_<archivo>~<azar>.json (el nombre dice de qué archivo son)
+PREFIJO_TEMPORAL = "tmp_bibl_"
+SEPARADOR_TEMPORAL = "~"
+
+class ArchivoCorrupto(ValueError):
+    """
+    El archivo de biblioteca no se puede leer (escritura cortada, disco dañado) y no había una copia
+    válida para restaurarlo. Mientras tanto este proceso no lo sobrescribe.
+    """
+
+    def __init__(self, path, detalle):
+        super().__init__(f"{os.path.basename(path)} está dañado y no hay una copia válida para restaurarlo: {detalle}")
+        self.path = path
+
+class ArchivoIlegible(ValueError):
+    """
+    Lectura de sólo consulta (leer_para_consulta) de un archivo que no se decodifica o cuyo contenido
+    no coincide con la suma anotada en su último guardado. No se intenta restaurar.
+    """
+
+    def __init__(self, path, detalle):
+        super().__init__(f"{os.path.basename(path)} no se puede leer: {detalle}")
+        self.path = path
 
 def asegurar_directorios():
     os.makedirs(DATA_DIR, exist_ok=True)
@@ -46,26 +79,167 @@ def listar_archivos_diarios():
                 res.append(filename)
             except Exception:
                 continue
-    res.sort
+    res.sort()
     return res
 
-def cargar_biblioteca(fecha: date = None, global_file: bool = False, path = None):
-    """Carga el archivo JSON solicitado. Devuelve un dict vacío si no existe o está corrupto."""
+TAMANO_BLOQUE_LECTURA = 1024 * 1024
+
+def _leer_json(path, progreso=None):
+    """
+    Lee y decodifica un JSON, plano o comprimido (gzip/zstd, se detecta solo). Si se pasa
+    'progreso(leidos, total)' el archivo se lee por bloques informando los bytes leídos del disco
+    (útil para mostrar una barra durante la carga en segundo plano).
+    """
+    lectura = compresion.Lectura(path)
+    with lectura as f:
+        if progreso is None:
+            datos = json.load(f)
+        else:
+            # los bloques descomprimidos se acumulan en un solo buffer (sin lista de partes + join)
+            contenido = bytearray()
+            while True:
+                bloque = f.read(TAMANO_BLOQUE_LECTURA)
+                if not bloque:
+                    break
+                contenido += bloque
+                progreso(lectura.leidos, lectura.total)
+            datos = json.loads(contenido)
+    metricas.contar("database.bytes_leidos", lectura.leidos)
+    return datos
+
+def cargar_biblioteca(fecha: date = None, global_file: bool = False, path = None, progreso=None):
+    """
+    Carga el archivo JSON solicitado. Devuelve un dict vacío si no existe.
+    Si está dañado se restaura desde el backup válido más reciente (ver recuperacion); si no hay
+    ninguno lanza ArchivoCorrupto, nunca un dict vacío que el autoguardado escribiría encima.
+    Un archivo de un esquema anterior se guarda una vez con el actual. Ambas cosas sólo dentro de
+    DATA_DIR: un 'path' de otra carpeta se lee sin escribir nada en disco.
+    'progreso' es opcional: callback(leidos, total) en bytes.
+    """
     #Agregamos compatibilidad para cargar archivos dentro de _load_clicked
     if path:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _cargar_o_restaurar(path, progreso)
         
     path = ruta_para(fecha, global_file)
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _cargar_o_restaurar(path, progreso)
     except FileNotFoundError:
+        _registrar_version(path, {}, 0, None)
         return {}
-    except json.JSONDecodeError:
-        #archivo corrupto: retornamos vacío para evitar romper la app
+
+def en_datos(path) -> bool:
+    """True si 'path' está dentro de DATA_DIR: sólo esos archivos se migran o restauran al cargarlos."""
+    raiz = _clave(DATA_DIR)
+    try:
+        return os.path.commonpath([_clave(path), raiz]) == raiz
+    except ValueError:
+        # otra unidad en Windows
+        return False
+
+def _cargar_o_restaurar(path, progreso=None):
+    if not en_datos(path):
+        # un archivo elegido con "Cargar" fuera de data/ sólo se lee: dañado, se informa sin tocarlo
+        return _cargar_versionado(path, progreso)
+    try:
+        return _cargar_versionado(path, progreso)
+    except (FileNotFoundError, PermissionError, esquema.ErrorEsquema):
+        raise
+    except Exception as e:
+        # JSON cortado, gzip/zstd truncado o bytes basura: guardado interrumpido o disco dañado
+        import recuperacion
+        log.error("No se pudo leer %s: %s", path, e)
+        # restaurar no hace nada si otra estación ya lo reescribió entero: se vuelve a leer igual
+        recuperacion.restaurar(path)
+    try:
+        datos = _cargar_versionado(path, progreso)
+    except (FileNotFoundError, PermissionError, esquema.ErrorEsquema):
+        raise
+    except Exception as e:
+        _danados.add(_clave(path))
+        raise ArchivoCorrupto(path, e) from e
+    _danados.discard(_clave(path))
+    return datos
+
+def leer_archivo(path):
+    """
+    Lee un archivo de biblioteca sólo para consultarlo (estadísticas, informes): no se registra para
+    la detección de cambios entre procesos. Devuelve {} si no existe o está corrupto.
+    """
+    try:
+        datos, _ = _leer_libros(path)
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError, compresion.ErrorDescompresion,
+            esquema.ErrorEsquema):
         return {}
+    return datos if isinstance(datos, dict) else {}
+
+def leer_para_consulta(path):
+    """
+    Lectura sin efectos secundarios para procesos que sólo consultan (el servidor HTTP): decodifica,
+    comprueba la versión del esquema y la suma anotada, y migra en memoria. No escribe nada en disco:
+    ni el esquema nuevo, ni restauraciones, ni estadísticas, ni .gen/.lock. Registra la versión leída
+    para que cambio_externo detecte los guardados de otras estaciones.
+    Lanza FileNotFoundError, ErrorEsquema (archivo más nuevo) o ArchivoIlegible (dañado o a medio escribir).
+    """
+    generacion, firma, suma = leer_generacion(path), firma_archivo(path), leer_suma(path)
+    try:
+        with metricas.medir("database.cargar", os.path.basename(path)):
+            datos, _ = _leer_libros(path)
+        actual = calcular_suma(path) if suma is not None else None
+    except (FileNotFoundError, PermissionError, esquema.ErrorEsquema):
+        raise
+    except Exception as e:
+        raise ArchivoIlegible(path, e) from e
+    if actual is not None and actual != suma:
+        # un guardado entre la lectura del .gen y la del archivo también llega aquí: quien llama reintenta
+        # cuando cambien la firma o la generación
+        raise ArchivoIlegible(path, "el contenido no coincide con la suma de su último guardado "
+                                    "(use 'cli.py verificar' si se editó a mano)")
+    if not isinstance(datos, dict):
+        raise ArchivoIlegible(path, "no contiene un diccionario de libros")
+    _registrar_version(path, datos, generacion, firma)
+    return datos
+
+def validar_archivo(path):
+    """
+    Decodifica el archivo entero sin registrarlo para la detección de cambios. Devuelve los libros;
+    si está dañado lanza la excepción de lectura (la usan verificar y la recuperación).
+    """
+    return _leer_libros(path)[0]
+
+def _leer_libros(path, progreso=None):
+    """(libros, versión del archivo) con los libros ya migrados en memoria al esquema actual."""
+    libros, version = esquema.desenvolver(_leer_json(path, progreso))
+    if version != esquema.VERSION and isinstance(libros, dict):
+        # un archivo de una versión más nueva lanza ErrorEsquema: nunca se sobrescribe con un formato viejo
+        esquema.migrar(libros, version)
+    return libros, version
+
+def _cargar_versionado(path, progreso=None):
+    # generación y firma se leen antes que los datos: si otro proceso escribe en medio,
+    # la próxima comprobación verá un cambio (nunca al revés)
+    generacion, firma = leer_generacion(path), firma_archivo(path)
+    with metricas.medir("database.cargar", os.path.basename(path)):
+        datos, version = _leer_libros(path, progreso)
+    if isinstance(datos, dict):
+        _registrar_version(path, datos, generacion, firma)
+        if version < esquema.VERSION:
+            if en_datos(path):
+                _sellar(path, datos, version)
+            else:
+                # fuera de data/ abrirlo no lo reescribe: queda migrado sólo en memoria hasta que se guarde
+                log.info("%s usa el esquema %d: migrado en memoria, el archivo no se modifica",
+                         os.path.basename(path), version)
+    return datos
+
+def _sellar(path, biblioteca, version):
+    """Guarda una sola vez con el esquema actual un archivo que se acaba de migrar en memoria."""
+    try:
+        _escribir_archivo(biblioteca, path)
+        log.info("%s migrado del esquema %d al %d", os.path.basename(path), version, esquema.VERSION)
+    except Exception as e:
+        # se sigue trabajando con lo migrado en memoria; el próximo guardado lo escribe
+        log.warning("No se pudo guardar %s con el esquema %d: %s", os.path.basename(path), esquema.VERSION, e)
 
 def hacer_backup(path):
     """
@@ -74,7 +248,7 @@ def hacer_backup(path):
     """
     try:
         if not path or not os.path.exists(path):
-            print(f"⚠️ No se puede hacer backup: archivo no encontrado -> {path}")
+            log.debug("Sin backup: el archivo aún no existe -> %s", path)
             return None
 
         asegurar_directorios()
@@ -84,38 +258,141 @@ def hacer_backup(path):
         nombre_backup = f"{base}.bak.{timestamp}"
         dest = os.path.join(BACKUP_DIR, nombre_backup)
 
-        copy2(path, dest)
-        print(f"🗂️ Backup creado: {dest}")
+        codec = compresion.actual()
+        with metricas.medir("database.backup", base):
+            if codec and not compresion.detectar(path):
+                # el archivo se guardó sin comprimir (antes de activar la compresión): la copia sí se comprime
+                originales, escritos = compresion.comprimir_archivo(path, dest, codec)
+                log.debug("Backup %s comprimido con %s: %d -> %d bytes", base, codec, originales, escritos)
+            else:
+                copy2(path, dest)
+        metricas.contar("database.backups")
+        log.info("Backup creado: %s", dest)
         return dest
 
     except PermissionError:
-        print(f"❌ Permiso denegado al intentar copiar: {path}")
+        log.error("Permiso denegado al intentar copiar: %s", path)
         return None
     except Exception as e:
-        print(f"⚠️ Error al crear backup: {e}")
+        log.warning("Error al crear backup de %s: %s", path, e)
         return None
 
-def guardar_biblioteca(biblioteca: dict, fecha=None, global_file: bool=False):
+def listar_archivos_datos():
+    """Rutas de todos los archivos de biblioteca (diarios y global) presentes en data/."""
+    rutas = [os.path.join(DATA_DIR, f) for f in listar_archivos_diarios()]
+    global_path = os.path.join(DATA_DIR, GLOBAL_FILENAME)
+    if os.path.exists(global_path):
+        rutas.append(global_path)
+    return rutas
+
+def podar_backups(conservar: int = 20, dias: int = None):
+    """
+    Elimina backups antiguos de data/backups. Por cada archivo de origen conserva los
+    'conservar' más recientes; si se indica 'dias', borra además los más viejos que eso.
+    Devuelve la lista de rutas eliminadas.
+    """
+    asegurar_directorios()
+    por_origen = {}
+    for nombre in os.listdir(BACKUP_DIR):
+        base, sep, marca = nombre.partition(".bak.")
+        if not sep:
+            continue
+        por_origen.setdefault(base, []).append((marca, nombre))
+
+    limite = datetime.now().timestamp() - dias * 86400 if dias is not None else None
+    eliminados = []
+    for base, copias in por_origen.items():
+        copias.sort(reverse=True)  # la marca YYYYmmdd_HHMMSS ordena cronológicamente
+        for idx, (marca, nombre) in enumerate(copias):
+            ruta = os.path.join(BACKUP_DIR, nombre)
+            viejo = limite is not None and os.path.getmtime(ruta) < limite
+            if idx >= conservar or viejo:
+                try:
+                    os.remove(ruta)
+                    eliminados.append(ruta)
+                except OSError as e:
+                    log.warning("No se pudo eliminar backup %s: %s", ruta, e)
+    return eliminados
+
+def guardar_biblioteca(biblioteca: dict, fecha=None, global_file: bool=False, cambios=None):
     """
     Guarda el diccionario 'biblioteca' en un JSON de forma robusta:
     - hace backup del archivo existente
     - escribe en un temporal y hace fsync
     - reemplaza atómicamente con os.replace
+    'cambios' ({isbn: (antes, despues)}, lo pasa Transaccion) permite actualizar las estadísticas
+    sin recorrer toda la biblioteca.
     Lanza excepciones si algo falla (la UI debe capturarlas y mostrarlas).
     """
     asegurar_directorios()
-    target_path = ruta_para(fecha, global_file)
-
-    # Normalizar claves - compatibilidad con archivos antiguos
-    for isbn, datos in list(biblioteca.items()):
-        if isinstance(datos, dict):
-            # claves antiguas -> nuevas
-            if "Titulo" in datos and "Título" not in datos:
-                datos["Título"] = datos.pop("Titulo")
-            if "Fecha de publicacion" in datos and "Fecha de Publicación" not in datos:
-                datos["Fecha de Publicación"] = datos.pop("Fecha de publicacion")
-            biblioteca[isbn] = datos
+    return _escribir_archivo(biblioteca, ruta_para(fecha, global_file), cambios)
+
+def _escribir_archivo(biblioteca, target_path, cambios=None):
+    # el bloqueo evita que dos estaciones escriban a la vez; si otra guardó desde nuestra última
+    # lectura, sus cambios se incorporan registro por registro antes de escribir (no se pierden)
+    with bloqueo.BloqueoArchivo(target_path), metricas.medir("database.guardar", os.path.basename(target_path)):
+        if _clave(target_path) in _danados and os.path.exists(target_path):
+            # lo que hay en memoria no salió de ese archivo: escribirlo encima perdería lo que se pueda rescatar
+            raise ArchivoCorrupto(target_path, "se conserva sin sobrescribir hasta restaurarlo")
+        firma_previa = firma_archivo(target_path)
+        if cambio_externo(target_path):
+            resultado = fusionar_externo(biblioteca, target_path)
+            if resultado is not None and resultado.hay_cambios():
+                log.warning("Cambios de otra estación incorporados antes de guardar %s: %s",
+                            os.path.basename(target_path), resultado.resumen())
+                # varios guardados antes de que la UI lo consulte (lotes de una importación): se acumulan
+                previo = _ultimas_fusiones.get(_clave(target_path))
+                _ultimas_fusiones[_clave(target_path)] = previo.incorporar(resultado) if previo else resultado
+                cambios = None   # entraron registros ajenos a la transacción
+        generacion = leer_generacion(target_path) + 1
+        suma = _guardar(biblioteca, target_path)
+        _escribir_generacion(target_path, generacion, suma)
+        firma = firma_archivo(target_path)
+        _registrar_version(target_path, biblioteca, generacion, firma)
+        _actualizar_estadisticas(target_path, biblioteca, cambios, firma_previa, firma)
+        return target_path
+
+def _actualizar_estadisticas(path, biblioteca, cambios, firma_previa, firma):
+    # las estadísticas son derivadas: si fallan, el guardado sigue siendo válido
+    import estadisticas
+    try:
+        estadisticas.servicio().al_guardar(path, biblioteca, cambios, firma_previa, firma)
+    except Exception as e:
+        log.warning("No se pudieron actualizar las estadísticas de %s: %s", os.path.basename(path), e)
+
+class _Suma:
+    """Archivo binario que calcula el CRC-32 y cuenta los bytes de lo que se escribe en él."""
+
+    def __init__(self, crudo):
+        self.crudo = crudo
+        self.crc = 0
+        self.bytes = 0
 
+    def write(self, datos):
+        self.crc = zlib.crc32(datos, self.crc)
+        self.bytes += len(datos)
+        return self.crudo.write(datos)
+
+    def flush(self):
+        self.crudo.flush()
+
+    def como_dict(self):
+        return {"crc32": f"{self.crc:08x}", "bytes": self.bytes}
+
+def calcular_suma(path):
+    """{'crc32', 'bytes'} de lo que hay en disco (bytes tal cual, comprimidos o no), leído por bloques."""
+    suma = _Suma(None)
+    with open(path, "rb") as f:
+        while True:
+            bloque = f.read(TAMANO_BLOQUE_LECTURA)
+            if not bloque:
+                break
+            suma.crc = zlib.crc32(bloque, suma.crc)
+            suma.bytes += len(bloque)
+    return suma.como_dict()
+
+def _guardar(biblioteca, target_path):
+    """Escribe 'biblioteca' en 'target_path' (backup, temporal, fsync, reemplazo). Devuelve la suma de lo escrito."""
     # backup del archivo existente (no obligatorio, pero recomendado)
     try:
         hacer_backup(target_path)
@@ -128,12 +405,28 @@ def guardar_biblioteca(biblioteca: dict, fecha=None, global_file: bool=False):
     tmp = None
     try:
         # NamedTemporaryFile con delete=False para control explícito del cierre
-        fd, tmp_path = tempfile.mkstemp(prefix="tmp_bibl_", dir=dirpath, suffix=".json")
-        # Escribir JSON en el descriptor
-        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
-            json.dump(biblioteca, tmp, indent=4, ensure_ascii=False)
-            tmp.flush()
-            os.fsync(tmp.fileno())  # asegurar que se escriba en disco
+        prefijo = f"{PREFIJO_TEMPORAL}{os.path.basename(target_path)}{SEPARADOR_TEMPORAL}"
+        fd, tmp_path = tempfile.mkstemp(prefix=prefijo, dir=dirpath, suffix=".json")
+        # Escribir JSON en el descriptor (comprimido por flujo si está activada la compresión)
+        codec = compresion.actual()
+        with os.fdopen(fd, "wb") as tmp:
+            t0 = time.perf_counter()
+            # la suma se calcula sobre los bytes que van al disco, mientras se escriben
+            suma = _Suma(tmp)
+            with metricas.medir("database.json_dump", codec or ""):
+                escritura = compresion.Escritura(suma, codec)
+                with escritura as texto:
+                    # comprimido nadie lo lee a mano: sin sangría, que sólo agrega trabajo al compresor
+                    json.dump(esquema.envolver(biblioteca), texto, indent=None if codec else 4, ensure_ascii=False)
+            with metricas.medir("database.fsync"):
+                os.fsync(tmp.fileno())  # asegurar que se escriba en disco
+            escritos = tmp.tell()
+            metricas.contar("database.bytes_escritos", escritos)
+            if codec:
+                metricas.contar("database.bytes_sin_comprimir", escritura.sin_comprimir)
+                log.debug("%s guardado con %s: %d -> %d bytes (%.1fx) en %.0f ms", os.path.basename(target_path),
+                          codec, escritura.sin_comprimir, escritos, escritura.sin_comprimir / max(escritos, 1),
+                          (time.perf_counter() - t0) * 1000)
         # Intento de reemplazo atómico
         try:
             os.replace(tmp_path, target_path)
@@ -153,7 +446,8 @@ def guardar_biblioteca(biblioteca: dict, fecha=None, global_file: bool=False):
                 raise RuntimeError(f"Fallo al reemplazar archivo: {e_replace}; intento2: {e2}") from e2
 
         # Si llegó aquí, se guardó correctamente
-        return target_path
+        metricas.contar("database.guardados")
+        return suma.como_dict()
 
     except Exception as exc:
         # limpiar tmp si quedó
@@ -163,4 +457,280 @@ def guardar_biblioteca(biblioteca: dict, fecha=None, global_file: bool=False):
         except Exception:
             pass
         # re-lanzar para que la UI pueda mostrar el error
-        raise
\ No newline at end of file
+        raise
+
+_AUSENTE = object()
+
+class Transaccion:
+    """
+    Agrupa altas, modificaciones y bajas sobre 'biblioteca' en un solo guardado:
+    un backup, un fsync y un reemplazo atómico sin importar cuántos registros cambien.
+    Si el bloque 'with' o el guardado fallan, la biblioteca en memoria vuelve a su estado anterior.
+
+        with database.transaccion(biblioteca, fecha=hoy) as tx:
+            tx.upsert(isbn, datos)
+            tx.eliminar(otro_isbn)
+    """
+
+    def __init__(self, biblioteca: dict, fecha=None, global_file: bool = False):
+        self.biblioteca = biblioteca
+        self.fecha = fecha
+        self.global_file = global_file
+        self.ruta = None
+        self._originales = {}
+
+    def reservar(self, isbn):
+        """Guarda el estado original de un registro antes de su primer cambio en la transacción."""
+        if isbn not in self._originales:
+            actual = self.biblioteca.get(isbn, _AUSENTE)
+            self._originales[isbn] = dict(actual) if isinstance(actual, dict) else actual
+
+    def upsert(self, isbn, datos: dict):
+        """Agrega o reemplaza el registro completo de 'isbn'."""
+        self.reservar(isbn)
+        self.biblioteca[isbn] = datos
+
+    def actualizar(self, isbn, campos: dict):
+        """Modifica sólo los campos indicados de un registro existente."""
+        if isbn not in self.biblioteca:
+            raise KeyError(f"No existe el libro con ISBN {isbn}")
+        self.reservar(isbn)
+        self.biblioteca[isbn] = {**self.biblioteca[isbn], **campos}
+
+    def eliminar(self, isbn):
+        """Elimina 'isbn' si existe. Devuelve True si había algo que eliminar."""
+        if isbn not in self.biblioteca:
+            return False
+        self.reservar(isbn)
+        del self.biblioteca[isbn]
+        return True
+
+    def cambios(self):
+        """{isbn: (antes, despues)} de los registros que realmente cambiaron (None = no existe)."""
+        res = {}
+        for isbn, original in self._originales.items():
+            antes = None if original is _AUSENTE else original
+            despues = self.biblioteca.get(isbn)
+            if antes != despues:
+                res[isbn] = (antes, despues)
+        return res
+
+    def revertir(self):
+        """Devuelve la biblioteca en memoria al estado previo a la transacción."""
+        for isbn, original in self._originales.items():
+            if original is _AUSENTE:
+                self.biblioteca.pop(isbn, None)
+            else:
+                self.biblioteca[isbn] = original
+        self._originales.clear()
+
+    def confirmar(self):
+        """Escribe la biblioteca una sola vez. Si no hubo cambios no toca el disco."""
+        cambios = self.cambios()
+        if not cambios:
+            return None
+        self.ruta = guardar_biblioteca(self.biblioteca, fecha=self.fecha, global_file=self.global_file,
+                                       cambios=cambios)
+        log.debug("Transacción confirmada: %d registro(s) en %s", len(self._originales), self.ruta)
+        return self.ruta
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is not None:
+            self.revertir()
+            return False
+        try:
+            self.confirmar()
+        except Exception:
+            log.warning("Fallo al guardar la transacción: se revierten %d registro(s)", len(self._originales))
+            self.revertir()
+            raise
+        return False
+
+def transaccion(biblioteca: dict, fecha=None, global_file: bool = False) -> Transaccion:
+    """Atajo para 'with database.transaccion(biblioteca, ...) as tx:' (ver Transaccion)."""
+    return Transaccion(biblioteca, fecha=fecha, global_file=global_file)
+
+
+# Detección de cambios entre procesos
+# Cada archivo de biblioteca tiene un '<archivo>.gen' con un número de generación que se incrementa
+# en cada guardado. Para cada archivo leído o escrito se recuerda la generación, la firma del
+# archivo (mtime, tamaño) y una huella por registro: así se sabe qué registros cambió otro proceso.
+SUFIJO_GENERACION = ".gen"
+
+class _Version:
+    __slots__ = ("generacion", "firma", "huellas")
+
+    def __init__(self, generacion, firma, huellas):
+        self.generacion = generacion
+        self.firma = firma
+        self.huellas = huellas
+
+_versiones = {}
+# resultado de la última fusión automática hecha al guardar, por archivo (ver tomar_fusion)
+_ultimas_fusiones = {}
+# archivos que no se pudieron leer ni restaurar: no se guardan encima
+_danados = set()
+
+def _clave(path):
+    return os.path.normcase(os.path.abspath(path))
+
+def _huella(libro):
+    if libro is None:
+        return None
+    try:
+        return hash(frozenset(libro.items()))
+    except (TypeError, AttributeError):
+        return hash(json.dumps(libro, sort_keys=True, ensure_ascii=False))
+
+def firma_archivo(path):
+    """(mtime_ns, tamaño) del archivo, o None si no existe. Es la comprobación más barata."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _leer_sidecar(path):
+    try:
+        with open(path + SUFIJO_GENERACION, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return datos if isinstance(datos, dict) else {}
+
+def leer_generacion(path) -> int:
+    try:
+        return int(_leer_sidecar(path).get("generacion", 0))
+    except (ValueError, TypeError):
+        return 0
+
+def leer_suma(path):
+    """Suma ({'crc32', 'bytes'}) anotada en el último guardado de 'path', o None (archivos anteriores)."""
+    suma = _leer_sidecar(path).get("suma")
+    return suma if isinstance(suma, dict) and "crc32" in suma and "bytes" in suma else None
+
+def anotar_suma(path, generacion=None):
+    """
+    Vuelve a calcular y anotar la suma de 'path' tal como está en disco (sin cambiar la generación,
+    salvo que se indique otra). Se usa tras comprobar que el archivo se lee entero, o al restaurarlo.
+    """
+    with bloqueo.BloqueoArchivo(path):
+        _escribir_generacion(path, leer_generacion(path) if generacion is None else generacion, calcular_suma(path))
+
+def _escribir_generacion(path, generacion, suma=None):
+    import socket
+    tmp = f"{path}{SUFIJO_GENERACION}.tmp{os.getpid()}"
+    try:
+        contenido = {"generacion": generacion, "escritor": f"{socket.gethostname()}:{os.getpid()}",
+                     "ts": datetime.now().isoformat(timespec="seconds")}
+        if suma is not None:
+            contenido["suma"] = suma
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(contenido, f)
+        os.replace(tmp, path + SUFIJO_GENERACION)
+    except OSError as e:
+        log.warning("No se pudo actualizar la generación de %s: %s", path, e)
+
+def _registrar_version(path, biblioteca, generacion, firma):
+    _versiones[_clave(path)] = _Version(generacion, firma,
+                                        {isbn: _huella(datos) for isbn, datos in biblioteca.items()})
+
+def version_conocida(path) -> bool:
+    return _clave(path) in _versiones
+
+def cambio_externo(path) -> bool:
+    """
+    True si otro proceso modificó 'path' desde que este proceso lo leyó o guardó por última vez.
+    Sólo hace un stat y lee el .gen (no abre el JSON). False si el archivo nunca se leyó aquí.
+    """
+    version = _versiones.get(_clave(path))
+    if version is None:
+        return False
+    return firma_archivo(path) != version.firma or leer_generacion(path) != version.generacion
+
+def tomar_fusion(path):
+    """Devuelve (y olvida) el ResultadoFusion de los guardados de 'path' que trajeron cambios ajenos."""
+    return _ultimas_fusiones.pop(_clave(path), None)
+
+class ResultadoFusion:
+    """Registros que otro proceso agregó, modificó o eliminó, y los que ambos cambiaron (conflictos)."""
+
+    def __init__(self):
+        self.agregados = []
+        self.modificados = []
+        self.eliminados = []
+        self.conflictos = []
+
+    def hay_cambios(self):
+        return bool(self.agregados or self.modificados or self.eliminados or self.conflictos)
+
+    def isbns(self):
+        return self.agregados + self.modificados + self.eliminados
+
+    def incorporar(self, otro):
+        """Suma los registros de un ResultadoFusion posterior del mismo archivo. Devuelve self."""
+        self.agregados += otro.agregados
+        self.modificados += otro.modificados
+        self.eliminados += otro.eliminados
+        self.conflictos += otro.conflictos
+        return self
+
+    def resumen(self):
+        texto = (f"{len(self.agregados)} agregados, {len(self.modificados)} modificados, "
+                 f"{len(self.eliminados)} eliminados")
+        if self.conflictos:
+            texto += f", {len(self.conflictos)} en conflicto (se conserva la versión local)"
+        return texto
+
+def fusionar_externo(biblioteca: dict, path):
+    """
+    Incorpora en 'biblioteca' (en memoria) sólo los registros que otro proceso cambió en 'path'.
+    Fusión a tres bandas por registro contra el estado de la última lectura/escritura:
+    - cambiado sólo en disco -> se toma la versión del disco (alta, modificación o baja)
+    - cambiado sólo en memoria -> se conserva (se escribirá en el próximo guardado)
+    - cambiado en ambos de forma distinta -> conflicto, se conserva la versión local
+    Devuelve un ResultadoFusion, o None si el archivo nunca se leyó en este proceso.
+    """
+    version = _versiones.get(_clave(path))
+    if version is None:
+        return None
+    generacion, firma = leer_generacion(path), firma_archivo(path)
+    try:
+        # ErrorEsquema no se atrapa: guardar encima de un archivo de una versión más nueva lo rompería
+        disco = _leer_libros(path)[0] if firma is not None else {}
+    except (json.JSONDecodeError, UnicodeDecodeError, compresion.ErrorDescompresion) as e:
+        # archivo a medio escribir o dañado (plano o comprimido): no se fusiona, el guardado sigue
+        log.warning("No se puede fusionar %s: %s", path, e)
+        return ResultadoFusion()
+
+    resultado = ResultadoFusion()
+    base = version.huellas
+    for isbn in base.keys() | disco.keys():
+        h_base, h_disco = base.get(isbn), _huella(disco.get(isbn))
+        if h_base == h_disco:
+            continue
+        h_memoria = _huella(biblioteca.get(isbn))
+        if h_memoria == h_disco:
+            continue
+        if h_memoria != h_base:
+            resultado.conflictos.append(isbn)
+            continue
+        if isbn not in disco:
+            biblioteca.pop(isbn, None)
+            resultado.eliminados.append(isbn)
+        elif isbn in biblioteca:
+            biblioteca[isbn] = disco[isbn]
+            resultado.modificados.append(isbn)
+        else:
+            biblioteca[isbn] = disco[isbn]
+            resultado.agregados.append(isbn)
+
+    # la nueva base es lo que hay en disco: los cambios locales pendientes siguen siendo "nuestros"
+    version.generacion, version.firma = generacion, firma
+    version.huellas = {isbn: _huella(datos) for isbn, datos in disco.items()}
+    if resultado.conflictos:
+        log.warning("Conflictos al fusionar %s: %s", os.path.basename(path), ", ".join(resultado.conflictos[:20]))
+    return resultado
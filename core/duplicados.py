@@ -0,0 +1,355 @@
+"""
+Detección de libros duplicados y casi duplicados en la biblioteca.
+- Por contenido del PDF: huella (SHA-1) del texto normalizado de las primeras páginas, o de los
+  bytes del archivo si el PDF no tiene texto. Detecta el mismo libro ingresado con otra clave
+  (NOISBN_<archivo>, ISBN inventado, copia del PDF con otro nombre).
+- Por título/autor parecidos: firmas MinHash de las palabras normalizadas, agrupadas con LSH
+  (bandas). Sólo se comparan los libros que comparten alguna banda, así no hace falta comparar
+  todos contra todos: el costo crece con el número de libros, no con su cuadrado.
+- Por portada: huella perceptual de la portada (ver portadas.py) en un árbol BK; encuentra
+  escaneos del mismo libro aunque el texto y los metadatos no coincidan.
+
+El índice es incremental (agregar/quitar por ISBN) y no usa Qt, así que puede construirse
+en una TareaSegundoPlano. Con catálogos grandes las firmas se calculan en varios procesos.
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+
+import esquema
+import portadas
+from normalizacion import plegar
+
+CAMPO_HUELLA_PDF = esquema.HUELLA_PDF
+
+NUM_PERMUTACIONES = 32
+BANDAS = 8
+FILAS_POR_BANDA = NUM_PERMUTACIONES // BANDAS
+UMBRAL_SIMILITUD = 0.7
+MIN_CARACTERES_TEXTO = 200
+UMBRAL_PROCESOS = 20000
+_MASCARA_64 = (1 << 64) - 1
+
+
+def _generar_mascaras(n, semilla=0x9E3779B97F4A7C15):
+    """
+    Máscaras XOR de 64 bits que hacen de permutaciones de la firma. Son fijas (generador
+    congruencial con semilla constante): las firmas son iguales en todos los procesos y ejecuciones.
+    """
+    res = []
+    for _ in range(n):
+        semilla = (semilla * 6364136223846793005 + 1442695040888963407) & _MASCARA_64
+        res.append(semilla)
+    return res
+
+
+_MASCARAS = _generar_mascaras(NUM_PERMUTACIONES)
+
+# palabras que no distinguen un libro de otro
+_VACIAS = {"el", "la", "los", "las", "un", "una", "de", "del", "y", "e", "o", "en", "a", "al",
+           "the", "of", "and", "an", "to", "in"}
+
+
+def palabras(registro, plegados=None):
+    """
+    Conjunto de palabras significativas de título y autor.
+    'plegados': (título, autor) ya normalizados, si se tienen (ClavesNormalizadas).
+    """
+    titulo, autor = plegados or (plegar(registro.get(esquema.TITULO, "")), plegar(registro.get(esquema.AUTOR, "")))
+    return frozenset(p for p in f"{titulo} {autor}".split() if p not in _VACIAS and len(p) > 1)
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash_palabra(palabra):
+    # las palabras se repiten mucho entre libros (autores, "historia", "volumen"...): se hashean una vez
+    return int.from_bytes(hashlib.blake2b(palabra.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def firma_minhash(tokens):
+    """Firma MinHash (tupla de NUM_PERMUTACIONES enteros) de un conjunto de palabras."""
+    if not tokens:
+        return None
+    valores = [_hash_palabra(t) for t in tokens]
+    return tuple(min([v ^ m for v in valores]) for m in _MASCARAS)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# Huella de contenido
+def huella_texto(texto):
+    """SHA-1 del texto normalizado, o None si es demasiado corto para identificar el libro."""
+    normal = plegar(texto)
+    if len(normal) < MIN_CARACTERES_TEXTO:
+        return None
+    return "t:" + hashlib.sha1(normal.encode("utf-8")).hexdigest()
+
+
+def huella_archivo(ruta, bloque=1024 * 1024):
+    """SHA-1 de los bytes del archivo (PDF escaneado sin texto)."""
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            h.update(datos)
+    return "b:" + h.hexdigest()
+
+
+def huella_pdf(ruta, texto=None):
+    """Huella de contenido de un PDF: del texto si tiene suficiente, si no de los bytes del archivo."""
+    return huella_texto(texto) or huella_archivo(ruta)
+
+
+# Índice
+def _firmas_bloque(items):
+    """[(isbn, registro)] -> [(isbn, palabras, firma)]. Nivel de módulo para multiprocessing."""
+    res = []
+    for isbn, registro in items:
+        tokens = palabras(registro)
+        res.append((isbn, tokens, firma_minhash(tokens)))
+    return res
+
+
+class Coincidencia:
+    """Un posible duplicado de un libro: otro ISBN, el motivo ('contenido', 'portada' o 'titulo') y la similitud."""
+    __slots__ = ("isbn", "motivo", "similitud")
+
+    def __init__(self, isbn, motivo, similitud):
+        self.isbn = isbn
+        self.motivo = motivo
+        self.similitud = similitud
+
+    def __repr__(self):
+        return f"Coincidencia({self.isbn!r}, {self.motivo!r}, {self.similitud:.2f})"
+
+
+class IndiceDuplicados:
+    """Índice incremental de firmas MinHash (con cubetas LSH) y huellas de contenido por ISBN."""
+
+    def __init__(self, umbral=UMBRAL_SIMILITUD, claves=None):
+        """claves: ClavesNormalizadas compartida (la de la búsqueda) para no volver a plegar los textos."""
+        self.umbral = umbral
+        self.claves = claves
+        self._palabras = {}
+        self._firmas = {}
+        self._huellas = {}
+        self._estado = {}
+        self._cubetas = {}
+        self._por_huella = {}
+        self._portadas = {}
+        self._arbol_portadas = portadas.ArbolBK()
+
+    def __len__(self):
+        return len(self._estado)
+
+    def __contains__(self, isbn):
+        return isbn in self._estado
+
+    @staticmethod
+    def _clave_estado(registro):
+        return (registro.get(esquema.TITULO, ""), registro.get(esquema.AUTOR, ""), registro.get(CAMPO_HUELLA_PDF),
+                registro.get(portadas.CAMPO_HUELLA_PORTADA))
+
+    # Mantenimiento
+    def agregar(self, isbn, registro, _precalculado=None):
+        if isbn in self._estado:
+            self.quitar(isbn)
+        if _precalculado is None:
+            tokens = self._palabras_de(isbn, registro)
+            firma = firma_minhash(tokens)
+        else:
+            tokens, firma = _precalculado
+        self._estado[isbn] = self._clave_estado(registro)
+        self._palabras[isbn] = tokens
+        if firma is not None:
+            self._firmas[isbn] = firma
+            for banda in self._bandas(firma):
+                self._cubetas.setdefault(banda, set()).add(isbn)
+        huella = registro.get(CAMPO_HUELLA_PDF)
+        if huella:
+            self._huellas[isbn] = huella
+            self._por_huella.setdefault(huella, set()).add(isbn)
+        portada = portadas.desde_texto(registro.get(portadas.CAMPO_HUELLA_PORTADA))
+        if portada is not None:
+            self._portadas[isbn] = portada
+            self._arbol_portadas.agregar(portada, isbn)
+
+    def quitar(self, isbn):
+        if self._estado.pop(isbn, None) is None:
+            return
+        self._palabras.pop(isbn, None)
+        firma = self._firmas.pop(isbn, None)
+        if firma is not None:
+            for banda in self._bandas(firma):
+                cubeta = self._cubetas.get(banda)
+                if cubeta is not None:
+                    cubeta.discard(isbn)
+                    if not cubeta:
+                        del self._cubetas[banda]
+        huella = self._huellas.pop(isbn, None)
+        if huella is not None:
+            grupo = self._por_huella.get(huella)
+            if grupo is not None:
+                grupo.discard(isbn)
+                if not grupo:
+                    del self._por_huella[huella]
+        portada = self._portadas.pop(isbn, None)
+        if portada is not None:
+            self._arbol_portadas.quitar(portada, isbn)
+
+    def actualizar(self, biblioteca, isbns):
+        """Vuelve a indexar los ISBN indicados según su estado actual en 'biblioteca' (alta, cambio o baja)."""
+        for isbn in isbns:
+            registro = biblioteca.get(isbn)
+            if isinstance(registro, dict):
+                if self._estado.get(isbn) != self._clave_estado(registro):
+                    self.agregar(isbn, registro)
+            else:
+                self.quitar(isbn)
+
+    def sincronizar(self, biblioteca, procesos=None, progreso=None, cancelado=None):
+        """
+        Deja el índice igual a 'biblioteca': agrega lo nuevo, quita lo eliminado y reindexa lo que cambió.
+        Con más de UMBRAL_PROCESOS libros pendientes, las firmas se calculan en varios procesos.
+        """
+        for isbn in [i for i in self._estado if i not in biblioteca]:
+            self.quitar(isbn)
+        pendientes = [(isbn, r) for isbn, r in biblioteca.items()
+                      if isinstance(r, dict) and self._estado.get(isbn) != self._clave_estado(r)]
+        total = len(pendientes)
+        if not total:
+            return 0
+        registros = dict(pendientes)
+        hechos = 0
+        for bloque in self._calcular_firmas(pendientes, procesos):
+            for isbn, tokens, firma in bloque:
+                self.agregar(isbn, registros[isbn], _precalculado=(tokens, firma))
+            hechos += len(bloque)
+            if progreso:
+                progreso(hechos, total)
+            if cancelado and cancelado():
+                break
+        return hechos
+
+    def _palabras_de(self, isbn, registro):
+        if self.claves is None:
+            return palabras(registro)
+        return palabras(registro, (self.claves.clave(isbn, registro, esquema.TITULO),
+                                   self.claves.clave(isbn, registro, esquema.AUTOR)))
+
+    def _calcular_firmas(self, pendientes, procesos, tamano=5000):
+        bloques = [pendientes[i:i + tamano] for i in range(0, len(pendientes), tamano)]
+        if procesos == 1 or len(pendientes) < UMBRAL_PROCESOS or (os.cpu_count() or 1) < 2:
+            for bloque in bloques:
+                res = []
+                for isbn, registro in bloque:
+                    tokens = self._palabras_de(isbn, registro)
+                    res.append((isbn, tokens, firma_minhash(tokens)))
+                yield res
+            return
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            yield from pool.map(_firmas_bloque, bloques)
+
+    def _bandas(self, firma):
+        return [(b, firma[b * FILAS_POR_BANDA:(b + 1) * FILAS_POR_BANDA]) for b in range(BANDAS)]
+
+    # Consultas
+    def buscar(self, registro, isbn=None):
+        """
+        Posibles duplicados de 'registro' (indexado o no) ordenados por similitud.
+        'isbn' se excluye de los resultados (el propio libro).
+        """
+        encontrados = {}
+        huella = registro.get(CAMPO_HUELLA_PDF)
+        if huella:
+            for otro in self._por_huella.get(huella, ()):
+                if otro != isbn:
+                    encontrados[otro] = Coincidencia(otro, "contenido", 1.0)
+
+        portada = portadas.desde_texto(registro.get(portadas.CAMPO_HUELLA_PORTADA))
+        if portada is not None:
+            for d, otro in self._arbol_portadas.buscar(portada):
+                if otro != isbn and otro not in encontrados:
+                    encontrados[otro] = Coincidencia(otro, "portada", 1 - d / 64)
+
+        tokens = self._palabras.get(isbn) if isbn in self._estado else palabras(registro)
+        firma = self._firmas.get(isbn) if isbn in self._estado else firma_minhash(tokens)
+        if firma is not None:
+            candidatos = set()
+            for banda in self._bandas(firma):
+                candidatos |= self._cubetas.get(banda, set())
+            candidatos.discard(isbn)
+            for otro in candidatos:
+                if otro in encontrados and encontrados[otro].motivo == "contenido":
+                    continue
+                similitud = jaccard(tokens, self._palabras.get(otro))
+                if similitud >= self.umbral and similitud > getattr(encontrados.get(otro), "similitud", 0):
+                    encontrados[otro] = Coincidencia(otro, "titulo", similitud)
+        return sorted(encontrados.values(), key=lambda c: (-c.similitud, c.isbn))
+
+    def grupos(self):
+        """
+        Grupos de ISBN que parecen el mismo libro (cada grupo con 2 o más), más grandes primero.
+        Sólo se comparan pares que comparten huella, alguna cubeta LSH o una portada cercana en el árbol BK.
+        """
+        padre = {}
+
+        def raiz(x):
+            while padre[x] != x:
+                padre[x] = padre[padre[x]]
+                x = padre[x]
+            return x
+
+        def unir(a, b):
+            ra, rb = raiz(padre.setdefault(a, a)), raiz(padre.setdefault(b, b))
+            if ra != rb:
+                padre[max(ra, rb)] = min(ra, rb)
+
+        for grupo in self._por_huella.values():
+            if len(grupo) > 1:
+                primero, *resto = sorted(grupo)
+                for otro in resto:
+                    unir(primero, otro)
+
+        for isbn, portada in self._portadas.items():
+            for _, otro in self._arbol_portadas.buscar(portada):
+                if otro != isbn:
+                    unir(isbn, otro)
+
+        comparados = set()
+        for cubeta in self._cubetas.values():
+            if len(cubeta) < 2:
+                continue
+            miembros = sorted(cubeta)
+            for i, a in enumerate(miembros):
+                for b in miembros[i + 1:]:
+                    if (a, b) in comparados:
+                        continue
+                    comparados.add((a, b))
+                    if jaccard(self._palabras[a], self._palabras[b]) >= self.umbral:
+                        unir(a, b)
+
+        res = {}
+        for isbn in padre:
+            res.setdefault(raiz(isbn), set()).add(isbn)
+        return sorted((sorted(g) for g in res.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
+
+
+def fusionar_registros(registros):
+    """
+    Combina varios registros del mismo libro: el primero manda y los campos vacíos se completan
+    con los de los demás (ej. Archivo PDF o Portada que sólo tiene una de las copias).
+    """
+    resultado = dict(registros[0])
+    for otro in registros[1:]:
+        for campo, valor in otro.items():
+            if valor and not resultado.get(campo):
+                resultado[campo] = valor
+    return resultado
@@ -0,0 +1,311 @@
+"""
+Estado de los enlaces a archivos de cada libro ('Archivo PDF' y 'Portada' son rutas absolutas).
+- RevisorEnlaces.revisar(): hace stat de todas las rutas referenciadas en un pool de hilos (la
+  espera es de E/S, sobre todo en unidades de red) y guarda el resultado en cache/enlaces.json;
+  la tabla marca los libros con archivos faltantes sin esperar a que alguien haga clic.
+- reubicar(): busca los PDFs faltantes bajo las carpetas raíz configuradas. Los candidatos salen
+  del tamaño que tenía el archivo la última vez que se vio (o, si no se conoce, del nombre) y se
+  confirman con la huella de contenido del libro (Huella PDF); sin huella sólo se acepta un
+  candidato único con el mismo nombre y el mismo tamaño.
+
+Las carpetas raíz se configuran con la variable de entorno BIBLIOTECH_RAICES_PDF (varias separadas
+por os.pathsep) o se pasan directamente.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import duplicados
+import esquema
+import metricas
+import registro
+
+log = registro.obtener(__name__)
+
+ARCHIVO_CACHE = os.path.join("cache", "enlaces.json")
+VERSION = 1
+CAMPOS = (esquema.PDF, esquema.PORTADA)
+HILOS = 32
+TAMANO_LOTE = 256
+MAX_CANDIDATOS = 20
+
+
+def raices_configuradas():
+    """Carpetas donde buscar PDFs movidos (BIBLIOTECH_RAICES_PDF), sólo las que existen."""
+    valor = os.environ.get("BIBLIOTECH_RAICES_PDF", "")
+    return [r for r in (p.strip() for p in valor.split(os.pathsep)) if r and os.path.isdir(r)]
+
+
+def referencias(biblioteca):
+    """{ruta: [(isbn, campo)]} de todos los archivos que referencian los libros."""
+    rutas = {}
+    for isbn, datos in biblioteca.items():
+        if not isinstance(datos, dict):
+            continue
+        for campo in CAMPOS:
+            ruta = datos.get(campo)
+            if ruta:
+                rutas.setdefault(ruta, []).append((isbn, campo))
+    return rutas
+
+
+def _stat_lote(rutas):
+    # lotes en vez de una tarea por ruta: con 100k rutas el costo de cada futuro pesaría más que el stat
+    res = []
+    for ruta in rutas:
+        try:
+            st = os.stat(ruta)
+            res.append((ruta, (True, st.st_size, st.st_mtime_ns)))
+        except OSError:
+            res.append((ruta, (False, None, None)))
+    return res
+
+
+class InformeEnlaces:
+    """Resultado de una revisión: faltantes por campo y PDFs reubicados."""
+
+    def __init__(self):
+        self.revisados = 0
+        self.faltantes = {campo: [] for campo in CAMPOS}   # campo -> [(isbn, ruta)]
+        self.reubicados = {}                                # isbn -> (ruta vieja, ruta nueva)
+        self.raices = []
+        self.segundos = 0.0
+
+    def hay_faltantes(self):
+        return any(self.faltantes.values())
+
+    def sin_ubicar(self):
+        """[(isbn, ruta)] de los PDFs faltantes que no se encontraron bajo las raíces."""
+        return [(isbn, ruta) for isbn, ruta in self.faltantes[esquema.PDF] if isbn not in self.reubicados]
+
+    def informe(self):
+        """Texto legible para el diálogo de enlaces."""
+        pdfs, portadas = self.faltantes[esquema.PDF], self.faltantes[esquema.PORTADA]
+        lineas = [f"Rutas revisadas: {self.revisados:,} en {self.segundos:.1f} s",
+                  f"PDFs faltantes: {len(pdfs):,}   ·   portadas faltantes: {len(portadas):,}"]
+        if self.reubicados:
+            lineas += ["", f"PDFs reubicados ({len(self.reubicados):,}):"]
+            for isbn, (vieja, nueva) in sorted(self.reubicados.items()):
+                lineas.append(f"   {isbn}: {vieja}\n      -> {nueva}")
+        pendientes = self.sin_ubicar()
+        if pendientes:
+            lineas += ["", f"PDFs sin ubicar ({len(pendientes):,}):"]
+            lineas += [f"   {isbn}: {ruta}" for isbn, ruta in sorted(pendientes)[:500]]
+        if portadas:
+            lineas += ["", "Portadas faltantes (se regeneran con 'cli.py reindexar' si el PDF existe):"]
+            lineas += [f"   {isbn}: {ruta}" for isbn, ruta in sorted(portadas)[:500]]
+        return "\n".join(lineas)
+
+
+class RevisorEnlaces:
+    """Resultado del último stat de cada ruta, persistido en cache/enlaces.json."""
+
+    def __init__(self, ruta_cache=None, hilos=HILOS):
+        self.ruta_cache = ruta_cache or ARCHIVO_CACHE
+        self.hilos = hilos
+        self._estado = {}   # ruta -> (existe, tamaño, mtime_ns)
+        self._lock = threading.Lock()
+        self._cargar()
+
+    def _cargar(self):
+        try:
+            with open(self.ruta_cache, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") == VERSION:
+                self._estado = {ruta: tuple(estado) for ruta, estado in datos.get("rutas", {}).items()}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            # sólo es una caché: la próxima revisión la vuelve a llenar
+            log.warning("Caché de enlaces ilegible en %s: %s", self.ruta_cache, e)
+
+    def _persistir(self):
+        directorio = os.path.dirname(self.ruta_cache) or "."
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix="tmp_enlaces_", dir=directorio, suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": VERSION, "rutas": self._estado}, f, ensure_ascii=False)
+            os.replace(tmp, self.ruta_cache)
+        except OSError as e:
+            log.warning("No se pudo guardar la caché de enlaces en %s: %s", self.ruta_cache, e)
+
+    def existe(self, ruta):
+        """True/False según la última revisión, o None si la ruta nunca se revisó."""
+        estado = self._estado.get(ruta)
+        return None if estado is None else estado[0]
+
+    def tamano_conocido(self, ruta):
+        """Tamaño que tenía el archivo la última vez que se lo vio (se conserva aunque ya no exista)."""
+        estado = self._estado.get(ruta)
+        return estado[1] if estado is not None else None
+
+    def rotos(self, libro):
+        """Campos del registro cuyo archivo faltaba en la última revisión (sólo búsquedas en un dict)."""
+        estado = self._estado
+        return [campo for campo in CAMPOS
+                if libro.get(campo) and estado.get(libro[campo], (True,))[0] is False]
+
+    def revisar(self, rutas, progreso=None, cancelado=None):
+        """
+        Hace stat de 'rutas' en paralelo y actualiza la caché. Devuelve True si cambió el estado de
+        alguna ruta respecto de la revisión anterior (para saber si hay que repintar la tabla).
+        """
+        rutas = list(rutas)
+        lotes = [rutas[i:i + TAMANO_LOTE] for i in range(0, len(rutas), TAMANO_LOTE)]
+        nuevo, hechos = {}, 0
+        with metricas.medir("enlaces.revisar", f"{len(rutas)} rutas"), \
+                ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            for resultado in pool.map(_stat_lote, lotes):
+                if cancelado is not None and cancelado():
+                    pool.shutdown(cancel_futures=True)
+                    return False
+                for ruta, (existe, tamano, mtime) in resultado:
+                    if not existe:
+                        # un archivo que desapareció conserva el tamaño que tenía: sirve para reubicarlo
+                        anterior = self._estado.get(ruta)
+                        tamano = anterior[1] if anterior is not None else None
+                    nuevo[ruta] = (existe, tamano, mtime)
+                hechos += len(resultado)
+                if progreso is not None:
+                    progreso(hechos, len(rutas))
+        metricas.contar("enlaces.rutas_revisadas", len(rutas))
+        with self._lock:
+            cambio = any(self._estado.get(ruta, (None,))[0] != estado[0] for ruta, estado in nuevo.items())
+            # se reemplaza el dict entero: la tabla puede leerlo desde el hilo de la UI mientras tanto
+            self._estado = {**self._estado, **nuevo}
+            self._persistir()
+        return cambio
+
+    def marcar(self, ruta):
+        """Registra el estado actual de una ruta (tras reubicar un PDF o asignar una portada)."""
+        (_, estado), = _stat_lote([ruta])
+        with self._lock:
+            self._estado = {**self._estado, ruta: estado}
+
+
+def _indexar_raices(raices, cancelado=None):
+    """PDFs bajo las raíces: ({tamaño: [ruta]}, {nombre en minúsculas: [ruta]})."""
+    por_tamano, por_nombre = {}, {}
+    pendientes = list(raices)
+    while pendientes:
+        if cancelado is not None and cancelado():
+            break
+        carpeta = pendientes.pop()
+        try:
+            with os.scandir(carpeta) as it:
+                for entrada in it:
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            pendientes.append(entrada.path)
+                            continue
+                        if not entrada.name.lower().endswith(".pdf") or not entrada.is_file():
+                            continue
+                        tamano = entrada.stat().st_size
+                    except OSError:
+                        continue
+                    por_tamano.setdefault(tamano, []).append(entrada.path)
+                    por_nombre.setdefault(entrada.name.lower(), []).append(entrada.path)
+        except OSError as e:
+            log.debug("No se pudo recorrer %s: %s", carpeta, e)
+    return por_tamano, por_nombre
+
+
+def _huella_como(ruta, huella):
+    """Huella del candidato calculada igual que 'huella' (de los bytes o del texto del PDF)."""
+    if huella.startswith("b:"):
+        return duplicados.huella_archivo(ruta)
+    import ingesta
+    try:
+        import fitz
+    except ImportError:
+        raise RuntimeError("Comparar PDFs por su texto requiere el paquete 'PyMuPDF' (pip install PyMuPDF).")
+    doc = fitz.open(ruta)
+    try:
+        texto = ingesta.texto_inicial(doc)
+    finally:
+        doc.close()
+    return duplicados.huella_pdf(ruta, texto)
+
+
+def reubicar(biblioteca, faltantes, revisor, raices, progreso=None, cancelado=None):
+    """
+    Busca bajo 'raices' los PDFs de 'faltantes' ([(isbn, ruta vieja)]). Devuelve {isbn: ruta nueva}.
+    No modifica la biblioteca: quien llama aplica los cambios (en una transacción).
+    """
+    if not faltantes or not raices:
+        return {}
+    with metricas.medir("enlaces.indexar_raices", ", ".join(raices)):
+        por_tamano, por_nombre = _indexar_raices(raices, cancelado)
+    # un archivo que ya es el PDF de otro libro no es el que se movió
+    en_uso = {d.get(esquema.PDF) for d in biblioteca.values() if isinstance(d, dict)}
+    huellas_calculadas = {}
+
+    def buscar(item):
+        isbn, vieja = item
+        if cancelado is not None and cancelado():
+            return isbn, None
+        nombre = os.path.basename(vieja).lower()
+        tamano = revisor.tamano_conocido(vieja)
+        if tamano is not None:
+            candidatos = sorted(por_tamano.get(tamano, []), key=lambda r: os.path.basename(r).lower() != nombre)
+        else:
+            candidatos = list(por_nombre.get(nombre, []))
+        candidatos = [c for c in candidatos if c not in en_uso][:MAX_CANDIDATOS]
+        huella = (biblioteca.get(isbn) or {}).get(esquema.HUELLA_PDF)
+        if not huella:
+            # sin huella no hay cómo confirmar el contenido: sólo un candidato inequívoco
+            mismos = [c for c in candidatos if os.path.basename(c).lower() == nombre]
+            return isbn, mismos[0] if tamano is not None and len(mismos) == 1 else None
+        for candidato in candidatos:
+            try:
+                calculada = huellas_calculadas.get((candidato, huella[:2]))
+                if calculada is None:
+                    calculada = huellas_calculadas[(candidato, huella[:2])] = _huella_como(candidato, huella)
+            except Exception as e:
+                log.debug("No se pudo calcular la huella de %s: %s", candidato, e)
+                continue
+            if calculada == huella:
+                return isbn, candidato
+        return isbn, None
+
+    encontrados = {}
+    with ThreadPoolExecutor(max_workers=min(8, revisor.hilos)) as pool:
+        for i, (isbn, nueva) in enumerate(pool.map(buscar, faltantes)):
+            if nueva is not None and nueva not in encontrados.values():
+                encontrados[isbn] = nueva
+            if progreso is not None:
+                progreso(i + 1, len(faltantes))
+    metricas.contar("enlaces.reubicados", len(encontrados))
+    return encontrados
+
+
+def escanear(biblioteca, revisor, raices=None, progreso=None, cancelado=None):
+    """
+    Revisión completa para el diálogo de enlaces y la CLI: stat de todas las rutas y, si hay
+    raíces, búsqueda de los PDFs faltantes. 'biblioteca' debe ser una copia (corre en otro hilo).
+    """
+    t0 = time.perf_counter()
+    informe = InformeEnlaces()
+    rutas = referencias(biblioteca)
+    informe.revisados = len(rutas)
+    revisor.revisar(rutas, progreso=progreso, cancelado=cancelado)
+    for ruta, usos in rutas.items():
+        if revisor.existe(ruta) is False:
+            for isbn, campo in usos:
+                informe.faltantes[campo].append((isbn, ruta))
+    informe.raices = raices_configuradas() if raices is None else list(raices)
+    nuevas = reubicar(biblioteca, informe.faltantes[esquema.PDF], revisor, informe.raices, progreso, cancelado)
+    for isbn, nueva in nuevas.items():
+        informe.reubicados[isbn] = (biblioteca[isbn][esquema.PDF], nueva)
+        revisor.marcar(nueva)
+    informe.segundos = time.perf_counter() - t0
+    if informe.hay_faltantes():
+        log.info("Enlaces: %d PDF(s) y %d portada(s) faltantes, %d reubicado(s)",
+                 len(informe.faltantes[esquema.PDF]), len(informe.faltantes[esquema.PORTADA]),
+                 len(informe.reubicados))
+    return informe
@@ -0,0 +1,89 @@
+"""
+Esquema de los archivos de biblioteca: nombres canónicos de los campos y versión del formato.
+
+Formato actual (versión 2):
+    {"esquema": 2, "libros": {isbn: {campo: valor, ...}}}
+La versión 1 es el formato anterior, sin cabecera: el dict de libros en la raíz y con claves
+de versiones viejas ("Titulo", "Fecha de publicacion"...).
+
+Al leer un archivo de una versión anterior se aplican en orden las migraciones de MIGRACIONES;
+cargar_biblioteca lo vuelve a guardar una sola vez con la versión actual (sólo los archivos de data/;
+uno abierto desde otra carpeta queda migrado en memoria). Los guardados ya no
+revisan los registros: lo que está en memoria siempre respeta el esquema actual.
+Todos los módulos toman los nombres de campo de aquí.
+"""
+
+TITULO = "Título"
+AUTOR = "Autor"
+EDITORIAL = "Editorial"
+FECHA = "Fecha de Publicación"
+PDF = "Archivo PDF"
+PORTADA = "Portada"
+HUELLA_PDF = "Huella PDF"
+HUELLA_PORTADA = "Huella portada"
+
+# campos que se cargan en el formulario y la tabla; el resto los agrega la ingesta de PDFs
+CAMPOS_LIBRO = (TITULO, AUTOR, EDITORIAL, FECHA)
+CAMPOS = CAMPOS_LIBRO + (PDF, PORTADA, HUELLA_PDF, HUELLA_PORTADA)
+
+VERSION = 2
+CLAVE_VERSION = "esquema"
+CLAVE_LIBROS = "libros"
+
+# claves antiguas -> nuevas
+CLAVES_ANTIGUAS = {
+    "Titulo": TITULO,
+    "Fecha de publicacion": FECHA,
+    "Fecha de publicación": FECHA,
+}
+
+
+class ErrorEsquema(ValueError):
+    """El archivo es de una versión más nueva que la que entiende este programa."""
+
+
+def renombrar_campos(registro):
+    """Pasa las claves antiguas de un registro a las canónicas. True si cambió algo."""
+    cambio = False
+    for antigua, nueva in CLAVES_ANTIGUAS.items():
+        if antigua in registro:
+            valor = registro.pop(antigua)
+            if not registro.get(nueva):
+                registro[nueva] = valor
+            cambio = True
+    return cambio
+
+
+def _v1_a_v2(libros):
+    return sum(renombrar_campos(datos) for datos in libros.values() if isinstance(datos, dict))
+
+
+# versión de origen -> migración a la siguiente; recibe el dict de libros, lo modifica y devuelve
+# cuántos registros cambió
+MIGRACIONES = {
+    1: _v1_a_v2,
+}
+
+
+def desenvolver(datos):
+    """(libros, versión) del contenido de un archivo; sin cabecera es la versión 1."""
+    if (isinstance(datos, dict) and set(datos) == {CLAVE_VERSION, CLAVE_LIBROS}
+            and isinstance(datos[CLAVE_VERSION], int) and isinstance(datos[CLAVE_LIBROS], dict)):
+        return datos[CLAVE_LIBROS], datos[CLAVE_VERSION]
+    return datos, 1
+
+
+def envolver(libros):
+    """Contenido a escribir: cabecera con la versión actual y los libros."""
+    return {CLAVE_VERSION: VERSION, CLAVE_LIBROS: libros}
+
+
+def migrar(libros, version):
+    """Lleva 'libros' (en memoria) de 'version' a VERSION. Devuelve cuántos registros cambiaron."""
+    if version > VERSION:
+        raise ErrorEsquema(f"El archivo usa el esquema {version} y este programa sólo entiende hasta el {VERSION}; "
+                           "actualice Bibliotech para abrirlo.")
+    cambiados = 0
+    for origen in range(version, VERSION):
+        cambiados += MIGRACIONES[origen](libros)
+    return cambiados
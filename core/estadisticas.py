@@ -0,0 +1,268 @@
+"""
+Estadísticas del catálogo (libros por día, editoriales principales, libros por década, con PDF/portada).
+
+Se guardan agregados por archivo de biblioteca en data/estadisticas.json, junto con la firma
+(mtime, tamaño) del archivo que describen:
+- cada guardado aplica sólo las diferencias de la transacción (altas, cambios y bajas) a los
+  agregados de ese archivo; si no se conocen (guardado completo, fusión con otra estación) se
+  recalculan desde la biblioteca en memoria, sin leer el disco;
+- al consultar, un archivo cuya firma no coincide (lo cambió otro proceso o es la primera vez)
+  se vuelve a leer; el resto sale de los agregados guardados.
+Así el panel de estadísticas abre al instante aunque el catálogo tenga cientos de miles de libros.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+from functools import lru_cache
+
+import database
+import esquema
+import registro
+from normalizacion import plegar
+
+log = registro.obtener(__name__)
+
+ARCHIVO_ESTADISTICAS = "estadisticas.json"
+VERSION = 1
+SIN_FECHA = ""
+_ANIO = re.compile(r"^\s*(\d{4})")
+
+
+@lru_cache(maxsize=4096)
+def _clave_editorial(editorial):
+    # hay pocas editoriales distintas: se pliega cada una una sola vez
+    return plegar(editorial), " ".join(editorial.split())
+
+
+def _decada(libro):
+    m = _ANIO.match(libro.get(esquema.FECHA, "") or "")
+    return str(int(m.group(1)) // 10 * 10) if m else SIN_FECHA
+
+
+class Agregados:
+    """Conteos de un archivo de biblioteca que se pueden sumar y restar registro por registro."""
+
+    def __init__(self):
+        self.total = 0
+        self.con_pdf = 0
+        self.con_portada = 0
+        self.editoriales = {}   # clave plegada -> [etiqueta, cantidad]
+        self.decadas = {}       # "1990" -> cantidad ("" = sin fecha)
+
+    @classmethod
+    def desde_biblioteca(cls, biblioteca):
+        agregados = cls()
+        for datos in biblioteca.values():
+            if isinstance(datos, dict):
+                agregados.sumar(datos)
+        return agregados
+
+    def sumar(self, libro, signo=1):
+        self.total += signo
+        self.con_pdf += signo if libro.get(esquema.PDF) else 0
+        self.con_portada += signo if libro.get(esquema.PORTADA) else 0
+        editorial = str(libro.get(esquema.EDITORIAL, "") or "")
+        if editorial.strip():
+            clave, etiqueta = _clave_editorial(editorial)
+            actual = self.editoriales.get(clave)
+            if actual is None:
+                actual = self.editoriales[clave] = [etiqueta, 0]
+            actual[1] += signo
+            if actual[1] <= 0:
+                del self.editoriales[clave]
+        decada = _decada(libro)
+        n = self.decadas.get(decada, 0) + signo
+        if n > 0:
+            self.decadas[decada] = n
+        else:
+            self.decadas.pop(decada, None)
+
+    def aplicar(self, cambios):
+        """Aplica {isbn: (antes, despues)} de una transacción (None = el registro no existe)."""
+        for antes, despues in cambios.values():
+            if isinstance(antes, dict):
+                self.sumar(antes, -1)
+            if isinstance(despues, dict):
+                self.sumar(despues)
+
+    def combinar(self, otro):
+        self.total += otro.total
+        self.con_pdf += otro.con_pdf
+        self.con_portada += otro.con_portada
+        for clave, (etiqueta, n) in otro.editoriales.items():
+            actual = self.editoriales.setdefault(clave, [etiqueta, 0])
+            actual[1] += n
+        for decada, n in otro.decadas.items():
+            self.decadas[decada] = self.decadas.get(decada, 0) + n
+
+    def como_dict(self):
+        return {"total": self.total, "con_pdf": self.con_pdf, "con_portada": self.con_portada,
+                "editoriales": self.editoriales, "decadas": self.decadas}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        agregados = cls()
+        agregados.total = int(datos.get("total", 0))
+        agregados.con_pdf = int(datos.get("con_pdf", 0))
+        agregados.con_portada = int(datos.get("con_portada", 0))
+        agregados.editoriales = {k: [v[0], int(v[1])] for k, v in datos.get("editoriales", {}).items()}
+        agregados.decadas = {k: int(v) for k, v in datos.get("decadas", {}).items()}
+        return agregados
+
+
+class Resumen:
+    """Estadísticas de todos los archivos de data/ combinadas, listas para mostrar."""
+
+    def __init__(self, por_archivo):
+        self.por_dia = []           # [(fecha ISO, libros en ese archivo diario)]
+        self.global_total = None    # libros en biblioteca_global.json (None si no existe)
+        self.todos = Agregados()
+        for nombre, agregados in sorted(por_archivo.items()):
+            if nombre == database.GLOBAL_FILENAME:
+                self.global_total = agregados.total
+            else:
+                self.por_dia.append((nombre[len(database.DAILY_PREFIX):-5], agregados.total))
+            self.todos.combinar(agregados)
+
+    def editoriales(self, limite=15):
+        """[(editorial, cantidad)] de las más frecuentes."""
+        orden = sorted(self.todos.editoriales.values(), key=lambda item: (-item[1], item[0]))
+        return [(etiqueta, n) for etiqueta, n in orden[:limite]]
+
+    def decadas(self):
+        """[(década, cantidad)] en orden cronológico; los libros sin fecha van al final."""
+        return sorted(self.todos.decadas.items(), key=lambda item: (item[0] == SIN_FECHA, item[0]))
+
+    def como_dict(self):
+        return {"por_dia": self.por_dia, "global": self.global_total, "total": self.todos.total,
+                "con_pdf": self.todos.con_pdf, "con_portada": self.todos.con_portada,
+                "editoriales": self.editoriales(), "decadas": self.decadas()}
+
+    def informe(self):
+        """Texto legible para el panel de estadísticas."""
+        t = self.todos
+        lineas = [f"Libros en todos los archivos: {t.total:,}   (con PDF: {t.con_pdf:,} · con portada: {t.con_portada:,})"]
+        if self.global_total is not None:
+            lineas.append(f"Biblioteca global: {self.global_total:,}")
+        lineas += ["", "Libros agregados por día:"]
+        maximo = max((n for _, n in self.por_dia), default=0) or 1
+        for fecha, n in self.por_dia:
+            lineas.append(f"   {fecha}  {n:>8,}  {'█' * max(1, round(30 * n / maximo)) if n else ''}")
+        lineas += ["", "Editoriales principales:"]
+        for etiqueta, n in self.editoriales():
+            lineas.append(f"   {etiqueta[:36]:<38}{n:>8,}")
+        lineas += ["", "Libros por década de publicación:"]
+        maximo = max(self.todos.decadas.values(), default=0) or 1
+        for decada, n in self.decadas():
+            nombre = f"{decada}s" if decada != SIN_FECHA else "sin fecha"
+            lineas.append(f"   {nombre:<10}{n:>8,}  {'█' * max(1, round(30 * n / maximo))}")
+        return "\n".join(lineas)
+
+
+class EstadisticasCatalogo:
+    """Agregados por archivo persistidos en disco y puestos al día en cada guardado."""
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.path.join(database.DATA_DIR, ARCHIVO_ESTADISTICAS)
+        self._archivos = {}     # nombre de archivo -> (firma, Agregados)
+        self._lock = threading.Lock()
+        self._cargar()
+
+    def _cargar(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") != VERSION:
+                return
+            for nombre, entrada in datos.get("archivos", {}).items():
+                firma = tuple(entrada["firma"]) if entrada.get("firma") else None
+                self._archivos[nombre] = (firma, Agregados.desde_dict(entrada["agregados"]))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # se reconstruyen leyendo los archivos: nunca son la única copia de nada
+            log.warning("Estadísticas ilegibles en %s, se recalculan: %s", self.ruta, e)
+            self._archivos = {}
+
+    def _persistir(self):
+        datos = {"version": VERSION,
+                 "archivos": {nombre: {"firma": firma, "agregados": agregados.como_dict()}
+                              for nombre, (firma, agregados) in self._archivos.items()}}
+        directorio = os.path.dirname(self.ruta) or "."
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix="tmp_estadisticas_", dir=directorio, suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(datos, f, ensure_ascii=False)
+            os.replace(tmp, self.ruta)
+        except OSError as e:
+            log.warning("No se pudieron guardar las estadísticas en %s: %s", self.ruta, e)
+
+    def al_guardar(self, path, biblioteca, cambios=None, firma_previa=None, firma=None):
+        """
+        Pone al día los agregados de 'path' recién guardado ('firma': la del archivo escrito). Con
+        'cambios' ({isbn: (antes, despues)}) y agregados que describían el archivo anterior
+        (firma_previa) sólo se aplican las diferencias.
+        """
+        nombre = os.path.basename(path)
+        with self._lock:
+            actual = self._archivos.get(nombre)
+            if cambios is not None and actual is not None and actual[0] == firma_previa:
+                agregados = actual[1]
+                agregados.aplicar(cambios)
+            else:
+                agregados = Agregados.desde_biblioteca(biblioteca)
+            self._archivos[nombre] = (firma or database.firma_archivo(path), agregados)
+            self._persistir()
+
+    def pendientes(self):
+        """Rutas de los archivos cuyos agregados no están al día (hay que leerlos)."""
+        rutas = database.listar_archivos_datos()
+        with self._lock:
+            return [ruta for ruta in rutas
+                    if self._archivos.get(os.path.basename(ruta), (None,))[0] != database.firma_archivo(ruta)]
+
+    def actualizar(self, progreso=None, cancelado=None):
+        """Recalcula sólo los archivos pendientes y devuelve el Resumen de todo data/."""
+        pendientes = self.pendientes()
+        for i, ruta in enumerate(pendientes):
+            if cancelado is not None and cancelado():
+                return None
+            # la firma se toma antes de leer: si el archivo cambia en medio, la próxima vez vuelve a estar pendiente
+            firma = database.firma_archivo(ruta)
+            agregados = Agregados.desde_biblioteca(database.leer_archivo(ruta))
+            with self._lock:
+                self._archivos[os.path.basename(ruta)] = (firma, agregados)
+            if progreso is not None:
+                progreso(i + 1, len(pendientes))
+        if pendientes:
+            log.info("Estadísticas recalculadas para %d archivo(s)", len(pendientes))
+        return self.resumen(persistir=bool(pendientes))
+
+    def resumen(self, persistir=False):
+        """Resumen con los agregados guardados (sin leer ningún archivo de biblioteca)."""
+        presentes = {os.path.basename(ruta) for ruta in database.listar_archivos_datos()}
+        with self._lock:
+            # archivos borrados de data/ dejan de contar
+            for nombre in [n for n in self._archivos if n not in presentes]:
+                del self._archivos[nombre]
+                persistir = True
+            if persistir:
+                self._persistir()
+            return Resumen({nombre: agregados for nombre, (_, agregados) in self._archivos.items()})
+
+
+_servicio = None
+_servicio_lock = threading.Lock()
+
+
+def servicio():
+    """Instancia compartida sobre data/estadisticas.json (se carga la primera vez que se usa)."""
+    global _servicio
+    with _servicio_lock:
+        if _servicio is None:
+            _servicio = EstadisticasCatalogo()
+        return _servicio
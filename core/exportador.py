@@ -0,0 +1,171 @@
+"""
+Exportación de la biblioteca a CSV, JSON Lines, Parquet y Excel (XLSX).
+Los registros se recorren por bloques en el orden pedido (por ejemplo, la vista filtrada
+de la tabla) y cada bloque se escribe y se descarta: la memoria usada no depende
+del número de libros. No usa Qt, así que puede correr en una TareaSegundoPlano.
+
+Parquet requiere 'pyarrow' y XLSX requiere 'openpyxl' (ambos opcionales).
+"""
+
+import csv
+import json
+import os
+import tempfile
+
+import esquema
+
+COLUMNAS = ["ISBN", *esquema.CAMPOS_LIBRO]
+TAMANO_BLOQUE = 2000
+
+# extensión -> descripción para el diálogo de guardado
+FORMATOS = {
+    "csv": "CSV (*.csv)",
+    "jsonl": "JSON Lines (*.jsonl)",
+    "parquet": "Parquet (*.parquet)",
+    "xlsx": "Excel (*.xlsx)",
+}
+
+
+class _EscritorCSV:
+    def __init__(self, ruta):
+        self._f = open(ruta, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(COLUMNAS)
+
+    def escribir(self, filas):
+        self._writer.writerows(filas)
+
+    def cerrar(self):
+        self._f.close()
+
+
+class _EscritorJSONL:
+    def __init__(self, ruta):
+        self._f = open(ruta, "w", encoding="utf-8")
+
+    def escribir(self, filas):
+        self._f.writelines(json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + "\n" for fila in filas)
+
+    def cerrar(self):
+        self._f.close()
+
+
+class _EscritorParquet:
+    def __init__(self, ruta):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("La exportación a Parquet requiere el paquete 'pyarrow' (pip install pyarrow).")
+        self._pa = pa
+        self._schema = pa.schema([(c, pa.string()) for c in COLUMNAS])
+        self._writer = pq.ParquetWriter(ruta, self._schema)
+
+    def escribir(self, filas):
+        columnas = list(zip(*filas)) if filas else [()] * len(COLUMNAS)
+        tabla = self._pa.Table.from_arrays([self._pa.array(col, type=self._pa.string()) for col in columnas],
+                                           schema=self._schema)
+        self._writer.write_table(tabla)
+
+    def cerrar(self):
+        self._writer.close()
+
+
+class _EscritorXLSX:
+    def __init__(self, ruta):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("La exportación a Excel requiere el paquete 'openpyxl' (pip install openpyxl).")
+        self._ruta = ruta
+        # write_only: openpyxl vuelca las filas a disco a medida que se agregan
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("Biblioteca")
+        self._ws.append(COLUMNAS)
+
+    def escribir(self, filas):
+        for fila in filas:
+            self._ws.append(fila)
+
+    def cerrar(self):
+        self._wb.save(self._ruta)
+
+
+_ESCRITORES = {
+    "csv": _EscritorCSV,
+    "jsonl": _EscritorJSONL,
+    "parquet": _EscritorParquet,
+    "xlsx": _EscritorXLSX,
+}
+
+
+def formato_de(ruta):
+    """Deduce el formato por la extensión del archivo (csv por defecto)."""
+    ext = os.path.splitext(ruta)[1].lower().lstrip(".")
+    if ext in ("json", "ndjson"):
+        return "jsonl"
+    return ext if ext in _ESCRITORES else "csv"
+
+
+def iterar_bloques(biblioteca, isbns=None, tamano=TAMANO_BLOQUE):
+    """
+    Genera listas de filas (tuplas en el orden de COLUMNAS) de a 'tamano' registros.
+    'isbns' fija el orden y el subconjunto (vista filtrada/ordenada); None exporta todo.
+    Los ISBN que ya no existan en la biblioteca se omiten.
+    """
+    if isbns is None:
+        isbns = biblioteca.keys()
+    bloque = []
+    for isbn in isbns:
+        datos = biblioteca.get(isbn)
+        if datos is None:
+            continue
+        bloque.append((isbn, *(datos.get(campo, "") for campo in esquema.CAMPOS_LIBRO)))
+        if len(bloque) >= tamano:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def exportar(ruta, biblioteca, isbns=None, formato=None, progreso=None, cancelado=None):
+    """
+    Exporta a 'ruta' y devuelve la cantidad de libros escritos, o None si se canceló.
+    Se escribe en un temporal del mismo directorio y se renombra al final, así una exportación
+    cancelada o fallida nunca deja un archivo a medias con el nombre elegido.
+    """
+    formato = formato or formato_de(ruta)
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    total = len(isbns) if isbns is not None else len(biblioteca)
+
+    fd, tmp_path = tempfile.mkstemp(prefix="tmp_export_", suffix="." + formato,
+                                    dir=os.path.dirname(os.path.abspath(ruta)))
+    os.close(fd)
+    escritor = None
+    try:
+        escritor = _ESCRITORES[formato](tmp_path)
+        escritos = 0
+        for bloque in iterar_bloques(biblioteca, isbns):
+            escritor.escribir(bloque)
+            escritos += len(bloque)
+            if progreso:
+                progreso(escritos, total)
+            if cancelado and cancelado():
+                escritor.cerrar()
+                escritor = None
+                os.remove(tmp_path)
+                return None
+        escritor.cerrar()
+        escritor = None
+        os.replace(tmp_path, ruta)
+        return escritos
+    except Exception:
+        if escritor is not None:
+            try:
+                escritor.cerrar()
+            except Exception:
+                pass
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,373 @@
+"""
+Filtros por facetas (editorial, autor, año, con/sin PDF, con/sin portada) con conteos en vivo.
+
+Cada libro recibe un número (ordinal) y cada valor de faceta guarda el conjunto de ordinales que lo
+tienen en un MapaBits: un mapa de bits comprimido al estilo "roaring". Los ordinales se parten en
+bloques de 65.536; un bloque con pocos elementos es un conjunto de enteros y uno con muchos es un
+mapa de bits de 8 KB, así un autor con tres libros no ocupa lo mismo que "Con PDF" con 400 mil.
+Intersecciones y conteos se hacen bloque a bloque (los bloques densos con operaciones de enteros de C).
+
+El índice es incremental: sincronizar() sólo procesa los registros cuyo dict cambió.
+No usa Qt.
+"""
+
+import re
+
+import esquema
+from normalizacion import ClavesNormalizadas
+
+FACETAS = {
+    "editorial": esquema.EDITORIAL,
+    "autor": esquema.AUTOR,
+    "anio": "Año",
+    "pdf": esquema.PDF,
+    "portada": esquema.PORTADA,
+}
+ETIQUETAS_SI_NO = {
+    "pdf": {"si": "Con PDF", "no": "Sin PDF"},
+    "portada": {"si": "Con portada", "no": "Sin portada"},
+}
+_ANIO = re.compile(r"^\s*(\d{4})")
+
+_BITS_BLOQUE = 16
+_MASCARA_BLOQUE = (1 << _BITS_BLOQUE) - 1
+_BYTES_DENSO = (1 << _BITS_BLOQUE) // 8
+# un bloque pasa a mapa de bits por encima de este tamaño y vuelve a conjunto por debajo de la mitad
+MAX_DISPERSO = 4096
+
+try:
+    _popcount = int.bit_count
+except AttributeError:   # Python < 3.10
+    def _popcount(x):
+        return bin(x).count("1")
+
+
+class _Denso:
+    """Bloque denso: 65.536 bits en un bytearray y su cantidad de bits encendidos."""
+    __slots__ = ("bits", "n")
+
+    def __init__(self, bits=None, n=0):
+        self.bits = bits if bits is not None else bytearray(_BYTES_DENSO)
+        self.n = n
+
+    @classmethod
+    def desde_conjunto(cls, valores):
+        denso = cls()
+        for v in valores:
+            denso.bits[v >> 3] |= 1 << (v & 7)
+        denso.n = len(valores)
+        return denso
+
+    @classmethod
+    def desde_entero(cls, x):
+        return cls(bytearray(x.to_bytes(_BYTES_DENSO, "little")), _popcount(x))
+
+    def entero(self):
+        return int.from_bytes(self.bits, "little")
+
+    def __contains__(self, v):
+        return self.bits[v >> 3] >> (v & 7) & 1
+
+    def __iter__(self):
+        for i, byte in enumerate(self.bits):
+            if byte:
+                base = i << 3
+                for j in range(8):
+                    if byte >> j & 1:
+                        yield base + j
+
+    def __len__(self):
+        return self.n
+
+
+def _compactar(valores_o_entero):
+    """Elige la representación de un bloque resultado de una operación (None si quedó vacío)."""
+    if isinstance(valores_o_entero, int):
+        n = _popcount(valores_o_entero)
+        if not n:
+            return None
+        if n > MAX_DISPERSO:
+            return _Denso.desde_entero(valores_o_entero)
+        return set(_Denso.desde_entero(valores_o_entero))
+    if not valores_o_entero:
+        return None
+    if len(valores_o_entero) > MAX_DISPERSO:
+        return _Denso.desde_conjunto(valores_o_entero)
+    return valores_o_entero
+
+
+class MapaBits:
+    """Conjunto de enteros no negativos comprimido por bloques (conjunto disperso o mapa de bits denso)."""
+    __slots__ = ("_bloques",)
+
+    def __init__(self, valores=()):
+        self._bloques = {}
+        for v in valores:
+            self.agregar(v)
+
+    def agregar(self, x):
+        alto, bajo = x >> _BITS_BLOQUE, x & _MASCARA_BLOQUE
+        bloque = self._bloques.get(alto)
+        if bloque is None:
+            self._bloques[alto] = {bajo}
+        elif type(bloque) is set:
+            bloque.add(bajo)
+            if len(bloque) > MAX_DISPERSO:
+                self._bloques[alto] = _Denso.desde_conjunto(bloque)
+        elif not bloque.bits[bajo >> 3] >> (bajo & 7) & 1:
+            bloque.bits[bajo >> 3] |= 1 << (bajo & 7)
+            bloque.n += 1
+
+    def quitar(self, x):
+        alto, bajo = x >> _BITS_BLOQUE, x & _MASCARA_BLOQUE
+        bloque = self._bloques.get(alto)
+        if bloque is None:
+            return
+        if type(bloque) is set:
+            bloque.discard(bajo)
+            if not bloque:
+                del self._bloques[alto]
+        elif bloque.bits[bajo >> 3] >> (bajo & 7) & 1:
+            bloque.bits[bajo >> 3] &= ~(1 << (bajo & 7)) & 0xFF
+            bloque.n -= 1
+            if not bloque.n:
+                del self._bloques[alto]
+            elif bloque.n < MAX_DISPERSO // 2:
+                self._bloques[alto] = set(bloque)
+
+    def __len__(self):
+        return sum(len(b) for b in self._bloques.values())
+
+    def __bool__(self):
+        return bool(self._bloques)
+
+    def __contains__(self, x):
+        bloque = self._bloques.get(x >> _BITS_BLOQUE)
+        return bloque is not None and (x & _MASCARA_BLOQUE) in bloque
+
+    def __iter__(self):
+        for alto in sorted(self._bloques):
+            base = alto << _BITS_BLOQUE
+            bloque = self._bloques[alto]
+            for bajo in (sorted(bloque) if type(bloque) is set else bloque):
+                yield base + bajo
+
+    @staticmethod
+    def _y_bloques(a, b):
+        if type(a) is set and type(b) is set:
+            return _compactar(a & b)
+        if type(a) is set:
+            return _compactar({v for v in a if v in b})
+        if type(b) is set:
+            return _compactar({v for v in b if v in a})
+        return _compactar(a.entero() & b.entero())
+
+    def __and__(self, otro):
+        res = MapaBits()
+        for alto in self._bloques.keys() & otro._bloques.keys():
+            bloque = self._y_bloques(self._bloques[alto], otro._bloques[alto])
+            if bloque is not None:
+                res._bloques[alto] = bloque
+        return res
+
+    def __or__(self, otro):
+        res = MapaBits()
+        for alto in self._bloques.keys() | otro._bloques.keys():
+            a, b = self._bloques.get(alto), otro._bloques.get(alto)
+            if a is None or b is None:
+                bloque = a if b is None else b
+                res._bloques[alto] = set(bloque) if type(bloque) is set else _Denso(bytearray(bloque.bits), bloque.n)
+            elif type(a) is set and type(b) is set:
+                res._bloques[alto] = _compactar(a | b)
+            else:
+                entero_a = a.entero() if type(a) is not set else _Denso.desde_conjunto(a).entero()
+                entero_b = b.entero() if type(b) is not set else _Denso.desde_conjunto(b).entero()
+                res._bloques[alto] = _compactar(entero_a | entero_b)
+        return res
+
+    def cuenta_y(self, otro):
+        """len(self & otro) sin construir la intersección."""
+        total = 0
+        for alto in self._bloques.keys() & otro._bloques.keys():
+            a, b = self._bloques[alto], otro._bloques[alto]
+            if type(a) is set and type(b) is set:
+                total += len(a & b) if len(a) < len(b) else len(b & a)
+            elif type(a) is set:
+                total += sum(1 for v in a if v in b)
+            elif type(b) is set:
+                total += sum(1 for v in b if v in a)
+            else:
+                total += _popcount(a.entero() & b.entero())
+        return total
+
+
+def _anio(registro):
+    m = _ANIO.match(registro.get(esquema.FECHA, "") or "")
+    return m.group(1) if m else ""
+
+
+class IndiceFacetas:
+    """Mapas de bits por valor de faceta sobre los ordinales de los libros, incremental por registro."""
+
+    def __init__(self, claves=None):
+        self.claves = claves or ClavesNormalizadas()
+        self._registros = {}        # isbn -> (dict indexado, ordinal, {faceta: clave})
+        self._isbns = []            # ordinal -> isbn (None si está libre)
+        self._libres = []
+        self._todos = MapaBits()
+        self._mapas = {f: {} for f in FACETAS}        # faceta -> {clave: MapaBits}
+        self._etiquetas = {f: {} for f in FACETAS}    # faceta -> {clave: texto a mostrar}
+
+    def __len__(self):
+        return len(self._registros)
+
+    def _valores(self, isbn, registro):
+        """{faceta: (clave, etiqueta)}; las claves de texto van plegadas ("García" y "Garcia" son una)."""
+        valores = {}
+        for faceta, campo in (("editorial", esquema.EDITORIAL), ("autor", esquema.AUTOR)):
+            clave = self.claves.clave(isbn, registro, campo)
+            if clave:
+                valores[faceta] = (clave, " ".join(str(registro.get(campo, "")).split()))
+        anio = _anio(registro)
+        if anio:
+            valores["anio"] = (anio, anio)
+        for faceta in ("pdf", "portada"):
+            clave = "si" if registro.get(FACETAS[faceta]) else "no"
+            valores[faceta] = (clave, ETIQUETAS_SI_NO[faceta][clave])
+        return valores
+
+    # Mantenimiento
+    def agregar(self, isbn, registro):
+        anterior = self._registros.get(isbn)
+        if anterior is not None:
+            ordinal = anterior[1]
+            self._quitar_valores(ordinal, anterior[2])
+        elif self._libres:
+            ordinal = self._libres.pop()
+            self._isbns[ordinal] = isbn
+        else:
+            ordinal = len(self._isbns)
+            self._isbns.append(isbn)
+        valores = self._valores(isbn, registro)
+        claves = {}
+        for faceta, (clave, etiqueta) in valores.items():
+            mapa = self._mapas[faceta].get(clave)
+            if mapa is None:
+                mapa = self._mapas[faceta][clave] = MapaBits()
+                self._etiquetas[faceta][clave] = etiqueta
+            mapa.agregar(ordinal)
+            claves[faceta] = clave
+        self._registros[isbn] = (registro, ordinal, claves)
+        self._todos.agregar(ordinal)
+
+    def _quitar_valores(self, ordinal, claves):
+        for faceta, clave in claves.items():
+            mapa = self._mapas[faceta].get(clave)
+            if mapa is not None:
+                mapa.quitar(ordinal)
+                if not mapa:
+                    del self._mapas[faceta][clave]
+                    del self._etiquetas[faceta][clave]
+
+    def quitar(self, isbn):
+        anterior = self._registros.pop(isbn, None)
+        if anterior is None:
+            return
+        _, ordinal, claves = anterior
+        self._quitar_valores(ordinal, claves)
+        self._todos.quitar(ordinal)
+        self._isbns[ordinal] = None
+        self._libres.append(ordinal)
+
+    def sincronizar(self, biblioteca):
+        """
+        Reindexa sólo lo que cambió (altas, bajas y registros reemplazados). Los cambios llegan
+        siempre como un dict nuevo, también al deshacer una edición.
+        """
+        for isbn in [i for i in self._registros if i not in biblioteca]:
+            self.quitar(isbn)
+        registros = self._registros
+        for isbn, registro in biblioteca.items():
+            actual = registros.get(isbn)
+            if (actual is None or actual[0] is not registro) and isinstance(registro, dict):
+                self.agregar(isbn, registro)
+
+    def actualizar(self, biblioteca, isbns):
+        """Reindexa sólo los ISBN indicados (altas, bajas o ediciones ya aplicadas), sin recorrer la biblioteca."""
+        registros = self._registros
+        for isbn in isbns:
+            registro = biblioteca.get(isbn)
+            if not isinstance(registro, dict):
+                self.quitar(isbn)
+                continue
+            actual = registros.get(isbn)
+            if actual is None or actual[0] is not registro:
+                self.agregar(isbn, registro)
+
+    # Consultas
+    def mapa_de(self, isbns):
+        """MapaBits con los ordinales de los ISBN dados (ej. el resultado de una búsqueda)."""
+        mapa = MapaBits()
+        registros = self._registros
+        for isbn in isbns:
+            actual = registros.get(isbn)
+            if actual is not None:
+                mapa.agregar(actual[1])
+        return mapa
+
+    def isbns(self, mapa):
+        """ISBN de un MapaBits, en orden de ordinal."""
+        return [self._isbns[o] for o in mapa]
+
+    def filtrar(self, seleccion, excepto=None):
+        """
+        Libros que cumplen la selección {faceta: {claves}}: dentro de una faceta basta un valor (OR),
+        entre facetas deben cumplirse todas (AND). None si no hay nada seleccionado (sin restricción).
+        """
+        resultado = None
+        # de la faceta más restrictiva a la menos: los AND siguientes trabajan con mapas más chicos
+        grupos = []
+        for faceta, claves in seleccion.items():
+            if faceta == excepto or not claves:
+                continue
+            mapa = MapaBits()
+            for clave in claves:
+                valor = self._mapas[faceta].get(clave)
+                if valor is not None:
+                    mapa = mapa | valor
+            grupos.append(mapa)
+        for mapa in sorted(grupos, key=len):
+            resultado = mapa if resultado is None else resultado & mapa
+            if not resultado:
+                break
+        return resultado
+
+    def conteos(self, faceta, seleccion, base=None, limite=20):
+        """
+        [(clave, etiqueta, cantidad)] de los valores más frecuentes de 'faceta' dentro de 'base' (o de toda
+        la biblioteca) y de lo seleccionado en las demás facetas. Los valores seleccionados siempre se incluyen.
+        """
+        filtro = self.filtrar(seleccion, excepto=faceta)
+        if base is not None:
+            filtro = base if filtro is None else filtro & base
+        mapas = self._mapas[faceta]
+        if filtro is None:
+            cuentas = {clave: len(mapa) for clave, mapa in mapas.items()}
+        elif len(filtro) < 8 * len(mapas):
+            # pocos libros y muchos valores (ej. autores): se recorre el filtro y se cuenta por libro
+            cuentas = {}
+            for ordinal in filtro:
+                clave = self._registros[self._isbns[ordinal]][2].get(faceta)
+                if clave is not None:
+                    cuentas[clave] = cuentas.get(clave, 0) + 1
+        else:
+            cuentas = {}
+            for clave, mapa in mapas.items():
+                n = mapa.cuenta_y(filtro)
+                if n:
+                    cuentas[clave] = n
+        elegidas = seleccion.get(faceta, set())
+        primeras = sorted(cuentas.items(), key=lambda item: (-item[1], item[0]))[:limite]
+        vistas = {clave for clave, _ in primeras}
+        primeras += [(clave, cuentas.get(clave, 0)) for clave in sorted(elegidas) if clave not in vistas]
+        return [(clave, self._etiquetas[faceta].get(clave, clave), n) for clave, n in primeras]
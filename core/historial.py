@@ -0,0 +1,389 @@
+"""
+Deshacer / rehacer de varios niveles para Bibliotech.
+Cada acción se guarda como un comando con las diferencias mínimas por ISBN
+(campo: valor anterior -> valor nuevo), no con copias completas de la biblioteca.
+- Profundidad y memoria máximas configurables (se descartan los comandos más antiguos); un comando
+  que por sí solo excede la memoria queda sin deshacer, sin vaciar el resto del historial
+- Agrupación: varias modificaciones (ej. procesar_lote) forman una sola unidad deshacible
+- Persistencia opcional para conservar el historial entre sesiones: un registro de operaciones
+  (JSON por línea) al que cada acción sólo agrega una línea; el archivo se reescribe entero cada
+  COMPACTAR_CADA operaciones o al vaciar el historial, no en cada edición
+- Antes de deshacer/rehacer se comprueba que los registros sigan como los dejó el comando: si otra
+  estación los cambió (recarga en vivo, fusión al guardar) el comando se descarta en lugar de pisarlos
+"""
+
+import json
+import os
+import sys
+from collections import deque
+from contextlib import contextmanager
+
+import compresion
+import database
+import registro
+
+log = registro.obtener(__name__)
+
+PROFUNDIDAD = 100
+LIMITE_BYTES = 2 * 1024 * 1024
+HISTORIAL_DIR = os.path.join(database.DATA_DIR, "historial")
+# operaciones agregadas al archivo antes de reescribirlo entero con sólo las pilas vigentes
+COMPACTAR_CADA = PROFUNDIDAD
+_DESCONOCIDO = object()
+
+
+def diferencia(isbn, antes, despues):
+    """
+    Calcula el cambio de un registro entre dos estados (None = el registro no existe).
+    Devuelve (isbn, existia, existe, {campo: (valor_antes, valor_despues)}) o None si no hay cambios.
+    Un valor None dentro de la tupla indica que el campo no existía en ese estado.
+    """
+    existia, existe = antes is not None, despues is not None
+    antes = antes or {}
+    despues = despues or {}
+    campos = {}
+    for campo in antes.keys() | despues.keys():
+        a, d = antes.get(campo), despues.get(campo)
+        if a != d:
+            campos[campo] = (a, d)
+    if not campos and existia == existe:
+        return None
+    return (isbn, existia, existe, campos)
+
+
+class ConflictoHistorial(Exception):
+    """Los registros del comando cambiaron por fuera del historial (otra estación): aplicarlo pisaría esos cambios."""
+
+    def __init__(self, comando, isbns, deshacer):
+        self.comando = comando
+        self.isbns = isbns
+        accion = "deshacer" if deshacer else "rehacer"
+        muestra = ", ".join(isbns[:5]) + ("..." if len(isbns) > 5 else "")
+        super().__init__(f"No se puede {accion} «{comando.descripcion}»: {len(isbns)} libro(s) cambiaron "
+                         f"después en otra estación o en una acción demasiado grande para deshacer ({muestra}). "
+                         f"Se quitó del historial para no pisar esos cambios.")
+
+
+class Comando:
+    """Una unidad deshacible: descripción legible y lista de diferencias por ISBN."""
+    __slots__ = ("descripcion", "cambios", "tamano")
+
+    def __init__(self, descripcion, cambios):
+        self.descripcion = descripcion
+        self.cambios = list(cambios)
+        self.tamano = sum(_tamano_cambio(c) for c in self.cambios)
+
+    def aplicar(self, biblioteca, deshacer=False, tx=None):
+        """
+        Aplica el comando sobre 'biblioteca' (o lo revierte si deshacer=True). Antes de tocar nada
+        comprueba que cada registro siga como lo dejó el comando (o como estaba antes, para rehacer):
+        si la recarga en vivo o una fusión trajo cambios de otra estación lanza ConflictoHistorial y
+        la biblioteca queda intacta. Con 'tx' (database.Transaccion) los cambios pasan por ella.
+        """
+        cambios = reversed(self.cambios) if deshacer else self.cambios
+        nuevos = {}         # isbn -> registro resultante (None = eliminado)
+        conflictos = []
+        for isbn, existia, existe, campos in cambios:
+            actual = nuevos[isbn] if isbn in nuevos else biblioteca.get(isbn)
+            debe_existir, existira = (existe, existia) if deshacer else (existia, existe)
+            esperado = {campo: (d if deshacer else a) for campo, (a, d) in campos.items()}
+            if (actual is not None) != debe_existir or (
+                    actual is not None and any(actual.get(campo) != valor for campo, valor in esperado.items())):
+                conflictos.append(isbn)
+                continue
+            if not existira:
+                nuevos[isbn] = None
+                continue
+            # registro nuevo en lugar de editar el dict: los índices (claves plegadas, consulta, facetas,
+            # búsqueda difusa) detectan los cambios por identidad
+            nuevo = dict(actual or {})
+            for campo, (a, d) in campos.items():
+                valor = a if deshacer else d
+                if valor is None:
+                    nuevo.pop(campo, None)
+                else:
+                    nuevo[campo] = valor
+            nuevos[isbn] = nuevo
+        if conflictos:
+            raise ConflictoHistorial(self, list(dict.fromkeys(conflictos)), deshacer)
+        for isbn, nuevo in nuevos.items():
+            if nuevo is None:
+                if tx is not None:
+                    tx.eliminar(isbn)
+                else:
+                    biblioteca.pop(isbn, None)
+            elif tx is not None:
+                tx.upsert(isbn, nuevo)
+            else:
+                biblioteca[isbn] = nuevo
+
+    def isbns(self):
+        return {c[0] for c in self.cambios}
+
+    def como_dict(self):
+        return {"descripcion": self.descripcion,
+                "cambios": [[isbn, existia, existe, campos] for isbn, existia, existe, campos in self.cambios]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(datos.get("descripcion", ""),
+                   [(c[0], c[1], c[2], {k: tuple(v) for k, v in c[3].items()}) for c in datos.get("cambios", [])])
+
+
+def _tamano_cambio(cambio):
+    isbn, _, _, campos = cambio
+    total = sys.getsizeof(isbn) + 64
+    for campo, (a, d) in campos.items():
+        total += sys.getsizeof(campo) + sys.getsizeof(a) + sys.getsizeof(d)
+    return total
+
+
+class HistorialCambios:
+    """
+    Pilas de deshacer/rehacer limitadas por profundidad (número de comandos) y por memoria
+    (bytes estimados). Si 'ruta' está definida, cada modificación se agrega a ese archivo y se lee
+    al crearlo. Formato: la primera línea es una foto de las pilas ({"deshacer", "rehacer"}, igual que
+    los archivos de versiones anteriores) y cada línea siguiente una operación ({"op": "apilar",
+    "comando"}, {"op": "deshacer"}, {"op": "rehacer"} o {"op": "descartar", "pila"}).
+    """
+
+    def __init__(self, profundidad=PROFUNDIDAD, limite_bytes=LIMITE_BYTES, ruta=None):
+        self.profundidad = profundidad
+        self.limite_bytes = limite_bytes
+        self.ruta = ruta
+        self._deshacer = deque()
+        self._rehacer = deque()
+        self._bytes = 0
+        self._grupo = None
+        self._nivel_grupo = 0
+        self._anotadas = 0                    # operaciones agregadas desde la última reescritura
+        self._codec_archivo = _DESCONOCIDO    # compresión del archivo en disco (si cambia, se reescribe)
+        if ruta:
+            self._cargar()
+
+    # Registro
+    def registrar(self, descripcion, cambios):
+        """
+        Registra una lista de diferencias (ver diferencia()) como un comando nuevo.
+        Devuelve False si el comando excede limite_bytes y no se puede deshacer (el resto del historial se conserva).
+        """
+        cambios = [c for c in cambios if c is not None]
+        if not cambios:
+            return True
+        if self._grupo is not None:
+            self._grupo.extend(cambios)
+            return True
+        return self._apilar(Comando(descripcion, cambios))
+
+    @contextmanager
+    def registrar_cambios(self, biblioteca, isbns, descripcion):
+        """
+        Toma una copia sólo de los registros afectados, ejecuta el bloque 'with' y registra
+        lo que cambió en ellos. Uso: with historial.registrar_cambios(bib, [isbn], "Editar"): ...
+        """
+        isbns = list(dict.fromkeys(isbns))
+        antes = {isbn: dict(biblioteca[isbn]) if isbn in biblioteca else None for isbn in isbns}
+        yield
+        self.registrar(descripcion, [
+            diferencia(isbn, antes[isbn], dict(biblioteca[isbn]) if isbn in biblioteca else None)
+            for isbn in isbns
+        ])
+
+    def registrar_transaccion(self, descripcion, tx):
+        """Registra lo que cambió una database.Transaccion ya confirmada (mismo resultado que registrar())."""
+        return self.registrar(descripcion, [diferencia(isbn, antes, despues)
+                                     for isbn, (antes, despues) in tx.cambios().items()])
+
+    @contextmanager
+    def agrupar(self, descripcion):
+        """Todo lo registrado dentro del bloque forma un solo comando (se admite anidar)."""
+        if self._grupo is None:
+            self._grupo = []
+            self._descripcion_grupo = descripcion
+        self._nivel_grupo += 1
+        try:
+            yield
+        finally:
+            self._nivel_grupo -= 1
+            if self._nivel_grupo == 0:
+                cambios, self._grupo = self._grupo, None
+                self.registrar(self._descripcion_grupo, cambios)
+
+    def _apilar(self, comando):
+        if comando.tamano > self.limite_bytes:
+            # no entra en el límite: sólo ese comando queda sin deshacer. Los anteriores se conservan; si
+            # alguno toca libros que éste cambió, Comando.aplicar lo detecta como conflicto y lo descarta
+            log.info("«%s» excede el límite del historial (%d bytes): no se podrá deshacer",
+                     comando.descripcion, comando.tamano)
+            if self._rehacer:
+                self._rehacer.clear()
+                self._persistir()
+            return False
+        self._rehacer.clear()
+        self._deshacer.append(comando)
+        self._bytes += comando.tamano
+        self._recortar()
+        self._persistir({"op": "apilar", "comando": comando.como_dict()})
+        return True
+
+    def _recortar(self):
+        while self._deshacer and (len(self._deshacer) > self.profundidad or self._total_bytes() > self.limite_bytes):
+            viejo = self._deshacer.popleft()
+            self._bytes -= viejo.tamano
+
+    def _total_bytes(self):
+        return self._bytes + sum(c.tamano for c in self._rehacer)
+
+    # Deshacer / rehacer
+    def puede_deshacer(self):
+        return bool(self._deshacer)
+
+    def puede_rehacer(self):
+        return bool(self._rehacer)
+
+    def descripcion_deshacer(self):
+        return self._deshacer[-1].descripcion if self._deshacer else ""
+
+    def descripcion_rehacer(self):
+        return self._rehacer[-1].descripcion if self._rehacer else ""
+
+    def deshacer(self, biblioteca, tx=None):
+        """
+        Revierte el último comando sobre 'biblioteca' y lo devuelve (None si no hay nada).
+        Con 'tx' (database.Transaccion sin confirmar) también lo guarda, y las pilas sólo se mueven si
+        el guardado funcionó; si falla la biblioteca vuelve a su estado y se relanza el error.
+        Un comando en conflicto (ver Comando.aplicar) se descarta y se lanza ConflictoHistorial.
+        """
+        return self._mover(self._deshacer, self._rehacer, biblioteca, tx, deshacer=True)
+
+    def rehacer(self, biblioteca, tx=None):
+        """Vuelve a aplicar el último comando deshecho (mismas reglas que deshacer)."""
+        return self._mover(self._rehacer, self._deshacer, biblioteca, tx, deshacer=False)
+
+    def _mover(self, origen, destino, biblioteca, tx, deshacer):
+        if not origen:
+            return None
+        comando = origen[-1]
+        try:
+            comando.aplicar(biblioteca, deshacer=deshacer, tx=tx)
+        except ConflictoHistorial:
+            # no se podrá aplicar nunca: quitarlo deja seguir con los comandos anteriores
+            origen.pop()
+            if deshacer:
+                self._bytes -= comando.tamano
+            self._persistir({"op": "descartar", "pila": "deshacer" if deshacer else "rehacer"})
+            raise
+        if tx is not None:
+            try:
+                tx.confirmar()
+            except Exception:
+                tx.revertir()
+                raise
+        origen.pop()
+        destino.append(comando)
+        self._bytes += -comando.tamano if deshacer else comando.tamano
+        self._persistir({"op": "deshacer" if deshacer else "rehacer"})
+        return comando
+
+    def limpiar(self):
+        self._deshacer.clear()
+        self._rehacer.clear()
+        self._bytes = 0
+        self._persistir()
+
+    # Persistencia
+    def _persistir(self, operacion=None):
+        """Agrega 'operacion' al archivo; sin operación (o cada COMPACTAR_CADA) lo reescribe entero."""
+        if not self.ruta:
+            return
+        try:
+            if (operacion is None or self._anotadas >= COMPACTAR_CADA
+                    or self._codec_archivo != compresion.actual()):
+                self._reescribir()
+            else:
+                self._agregar(operacion)
+        except Exception as e:
+            self._codec_archivo = _DESCONOCIDO   # el próximo intento reescribe el archivo completo
+            log.warning("No se pudo guardar el historial de cambios: %s", e)
+
+    def _reescribir(self):
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        tmp = self.ruta + ".tmp"
+        codec = compresion.actual()
+        with open(tmp, "wb") as crudo, compresion.Escritura(crudo, codec) as f:
+            json.dump({"deshacer": [c.como_dict() for c in self._deshacer],
+                       "rehacer": [c.como_dict() for c in self._rehacer]}, f, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp, self.ruta)
+        self._anotadas, self._codec_archivo = 0, codec
+
+    def _agregar(self, operacion):
+        # comprimido, cada línea es un miembro gzip / frame zstd más: Lectura los lee seguidos
+        with open(self.ruta, "ab") as crudo, compresion.Escritura(crudo, self._codec_archivo) as f:
+            f.write(json.dumps(operacion, ensure_ascii=False) + "\n")
+        self._anotadas += 1
+
+    def _cargar(self):
+        foto, operaciones = None, []
+        try:
+            with compresion.Lectura(self.ruta) as f:
+                for linea in f:
+                    if not linea.strip():
+                        continue
+                    if foto is None:
+                        foto = json.loads(linea)
+                    else:
+                        operaciones.append(json.loads(linea))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            # una línea cortada al final (corte durante el agregado) no invalida lo anterior
+            log.warning("Historial de cambios ilegible desde la operación %d, se ignora el resto (%s): %s",
+                        len(operaciones) + 1, self.ruta, e)
+        else:
+            self._codec_archivo = compresion.detectar(self.ruta)
+        if not isinstance(foto, dict):
+            self._codec_archivo = _DESCONOCIDO
+            return
+        self._deshacer = deque(Comando.desde_dict(c) for c in foto.get("deshacer", []))
+        self._rehacer = deque(Comando.desde_dict(c) for c in foto.get("rehacer", []))
+        self._bytes = sum(c.tamano for c in self._deshacer)
+        self._recortar()
+        for operacion in operaciones:
+            if not self._reproducir(operacion):
+                log.warning("Operación de historial inconsistente en %s: se descarta el resto", self.ruta)
+                self._codec_archivo = _DESCONOCIDO
+                break
+        self._anotadas = len(operaciones)
+
+    def _reproducir(self, operacion):
+        """Aplica a las pilas una operación leída del archivo (sin tocar la biblioteca). False si no encaja."""
+        op = operacion.get("op")
+        if op == "apilar":
+            comando = Comando.desde_dict(operacion.get("comando", {}))
+            self._rehacer.clear()
+            self._deshacer.append(comando)
+            self._bytes += comando.tamano
+            self._recortar()
+        elif op in ("deshacer", "rehacer"):
+            origen, destino = (self._deshacer, self._rehacer) if op == "deshacer" else (self._rehacer, self._deshacer)
+            if not origen:
+                return False
+            comando = origen.pop()
+            destino.append(comando)
+            self._bytes += -comando.tamano if op == "deshacer" else comando.tamano
+        elif op == "descartar":
+            pila = self._deshacer if operacion.get("pila") == "deshacer" else self._rehacer
+            if not pila:
+                return False
+            comando = pila.pop()
+            if pila is self._deshacer:
+                self._bytes -= comando.tamano
+        else:
+            return False
+        return True
+
+
+def ruta_historial(ruta_datos):
+    """Archivo de historial asociado a un archivo de biblioteca (uno por archivo diario/global)."""
+    return os.path.join(HISTORIAL_DIR, os.path.basename(ruta_datos) + ".historial.json")
@@ -0,0 +1,329 @@
+"""
+Importación masiva de catálogos (CSV, JSON y JSON Lines) para Bibliotech.
+- Lee el archivo de forma incremental (nunca se carga entero en memoria)
+- Valida ISBN y fechas por lotes con utils.validar_isbn / utils.validar_fecha_iso
+- Descarta duplicados contra la biblioteca actual mediante un índice de ISBN
+- Entrega los libros aceptados por lotes a una función de guardado
+Pensado para ejecutarse en una TareaSegundoPlano (no usa Qt).
+"""
+
+import csv
+import io
+import json
+import os
+
+import esquema
+import isbn_canonico
+import registro
+import utils
+
+log = registro.obtener(__name__)
+
+TAMANO_LOTE = 5000
+TAMANO_BLOQUE = 64 * 1024
+MAX_ERRORES_GUARDADOS = 50
+
+# Nombres de columna aceptados (en minúsculas) -> clave usada en la biblioteca
+ALIAS_COLUMNAS = {
+    "isbn": "ISBN",
+    "título": esquema.TITULO, "titulo": esquema.TITULO, "title": esquema.TITULO,
+    "autor": esquema.AUTOR, "author": esquema.AUTOR,
+    "editorial": esquema.EDITORIAL, "publisher": esquema.EDITORIAL,
+    "fecha de publicación": esquema.FECHA, "fecha de publicacion": esquema.FECHA,
+    "fecha": esquema.FECHA, "date": esquema.FECHA,
+    "archivo pdf": esquema.PDF, "pdf": esquema.PDF,
+    "portada": esquema.PORTADA,
+}
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: contadores y una muestra de los errores encontrados."""
+
+    def __init__(self):
+        self.leidos = 0
+        self.importados = 0
+        self.duplicados = 0
+        self.invalidos = 0
+        self.lotes = 0
+        self.cancelado = False
+        self.errores = []
+
+    def anotar_error(self, fila, motivo):
+        self.invalidos += 1
+        if len(self.errores) < MAX_ERRORES_GUARDADOS:
+            self.errores.append(f"Fila {fila}: {motivo}")
+
+    def resumen(self):
+        texto = "Importación cancelada: se conservan los lotes ya guardados.\n\n" if self.cancelado else ""
+        texto += (f"Filas leídas: {self.leidos}\n"
+                 f"Libros importados: {self.importados}\n"
+                 f"Duplicados omitidos: {self.duplicados}\n"
+                 f"Filas inválidas: {self.invalidos}")
+        if self.errores:
+            texto += "\n\nPrimeros errores:\n" + "\n".join(self.errores[:10])
+        return texto
+
+
+def clave_isbn(isbn):
+    """Forma comparable de un ISBN para detectar duplicados (ISBN-13 canónico; si no es un ISBN, sin guiones ni espacios)."""
+    return isbn_canonico.canonico(isbn) or isbn_canonico.limpiar(isbn)
+
+
+class _LectorContado(io.RawIOBase):
+    """Envuelve un archivo binario y cuenta los bytes leídos (para informar el progreso)."""
+
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self.leidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._archivo.readinto(buffer)
+        self.leidos += n or 0
+        return n
+
+    def close(self):
+        self._archivo.close()
+        super().close()
+
+
+def _abrir_texto(ruta):
+    crudo = _LectorContado(open(ruta, "rb"))
+    # utf-8-sig descarta el BOM que agregan Excel y otros programas al exportar CSV
+    return crudo, io.TextIOWrapper(io.BufferedReader(crudo), encoding="utf-8-sig", newline="")
+
+
+def _detectar_dialecto_csv(ruta):
+    """Detecta el separador (, ; tab |) leyendo sólo el comienzo del archivo."""
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        muestra = f.read(TAMANO_BLOQUE)
+    try:
+        return csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+    except csv.Error:
+        return csv.excel
+
+
+def _iterar_jsonl(texto):
+    for num, linea in enumerate(texto, start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            yield json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"JSON inválido en la línea {num}: {e.msg}")
+
+
+def _iterar_json(texto):
+    """
+    Decodifica un JSON de nivel superior sin leerlo entero:
+    - lista de objetos: [{"ISBN": ..., "Título": ...}, ...]
+    - diccionario por ISBN: {"978...": {...}, ...}, sólo o dentro de la cabecera de los archivos
+      de Bibliotech ({"esquema": 2, "libros": {...}})
+    Se usa raw_decode sobre un buffer que se rellena por bloques.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    fin = False
+
+    def rellenar():
+        nonlocal buf, pos, fin
+        bloque = texto.read(TAMANO_BLOQUE)
+        if not bloque:
+            fin = True
+        buf = buf[pos:] + bloque
+        pos = 0
+
+    def saltar_espacios():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or fin:
+                return
+            rellenar()
+
+    def decodificar():
+        nonlocal pos
+        saltar_espacios()
+        while True:
+            try:
+                valor, nuevo = decoder.raw_decode(buf, pos)
+                # un número al final del buffer podría estar cortado: pedir más antes de aceptarlo
+                if nuevo == len(buf) and not fin and not isinstance(valor, (dict, list, str)):
+                    raise json.JSONDecodeError("incompleto", buf, nuevo)
+                pos = nuevo
+                return valor
+            except json.JSONDecodeError:
+                if fin:
+                    raise
+                rellenar()
+
+    def esperar(caracteres):
+        saltar_espacios()
+        if pos >= len(buf) or buf[pos] not in caracteres:
+            raise ValueError(f"JSON inesperado cerca de la posición {pos}: se esperaba {caracteres!r}")
+        return buf[pos]
+
+    def elementos(apertura, raiz=False):
+        # recorre un objeto/lista ya abierto; en la raíz, la cabecera del esquema se salta y
+        # "libros" se recorre en vez de decodificarse entero
+        nonlocal pos
+        cierre = "]" if apertura == "[" else "}"
+        saltar_espacios()
+        if pos < len(buf) and buf[pos] == cierre:
+            pos += 1
+            return
+        while True:
+            if apertura == "[":
+                yield decodificar()
+            else:
+                isbn = decodificar()
+                esperar(":")
+                pos += 1
+                saltar_espacios()
+                if raiz and isbn == esquema.CLAVE_LIBROS and buf[pos:pos + 1] == "{":
+                    pos += 1
+                    yield from elementos("{")
+                else:
+                    datos = decodificar()
+                    if raiz and isbn == esquema.CLAVE_VERSION and isinstance(datos, int):
+                        pass
+                    elif isinstance(datos, dict):
+                        yield dict(datos, ISBN=isbn)
+                    else:
+                        yield datos
+            if esperar("," + cierre) == cierre:
+                pos += 1
+                return
+            pos += 1
+
+    rellenar()
+    apertura = esperar("[{")
+    pos += 1
+    yield from elementos(apertura, raiz=True)
+
+
+def iterar_filas(ruta):
+    """
+    Genera (contador_bytes, fila) para cada registro del archivo. 'contador_bytes' es el lector
+    que lleva la cuenta de bytes consumidos. Las filas ilegibles se entregan como ValueError.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    crudo, texto = _abrir_texto(ruta)
+    try:
+        if extension == ".csv":
+            filas = csv.DictReader(texto, dialect=_detectar_dialecto_csv(ruta))
+        elif extension in (".jsonl", ".ndjson"):
+            filas = _iterar_jsonl(texto)
+        elif extension == ".json":
+            filas = _iterar_json(texto)
+        else:
+            raise ValueError(f"Formato no soportado: {extension or ruta}")
+        for fila in filas:
+            yield crudo, fila
+    finally:
+        texto.close()
+
+
+def normalizar_fila(fila):
+    """Mapea los nombres de columna del archivo a las claves de la biblioteca."""
+    datos = {}
+    for columna, valor in fila.items():
+        if columna is None:
+            continue
+        clave = ALIAS_COLUMNAS.get(str(columna).strip().lower())
+        if clave and valor is not None:
+            datos[clave] = str(valor).strip()
+    return datos
+
+
+def _validar_lote(lote, existentes, resultado):
+    """
+    Valida un lote de (num_fila, fila) y devuelve {isbn: datos} con los aceptados.
+    'existentes' es el índice de ISBN normalizados; se actualiza con los nuevos para detectar
+    duplicados dentro del propio archivo.
+    """
+    validar_isbn = utils.validar_isbn
+    validar_fecha = utils.validar_fecha_iso
+    aceptados = {}
+    for num, fila in lote:
+        isbn = fila.pop("ISBN", "")
+        if not validar_isbn(isbn):
+            resultado.anotar_error(num, f"ISBN inválido '{isbn}'")
+            continue
+        if not fila.get(esquema.TITULO):
+            resultado.anotar_error(num, "sin título")
+            continue
+        fecha = fila.get(esquema.FECHA, "")
+        if fecha and not validar_fecha(fecha):
+            resultado.anotar_error(num, f"fecha inválida '{fecha}'")
+            continue
+        clave = clave_isbn(isbn)
+        if clave in existentes:
+            resultado.duplicados += 1
+            continue
+        existentes.add(clave)
+        aceptados[isbn_canonico.clave(isbn)] = {
+            esquema.TITULO: fila.get(esquema.TITULO, ""),
+            esquema.AUTOR: fila.get(esquema.AUTOR, ""),
+            esquema.EDITORIAL: fila.get(esquema.EDITORIAL, ""),
+            esquema.FECHA: fecha,
+            **{k: fila[k] for k in (esquema.PDF, esquema.PORTADA) if fila.get(k)},
+        }
+    return aceptados
+
+
+def importar_catalogo(ruta, biblioteca, confirmar_lote, tamano_lote=TAMANO_LOTE,
+                      progreso=None, cancelado=None):
+    """
+    Importa 'ruta' en 'biblioteca' por lotes.
+    - confirmar_lote(nuevos): recibe {isbn: datos} de cada lote ya validado; debe agregarlos
+      a la biblioteca (persistirlos por lote o una sola vez al final lo decide quien llama).
+      Los lotes confirmados se conservan aunque se cancele.
+    - progreso(bytes_leidos, bytes_totales) y cancelado() son opcionales (ver tareas.py).
+    Devuelve un ResultadoImportacion (con 'cancelado' en True si se interrumpió).
+    """
+    total_bytes = os.path.getsize(ruta)
+    existentes = {clave_isbn(isbn) for isbn in biblioteca}
+    resultado = ResultadoImportacion()
+    lote = []
+    crudo = None
+
+    def procesar():
+        aceptados = _validar_lote(lote, existentes, resultado)
+        lote.clear()
+        if aceptados:
+            confirmar_lote(aceptados)
+            resultado.importados += len(aceptados)
+            resultado.lotes += 1
+            log.debug("Lote %d confirmado: %d libros", resultado.lotes, len(aceptados))
+        if progreso:
+            progreso(crudo.leidos if crudo else 0, total_bytes)
+
+    for crudo, fila in iterar_filas(ruta):
+        resultado.leidos += 1
+        if isinstance(fila, ValueError):
+            resultado.anotar_error(resultado.leidos, str(fila))
+            continue
+        if not isinstance(fila, dict):
+            resultado.anotar_error(resultado.leidos, "el registro no es un objeto")
+            continue
+        lote.append((resultado.leidos, normalizar_fila(fila)))
+        if len(lote) >= tamano_lote:
+            procesar()
+            if cancelado and cancelado():
+                resultado.cancelado = True
+                log.info("Importación de %s cancelada tras %d filas (%d importadas)",
+                         ruta, resultado.leidos, resultado.importados)
+                return resultado
+    if lote:
+        procesar()
+    if progreso:
+        progreso(total_bytes, total_bytes)
+    log.info("Importación de %s terminada: %d filas, %d importadas, %d duplicadas, %d inválidas",
+             ruta, resultado.leidos, resultado.importados, resultado.duplicados, resultado.invalidos)
+    return resultado
@@ -0,0 +1,204 @@
+"""
+Ingesta de PDFs sin interfaz gráfica.
+Extrae metadatos, ISBN y portada de cada PDF usando sólo PyMuPDF, de modo que
+sirve tanto para procesar_lote (UI) como para el modo por línea de comandos,
+donde los archivos se reparten entre varios procesos.
+"""
+
+import os
+import re
+from datetime import datetime
+
+import duplicados
+import esquema
+import isbn_canonico
+import metricas
+import portadas
+import registro
+
+log = registro.obtener(__name__)
+
+CACHE_DIR = "cache"
+PAGINAS_ISBN = 5
+ISBN_PDF_RE = re.compile(r"(97[89][-\s]?\d{1,5}[-\s]?\d{1,7}[-\s]?\d{1,7}[-\s]?[\dX])")
+
+
+def parse_pdf_date(raw_date: str) -> str:
+    """Convierte una fecha PDF ('D:20240131...') a 'YYYY-MM-DD'; cadena vacía si no se puede."""
+    if not raw_date:
+        return ""
+    try:
+        if raw_date.startswith("D:"):
+            raw_date = raw_date[2:]
+        return datetime.strptime(raw_date[:8], "%Y%m%d").strftime("%Y-%m-%d")
+    except Exception:
+        return ""
+
+
+def ruta_miniatura(nombre_archivo, cache_dir=None):
+    """Ruta del .jpg de portada en cache/ para un PDF (nombre base saneado)."""
+    cache_dir = cache_dir or os.path.join(os.getcwd(), CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    nombre_base = os.path.splitext(os.path.basename(nombre_archivo))[0]
+    nombre_base = "".join(c if c.isalnum() or c in ("_", "-") else "_" for c in nombre_base)
+    return os.path.join(cache_dir, f"{nombre_base}_preview.jpg")
+
+
+def renderizar_portada(pdf_path, destino):
+    """Renderiza la primera página del PDF en 'destino'. Lanza excepción si no se puede."""
+    import fitz
+    with metricas.medir("pdf.renderizar_portada", os.path.basename(pdf_path)):
+        doc = fitz.open(pdf_path)
+        metricas.contar("pdf.abiertos")
+        try:
+            if len(doc) == 0:
+                raise ValueError("El PDF no contiene páginas.")
+            pix = doc.load_page(0).get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
+            pix.save(destino)
+        finally:
+            doc.close()
+    if not os.path.exists(destino):
+        raise FileNotFoundError("No se generó el archivo de portada.")
+    return destino
+
+
+def portada_placeholder(destino):
+    """Imagen 'Sin Portada' generada con PyMuPDF (no necesita QApplication)."""
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=200, height=275)
+    page.draw_rect(page.rect, color=None, fill=(0.118, 0.118, 0.118))
+    page.insert_textbox(fitz.Rect(20, 120, 180, 160), "Sin Portada", fontsize=16,
+                        color=(0, 0.478, 0.8), align=fitz.TEXT_ALIGN_CENTER)
+    page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False).save(destino)
+    doc.close()
+    return destino
+
+
+def generar_miniatura(pdf_path, nombre_archivo=None, cache_dir=None):
+    """Genera la portada en cache/; si el PDF no se puede renderizar usa un placeholder. '' si todo falla."""
+    destino = ruta_miniatura(nombre_archivo or pdf_path, cache_dir)
+    try:
+        return renderizar_portada(pdf_path, destino)
+    except Exception as e:
+        log.warning("No se pudo generar portada para '%s': %s", os.path.basename(pdf_path), e)
+    try:
+        return portada_placeholder(destino)
+    except Exception as e:
+        log.error("Error creando placeholder para '%s': %s", os.path.basename(pdf_path), e)
+        return ""
+
+
+def texto_inicial(doc, paginas=PAGINAS_ISBN):
+    """Texto de las primeras páginas de un documento abierto."""
+    return "".join(doc[i].get_text("text") for i in range(min(paginas, len(doc))))
+
+
+def detectar_isbn_pdf(doc, paginas=PAGINAS_ISBN, texto=None):
+    """Busca un ISBN-13 (978/979) en las primeras páginas de un documento abierto."""
+    if texto is None:
+        texto = texto_inicial(doc, paginas)
+    match = ISBN_PDF_RE.search(texto)
+    if match:
+        return match.group(0).replace(" ", "").replace("-", "")
+    return None
+
+
+def extraer_registro(ruta_pdf, cache_dir=None, con_portada=True):
+    """
+    Lee un PDF y devuelve (isbn, registro). Si no se detecta ISBN se usa NOISBN_<nombre>.
+    Función de nivel de módulo para poder usarse en un multiprocessing.Pool.
+    """
+    import fitz
+    archivo = os.path.basename(ruta_pdf)
+    with metricas.medir("pdf.leer_metadatos", archivo):
+        doc = fitz.open(ruta_pdf)
+        metricas.contar("pdf.abiertos")
+        try:
+            info = doc.metadata or {}
+            try:
+                texto = texto_inicial(doc)
+                isbn_detectado = detectar_isbn_pdf(doc, texto=texto)
+            except Exception:
+                texto, isbn_detectado = None, None
+            try:
+                portada_huella = portadas.huella_documento(doc)
+            except Exception:
+                portada_huella = None
+        finally:
+            doc.close()
+        # el mismo texto sirve para reconocer el libro aunque llegue con otro nombre o sin ISBN
+        huella = duplicados.huella_pdf(ruta_pdf, texto)
+
+    portada_path = generar_miniatura(ruta_pdf, archivo, cache_dir) if con_portada else ""
+    isbn = isbn_detectado or isbn_canonico.clave_sin_isbn(archivo)
+    return isbn, {
+        esquema.TITULO: info.get("title") or os.path.splitext(archivo)[0],
+        esquema.AUTOR: info.get("author", ""),
+        esquema.EDITORIAL: info.get("producer", ""),
+        esquema.FECHA: parse_pdf_date(info.get("creationDate", "")),
+        esquema.PDF: ruta_pdf,
+        esquema.PORTADA: portada_path,
+        esquema.HUELLA_PDF: huella,
+        esquema.HUELLA_PORTADA: portadas.a_texto(portada_huella) if portada_huella is not None else "",
+    }
+
+
+def _extraer_seguro(ruta_pdf):
+    """Envoltura para el pool: nunca lanza, devuelve (ruta, isbn, registro, error)."""
+    try:
+        isbn, libro = extraer_registro(ruta_pdf)
+        return ruta_pdf, isbn, libro, None
+    except Exception as e:
+        return ruta_pdf, None, None, str(e)
+
+
+def listar_pdfs(carpeta, recursivo=False):
+    if not recursivo:
+        return sorted(os.path.join(carpeta, f) for f in os.listdir(carpeta) if f.lower().endswith(".pdf"))
+    res = []
+    for raiz, _, archivos in os.walk(carpeta):
+        res.extend(os.path.join(raiz, f) for f in archivos if f.lower().endswith(".pdf"))
+    return sorted(res)
+
+
+def _iniciar_trabajador(cola_log, nivel_log, id_correlacion):
+    # los procesos trabajadores escriben sus avisos en stderr: stdout puede ser una salida JSON (cli.py)
+    import sys
+    sys.stdout = sys.stderr
+    if cola_log is not None:
+        registro.configurar_trabajador(cola_log, nivel_log, id_correlacion)
+
+
+def extraer_en_paralelo(rutas, procesos=None, progreso=None, cancelado=None):
+    """
+    Extrae los registros de 'rutas' repartiéndolos entre 'procesos' procesos (por defecto, uno por CPU).
+    Genera (ruta, isbn, registro, error) a medida que terminan; el orden no está garantizado.
+    """
+    import multiprocessing
+
+    total = len(rutas)
+    if procesos == 1 or total <= 1:
+        for hecho, ruta in enumerate(rutas, start=1):
+            yield _extraer_seguro(ruta)
+            if progreso:
+                progreso(hecho, total)
+            if cancelado and cancelado():
+                return
+        return
+
+    # el registro de los trabajadores vuelve al proceso principal por una cola (mismo archivo y correlación)
+    cola_log, listener = registro.cola_para_procesos() if registro.configurado() else (None, None)
+    iniciar = (cola_log, log.getEffectiveLevel(), registro.correlacion_actual())
+    try:
+        with multiprocessing.Pool(processes=procesos, initializer=_iniciar_trabajador, initargs=iniciar) as pool:
+            for hecho, resultado in enumerate(pool.imap_unordered(_extraer_seguro, rutas, chunksize=4), start=1):
+                yield resultado
+                if progreso:
+                    progreso(hecho, total)
+                if cancelado and cancelado():
+                    pool.terminate()
+                    return
+    finally:
+        if listener is not None:
+            listener.stop()
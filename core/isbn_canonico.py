@@ -0,0 +1,184 @@
+"""
+Forma canónica de los ISBN: "978-84-376-0494-7", "9788437604947" y "84-376-0494-X" son el mismo libro.
+- canonico(): sin guiones ni espacios, con el dígito de control verificado y los ISBN-10
+  convertidos a ISBN-13 (prefijo 978). None si no es un ISBN válido.
+- clave(): la clave con la que se guarda un libro; lo que no es un ISBN (NOISBN_<archivo>,
+  códigos internos) se conserva tal cual.
+- IndiceISBN: ISBN canónico -> clave guardada, para que buscar y detectar repetidos sea O(1)
+  sin importar cómo se escribió el ISBN (incluso en archivos anteriores a la migración).
+- plan_migracion() / migrar(): vuelven a guardar los libros con su clave canónica.
+"""
+
+import os
+import re
+
+_SEPARADORES = re.compile(r"[\s\-‐‑–]+")
+_PREFIJO = re.compile(r"^ISBN(?:-1[03])?:?", re.IGNORECASE)
+# clave de los libros cuyo PDF no trae ISBN: NOISBN_<nombre del archivo sin extensión>
+PREFIJO_SIN_ISBN = "NOISBN_"
+
+
+def clave_sin_isbn(ruta_pdf):
+    """Clave para un PDF sin ISBN detectado (la misma en la ingesta por lote y en la importación manual)."""
+    return f"{PREFIJO_SIN_ISBN}{os.path.splitext(os.path.basename(ruta_pdf))[0]}"
+
+
+def es_clave_sin_isbn(texto):
+    texto = str(texto or "").strip()
+    return texto.startswith(PREFIJO_SIN_ISBN) and len(texto) > len(PREFIJO_SIN_ISBN)
+
+
+def limpiar(texto):
+    """Sin prefijo 'ISBN', guiones ni espacios, con la X final en mayúscula."""
+    texto = _PREFIJO.sub("", str(texto or "").strip())
+    return _SEPARADORES.sub("", texto).upper()
+
+
+def digito_isbn10(nueve):
+    resto = (11 - sum((10 - i) * int(d) for i, d in enumerate(nueve)) % 11) % 11
+    return "X" if resto == 10 else str(resto)
+
+
+def digito_isbn13(doce):
+    return str((10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(doce)) % 10) % 10)
+
+
+def es_isbn10(limpio):
+    return (len(limpio) == 10 and limpio[:9].isdigit() and (limpio[9].isdigit() or limpio[9] == "X")
+            and digito_isbn10(limpio[:9]) == limpio[9])
+
+
+def es_isbn13(limpio):
+    return len(limpio) == 13 and limpio.isdigit() and digito_isbn13(limpio[:12]) == limpio[12]
+
+
+def a_isbn13(isbn10):
+    doce = "978" + isbn10[:9]
+    return doce + digito_isbn13(doce)
+
+
+def a_isbn10(isbn13):
+    """ISBN-10 equivalente, o None (los 979 no tienen forma de 10 dígitos)."""
+    if not isbn13.startswith("978"):
+        return None
+    return isbn13[3:12] + digito_isbn10(isbn13[3:12])
+
+
+def parece_isbn(texto):
+    """True si tiene forma de ISBN-10/13 (sirve para avisar de un dígito de control mal escrito)."""
+    limpio = limpiar(texto)
+    return (len(limpio) == 13 and limpio.isdigit()) or (len(limpio) == 10 and limpio[:9].isdigit())
+
+
+def canonico(texto):
+    """ISBN-13 sin guiones si 'texto' es un ISBN-10 o 13 válido; None si no lo es."""
+    limpio = limpiar(texto)
+    if es_isbn13(limpio):
+        return limpio
+    if es_isbn10(limpio):
+        return a_isbn13(limpio)
+    return None
+
+
+def clave(texto):
+    """Clave con la que se guarda un libro: el ISBN canónico o, si no es un ISBN, el texto sin espacios alrededor."""
+    return canonico(texto) or str(texto).strip()
+
+
+class IndiceISBN:
+    """ISBN canónico -> claves guardadas con ese ISBN (normalmente una sola), incremental por clave."""
+
+    def __init__(self):
+        self._canonicas = {}    # clave guardada -> clave canónica
+        self._por_canonica = {}  # clave canónica -> [claves guardadas]
+
+    def __len__(self):
+        return len(self._canonicas)
+
+    def agregar(self, clave_guardada):
+        if clave_guardada in self._canonicas:
+            return
+        canonica = clave(clave_guardada)
+        self._canonicas[clave_guardada] = canonica
+        self._por_canonica.setdefault(canonica, []).append(clave_guardada)
+
+    def quitar(self, clave_guardada):
+        canonica = self._canonicas.pop(clave_guardada, None)
+        if canonica is None:
+            return
+        claves = self._por_canonica[canonica]
+        claves.remove(clave_guardada)
+        if not claves:
+            del self._por_canonica[canonica]
+
+    def actualizar(self, biblioteca, claves):
+        """Pone al día sólo las claves indicadas (las que cambiaron): las que ya no están se quitan."""
+        for clave_guardada in claves:
+            if clave_guardada in biblioteca:
+                self.agregar(clave_guardada)
+            else:
+                self.quitar(clave_guardada)
+
+    def sincronizar(self, biblioteca):
+        """Sólo procesa las claves que aparecieron o desaparecieron (diferencia de conjuntos de claves)."""
+        actuales = biblioteca.keys()
+        for clave_guardada in self._canonicas.keys() - actuales:
+            self.quitar(clave_guardada)
+        for clave_guardada in actuales - self._canonicas.keys():
+            self.agregar(clave_guardada)
+
+    def buscar(self, texto):
+        """Clave guardada del libro con ese ISBN (escrito de cualquier forma), o None."""
+        claves = self._por_canonica.get(clave(texto))
+        return claves[0] if claves else None
+
+    def claves(self, texto):
+        """Todas las claves guardadas con ese ISBN (escrito de cualquier forma)."""
+        return self._por_canonica.get(clave(texto), ())
+
+    def __contains__(self, texto):
+        return clave(texto) in self._por_canonica
+
+    def repetidos(self):
+        """{clave canónica: [claves guardadas]} de los ISBN guardados más de una vez con distinta forma."""
+        return {c: list(claves) for c, claves in self._por_canonica.items() if len(claves) > 1}
+
+
+def plan_migracion(biblioteca):
+    """
+    (renombres, repetidos) para pasar 'biblioteca' a claves canónicas:
+    renombres {clave actual: clave canónica} y repetidos {clave canónica: [claves actuales]}
+    cuando varias formas del mismo ISBN están guardadas como libros distintos.
+    """
+    grupos = {}
+    for clave_guardada in biblioteca:
+        grupos.setdefault(clave(clave_guardada), []).append(clave_guardada)
+    renombres, repetidos = {}, {}
+    for canonica, claves in grupos.items():
+        if len(claves) > 1:
+            repetidos[canonica] = claves
+        elif claves[0] != canonica:
+            renombres[claves[0]] = canonica
+    return renombres, repetidos
+
+
+def migrar(tx, fusionar):
+    """
+    Aplica plan_migracion() dentro de una transacción: renombra las claves y une los repetidos
+    con fusionar(registros) (el que ya tenía la clave canónica, si lo hay, manda).
+    Devuelve (renombrados, fusionados).
+    """
+    biblioteca = tx.biblioteca
+    renombres, repetidos = plan_migracion(biblioteca)
+    for vieja, nueva in renombres.items():
+        datos = biblioteca[vieja]
+        tx.eliminar(vieja)
+        tx.upsert(nueva, datos)
+    for canonica, claves in repetidos.items():
+        claves = sorted(claves, key=lambda c: c != canonica)
+        registros = [biblioteca[c] for c in claves if isinstance(biblioteca[c], dict)]
+        for c in claves:
+            tx.eliminar(c)
+        if registros:
+            tx.upsert(canonica, fusionar(registros))
+    return len(renombres), sum(len(c) - 1 for c in repetidos.values())
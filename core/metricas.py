@@ -0,0 +1,237 @@
+"""
+Métricas internas de Bibliotech (diagnóstico de rendimiento).
+Registra tiempos de las operaciones críticas (guardar JSON, fsync, backup, llenado de la tabla,
+render de PDFs...), contadores (guardados, bytes escritos, PDFs abiertos, aciertos de caché)
+y un registro de operaciones lentas.
+
+Desactivado por defecto: medir() devuelve un contexto vacío compartido y contar() retorna
+en la primera línea, así el costo en los caminos críticos es despreciable.
+Se activa con la variable de entorno BIBLIOTECH_METRICAS=1 o con activar().
+
+Uso:
+    with metricas.medir("database.guardar"):
+        ...
+    metricas.contar("database.bytes_escritos", n)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import registro
+
+log = registro.obtener(__name__)
+
+METRICAS_DIR = os.path.join("data", "metricas")
+ARCHIVO_METRICAS = "metricas.jsonl"
+TAMANO_MAX_ARCHIVO = 1024 * 1024
+ARCHIVOS_ROTADOS = 5
+
+# límites superiores de cada cubeta del histograma, en milisegundos (la última es infinito)
+CUBETAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+UMBRAL_LENTO_MS = 250
+# umbrales propios para operaciones que normalmente tardan más (o menos) que el valor general
+UMBRALES_LENTO_MS = {
+    "ui.busqueda": 100,
+    "ui.busqueda_difusa": 150,
+    "ui.consulta": 150,
+    "ui.facetas": 100,
+    "pdf.procesar_lote": 30_000,
+    "database.cargar": 1000,
+}
+MAX_LENTAS = 200
+
+_activo = os.environ.get("BIBLIOTECH_METRICAS", "").strip().lower() in ("1", "true", "si", "sí", "on")
+_lock = threading.Lock()
+_histogramas = {}
+_contadores = {}
+_lentas = deque(maxlen=MAX_LENTAS)
+_desde = time.time()
+
+
+class Histograma:
+    """Distribución de duraciones de una operación (conteo, suma, mínimo, máximo y cubetas)."""
+    __slots__ = ("conteo", "suma_ms", "min_ms", "max_ms", "cubetas")
+
+    def __init__(self):
+        self.conteo = 0
+        self.suma_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.cubetas = [0] * (len(CUBETAS_MS) + 1)
+
+    def agregar(self, ms):
+        self.conteo += 1
+        self.suma_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+        for i, limite in enumerate(CUBETAS_MS):
+            if ms <= limite:
+                self.cubetas[i] += 1
+                return
+        self.cubetas[-1] += 1
+
+    def percentil(self, p):
+        """Aproximación del percentil p (0-100): límite superior de la cubeta, acotado por el máximo."""
+        if not self.conteo:
+            return 0.0
+        objetivo = self.conteo * p / 100
+        acumulado = 0
+        for i, n in enumerate(self.cubetas):
+            acumulado += n
+            if acumulado >= objetivo:
+                return min(float(CUBETAS_MS[i]), self.max_ms) if i < len(CUBETAS_MS) else self.max_ms
+        return self.max_ms
+
+    def como_dict(self):
+        return {
+            "conteo": self.conteo,
+            "media_ms": round(self.suma_ms / self.conteo, 3) if self.conteo else 0.0,
+            "min_ms": round(self.min_ms or 0.0, 3),
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentil(50),
+            "p95_ms": self.percentil(95),
+            "cubetas": dict(zip([str(c) for c in CUBETAS_MS] + ["inf"], self.cubetas)),
+        }
+
+
+class _Nulo:
+    """Contexto vacío que se devuelve cuando las métricas están desactivadas."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULO = _Nulo()
+
+
+class _Medicion:
+    __slots__ = ("nombre", "detalle", "t0")
+
+    def __init__(self, nombre, detalle):
+        self.nombre = nombre
+        self.detalle = detalle
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar_tiempo(self.nombre, (time.perf_counter() - self.t0) * 1000, self.detalle)
+        return False
+
+
+# API
+def activo():
+    return _activo
+
+
+def activar(valor=True):
+    global _activo
+    _activo = bool(valor)
+
+
+def medir(nombre, detalle=None):
+    """Context manager que mide la duración del bloque 'with' bajo 'nombre'."""
+    if not _activo:
+        return _NULO
+    return _Medicion(nombre, detalle)
+
+
+def registrar_tiempo(nombre, ms, detalle=None):
+    """Agrega una duración (en ms) al histograma de 'nombre' y la anota si supera el umbral de lentitud."""
+    if not _activo:
+        return
+    with _lock:
+        hist = _histogramas.get(nombre)
+        if hist is None:
+            hist = _histogramas[nombre] = Histograma()
+        hist.agregar(ms)
+        if ms >= UMBRALES_LENTO_MS.get(nombre, UMBRAL_LENTO_MS):
+            _lentas.append({"ts": time.strftime("%Y-%m-%d %H:%M:%S"), "operacion": nombre,
+                            "ms": round(ms, 1), "detalle": detalle})
+
+
+def contar(nombre, n=1):
+    """Suma 'n' al contador 'nombre' (ej. bytes escritos, PDFs abiertos, aciertos de caché)."""
+    if not _activo:
+        return
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + n
+
+
+def reiniciar():
+    global _desde
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
+        _lentas.clear()
+        _desde = time.time()
+
+
+def instantanea():
+    """Copia del estado actual como dict serializable a JSON."""
+    with _lock:
+        return {
+            "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "desde": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_desde)),
+            "tiempos": {nombre: h.como_dict() for nombre, h in sorted(_histogramas.items())},
+            "contadores": dict(sorted(_contadores.items())),
+            "lentas": list(_lentas),
+        }
+
+
+def informe():
+    """Texto legible con tiempos, contadores y las últimas operaciones lentas."""
+    datos = instantanea()
+    lineas = [f"Métricas desde {datos['desde']} ({'activas' if _activo else 'desactivadas'})", ""]
+    lineas.append(f"{'operación':<32}{'n':>8}{'media':>10}{'p50':>9}{'p95':>9}{'máx':>10}  (ms)")
+    for nombre, h in datos["tiempos"].items():
+        lineas.append(f"{nombre:<32}{h['conteo']:>8}{h['media_ms']:>10.1f}{h['p50_ms']:>9.0f}"
+                      f"{h['p95_ms']:>9.0f}{h['max_ms']:>10.1f}")
+    lineas.append("")
+    lineas.append("Contadores:")
+    for nombre, valor in datos["contadores"].items():
+        lineas.append(f"   {nombre:<36}{valor:>14,}")
+    lineas.append("")
+    lineas.append(f"Operaciones lentas (últimas {MAX_LENTAS}):")
+    for lenta in reversed(datos["lentas"]):
+        detalle = f"  [{lenta['detalle']}]" if lenta.get("detalle") else ""
+        lineas.append(f"   {lenta['ts']}  {lenta['operacion']:<28}{lenta['ms']:>10.1f} ms{detalle}")
+    return "\n".join(lineas)
+
+
+# Archivo de métricas (JSON Lines con rotación)
+def _rotar(ruta):
+    for i in range(ARCHIVOS_ROTADOS - 1, 0, -1):
+        origen = f"{ruta}.{i}"
+        if os.path.exists(origen):
+            os.replace(origen, f"{ruta}.{i + 1}")
+    os.replace(ruta, f"{ruta}.1")
+
+
+def volcar(directorio=None):
+    """
+    Agrega una instantánea al archivo de métricas (data/metricas/metricas.jsonl).
+    Al superar TAMANO_MAX_ARCHIVO se rota (metricas.jsonl.1 ... .5). Devuelve la ruta o None.
+    """
+    if not _activo:
+        return None
+    directorio = directorio or METRICAS_DIR
+    ruta = os.path.join(directorio, ARCHIVO_METRICAS)
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        if os.path.exists(ruta) and os.path.getsize(ruta) >= TAMANO_MAX_ARCHIVO:
+            _rotar(ruta)
+        with open(ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(instantanea(), ensure_ascii=False) + "\n")
+        return ruta
+    except OSError as e:
+        log.warning("No se pudo escribir el archivo de métricas: %s", e)
+        return None
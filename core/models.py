@@ -1,3 +1,6 @@
+import esquema
+
+
 class Libro:
     def __init__(self, isbn: str, titulo: str, autor: str, editoral: str, fecha_publicacion: str):
         self.isbn = isbn.strip()
@@ -8,17 +11,17 @@ class Libro:
 
     def to_dict(self):
         return {
-            "Título": self.titulo,
-            "Autor": self.autor,
-            "Editorial": self.editorial,
-            "Fecha de Publicación": self.fecha_publicacion
+            esquema.TITULO: self.titulo,
+            esquema.AUTOR: self.autor,
+            esquema.EDITORIAL: self.editorial,
+            esquema.FECHA: self.fecha_publicacion
         }
     @classmethod
     def from_dict(cls, isbn: str, datos: dict):
         return cls(
             isbn=isbn,
-            titulo=datos.get("Título", ""),
-            autor=datos.get("Autor", ""),
-            editorial=datos.get("Editorial", ""),
-            fecha_publicacion=datos.get("Fecha de Publicación", "")
+            titulo=datos.get(esquema.TITULO, ""),
+            autor=datos.get(esquema.AUTOR, ""),
+            editorial=datos.get(esquema.EDITORIAL, ""),
+            fecha_publicacion=datos.get(esquema.FECHA, "")
         )
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Normalización de texto para comparar, buscar y ordenar sin importar tildes ni mayúsculas.
+plegar("García-Márquez, Gabriel") -> "garcia marquez gabriel"
+
+Las claves plegadas de cada libro se calculan una vez (al cargar o al cambiar el registro) y se
+guardan en ClavesNormalizadas: la búsqueda en tiempo real, el orden de la tabla y la detección de
+duplicados las reutilizan en lugar de normalizar todo el catálogo en cada tecla.
+"""
+
+import re
+import unicodedata
+
+import esquema
+
+CAMPOS = esquema.CAMPOS_LIBRO
+CAMPOS_BUSQUEDA = (esquema.TITULO, esquema.AUTOR)
+_NO_PALABRA = re.compile(r"[^\w]+")
+# separador entre campos en la clave de búsqueda: plegar() nunca lo produce, así una consulta no une dos campos
+_SEPARADOR = "\n"
+
+
+def plegar(texto):
+    """Minúsculas (casefold), sin tildes (NFKD) y con puntuación y espacios reducidos a un espacio."""
+    if not texto:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(texto).casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(_NO_PALABRA.sub(" ", texto).split())
+
+
+class _Claves:
+    __slots__ = ("registro", "originales", "plegados", "busqueda")
+
+    def __init__(self, registro, originales):
+        self.registro = registro
+        self.originales = originales
+        self.plegados = tuple(plegar(v) for v in originales)
+        self.busqueda = _SEPARADOR.join(self.plegados[CAMPOS.index(c)] for c in CAMPOS_BUSQUEDA)
+
+
+class ClavesNormalizadas:
+    """
+    Caché de claves plegadas por ISBN. Toda edición reemplaza el dict del registro en lugar de
+    modificarlo (Transaccion.upsert/actualizar, Comando.aplicar del historial, fusionar_externo), así
+    que basta comparar identidad: si el dict cambió se comparan los textos originales y sólo se vuelve
+    a plegar si alguno es distinto. Un registro editado en su lugar quedaría con claves viejas.
+    """
+
+    def __init__(self):
+        self._claves = {}
+
+    def __len__(self):
+        return len(self._claves)
+
+    def _entrada(self, isbn, registro):
+        entrada = self._claves.get(isbn)
+        if entrada is not None and entrada.registro is registro:
+            return entrada
+        originales = tuple(registro.get(c, "") for c in CAMPOS)
+        if entrada is None or entrada.originales != originales:
+            entrada = self._claves[isbn] = _Claves(registro, originales)
+        else:
+            entrada.registro = registro
+        return entrada
+
+    def clave(self, isbn, registro, campo):
+        """Texto plegado de 'campo' ("Título", "Autor"...) del registro."""
+        return self._entrada(isbn, registro).plegados[CAMPOS.index(campo)]
+
+    def sincronizar(self, biblioteca):
+        """Pliega lo nuevo o cambiado y olvida los ISBN que ya no están (ej. al cargar otro archivo)."""
+        for isbn in [i for i in self._claves if i not in biblioteca]:
+            del self._claves[isbn]
+        for isbn, registro in biblioteca.items():
+            if isinstance(registro, dict):
+                self._entrada(isbn, registro)
+
+    def filtrar(self, biblioteca, consulta):
+        """Libros cuyo título o autor contiene 'consulta' (sin distinguir tildes, mayúsculas ni puntuación)."""
+        consulta = plegar(consulta)
+        if not consulta:
+            return dict(biblioteca)
+        claves, entrada = self._claves, self._entrada
+        res = {}
+        for isbn, d in biblioteca.items():
+            e = claves.get(isbn)
+            if e is None or e.registro is not d:
+                e = entrada(isbn, d)
+            if consulta in e.busqueda:
+                res[isbn] = d
+        return res
+
+    def ordenar(self, datos, campo, descendente=False):
+        """Copia de 'datos' ordenada por el texto plegado de 'campo' ("ISBN" ordena por la clave)."""
+        if campo == "ISBN":
+            clave = lambda item: item[0]
+        else:
+            i = CAMPOS.index(campo)
+            entrada = self._entrada
+            clave = lambda item: (entrada(item[0], item[1]).plegados[i], item[0])
+        return dict(sorted(datos.items(), key=clave, reverse=descendente))
@@ -7,21 +7,31 @@
 #   - Generación y visualización de miniatura de portada
 #   - Procesamiento en lote
 #   - Vista previa dentro de la UI
+#
+# PyMuPDF (fitz) se importa dentro de cada función que lo usa: así el arranque
+# de la aplicación no paga su carga hasta la primera acción sobre un PDF.
 
 import os
 import re
 import subprocess
 import sys
-import fitz
 import database
+import duplicados
+import ingesta
+import isbn_canonico
+import metricas
+import portadas
+import registro
 from datetime import datetime
 from PySide6.QtWidgets import (
     QFileDialog, QMessageBox, QLabel, QVBoxLayout, QDialog, QPushButton, QWidget, QHBoxLayout
 )
-from PySide6.QtGui import QPixmap, QImage, QPainter, QColor, QFont
+from PySide6.QtGui import QPixmap, QPixmapCache, QImage, QPainter, QColor, QFont
 from PySide6.QtCore import Qt
 from typing import Optional
 
+log = registro.obtener(__name__)
+
 
 # Lista de nombres alternativos comunes para cada campo
 _field_names = {
@@ -74,6 +84,7 @@ def importar_pdf(parent):
     Busca varios nombres comunes para los widgets del formulario y no lanza excepción
     si faltan — en su lugar devuelve/establece parent.current_pdf_path.
     """
+    import fitz
     file_paths, _ = QFileDialog.getOpenFileNames(
         parent,
         "Seleccionar archivo(s) PDF",
@@ -118,6 +129,11 @@ def importar_pdf(parent):
                         texto_preview += doc2[i].get_text("text") + "\n"
                     except Exception:
                         pass
+                try:
+                    portada_huella = portadas.huella_documento(doc2)
+                    parent.current_portada_huella = portadas.a_texto(portada_huella) if portada_huella is not None else None
+                except Exception:
+                    parent.current_portada_huella = None
                 doc2.close()
             except Exception:
                 texto_preview = ""
@@ -129,17 +145,14 @@ def importar_pdf(parent):
                 patron = r"(97[89][-– ]?\d{1,5}[-– ]?\d{1,7}[-– ]?\d{1,7}[-– ]?\d|(?:\d{1,5}[-– ]?\d{1,7}[-– ]?\d{1,7}[-– ]?[\dX]))"
                 match = re.search(patron, texto_preview)
                 if match:
-                    isbn_detected = match.group(0).replace(" ", "").replace("-", "")
+                    # un número cualquiera del texto con dígito de control erróneo no es un ISBN
+                    isbn_detected = isbn_canonico.canonico(match.group(0))
             except Exception:
                 isbn_detected = None
 
-            import random
-            if not isbn_detected:
-                while True:
-                    isbn_candidate = str(random.randint(10**9, 10**10 - 1))
-                    if isbn_candidate not in getattr(parent, "biblioteca", {}):
-                        isbn_detected = isbn_candidate
-                        break
+            # sin ISBN en el texto se usa la misma clave que la ingesta por lote (NOISBN_<archivo>),
+            # nunca un número inventado que no pasaría la verificación del dígito de control
+            isbn_campo = isbn_detected or isbn_canonico.clave_sin_isbn(pdf_path)
 
             if fields["titulo"]:
                 _safe_set_text(fields["titulo"], titulo)
@@ -149,11 +162,13 @@ def importar_pdf(parent):
                 _safe_set_text(fields["editorial"], editorial)
             if fields["fecha"]:
                 _safe_set_text(fields["fecha"], fecha)
-            if fields["isbn"] and isbn_detected:
-                _safe_set_text(fields["isbn"], isbn_detected)
+            if fields["isbn"]:
+                _safe_set_text(fields["isbn"], isbn_campo)
 
             # guardar ruta del pdf en parent para que _on_add la asocie
             parent.current_pdf_path = pdf_path
+            # huella de contenido: _on_add avisa si el mismo PDF ya está en la biblioteca con otro ISBN
+            parent.current_pdf_huella = duplicados.huella_pdf(pdf_path, texto_preview)
 
             try:
                 QMessageBox.information(
@@ -161,12 +176,13 @@ def importar_pdf(parent):
                     "PDF importado",
                     f"Archivo leído: {os.path.basename(pdf_path)}\n\n"
                     f"Título: {titulo}\nAutor: {autor or 'Desconocido'}\nEditorial: {editorial or 'N/A'}\nFecha: {fecha or 'Desconocida'}\n"
-                    f"{'ISBN detectado: ' + isbn_detected if isbn_detected else ''}"
+                    f"{'ISBN detectado: ' + isbn_detected if isbn_detected else 'Sin ISBN: se usará ' + isbn_campo}"
                 )
             except Exception:
                 pass
 
         except Exception as e:
+            log.warning("Error al leer PDF %s: %s", pdf_path, e)
             try:
                 QMessageBox.warning(
                     parent,
@@ -174,14 +190,21 @@ def importar_pdf(parent):
                     f"No se pudo procesar el archivo:\n{pdf_path}\n\nDetalles:\n{e}"
                 )
             except Exception:
-                print("Error al procesar PDF:", pdf_path, e)
+                pass
 
 
 def procesar_lote(parent):
     """
     Procesa automáticamente varios PDFs de una carpeta seleccionada.
     Extrae metadatos, ISBN y texto, y los indexa en la biblioteca.
+    Todos los libros nuevos se guardan en una sola transacción (un backup y un fsync) y,
+    si parent tiene 'historial', el lote queda como una sola acción deshacible.
     """
+    with registro.correlacion("lote"), metricas.medir("pdf.procesar_lote"):
+        _procesar_lote(parent)
+
+
+def _procesar_lote(parent):
     folder = QFileDialog.getExistingDirectory(parent, "Seleccionar carpeta de PDFs")
     if not folder:
         return
@@ -190,79 +213,89 @@ def procesar_lote(parent):
     if not pdf_files:
         QMessageBox.warning(parent, "Sin PDF", "No se encontraron archivos en la carpeta seleccionada")
         return
-    nuevos_registros = 0
-
-    for archivo in pdf_files:
-        ruta_pdf = os.path.join(folder, archivo)
-        try:
-            doc = fitz.open(ruta_pdf)
-            info = doc.metadata or {}
-
-            titulo = info.get("title") or os.path.splitext(archivo) [0]
-            autor = info.get("author", "")
-            editorial = info.get("producer", "")
-            fecha_raw = info.get("creationDate", "")
-            if fecha_raw.startswith("D:"):
-                fecha_raw = fecha_raw[2:]
-            try:
-                fecha_publicacion = datetime.striptime(fecha_raw[:8], "%Y%m%d").strftime("%Y-%m-%d")
-            except Exception:
-                fecha_publicacion = ""
-            #genera miniatura
-            portada_path = ""
-            try:
-                portada_path = generar_miniatura_segura(ruta_pdf, archivo)
-            except Exception:
-                portada_path = ""
-
-            doc.close()
-            #Intenta detectar ISBN en el texto
-            isbn_detectado = None
-            try:
-                texto = ""
-                doc2 = fitz.open(ruta_pdf)
-                for i in range(min(5, len(doc2))):
-                    texto += doc2[i].get_text("text")
-                doc2.close()
-                import re
-                match = re.search(r"(97[89][-\s]?\d{1,5}[-\s]?\d{1,7}[-\s]?\d{1,7}[-\s]?[\dX])", texto)
-                if match:
-                    isbn_detectado = match.group(0).replace(" ", "").replace("-", "")
-            except Exception:
-                isbn_detectado = None
-
-            isbn = isbn_detectado or f"NOISBN_{os.path.splitext(archivo)[0]}"
-            #Si ya existe, se lo salta
-            if isbn in parent.biblioteca:
-                continue
-            parent.biblioteca[isbn] = {
-                "Título": titulo,
-                "Autor": autor,
-                "Editorial": editorial,
-                "Fecha de publicación": fecha_publicacion,
-                "Archivo PDF": ruta_pdf,
-                "Portada": portada_path
-            }
-
-            nuevos_registros += 1
+    historial = getattr(parent, "historial", None)
+    if hasattr(parent, "_indice_duplicados"):
+        indice = parent._indice_duplicados()
+    else:
+        indice = duplicados.IndiceDuplicados()
+        indice.sincronizar(parent.biblioteca)
+    if hasattr(parent, "_indice_isbn"):
+        # el de la ventana ya está al día salvo por los ISBN que cambiaron: no se recorre la biblioteca
+        indice_isbn = parent._indice_isbn()
+    else:
+        indice_isbn = isbn_canonico.IndiceISBN()
+        indice_isbn.sincronizar(parent.biblioteca)
+    agregados = []
+    parecidos = []
+    log.info("Procesando lote: %d PDF(s) en %s", len(pdf_files), folder)
 
-        except Exception as e:
-            print(f"Error procesado {archivo}: {e}")
-        #guarda y refresca la tabla
-        if nuevos_registros > 0:
-            try:
-                database.guardar_biblioteca(parent.biblioteca, fecha=parent.selected_date, global_file=parent.use_global)
-                parent._actualizar_tabla()
-                QMessageBox.information(
-                    parent,
-                    "Lote Procesado",
-                    f"Se procesaron {nuevos_registros} PDF(s) correctamente"
-                )
-            except Exception as e:
-                QMessageBox.critical(parent, "Error al guardar", f"No se pudieron almacenar los libros procesados:\n{e}")
-        else:
-            QMessageBox.information(parent, "Sin cambios", "No se agregaron nuevos libros al sistema.")
+    try:
+        # un solo guardado al final del lote; si falla, ningún libro del lote queda en memoria
+        with database.transaccion(parent.biblioteca, fecha=parent.selected_date,
+                                  global_file=parent.use_global) as tx:
+            for archivo in pdf_files:
+                ruta_pdf = os.path.join(folder, archivo)
+                try:
+                    with metricas.medir("pdf.extraer_registro", archivo):
+                        isbn, libro = ingesta.extraer_registro(ruta_pdf)
+                    metricas.contar("pdf.procesados")
+                    #Si ya existe (con cualquier forma del ISBN), se lo salta
+                    if isbn in indice_isbn:
+                        metricas.contar("pdf.duplicados")
+                        log.debug("Omitido %s: el ISBN %s ya existe", archivo, isbn)
+                        continue
+                    # el mismo PDF con otro nombre o sin ISBN (NOISBN_<archivo>) no se vuelve a ingresar
+                    coincidencias = indice.buscar(libro)
+                    iguales = [c.isbn for c in coincidencias if c.motivo == "contenido"]
+                    if iguales:
+                        metricas.contar("pdf.duplicados")
+                        log.debug("Omitido %s: mismo contenido que %s", archivo, iguales[0])
+                        continue
+                    if coincidencias:
+                        # portada o título/autor parecidos (ej. otro escaneo del mismo libro): se ingresa y se avisa
+                        parecidos.append((archivo, coincidencias[0]))
+                    tx.upsert(isbn, libro)
+                    indice.agregar(isbn, libro)
+                    indice_isbn.agregar(isbn)
+                    agregados.append(isbn)
+
+                except Exception as e:
+                    metricas.contar("pdf.errores")
+                    log.warning("Error procesando %s: %s", archivo, e)
+    except Exception as e:
+        # la transacción se revirtió: los índices vuelven a revisar los libros que se les agregaron
+        if hasattr(parent, "_marcar_cambiados"):
+            parent._marcar_cambiados(agregados)
+        log.exception("No se pudo guardar el lote procesado")
+        QMessageBox.critical(parent, "Error al guardar", f"No se pudieron almacenar los libros procesados:\n{e}")
+        return
 
+    cambios = tx.cambios()
+    nuevos_registros = len(cambios)
+    log.info("Lote terminado: %d libro(s) nuevo(s) de %d PDF(s)", nuevos_registros, len(pdf_files))
+    # los índices de búsqueda de la ventana sólo revisan los libros que cambiaron
+    if hasattr(parent, "_marcar_cambiados"):
+        parent._marcar_cambiados(cambios)
+    if hasattr(parent, "_revisar_fusion_al_guardar"):
+        parent._revisar_fusion_al_guardar()
+    if nuevos_registros > 0:
+        deshacible = True
+        if historial is not None:
+            deshacible = historial.registrar_transaccion("Procesar lote PDF", tx)
+            if hasattr(parent, "_actualizar_botones_historial"):
+                parent._actualizar_botones_historial()
+        parent._actualizar_tabla()
+        mensaje = f"Se procesaron {nuevos_registros} PDF(s) correctamente"
+        if not deshacible:
+            mensaje += "\n\nEl lote es demasiado grande para el historial y no se puede deshacer."
+        if parecidos:
+            mensaje += (f"\n\n{len(parecidos)} libro(s) se parecen a otros ya existentes "
+                        f"(revíselos con 'Buscar duplicados'):\n"
+                        + "\n".join(f"• {archivo} ≈ {c.isbn} ({'portada' if c.motivo == 'portada' else 'título/autor'})"
+                                    for archivo, c in parecidos[:10]))
+        QMessageBox.information(parent, "Lote Procesado", mensaje)
+    else:
+        QMessageBox.information(parent, "Sin cambios", "No se agregaron nuevos libros al sistema.")
 
 
 def mostrar_portada(parent, isbn):
@@ -283,8 +316,16 @@ def mostrar_portada(parent, isbn):
     portada_path = datos.get("Portada", "")
 
     if portada_path and os.path.exists(portada_path):
-        image = QImage(portada_path)
-        pix = QPixmap.fromImage(image).scaledToWidth(200, Qt.SmoothTransformation)
+        # la miniatura escalada se guarda en QPixmapCache: recorrer la tabla no vuelve a decodificar el JPG
+        clave = f"portada:{portada_path}:{os.path.getmtime(portada_path)}"
+        pix = QPixmapCache.find(clave)
+        if pix is None or pix.isNull():
+            metricas.contar("portada.cache_fallos")
+            with metricas.medir("ui.cargar_portada"):
+                pix = QPixmap.fromImage(QImage(portada_path)).scaledToWidth(200, Qt.SmoothTransformation)
+            QPixmapCache.insert(clave, pix)
+        else:
+            metricas.contar("portada.cache_aciertos")
         parent.lblPreview.setPixmap(pix)
         parent.lblPreview.setAlignment(Qt.AlignCenter)
     else:
@@ -372,6 +413,7 @@ def vista_previa_pdf(parent, pdf_path):
 
 
 def leer_metadatos(pdf_path):
+    import fitz
     doc = fitz.open(pdf_path)
     info = doc.metadata or {}
     doc.close()
@@ -386,6 +428,7 @@ def leer_metadatos(pdf_path):
 
 
 def extraer_texto(pdf_path, limit_pages=10):
+    import fitz
     texto = []
     doc = fitz.open(pdf_path)
     for i, page in enumerate(doc):
@@ -408,6 +451,7 @@ def detectar_isbn(texto):
 
 
 def generar_portada(pdf_path):
+    import fitz
     cache_dir = os.path.join(os.path.dirname(__file__), "cache")
     os.makedirs(cache_dir, exist_ok=True)
     img_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(pdf_path))[0] + "_preview.jpg")
@@ -474,33 +518,13 @@ def generar_miniatura_segura(pdf_path, nombre_archivo):
     Si el PDF no puede renderizarse, crea un placeholder visual.
     Devuelve la ruta completa del .jpg generado.
     """
-    cache_dir = os.path.join(os.getcwd(), "cache")
-    os.makedirs(cache_dir, exist_ok=True)
-
-    # Sanitizar nombre base
-    nombre_base = os.path.splitext(os.path.basename(nombre_archivo))[0]
-    nombre_base = "".join(c if c.isalnum() or c in ("_", "-") else "_" for c in nombre_base)
-
-    portada_path = os.path.join(cache_dir, f"{nombre_base}_preview.jpg")
+    portada_path = ingesta.ruta_miniatura(nombre_archivo)
 
     try:
-        doc = fitz.open(pdf_path)
-        if len(doc) == 0:
-            raise ValueError("El PDF no contiene páginas.")
-
-        # Intentar renderizar la primera página
-        page = doc.load_page(0)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)
-        pix.save(portada_path)
-        doc.close()
-
-        if os.path.exists(portada_path):
-            return portada_path
-        else:
-            raise FileNotFoundError("No se generó el archivo de portada.")
+        return ingesta.renderizar_portada(pdf_path, portada_path)
 
     except Exception as e:
-        print(f"⚠️ No se pudo generar portada para '{nombre_archivo}': {e}")
+        log.warning("No se pudo generar portada para '%s': %s", nombre_archivo, e)
         # Si falla, generar una imagen de placeholder visual
         try:
             width, height = 400, 550
@@ -514,5 +538,5 @@ def generar_miniatura_segura(pdf_path, nombre_archivo):
             image.save(portada_path, "JPG")
             return portada_path
         except Exception as img_err:
-            print(f"⚠️ Error creando placeholder: {img_err}")
+            log.error("Error creando placeholder para '%s': %s", nombre_archivo, img_err)
             return ""
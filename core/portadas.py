@@ -0,0 +1,158 @@
+"""
+Huella perceptual de las portadas y búsqueda de portadas parecidas.
+- dHash de 64 bits: la imagen se reduce a 9x8 tonos de gris y cada bit indica si un punto es más
+  claro que su vecino derecho. Dos portadas iguales (aunque una sea un escaneo con otra resolución
+  o compresión) quedan a pocos bits de distancia (distancia de Hamming).
+- Árbol BK sobre esas huellas: la desigualdad triangular permite descartar ramas completas, así que
+  buscar "portadas a distancia <= r" no recorre todas las huellas.
+
+La huella se guarda en el registro como texto hexadecimal (CAMPO_HUELLA_PORTADA).
+PyMuPDF se importa sólo dentro de las funciones que leen imágenes.
+"""
+
+import esquema
+
+CAMPO_HUELLA_PORTADA = esquema.HUELLA_PORTADA
+DISTANCIA_PARECIDA = 6
+LADO_MUESTRA = 64
+# diferencia mínima de tono entre celdas: una página en blanco o lisa no identifica a ningún libro
+CONTRASTE_MINIMO = 8
+
+
+def distancia(a, b):
+    """Bits distintos entre dos huellas (enteros)."""
+    return bin(a ^ b).count("1")
+
+
+def a_texto(huella):
+    return f"{huella:016x}"
+
+
+def desde_texto(texto):
+    """Huella guardada en un registro -> entero, o None si falta o no es válida."""
+    try:
+        return int(texto, 16) if texto else None
+    except (TypeError, ValueError):
+        return None
+
+
+def dhash(muestras, ancho, alto, stride=None):
+    """
+    dHash de una imagen en escala de grises (un byte por píxel, filas de 'stride' bytes).
+    Devuelve un entero de 64 bits, o None si la imagen es demasiado chica o casi lisa.
+    """
+    stride = stride or ancho
+    if ancho < 9 or alto < 8:
+        return None
+    # promedio de cada celda de una grilla de 9 columnas x 8 filas
+    celdas = []
+    for fila in range(8):
+        y0, y1 = fila * alto // 8, (fila + 1) * alto // 8
+        for col in range(9):
+            x0, x1 = col * ancho // 9, (col + 1) * ancho // 9
+            total = 0
+            for y in range(y0, y1):
+                inicio = y * stride
+                total += sum(muestras[inicio + x0:inicio + x1])
+            celdas.append(total / ((y1 - y0) * (x1 - x0)))
+    if max(celdas) - min(celdas) < CONTRASTE_MINIMO:
+        return None
+    huella = 0
+    for fila in range(8):
+        base = fila * 9
+        for col in range(8):
+            huella = (huella << 1) | (celdas[base + col] > celdas[base + col + 1])
+    return huella
+
+
+def huella_pixmap(pix):
+    """dHash de un fitz.Pixmap (se pasa a gris y se reduce antes de promediar)."""
+    import fitz
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    while pix.width > 2 * LADO_MUESTRA and pix.height > 2 * LADO_MUESTRA:
+        pix.shrink(1)
+    return dhash(pix.samples, pix.width, pix.height, pix.stride)
+
+
+def huella_documento(doc):
+    """Huella de la primera página de un PDF abierto (la misma que se usa como portada)."""
+    import fitz
+    if len(doc) == 0:
+        return None
+    pagina = doc.load_page(0)
+    escala = LADO_MUESTRA / max(pagina.rect.width, pagina.rect.height, 1)
+    pix = pagina.get_pixmap(matrix=fitz.Matrix(escala, escala), colorspace=fitz.csGRAY, alpha=False)
+    return huella_pixmap(pix)
+
+
+def huella_imagen(ruta):
+    """Huella de un archivo de imagen (portada asignada a mano)."""
+    import fitz
+    return huella_pixmap(fitz.Pixmap(ruta))
+
+
+class ArbolBK:
+    """
+    Árbol BK de huellas con distancia de Hamming. Cada nodo guarda las claves (ISBN) que tienen
+    exactamente esa huella. Quitar sólo vacía el conjunto del nodo: el nodo queda como paso
+    intermedio y se reutiliza si la huella vuelve a aparecer.
+    """
+
+    def __init__(self):
+        self._raiz = None   # nodo: [huella, claves, {distancia: hijo}]
+        self._claves = 0
+
+    def __len__(self):
+        return self._claves
+
+    def _nodo(self, huella, crear=False):
+        if self._raiz is None:
+            if not crear:
+                return None
+            self._raiz = [huella, set(), {}]
+            return self._raiz
+        nodo = self._raiz
+        while True:
+            d = distancia(huella, nodo[0])
+            if d == 0:
+                return nodo
+            hijo = nodo[2].get(d)
+            if hijo is None:
+                if not crear:
+                    return None
+                hijo = nodo[2][d] = [huella, set(), {}]
+                return hijo
+            nodo = hijo
+
+    def agregar(self, huella, clave):
+        claves = self._nodo(huella, crear=True)[1]
+        if clave not in claves:
+            claves.add(clave)
+            self._claves += 1
+
+    def quitar(self, huella, clave):
+        nodo = self._nodo(huella)
+        if nodo is not None and clave in nodo[1]:
+            nodo[1].discard(clave)
+            self._claves -= 1
+
+    def buscar(self, huella, radio=DISTANCIA_PARECIDA):
+        """[(distancia, clave)] de las huellas a distancia <= radio, más cercanas primero."""
+        if self._raiz is None:
+            return []
+        encontrados = []
+        pendientes = [self._raiz]
+        while pendientes:
+            valor, claves, hijos = pendientes.pop()
+            d = distancia(huella, valor)
+            if d <= radio:
+                encontrados.extend((d, clave) for clave in claves)
+            # sólo los hijos a distancia [d - radio, d + radio] del nodo pueden estar dentro del radio
+            for dist_hijo, hijo in hijos.items():
+                if d - radio <= dist_hijo <= d + radio:
+                    pendientes.append(hijo)
+        encontrados.sort()
+        return encontrados
@@ -0,0 +1,275 @@
+"""
+Recuperación ante cortes y verificación rápida de los archivos de biblioteca.
+- Cada guardado anota en el .gen del archivo el CRC-32 y el tamaño de los bytes escritos
+  (database._guardar los calcula mientras escribe, sin releer el archivo).
+- verificar(): compara el archivo con esa suma leyendo sólo bytes, sin decodificar el JSON. Si no
+  coincide o no hay suma (archivo de una versión anterior, o un corte entre el reemplazo y el .gen)
+  se decodifica entero: si se lee bien sólo se anota la suma nueva.
+- restaurar(): un archivo que no se lee (escritura cortada, disco dañado) se aparta a
+  data/backups/<archivo>.danado.<fecha> y se reemplaza por la copia válida más reciente: el temporal
+  de un guardado que se cortó antes del reemplazo o, si no, el backup más nuevo.
+- recuperar(): se ejecuta al arrancar; revisa todos los archivos de data/ en paralelo, restaura los
+  dañados y borra los temporales tmp_bibl_* que quedaron de guardados interrumpidos.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import bloqueo
+import database
+import metricas
+import registro
+
+log = registro.obtener(__name__)
+
+OK = "ok"
+SUMA_ANOTADA = "suma anotada"   # se leyó entero; no tenía suma o la que tenía no correspondía
+DANADO = "dañado"
+AUSENTE = "ausente"
+
+SUFIJO_DANADO = ".danado."
+# un temporal sin el nombre de su archivo (versiones anteriores) se borra pasado este tiempo
+EDAD_TEMPORAL_ANONIMO = 3600
+HILOS = min(8, (os.cpu_count() or 2))
+
+_restaurados = []   # (archivo, copia usada) desde la última consulta de la interfaz
+
+
+class Verificacion:
+    """Resultado de verificar un archivo de biblioteca."""
+
+    def __init__(self, ruta, estado, detalle="", bytes_=0):
+        self.ruta = ruta
+        self.estado = estado
+        self.detalle = detalle
+        self.bytes = bytes_
+
+    @property
+    def valido(self):
+        return self.estado in (OK, SUMA_ANOTADA)
+
+    def como_dict(self):
+        return {"archivo": os.path.basename(self.ruta), "estado": self.estado, "detalle": self.detalle,
+                "bytes": self.bytes}
+
+
+def verificar(ruta, anotar=True):
+    """
+    Verifica 'ruta': primero por suma (sólo lectura de bytes) y, si no alcanza, decodificándolo.
+    Con 'anotar', a un archivo que se lee bien se le guarda la suma para que la próxima vez baste con ella.
+    """
+    suma = database.leer_suma(ruta)
+    try:
+        actual = database.calcular_suma(ruta)
+    except FileNotFoundError:
+        return Verificacion(ruta, AUSENTE)
+    except OSError as e:
+        return Verificacion(ruta, DANADO, str(e))
+    if suma == actual:
+        metricas.contar("recuperacion.verificados_por_suma")
+        return Verificacion(ruta, OK, bytes_=actual["bytes"])
+    try:
+        database.validar_archivo(ruta)
+    except FileNotFoundError:
+        return Verificacion(ruta, AUSENTE)
+    except Exception as e:
+        return Verificacion(ruta, DANADO, str(e), actual["bytes"])
+    if anotar:
+        try:
+            database.anotar_suma(ruta)
+        except (OSError, bloqueo.ArchivoBloqueado) as e:
+            log.debug("No se pudo anotar la suma de %s: %s", ruta, e)
+    detalle = "sin suma previa" if suma is None else "la suma anotada no correspondía"
+    return Verificacion(ruta, SUMA_ANOTADA, detalle, actual["bytes"])
+
+
+def verificar_todos(rutas=None, anotar=True, progreso=None):
+    """Verifica varios archivos en paralelo (el CRC libera el GIL). Devuelve [Verificacion] en el mismo orden."""
+    rutas = database.listar_archivos_datos() if rutas is None else rutas
+    resultados = []
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        for i, resultado in enumerate(pool.map(lambda r: verificar(r, anotar), rutas)):
+            resultados.append(resultado)
+            if progreso is not None:
+                progreso(i + 1, len(rutas))
+    return resultados
+
+
+def _temporales(directorio=None):
+    directorio = directorio or database.DATA_DIR
+    try:
+        nombres = os.listdir(directorio)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directorio, n) for n in nombres if n.startswith(database.PREFIJO_TEMPORAL)]
+
+
+def _destino_temporal(ruta_tmp):
+    """Archivo de biblioteca al que pertenecía un temporal, o None si es de una versión anterior."""
+    nombre = os.path.basename(ruta_tmp)[len(database.PREFIJO_TEMPORAL):]
+    destino, sep, _ = nombre.partition(database.SEPARADOR_TEMPORAL)
+    return os.path.join(os.path.dirname(ruta_tmp), destino) if sep else None
+
+
+def candidatos(ruta):
+    """
+    Copias de 'ruta' de la más nueva a la más vieja: temporales de guardados que no llegaron al
+    reemplazo y luego los backups (data/backups/<archivo>.bak.<fecha>).
+    """
+    base = os.path.basename(ruta)
+    temporales = [t for t in _temporales(os.path.dirname(ruta) or ".")
+                  if os.path.basename(_destino_temporal(t) or "") == base]
+    temporales.sort(key=lambda t: os.path.getmtime(t), reverse=True)
+    try:
+        backups = [n for n in os.listdir(database.BACKUP_DIR) if n.startswith(base + ".bak.")]
+    except FileNotFoundError:
+        backups = []
+    # la marca YYYYmmdd_HHMMSS ordena cronológicamente
+    backups.sort(reverse=True)
+    return temporales + [os.path.join(database.BACKUP_DIR, n) for n in backups]
+
+
+def _copiar_con_reemplazo(origen, destino):
+    """Copia 'origen' sobre 'destino' de forma atómica (temporal, fsync, os.replace)."""
+    prefijo = f"{database.PREFIJO_TEMPORAL}{os.path.basename(destino)}{database.SEPARADOR_TEMPORAL}"
+    fd, tmp = tempfile.mkstemp(prefix=prefijo, dir=os.path.dirname(destino) or ".", suffix=".json")
+    try:
+        with os.fdopen(fd, "wb") as salida, open(origen, "rb") as entrada:
+            while True:
+                bloque = entrada.read(database.TAMANO_BLOQUE_LECTURA)
+                if not bloque:
+                    break
+                salida.write(bloque)
+            salida.flush()
+            os.fsync(salida.fileno())
+        os.replace(tmp, destino)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def restaurar(ruta):
+    """
+    Reemplaza 'ruta' dañado por su copia válida más reciente. Devuelve la ruta de la copia usada,
+    o None si el archivo resultó estar bien (otra estación ya lo reescribió) o no hay ninguna copia válida.
+    """
+    with bloqueo.BloqueoArchivo(ruta), metricas.medir("recuperacion.restaurar", os.path.basename(ruta)):
+        try:
+            database.validar_archivo(ruta)
+        except Exception:
+            pass
+        else:
+            return None
+        for copia in candidatos(ruta):
+            try:
+                database.validar_archivo(copia)
+            except Exception as e:
+                log.warning("Copia descartada para restaurar %s: %s (%s)", os.path.basename(ruta), copia, e)
+                continue
+            if os.path.exists(ruta):
+                database.asegurar_directorios()
+                marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+                apartado = os.path.join(database.BACKUP_DIR, f"{os.path.basename(ruta)}{SUFIJO_DANADO}{marca}")
+                os.replace(ruta, apartado)
+                log.warning("Archivo dañado apartado en %s", apartado)
+            _copiar_con_reemplazo(copia, ruta)
+            # generación nueva: las otras estaciones que tenían el archivo abierto lo vuelven a leer
+            database.anotar_suma(ruta, database.leer_generacion(ruta) + 1)
+            if os.path.basename(copia).startswith(database.PREFIJO_TEMPORAL):
+                os.remove(copia)
+            metricas.contar("recuperacion.restaurados")
+            log.warning("%s restaurado desde %s", os.path.basename(ruta), os.path.basename(copia))
+            _restaurados.append((os.path.basename(ruta), os.path.basename(copia)))
+            return copia
+        log.error("%s está dañado y no hay ninguna copia válida para restaurarlo", os.path.basename(ruta))
+        return None
+
+
+def limpiar_temporales():
+    """
+    Borra los temporales de guardados interrumpidos. Los que dicen a qué archivo pertenecen se borran
+    con el bloqueo de ese archivo tomado (nadie los está escribiendo); los anónimos, si son viejos.
+    Devuelve las rutas borradas.
+    """
+    borrados = []
+    ahora = time.time()
+    for tmp in _temporales():
+        destino = _destino_temporal(tmp)
+        try:
+            if destino is None:
+                if ahora - os.path.getmtime(tmp) < EDAD_TEMPORAL_ANONIMO:
+                    continue
+                os.remove(tmp)
+            else:
+                with bloqueo.BloqueoArchivo(destino, espera=1.0):
+                    if not os.path.exists(tmp):
+                        continue
+                    os.remove(tmp)
+        except bloqueo.ArchivoBloqueado:
+            # otra estación está guardando ese archivo ahora mismo: el temporal es suyo
+            continue
+        except OSError as e:
+            log.warning("No se pudo borrar el temporal %s: %s", tmp, e)
+            continue
+        log.info("Temporal de un guardado interrumpido eliminado: %s", os.path.basename(tmp))
+        borrados.append(tmp)
+    return borrados
+
+
+class InformeRecuperacion:
+    """Lo que hizo recuperar(): archivos verificados, restaurados, sin copia válida y temporales borrados."""
+
+    def __init__(self):
+        self.verificados = []
+        self.restaurados = []       # (archivo, copia usada)
+        self.sin_copia = []         # archivos dañados que siguen dañados
+        self.temporales = []
+
+    def hay_problemas(self):
+        return bool(self.restaurados or self.sin_copia)
+
+    def resumen(self):
+        partes = [f"{len(self.verificados)} archivo(s) verificados"]
+        if self.restaurados:
+            partes.append("restaurados: " + ", ".join(f"{a} (desde {c})" for a, c in self.restaurados))
+        if self.sin_copia:
+            partes.append("dañados sin copia válida: " + ", ".join(self.sin_copia))
+        if self.temporales:
+            partes.append(f"{len(self.temporales)} temporal(es) eliminados")
+        return "; ".join(partes)
+
+
+def recuperar(progreso=None):
+    """Paso de arranque: verifica todo data/, restaura lo dañado y limpia temporales huérfanos."""
+    informe = InformeRecuperacion()
+    with metricas.medir("recuperacion.arranque"):
+        informe.verificados = verificar_todos(progreso=progreso)
+        for verificacion in informe.verificados:
+            if verificacion.estado != DANADO:
+                continue
+            log.error("%s no se puede leer: %s", os.path.basename(verificacion.ruta), verificacion.detalle)
+            try:
+                copia = restaurar(verificacion.ruta)
+            except (OSError, bloqueo.ArchivoBloqueado) as e:
+                log.warning("No se pudo restaurar %s: %s", verificacion.ruta, e)
+                copia = None
+            if copia is not None:
+                informe.restaurados.append((os.path.basename(verificacion.ruta), os.path.basename(copia)))
+            else:
+                informe.sin_copia.append(os.path.basename(verificacion.ruta))
+        # después de restaurar: un temporal completo pudo haber sido la copia usada
+        informe.temporales = limpiar_temporales()
+    if informe.hay_problemas() or informe.temporales:
+        log.warning("Recuperación al arrancar: %s", informe.resumen())
+    return informe
+
+
+def tomar_restaurados():
+    """Devuelve (y olvida) los archivos restaurados desde la última consulta, para avisar en la interfaz."""
+    restaurados = list(_restaurados)
+    del _restaurados[:]
+    return restaurados
@@ -0,0 +1,191 @@
+"""
+Registro de eventos (logging) de Bibliotech.
+Los módulos escriben con logging y los mensajes pasan por una cola: quien registra no espera
+a que se escriba el archivo ni la consola, de eso se encarga un hilo aparte (QueueListener).
+
+- Archivo rotativo en data/logs/bibliotech.log, una línea JSON por evento
+- Consola (stderr) en texto legible, si existe (en el .exe sin consola no la hay)
+- Niveles por módulo: BIBLIOTECH_LOG="INFO,database=DEBUG,pdf_reader=WARNING"
+- ID de correlación por tarea (procesar_lote, importación, comandos de cli.py) con correlacion()
+
+Uso en un módulo:
+    import registro
+    log = registro.obtener(__name__)
+    log.debug("Procesado %s en %.1f ms", archivo, ms)   # sin formatear si DEBUG está apagado
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+from contextlib import contextmanager
+
+RAIZ = "bibliotech"
+LOGS_DIR = os.path.join("data", "logs")
+ARCHIVO_LOG = "bibliotech.log"
+TAMANO_MAX_ARCHIVO = 2 * 1024 * 1024
+ARCHIVOS_ROTADOS = 5
+NIVEL_DEFECTO = "INFO"
+VARIABLE_NIVELES = "BIBLIOTECH_LOG"
+
+_correlacion = contextvars.ContextVar("bibliotech_correlacion", default="-")
+_listener = None
+_handlers_destino = []
+
+
+class _FiltroCorrelacion(logging.Filter):
+    """Agrega a cada registro el ID de correlación del contexto que lo emitió."""
+
+    def filter(self, record):
+        if not hasattr(record, "correlacion"):
+            record.correlacion = _correlacion.get()
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento: fácil de filtrar por módulo, nivel o correlación."""
+
+    def format(self, record):
+        datos = {
+            "ts": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "correlacion": getattr(record, "correlacion", "-"),
+            "mensaje": record.getMessage(),
+        }
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False)
+
+
+def obtener(nombre):
+    """Logger de un módulo, colgado de 'bibliotech' (ej. obtener(__name__) -> bibliotech.database)."""
+    nombre = nombre.rsplit(".", 1)[-1] if nombre != "__main__" else "main"
+    return logging.getLogger(f"{RAIZ}.{nombre}")
+
+
+def interpretar_niveles(texto):
+    """'INFO,database=DEBUG' -> ('INFO', {'database': 'DEBUG'})."""
+    general, por_modulo = None, {}
+    for parte in (texto or "").split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if "=" in parte:
+            modulo, nivel = parte.split("=", 1)
+            por_modulo[modulo.strip()] = nivel.strip().upper()
+        else:
+            general = parte.upper()
+    return general, por_modulo
+
+
+def aplicar_niveles(nivel=None, por_modulo=None):
+    """Fija el nivel general y los niveles por módulo (sin reiniciar los handlers)."""
+    logging.getLogger(RAIZ).setLevel(nivel or NIVEL_DEFECTO)
+    for modulo, nivel_modulo in (por_modulo or {}).items():
+        logging.getLogger(f"{RAIZ}.{modulo}").setLevel(nivel_modulo)
+
+
+def configurar(nivel=None, por_modulo=None, directorio=None, consola=True):
+    """
+    Prepara el registro de la aplicación (una sola vez; las llamadas siguientes sólo cambian niveles).
+    nivel/por_modulo tienen prioridad sobre la variable de entorno BIBLIOTECH_LOG.
+    """
+    global _listener
+    env_general, env_modulos = interpretar_niveles(os.environ.get(VARIABLE_NIVELES))
+    aplicar_niveles(nivel or env_general, {**env_modulos, **(por_modulo or {})})
+    if _listener is not None:
+        return
+
+    raiz = logging.getLogger(RAIZ)
+    raiz.propagate = False
+
+    directorio = directorio or LOGS_DIR
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        archivo = logging.handlers.RotatingFileHandler(
+            os.path.join(directorio, ARCHIVO_LOG), maxBytes=TAMANO_MAX_ARCHIVO,
+            backupCount=ARCHIVOS_ROTADOS, encoding="utf-8")
+        archivo.setFormatter(FormatoJSON())
+        _handlers_destino.append(archivo)
+    except OSError as e:
+        if sys.stderr is not None:
+            sys.stderr.write(f"⚠️ No se pudo abrir el archivo de log: {e}\n")
+
+    # en el .exe con --windowed no hay consola: sys.stderr es None
+    if consola and sys.stderr is not None:
+        pantalla = logging.StreamHandler(sys.stderr)
+        pantalla.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s [%(correlacion)s] %(message)s",
+                                                "%H:%M:%S"))
+        _handlers_destino.append(pantalla)
+
+    cola = queue.SimpleQueue()
+    en_cola = logging.handlers.QueueHandler(cola)
+    en_cola.addFilter(_FiltroCorrelacion())
+    raiz.addHandler(en_cola)
+
+    _listener = logging.handlers.QueueListener(cola, *_handlers_destino, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener)
+
+
+def detener():
+    """Vacía la cola y cierra los archivos (se llama sola al salir)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for handler in _handlers_destino:
+            handler.close()
+        _handlers_destino.clear()
+
+
+def configurado():
+    return _listener is not None
+
+
+# ID de correlación
+def correlacion_actual():
+    return _correlacion.get()
+
+
+@contextmanager
+def correlacion(prefijo="tarea", identificador=None):
+    """Todo lo registrado dentro del bloque lleva el mismo ID (ej. 'lote-3f9a1c2e')."""
+    token = _correlacion.set(identificador or f"{prefijo}-{uuid.uuid4().hex[:8]}")
+    try:
+        yield _correlacion.get()
+    finally:
+        _correlacion.reset(token)
+
+
+# Procesos trabajadores (multiprocessing)
+def cola_para_procesos():
+    """
+    Cola de multiprocessing cuyos mensajes se escriben con los mismos destinos que el proceso
+    principal. Devuelve (cola, listener); el llamador detiene el listener al terminar.
+    """
+    import multiprocessing
+    cola = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(cola, *_handlers_destino, respect_handler_level=True)
+    listener.start()
+    return cola, listener
+
+
+def configurar_trabajador(cola, nivel, id_correlacion):
+    """Inicializador de un proceso trabajador: todo su registro se envía a 'cola' con la correlación del padre."""
+    raiz = logging.getLogger(RAIZ)
+    raiz.handlers.clear()
+    raiz.propagate = False
+    raiz.setLevel(nivel)
+    en_cola = logging.handlers.QueueHandler(cola)
+    en_cola.addFilter(_FiltroCorrelacion())
+    raiz.addHandler(en_cola)
+    _correlacion.set(id_correlacion)
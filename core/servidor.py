@@ -0,0 +1,470 @@
+"""
+Servicio HTTP/JSON local y de sólo lectura sobre el catálogo (asyncio, sin dependencias externas).
+Pensado para terminales de consulta y un OPAC web: leen el mismo catálogo sin abrir la interfaz
+Qt ni volver a decodificar el JSON en cada pedido.
+
+    GET /api/libros?pagina=1&por_pagina=50     listado paginado (orden por ISBN)
+    GET /api/buscar?q=autor:borges&pagina=1    lenguaje de consulta del buscador (ver consulta.py)
+    GET /api/isbn/<isbn>                       un libro; el ISBN puede venir con guiones o en forma de 10 dígitos
+    GET /api/portada/<isbn>                    imagen de la portada, con ETag (responde 304 si no cambió)
+    GET /api/estado                            archivo servido, libros y generación
+    POST /api/sesion {"usuario", "contrasena"} token para 'Authorization: Bearer' (sólo con autenticación)
+
+Con autenticación (servir --autenticar, cuentas de autenticacion.py) todas las rutas salvo /api/sesion
+piden un token vigente; la contraseña se comprueba en el pool de scrypt sin detener el bucle.
+
+Un solo proceso atiende todas las conexiones (HTTP/1.1 con keep-alive) desde un único Catalogo en
+memoria: los índices de consulta e ISBN se construyen una vez y se ponen al día sólo con los registros
+que cambian. Una tarea vigila el archivo de datos (stat + .gen, como la recarga en vivo de la
+interfaz); cuando otra estación guarda, el archivo se vuelve a leer en un hilo aparte y los índices
+se sincronizan por registro en el bucle, sin cortar los pedidos en curso.
+
+El archivo se lee con database.leer_para_consulta: nunca se migra, restaura ni reescribe desde aquí.
+Si al arrancar no se puede leer (dañado, suma que no coincide) las rutas responden 503 hasta que
+otra estación lo guarde o lo restaure.
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import consulta
+import database
+import esquema
+import isbn_canonico
+import metricas
+import registro
+from normalizacion import ClavesNormalizadas
+
+log = registro.obtener(__name__)
+
+HOST = "127.0.0.1"
+PUERTO = 8765
+POR_PAGINA = 50
+MAX_POR_PAGINA = 500
+INTERVALO_VIGILANCIA = 1.0
+ESPERA_CONEXION = 30.0         # segundos que una conexión keep-alive puede quedar inactiva
+MAX_CABECERAS = 64 * 1024
+LIMITE_CACHE_PORTADAS = 32 * 1024 * 1024
+MAX_CUERPO = 16 * 1024          # sólo POST /api/sesion lleva cuerpo
+
+_ESTADOS = {200: "OK", 204: "No Content", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+            404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 431: "Request Header Fields Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class ErrorPeticion(Exception):
+    """Error que se informa al cliente con su código HTTP."""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class Catalogo:
+    """Biblioteca en memoria con los índices compartidos por todas las conexiones."""
+
+    def __init__(self, path):
+        self.path = path
+        self.biblioteca = {}
+        self.claves = ClavesNormalizadas()
+        self.indice = consulta.IndiceConsulta(claves=self.claves)
+        self.indice_isbn = isbn_canonico.IndiceISBN()
+        self.generacion = 0
+        self.actualizado = None
+        self._orden = None      # ISBN ordenados para el listado (se rehace tras un cambio)
+        self.error = None       # motivo por el que el archivo no se puede leer (las rutas responden 503)
+        self._firma_error = None
+
+    def cargar(self):
+        firma = self._firma()
+        try:
+            biblioteca = self._leer()
+        except FileNotFoundError:
+            # todavía no existe: se sirve vacío y se lee en cuanto alguien lo guarde
+            biblioteca = {}
+        except database.ArchivoIlegible as e:
+            # dañado o a medio escribir: se responde 503 hasta que otra estación lo guarde o lo restaure
+            log.error("No se puede servir %s: %s", os.path.basename(self.path), e)
+            self.error, self._firma_error = str(e), firma
+            biblioteca = {}
+        self._usar(biblioteca)
+
+    def _leer(self):
+        # nunca cargar_biblioteca: migraría el archivo, lo restauraría o escribiría estadísticas
+        return database.leer_para_consulta(self.path)
+
+    def _firma(self):
+        return database.firma_archivo(self.path), database.leer_generacion(self.path)
+
+    def _usar(self, biblioteca):
+        with metricas.medir("servidor.indexar", f"{len(biblioteca)} libros"):
+            self.biblioteca = biblioteca
+            self.claves.sincronizar(biblioteca)
+            self.indice.sincronizar(biblioteca)
+            self.indice_isbn.sincronizar(biblioteca)
+        self._orden = None
+        self.generacion = database.leer_generacion(self.path)
+        self.actualizado = time.time()
+
+    def leer_cambios(self):
+        """
+        (En un hilo aparte.) Copia de la biblioteca con los cambios del disco incorporados, o None si
+        el archivo no cambió. Los registros que no cambiaron conservan su identidad: los índices
+        sólo vuelven a procesar los nuevos.
+        """
+        firma = self._firma()
+        if self._firma_error is not None:
+            # tras un fallo se vuelve a intentar sólo cuando el archivo o su .gen cambian
+            if firma == self._firma_error:
+                return None
+        elif not database.version_conocida(self.path):
+            # no existía al arrancar: lectura completa cuando aparezca
+            if not os.path.exists(self.path):
+                return None
+        elif not database.cambio_externo(self.path):
+            return None
+        try:
+            nueva = self._leer()
+        except FileNotFoundError:
+            return None
+        except database.ArchivoIlegible as e:
+            if self.error is None:
+                # ya se sirvió una versión válida (o un guardado quedó a medio camino entre el archivo y
+                # su .gen): se sigue sirviendo y se reintenta en cuanto cambie
+                log.warning("No se pudieron leer los cambios de %s: %s", os.path.basename(self.path), e)
+            self._firma_error = firma
+            return None
+        # los registros que no cambiaron conservan su identidad: los índices no los vuelven a procesar
+        actual = self.biblioteca
+        for isbn, datos in nueva.items():
+            previo = actual.get(isbn)
+            if previo is not None and previo == datos:
+                nueva[isbn] = previo
+        return nueva
+
+    def aplicar(self, biblioteca):
+        """(En el bucle.) Publica la biblioteca nueva y sincroniza los índices."""
+        self.error, self._firma_error = None, None
+        self._usar(biblioteca)
+        log.info("Catálogo actualizado desde %s: %d libros (generación %d)",
+                 os.path.basename(self.path), len(biblioteca), self.generacion)
+
+    def ordenados(self):
+        if self._orden is None:
+            self._orden = sorted(k for k, v in self.biblioteca.items() if isinstance(v, dict))
+        return self._orden
+
+    def libro(self, isbn):
+        datos = self.biblioteca.get(isbn)
+        return dict(datos, ISBN=isbn) if isinstance(datos, dict) else None
+
+
+def _entero(parametros, nombre, defecto, minimo=1, maximo=None):
+    valor = parametros.get(nombre, [None])[0]
+    if valor in (None, ""):
+        return defecto
+    try:
+        n = int(valor)
+    except ValueError:
+        raise ErrorPeticion(400, f"'{nombre}' debe ser un número entero")
+    if n < minimo:
+        raise ErrorPeticion(400, f"'{nombre}' debe ser al menos {minimo}")
+    return min(n, maximo) if maximo is not None else n
+
+
+def _pagina(catalogo, isbns, parametros):
+    pagina = _entero(parametros, "pagina", 1)
+    por_pagina = _entero(parametros, "por_pagina", POR_PAGINA, maximo=MAX_POR_PAGINA)
+    inicio = (pagina - 1) * por_pagina
+    libros = [catalogo.libro(isbn) for isbn in isbns[inicio:inicio + por_pagina]]
+    return {"total": len(isbns), "pagina": pagina, "por_pagina": por_pagina,
+            "paginas": (len(isbns) + por_pagina - 1) // por_pagina, "libros": libros}
+
+
+def _etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _coincide_etag(cabecera, etag):
+    if not cabecera:
+        return False
+    if cabecera.strip() == "*":
+        return True
+    return any(e.strip().removeprefix("W/") == etag for e in cabecera.split(","))
+
+
+class ServidorCatalogo:
+    """Servidor HTTP de sólo lectura; 'iniciar' abre el puerto y 'servir_siempre' corre hasta cancelarlo."""
+
+    def __init__(self, path, host=HOST, puerto=PUERTO, intervalo=INTERVALO_VIGILANCIA, autenticacion=None):
+        self.catalogo = Catalogo(path)
+        self.autenticacion = autenticacion   # autenticacion.ServicioAutenticacion, o None para acceso libre
+        self.host = host
+        self.puerto = puerto
+        self.intervalo = intervalo
+        self._servidor = None
+        self._vigilancia = None
+        self._portadas = OrderedDict()   # (ruta, etag) -> bytes, LRU acotada por LIMITE_CACHE_PORTADAS
+        self._bytes_portadas = 0
+        self.rutas = {
+            "libros": self._listar,
+            "buscar": self._buscar,
+            "isbn": self._isbn,
+            "portada": self._portada,
+            "estado": self._estado,
+        }
+
+    # Ciclo de vida
+    async def iniciar(self):
+        loop = asyncio.get_running_loop()
+        # la primera lectura también va a un hilo: el bucle sigue libre para las señales
+        await loop.run_in_executor(None, self.catalogo.cargar)
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.puerto)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        self._vigilancia = asyncio.create_task(self._vigilar())
+        log.info("Sirviendo %s en http://%s:%d (%d libros)", os.path.basename(self.catalogo.path),
+                 self.host, self.puerto, len(self.catalogo.biblioteca))
+        return self.puerto
+
+    async def servir_siempre(self):
+        if self._servidor is None:
+            await self.iniciar()
+        async with self._servidor:
+            await self._servidor.serve_forever()
+
+    async def cerrar(self):
+        if self._vigilancia is not None:
+            self._vigilancia.cancel()
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    async def _vigilar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                nueva = await loop.run_in_executor(None, self.catalogo.leer_cambios)
+            except Exception as e:
+                # archivo a medio reemplazar, dañado o bloqueado: se sigue sirviendo lo último que se leyó
+                log.warning("No se pudieron leer los cambios de %s: %s", self.catalogo.path, e)
+                continue
+            if nueva is not None:
+                self.catalogo.aplicar(nueva)
+
+    # HTTP
+    async def _atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    linea = await asyncio.wait_for(reader.readline(), ESPERA_CONEXION)
+                except asyncio.TimeoutError:
+                    break
+                if not linea:
+                    break
+                cabeceras, tamano = {}, len(linea)
+                while True:
+                    cabecera = await reader.readline()
+                    tamano += len(cabecera)
+                    if tamano > MAX_CABECERAS:
+                        await self._responder(writer, 431, {"error": "cabeceras demasiado grandes"}, cerrar=True)
+                        return
+                    if cabecera in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+                partes = linea.decode("latin-1").split()
+                version = partes[2] if len(partes) == 3 else "HTTP/1.0"
+                conexion = cabeceras.get("connection", "").lower()
+                cerrar = conexion == "close" or (version == "HTTP/1.0" and conexion != "keep-alive")
+                if len(partes) != 3:
+                    await self._responder(writer, 400, {"error": "petición mal formada"}, cerrar=True)
+                    return
+                metodo, destino = partes[0], partes[1]
+                cuerpo = b""
+                if metodo == "POST":
+                    try:
+                        largo = int(cabeceras.get("content-length", "0"))
+                    except ValueError:
+                        largo = -1
+                    if not 0 <= largo <= MAX_CUERPO:
+                        await self._responder(writer, 413, {"error": "cuerpo inválido o demasiado grande"}, cerrar=True)
+                        return
+                    cuerpo = await reader.readexactly(largo)
+                # el cuerpo de otros métodos no se lee: se responde 405 y se cierra
+                cerrar = cerrar or metodo not in ("GET", "HEAD", "POST", "OPTIONS")
+                await self._despachar(writer, metodo, destino, cabeceras, cuerpo, cerrar)
+                if cerrar:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _despachar(self, writer, metodo, destino, cabeceras, cuerpo, cerrar):
+        t0 = time.perf_counter()
+        metricas.contar("servidor.peticiones")
+        if metodo == "OPTIONS":
+            # verificación previa de CORS: el OPAC web manda 'Authorization' desde otro origen
+            await self._responder(writer, 204, None, cerrar, {
+                "Access-Control-Allow-Methods": "GET, HEAD, POST",
+                "Access-Control-Allow-Headers": "Authorization, Content-Type, If-None-Match",
+                "Access-Control-Max-Age": "86400"})
+            return
+        url = urlsplit(destino)
+        segmentos = [unquote(s) for s in url.path.strip("/").split("/") if s]
+        ruta = segmentos[1] if len(segmentos) >= 2 and segmentos[0] == "api" else None
+        sesion = ruta == "sesion" and self.autenticacion is not None
+        permitidos = ("POST",) if sesion else ("GET", "HEAD")
+        if metodo not in permitidos:
+            await self._responder(writer, 405, {"error": f"use {' o '.join(permitidos)}"}, cerrar,
+                                  {"Allow": ", ".join(permitidos)})
+            return
+        manejador = self._sesion if sesion else self.rutas.get(ruta)
+        try:
+            if manejador is None:
+                raise ErrorPeticion(404, f"ruta desconocida: {url.path}")
+            if not sesion and self.autenticacion is not None:
+                self._autorizar(cabeceras)
+            if not sesion and self.catalogo.error is not None:
+                raise ErrorPeticion(503, f"catálogo no disponible: {self.catalogo.error}")
+            respuesta = manejador(segmentos[2:], parse_qs(url.query), cuerpo if sesion else cabeceras)
+            if asyncio.iscoroutine(respuesta):
+                respuesta = await respuesta
+            estado, cuerpo, extra = respuesta
+        except ErrorPeticion as e:
+            estado, cuerpo, extra = e.estado, {"error": str(e)}, {}
+            if e.estado == 401:
+                extra = {"WWW-Authenticate": 'Bearer realm="bibliotech"'}
+        except consulta.ErrorConsulta as e:
+            estado, cuerpo, extra = 400, {"error": str(e)}, {}
+        except Exception as e:
+            log.exception("Error atendiendo %s", destino)
+            estado, cuerpo, extra = 500, {"error": str(e)}, {}
+        await self._responder(writer, estado, cuerpo, cerrar, extra, solo_cabeceras=metodo == "HEAD")
+        metricas.registrar_tiempo("servidor.peticion", (time.perf_counter() - t0) * 1000, url.path)
+
+    async def _responder(self, writer, estado, cuerpo, cerrar, extra=None, solo_cabeceras=False):
+        extra = dict(extra or {})
+        if isinstance(cuerpo, (bytes, bytearray)):
+            datos = bytes(cuerpo)
+            tipo = extra.pop("Content-Type", "application/octet-stream")
+        elif cuerpo is None:
+            datos, tipo = b"", None
+        else:
+            datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+        lineas = [f"HTTP/1.1 {estado} {_ESTADOS.get(estado, '')}",
+                  f"Content-Length: {len(datos)}",
+                  # el OPAC web puede estar en otro origen
+                  "Access-Control-Allow-Origin: *",
+                  f"Connection: {'close' if cerrar else 'keep-alive'}"]
+        if tipo:
+            lineas.append(f"Content-Type: {tipo}")
+        lineas += [f"{k}: {v}" for k, v in extra.items()]
+        writer.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1"))
+        if datos and not solo_cabeceras:
+            writer.write(datos)
+        await writer.drain()
+
+    # Sesión
+    def _autorizar(self, cabeceras):
+        esquema_auth, _, token = cabeceras.get("authorization", "").partition(" ")
+        if esquema_auth.lower() != "bearer" or not token.strip():
+            raise ErrorPeticion(401, "falta el token: inicie sesión en /api/sesion")
+        if self.autenticacion.verificar(token.strip()) is None:
+            raise ErrorPeticion(401, "token inválido o vencido")
+
+    async def _sesion(self, resto, parametros, cuerpo):
+        try:
+            datos = json.loads(cuerpo or b"{}")
+            usuario, contrasena = datos["usuario"], datos["contrasena"]
+        except (ValueError, TypeError, KeyError):
+            raise ErrorPeticion(400, 'envíe {"usuario": ..., "contrasena": ...}')
+        if not isinstance(usuario, str) or not isinstance(contrasena, str):
+            raise ErrorPeticion(400, "usuario y contraseña deben ser texto")
+        # scrypt corre en el pool del servicio; el bucle sigue atendiendo a los demás
+        token = await asyncio.wrap_future(self.autenticacion.iniciar_sesion(usuario, contrasena))
+        if token is None:
+            raise ErrorPeticion(401, "usuario o contraseña incorrectos")
+        return 200, {"token": token, "expira_en": self.autenticacion.duracion}, {}
+
+    # Rutas
+    def _listar(self, resto, parametros, cabeceras):
+        return 200, _pagina(self.catalogo, self.catalogo.ordenados(), parametros), {}
+
+    def _buscar(self, resto, parametros, cabeceras):
+        texto = parametros.get("q", [""])[0].strip()
+        if not texto:
+            raise ErrorPeticion(400, "falta el parámetro 'q'")
+        with metricas.medir("servidor.buscar", texto):
+            isbns = self.catalogo.indice.buscar(texto)
+        return 200, dict(_pagina(self.catalogo, isbns, parametros), consulta=texto), {}
+
+    def _isbn(self, resto, parametros, cabeceras):
+        if len(resto) != 1:
+            raise ErrorPeticion(400, "use /api/isbn/<isbn>")
+        clave = self.catalogo.indice_isbn.buscar(resto[0])
+        libro = self.catalogo.libro(clave) if clave is not None else None
+        if libro is None:
+            raise ErrorPeticion(404, f"no hay ningún libro con ISBN {resto[0]}")
+        return 200, libro, {}
+
+    async def _portada(self, resto, parametros, cabeceras):
+        if len(resto) != 1:
+            raise ErrorPeticion(400, "use /api/portada/<isbn>")
+        clave = self.catalogo.indice_isbn.buscar(resto[0])
+        libro = self.catalogo.biblioteca.get(clave) if clave is not None else None
+        ruta = libro.get(esquema.PORTADA) if isinstance(libro, dict) else None
+        if not ruta:
+            raise ErrorPeticion(404, f"el libro {resto[0]} no tiene portada")
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            raise ErrorPeticion(404, f"no se encuentra la portada del libro {resto[0]}")
+        etag = _etag(st)
+        extra = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _coincide_etag(cabeceras.get("if-none-match"), etag):
+            metricas.contar("servidor.portadas_304")
+            return 304, None, extra
+        datos = self._portadas.get((ruta, etag))
+        if datos is None:
+            datos = await asyncio.get_running_loop().run_in_executor(None, _leer_bytes, ruta)
+            self._guardar_portada((ruta, etag), datos)
+        else:
+            self._portadas.move_to_end((ruta, etag))
+        extra["Content-Type"] = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        return 200, datos, extra
+
+    def _guardar_portada(self, clave, datos):
+        if len(datos) > LIMITE_CACHE_PORTADAS // 4:
+            return
+        self._portadas[clave] = datos
+        self._bytes_portadas += len(datos)
+        while self._bytes_portadas > LIMITE_CACHE_PORTADAS:
+            _, viejo = self._portadas.popitem(last=False)
+            self._bytes_portadas -= len(viejo)
+
+    def _estado(self, resto, parametros, cabeceras):
+        c = self.catalogo
+        return 200, {"archivo": os.path.basename(c.path), "libros": len(c.biblioteca),
+                     "generacion": c.generacion, "actualizado": c.actualizado}, {}
+
+
+def _leer_bytes(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+def servir(path, host=HOST, puerto=PUERTO, autenticacion=None):
+    """Corre el servidor hasta Ctrl+C."""
+    servidor = ServidorCatalogo(path, host, puerto, autenticacion=autenticacion)
+    try:
+        asyncio.run(servidor.servir_siempre())
+    except KeyboardInterrupt:
+        log.info("Servidor detenido")
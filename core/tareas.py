@@ -0,0 +1,61 @@
+"""
+Tareas en segundo plano para no congelar la interfaz.
+Envuelve una función Python en un QThread y comunica progreso/resultado mediante señales.
+"""
+
+from PySide6.QtCore import QThread, Signal
+
+import registro
+
+log = registro.obtener(__name__)
+
+
+class TareaCancelada(Exception):
+    """Se lanza desde la función de trabajo cuando el usuario cancela la tarea."""
+
+
+class TareaSegundoPlano(QThread):
+    """
+    Ejecuta funcion(*args, progreso=..., cancelado=..., **kwargs) en otro hilo.
+    - progreso(hecho, total): emite la señal 'progreso' (total=0 indica progreso indeterminado)
+    - cancelado(): devuelve True si se pidió cancelar; la función debe comprobarlo periódicamente
+    El resultado se entrega con 'terminado' y los errores con 'fallo' (ambos en el hilo de la UI).
+    Todo lo que la tarea registre en el log lleva un mismo ID de correlación (ej. 'importar-3f9a1c2e').
+    """
+    progreso = Signal(object, object)
+    terminado = Signal(object)
+    fallo = Signal(str)
+    cancelada = Signal()
+
+    def __init__(self, funcion, *args, parent=None, **kwargs):
+        super().__init__(parent)
+        self._funcion = funcion
+        self._args = args
+        self._kwargs = kwargs
+        self._cancelar = False
+
+    def cancelar(self):
+        self._cancelar = True
+
+    def esta_cancelada(self):
+        return self._cancelar
+
+    def run(self):
+        nombre = getattr(self._funcion, "__name__", "tarea")
+        with registro.correlacion(nombre):
+            try:
+                resultado = self._funcion(
+                    *self._args,
+                    progreso=lambda hecho, total=0: self.progreso.emit(hecho, total),
+                    cancelado=self.esta_cancelada,
+                    **self._kwargs
+                )
+            except TareaCancelada:
+                log.info("Tarea '%s' cancelada", nombre)
+                self.cancelada.emit()
+                return
+            except Exception as e:
+                log.exception("Tarea '%s' falló", nombre)
+                self.fallo.emit(str(e))
+                return
+        self.terminado.emit(resultado)
@@ -4,33 +4,71 @@ Requiere: PySide6, y los módulos database.py, models.py, utils.py
 """
 
 import os
+import time
 from datetime import date
 
 from PySide6.QtCore import Qt, QTimer, QDate
-from PySide6.QtGui import QFont, QAction, QIcon, QPixmap, QImage
+from PySide6.QtGui import QFont, QAction, QIcon, QPixmap, QImage, QShortcut, QKeySequence, QColor
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QLineEdit,
     QPushButton, QTableWidget, QTableWidgetItem, QMessageBox, QHeaderView,
     QAbstractItemView, QApplication, QComboBox, QDateEdit, QCheckBox,
     QSpinBox, QFrame, QSplitter, QSizePolicy, QToolButton, QStatusBar,
-    QFileDialog, QMenu, QDialog
+    QFileDialog, QMenu, QDialog, QProgressBar, QPlainTextEdit, QListWidget,
+    QTreeWidget, QTreeWidgetItem
 )
 
 from models import Libro
 import database 
-import shutil
+import consulta
+import duplicados
+import enlaces
+import esquema
+import estadisticas
+import isbn_canonico
+import facetas
+from busqueda_difusa import IndiceDifuso
 import utils
-import ux_helpers as ux
-import pdf_reader
-import json
+import historial
+import metricas
+import normalizacion
+import portadas
+import recuperacion
+import registro
+from tareas import TareaSegundoPlano
+from vigilante import VigilanteArchivos
 
 
 # Ruta del QSS local (si existe) — preferimos usar styles.qss del proyecto
 STYLE_PATH = os.path.join(os.path.dirname(__file__), "styles.qss")
+INTERVALO_VOLCADO_METRICAS_MS = 5 * 60 * 1000
+COLOR_ENLACE_ROTO = QColor("#f48771")   # filas de libros con el PDF o la portada faltante
+
+log = registro.obtener(__name__)
+
+
+def _pdf_reader():
+    """
+    Importa pdf_reader (y con él PyMuPDF) sólo cuando se usa por primera vez una acción de PDF.
+    Después de la primera llamada Python lo devuelve desde sys.modules sin coste.
+    """
+    import pdf_reader
+    return pdf_reader
+
+
+def _ux():
+    """Importación diferida de ux_helpers (diálogos, exportación y backups)."""
+    import ux_helpers
+    return ux_helpers
 
 
 class BibliotecaWindow(QWidget):
-    def __init__(self):
+    def __init__(self, informe_arranque=None, carga_diferida=False):
+        """
+        informe_arranque: InformeArranque opcional donde se anota el tiempo de carga de datos.
+        carga_diferida: si es True la biblioteca no se lee aquí; el llamador debe invocar
+        iniciar_carga_diferida() después de show() para cargarla en segundo plano.
+        """
         super().__init__()
         self.setWindowTitle("Bibliotech — Asistente Bibliotecario Virtual")
         self.resize(1360, 768)
@@ -52,19 +90,339 @@ class BibliotecaWindow(QWidget):
         self.selected_date = date.today()
 
 
-        self.biblioteca = database.cargar_biblioteca(fecha=self.selected_date, global_file=self.use_global)
+        self.informe_arranque = informe_arranque
+        self._tarea_carga = None
+        # claves sin tildes/mayúsculas por libro: las comparten la búsqueda, el orden de la tabla y los duplicados
+        self.claves = normalizacion.ClavesNormalizadas()
+        self.indice_duplicados = duplicados.IndiceDuplicados(claves=self.claves)
+        self.indice_difuso = IndiceDifuso(claves=self.claves)
+        self.indice_consulta = consulta.IndiceConsulta(claves=self.claves)
+        self.indice_facetas = facetas.IndiceFacetas(claves=self.claves)
+        # índice -> (biblioteca con la que se sincronizó, ISBN cambiados desde entonces): las búsquedas
+        # no recorren la biblioteca, sólo revisan lo anotado por _marcar_cambiados
+        self._estado_indices = {}
+        # "978-84-..." , "97884..." y el ISBN-10 son el mismo libro
+        self.indice_isbn = isbn_canonico.IndiceISBN()
+        # último estado conocido de cada Archivo PDF / Portada (los faltantes se marcan en la tabla)
+        self.enlaces = enlaces.RevisorEnlaces()
+        self._tarea_enlaces = None
+        self._seleccion_facetas = {}    # faceta -> {claves marcadas}
+        self._facetas_plegadas = {"autor"}
+        self._orden = None
+        self.biblioteca = {} if carga_diferida else database.cargar_biblioteca(fecha=self.selected_date, global_file=self.use_global)
         self.autosave_timer = QTimer(self)
         self.autosave_timer.timeout.connect(self._autoguardar)
+        # las métricas se vuelcan a data/metricas cada cierto tiempo (sólo si están activas)
+        self.metricas_timer = QTimer(self)
+        self.metricas_timer.timeout.connect(metricas.volcar)
+        self.metricas_timer.start(INTERVALO_VOLCADO_METRICAS_MS)
+        self._vincular_historial(database.ruta_para(self.selected_date, self.use_global))
 
         self._build_ui()
         self._connect_signals()
+        self._actualizar_botones_historial()
+
+        # recarga en vivo: cambios de otras estaciones en el archivo activo y en la lista de archivos diarios
+        self.vigilante = VigilanteArchivos(os.path.abspath(database.DATA_DIR), parent=self)
+        self.vigilante.archivo_cambiado.connect(self._on_archivo_externo)
+        self.vigilante.carpeta_cambiada.connect(self._actualizar_lista_archivos)
+        self._vigilar_archivo_activo()
+        self._actualizar_lista_archivos()
 
         # Inicializar tabla
         self._actualizar_tabla()
         # Tabla de opciones al oprimir click derecho.
         self._setup_context_menu()
 
-        self.status.showMessage("Listo — datos cargados.", 4000)
+        if not carga_diferida:
+            self.status.showMessage("Listo — datos cargados.", 4000)
+
+    #Carga en segundo plano
+    def iniciar_carga_diferida(self):
+        """Lee la biblioteca activa en un hilo aparte mostrando una barra de progreso."""
+        self._set_acciones_habilitadas(False)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.status.showMessage("Cargando biblioteca...")
+
+        fecha, global_file = self.selected_date, self.use_global
+
+        claves = self.claves
+        informe = self.informe_arranque
+
+        def cargar(progreso, cancelado):
+            # antes de leer nada: los archivos que un guardado interrumpido dejó dañados se restauran
+            t0 = time.perf_counter()
+            recuperacion.recuperar()
+            if informe is not None:
+                informe.registrar("recuperación", time.perf_counter() - t0)
+            datos = database.cargar_biblioteca(fecha=fecha, global_file=global_file, progreso=progreso)
+            # las claves de búsqueda se pliegan aquí, fuera del hilo de la UI, y no en la primera tecla
+            claves.sincronizar(datos)
+            return datos
+
+        self._t_carga = time.perf_counter()
+        self._tarea_carga = TareaSegundoPlano(cargar, parent=self)
+        self._tarea_carga.progreso.connect(self._on_progreso_tarea)
+        self._tarea_carga.terminado.connect(self._on_carga_terminada)
+        self._tarea_carga.fallo.connect(self._on_carga_fallida)
+        self._tarea_carga.start()
+
+    def _on_progreso_tarea(self, hecho, total):
+        if total:
+            # Qt usa enteros de 32 bits: se trabaja en porcentaje
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(int(hecho * 100 / total))
+        else:
+            self.progress_bar.setRange(0, 0)
+
+    def _on_carga_terminada(self, datos):
+        t_lectura = time.perf_counter() - self._t_carga
+        t0 = time.perf_counter()
+        self.biblioteca = datos or {}
+        self._actualizar_tabla()
+        self._fin_carga()
+        self._vincular_historial(database.ruta_para(self.selected_date, self.use_global))
+        self.status.showMessage(f"Listo — {len(self.biblioteca)} libros cargados.", 4000)
+        self._avisar_restaurados()
+        self._revisar_enlaces()
+        if self.informe_arranque is not None:
+            self.informe_arranque.registrar("carga de datos", t_lectura)
+            self.informe_arranque.registrar("llenado de tabla", time.perf_counter() - t0)
+            self.informe_arranque.cerrar()
+            log.info("%s", self.informe_arranque.resumen())
+
+    def _on_carga_fallida(self, mensaje):
+        self._fin_carga()
+        self._avisar_restaurados()
+        QMessageBox.critical(self, "Error", f"No se pudo cargar la biblioteca:\n{mensaje}")
+
+    def _avisar_restaurados(self):
+        """Informa los archivos que estaban dañados y se restauraron desde una copia (ver recuperacion)."""
+        restaurados = recuperacion.tomar_restaurados()
+        if not restaurados:
+            return
+        lineas = "\n".join(f"• {archivo}  ←  {copia}" for archivo, copia in restaurados)
+        QMessageBox.warning(
+            self, "Archivos restaurados",
+            "Estos archivos estaban dañados (probablemente por un guardado interrumpido) y se restauraron "
+            f"desde su copia válida más reciente:\n\n{lineas}\n\n"
+            "Los cambios posteriores a esa copia pueden faltar. El archivo dañado se conservó en data/backups.")
+
+    def _fin_carga(self):
+        self.progress_bar.hide()
+        self._set_acciones_habilitadas(True)
+        self._tarea_carga = None
+
+    def _set_acciones_habilitadas(self, habilitadas):
+        """
+        Activa o desactiva las acciones que modifican la biblioteca (mientras hay una tarea en curso).
+        El auto-guardado se pausa para no recorrer el diccionario mientras otro hilo lo modifica.
+        """
+        for w in (self.add_btn, self.edit_btn, self.delete_btn, self.reload_btn, self.btn_load,
+                  self.btn_reload_from_disk, self.btn_importar_pdf, self.btn_procesar_lote,
+                  self.btn_importar_catalogo, self.btn_portada, self.btn_duplicados, self.quick_edit_btn,
+                  self.quick_delete_btn, self.quick_export_btn, self.btn_enlaces, self.autosave_checkbox,
+                  self.search_input, self.chk_difusa, self.btn_facetas, self.arbol_facetas,
+                  self.undo_btn, self.redo_btn):
+            w.setEnabled(habilitadas)
+        if habilitadas:
+            self._actualizar_botones_historial()
+        if not habilitadas:
+            self.autosave_timer.stop()
+        elif self.autosave_checkbox.isChecked():
+            self.autosave_timer.start(self.autosave_interval.value() * 1000)
+
+    def _on_cancelar_tarea(self):
+        tarea = getattr(self, "_tarea_actual", None)
+        if tarea is not None:
+            tarea.cancelar()
+            self.btn_cancelar_tarea.setEnabled(False)
+            self.status.showMessage("Cancelando...")
+
+    def _iniciar_tarea(self, tarea, mensaje, al_terminar):
+        """Lanza una tarea cancelable con barra de progreso; al_terminar(resultado) corre en el hilo de la UI."""
+        self._tarea_actual = tarea
+        self._set_acciones_habilitadas(False)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.btn_cancelar_tarea.setEnabled(True)
+        self.btn_cancelar_tarea.show()
+        self.status.showMessage(mensaje)
+
+        def finalizar():
+            self.progress_bar.hide()
+            self.btn_cancelar_tarea.hide()
+            self._set_acciones_habilitadas(True)
+            self._tarea_actual = None
+
+        def ok(resultado):
+            finalizar()
+            al_terminar(resultado)
+
+        def error(msg):
+            finalizar()
+            QMessageBox.critical(self, "Error", f"La tarea no pudo completarse:\n{msg}")
+
+        def cancelada():
+            finalizar()
+            self.status.showMessage("Tarea cancelada.", 3000)
+
+        tarea.progreso.connect(self._on_progreso_tarea)
+        tarea.terminado.connect(ok)
+        tarea.fallo.connect(error)
+        tarea.cancelada.connect(cancelada)
+        tarea.start()
+
+    #Importación masiva
+    def _on_importar_catalogo(self):
+        ruta, _ = QFileDialog.getOpenFileName(
+            self,
+            "Importar catálogo",
+            "",
+            "Catálogos (*.csv *.json *.jsonl *.ndjson);;Todos los archivos (*)"
+        )
+        if not ruta:
+            return
+
+        import importador
+        fecha, global_file = self.selected_date, self.use_global
+
+        def importar(progreso, cancelado):
+            # corre en el hilo de la tarea; la UI tiene las acciones de escritura desactivadas.
+            # Toda la importación es una sola transacción: los lotes sólo se agregan en memoria y el
+            # archivo se escribe (con un único backup) al final, también si se cancela a mitad.
+            # Si el guardado falla no queda ningún libro importado.
+            with database.transaccion(self.biblioteca, fecha=fecha, global_file=global_file) as tx:
+                def confirmar_lote(nuevos):
+                    for isbn, datos in nuevos.items():
+                        tx.upsert(isbn, datos)
+
+                resultado = importador.importar_catalogo(ruta, self.biblioteca, confirmar_lote,
+                                                         progreso=progreso, cancelado=cancelado)
+            # la búsqueda está desactivada mientras corre la tarea: nadie lee los pendientes a la vez
+            self._marcar_cambiados(tx.cambios())
+            # una importación grande excede el límite del historial: queda sin deshacer (el resto se conserva)
+            deshacible = self.historial.registrar_transaccion(f"Importar {os.path.basename(ruta)}", tx)
+            return resultado, deshacible
+
+        tarea = TareaSegundoPlano(importar, parent=self)
+        self._iniciar_tarea(tarea, f"Importando {os.path.basename(ruta)}...", self._on_importacion_terminada)
+
+    #Exportación
+    def _isbns_vista(self):
+        """ISBN de las filas visibles en la tabla, en el orden en que se muestran."""
+        return [self.table.item(r, 0).text() for r in range(self.table.rowCount())
+                if self.table.item(r, 0) is not None and not self.table.isRowHidden(r)]
+
+    def _on_exportar(self):
+        import exportador
+        isbns = self._isbns_vista()
+        if not isbns:
+            QMessageBox.warning(self, "Exportar", "No hay datos para exportar.")
+            return
+
+        filtros = ";;".join(exportador.FORMATOS.values())
+        ruta, filtro = QFileDialog.getSaveFileName(self, "Exportar vista actual", "biblioteca_export.csv", filtros)
+        if not ruta:
+            return
+        formato = next((f for f, desc in exportador.FORMATOS.items() if desc == filtro), None)
+        if formato and not os.path.splitext(ruta)[1]:
+            ruta += "." + formato
+
+        tarea = TareaSegundoPlano(exportador.exportar, ruta, self.biblioteca, isbns=isbns,
+                                  formato=formato, parent=self)
+
+        def terminado(escritos):
+            if escritos is None:
+                self.status.showMessage("Exportación cancelada.", 3000)
+                return
+            self.status.showMessage(f"Exportados {escritos} libros.", 4000)
+            QMessageBox.information(self, "Exportar", f"Archivo exportado correctamente en:\n{ruta}")
+
+        self._iniciar_tarea(tarea, f"Exportando {len(isbns)} libros...", terminado)
+
+    def _on_importacion_terminada(self, terminado):
+        resultado, deshacible = terminado
+        self._revisar_fusion_al_guardar()
+        self._actualizar_tabla()
+        self.status.showMessage(f"Importación terminada: {resultado.importados} libros nuevos.", 4000)
+        resumen = resultado.resumen()
+        if not deshacible:
+            resumen += ("\n\nLa importación es demasiado grande para el historial y no se puede deshacer "
+                        "(las acciones anteriores se pueden seguir deshaciendo).")
+        QMessageBox.information(self, "Importar catálogo", resumen)
+
+    #Historial de cambios (deshacer / rehacer)
+    def _vincular_historial(self, ruta_datos):
+        """Cada archivo de biblioteca tiene su propio historial persistente en data/historial/."""
+        # archivo del que proviene lo que hay en memoria (sólo sus cambios externos se fusionan)
+        self.ruta_datos = os.path.abspath(ruta_datos)
+        self.historial = historial.HistorialCambios(ruta=historial.ruta_historial(ruta_datos))
+        if hasattr(self, "undo_btn"):
+            self._actualizar_botones_historial()
+
+    def _actualizar_botones_historial(self):
+        self.undo_btn.setEnabled(self.historial.puede_deshacer())
+        self.redo_btn.setEnabled(self.historial.puede_rehacer())
+        self.undo_btn.setToolTip(f"Deshacer: {self.historial.descripcion_deshacer()} (Ctrl+Z)")
+        self.redo_btn.setToolTip(f"Rehacer: {self.historial.descripcion_rehacer()} (Ctrl+Y)")
+
+    def _transaccion(self):
+        return database.transaccion(self.biblioteca, fecha=self.selected_date, global_file=self.use_global)
+
+    def _aplicar_cambios(self, descripcion, aplicar, mensaje_error="No se pudo guardar"):
+        """
+        Ejecuta aplicar(tx) dentro de una transacción sobre el archivo activo: todos los cambios se
+        guardan de una vez y se registran como una sola acción deshacible. Si el guardado falla no se
+        aplica ninguno. Devuelve True si se guardó.
+        """
+        try:
+            with self._transaccion() as tx:
+                aplicar(tx)
+        except Exception as e:
+            log.exception("%s: %s", mensaje_error, descripcion)
+            QMessageBox.critical(self, "Error", f"{mensaje_error} (no se aplicó ningún cambio):\n{e}")
+            return False
+        self._marcar_cambiados(tx.cambios())
+        if not self.historial.registrar_transaccion(descripcion, tx):
+            self.status.showMessage(f"{descripcion}: demasiados cambios para el historial, no se podrá deshacer.", 6000)
+        self._actualizar_botones_historial()
+        self._revisar_fusion_al_guardar()
+        return True
+
+    def _on_deshacer(self):
+        self._deshacer_rehacer(self.historial.deshacer, "Deshecho")
+
+    def _on_rehacer(self):
+        self._deshacer_rehacer(self.historial.rehacer, "Rehecho")
+
+    def _deshacer_rehacer(self, accion, verbo):
+        """
+        Aplica y guarda el deshacer/rehacer en una transacción: si el guardado falla no cambia ni la
+        biblioteca ni el historial (igual que _aplicar_cambios).
+        """
+        if getattr(self, "_tarea_actual", None) is not None or self._tarea_carga is not None:
+            return
+        try:
+            comando = accion(self.biblioteca, tx=self._transaccion())
+        except historial.ConflictoHistorial as e:
+            log.warning("%s", e)
+            QMessageBox.warning(self, "Historial de cambios", str(e))
+            self._actualizar_botones_historial()
+            return
+        except Exception as e:
+            log.exception("No se pudo guardar el cambio del historial")
+            QMessageBox.critical(self, "Error", f"No se pudo guardar (no se aplicó ningún cambio):\n{e}")
+            self._actualizar_tabla()
+            return
+        if comando is None:
+            return
+        self._marcar_cambiados(comando.isbns())
+        self.status.showMessage(f"{verbo}: {comando.descripcion}", 3000)
+        self._revisar_fusion_al_guardar()
+        self._actualizar_tabla()
+        self._actualizar_botones_historial()
 
     #UI BUILDERS
     def _build_ui(self):
@@ -103,13 +461,35 @@ class BibliotecaWindow(QWidget):
         self.btn_list_files = QPushButton("Listar archivos diarios")
         self.btn_list_files.setCursor(Qt.PointingHandCursor)
         sb_layout.addWidget(self.btn_list_files)
+        self.lista_archivos = QListWidget()
+        self.lista_archivos.setMaximumHeight(110)
+        self.lista_archivos.setToolTip("Archivos diarios en data/ (se actualiza solo). Doble clic para abrir.")
+        sb_layout.addWidget(self.lista_archivos)
 
         sb_layout.addSpacing(8)
         # Search
         sb_layout.addWidget(QLabel("Buscar (título/autor):"))
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Escribe para buscar (filtro en tiempo real)...")
+        self.search_input.setToolTip('Texto libre o consulta: autor:borges editorial:"Alfaguara" año:1990..2000 '
+                                     'isbn:978* (con AND, OR, NOT/- y paréntesis)')
         sb_layout.addWidget(self.search_input)
+        self.chk_difusa = QCheckBox("Tolerar errores de tipeo")
+        self.chk_difusa.setCursor(Qt.PointingHandCursor)
+        self.chk_difusa.setToolTip("Búsqueda difusa en título, autor y editorial: 'borjes' encuentra 'Borges'")
+        sb_layout.addWidget(self.chk_difusa)
+        self.btn_facetas = QToolButton()
+        self.btn_facetas.setText("Filtros")
+        self.btn_facetas.setCheckable(True)
+        self.btn_facetas.setArrowType(Qt.RightArrow)
+        self.btn_facetas.setToolButtonStyle(Qt.ToolButtonTextBesideIcon)
+        self.btn_facetas.setCursor(Qt.PointingHandCursor)
+        self.btn_facetas.setToolTip("Filtrar por editorial, autor, año, PDF o portada (con la cantidad de libros de cada valor)")
+        sb_layout.addWidget(self.btn_facetas)
+        self.arbol_facetas = QTreeWidget()
+        self.arbol_facetas.setHeaderHidden(True)
+        self.arbol_facetas.setVisible(False)
+        sb_layout.addWidget(self.arbol_facetas)
 
         # Auto-save controls
         sb_layout.addSpacing(8)
@@ -143,17 +523,38 @@ class BibliotecaWindow(QWidget):
         self.quick_delete_btn = QPushButton("Eliminar seleccionado")
         self.quick_delete_btn.setCursor(Qt.PointingHandCursor)
         sb_layout.addWidget(self.quick_delete_btn)
-        self.quick_export_btn = QPushButton("Exportar CSV")
+        self.quick_export_btn = QPushButton("Exportar (CSV/JSON/Excel)")
+        self.quick_export_btn.setToolTip("Exporta la vista actual de la tabla (respeta el filtro de búsqueda)")
         self.quick_export_btn.setCursor(Qt.PointingHandCursor)
         sb_layout.addWidget(self.quick_export_btn)
         self.btn_procesar_lote = QPushButton("Procesar Lote PDF")
         self.btn_procesar_lote.setCursor(Qt.PointingHandCursor)
         self.btn_procesar_lote.setToolTip("Procesar todos los PDFs en una carpeta")
         sb_layout.addWidget(self.btn_procesar_lote)
+        self.btn_importar_catalogo = QPushButton("Importar catálogo (CSV/JSON)")
+        self.btn_importar_catalogo.setCursor(Qt.PointingHandCursor)
+        self.btn_importar_catalogo.setToolTip("Importar libros en bloque desde un archivo CSV, JSON o JSON Lines")
+        sb_layout.addWidget(self.btn_importar_catalogo)
         self.btn_portada = QPushButton("🖼️ Añadir Portada")
         self.btn_portada.setCursor(Qt.PointingHandCursor)
         self.btn_portada.setToolTip("Seleccionar e insertar una imagen de portada para el libro seleccionado.")
         sb_layout.addWidget(self.btn_portada)
+        self.btn_duplicados = QPushButton("Buscar duplicados")
+        self.btn_duplicados.setCursor(Qt.PointingHandCursor)
+        self.btn_duplicados.setToolTip("Libros repetidos (mismo PDF o título/autor parecidos) para fusionarlos")
+        sb_layout.addWidget(self.btn_duplicados)
+        self.btn_estadisticas = QPushButton("Estadísticas")
+        self.btn_estadisticas.setCursor(Qt.PointingHandCursor)
+        self.btn_estadisticas.setToolTip("Libros agregados por día, editoriales principales y libros por década (todos los archivos)")
+        sb_layout.addWidget(self.btn_estadisticas)
+        self.btn_enlaces = QPushButton("Archivos faltantes")
+        self.btn_enlaces.setCursor(Qt.PointingHandCursor)
+        self.btn_enlaces.setToolTip("Revisar que existan los PDFs y portadas y reubicar los PDFs movidos")
+        sb_layout.addWidget(self.btn_enlaces)
+        self.btn_diagnostico = QPushButton("Diagnóstico de rendimiento")
+        self.btn_diagnostico.setCursor(Qt.PointingHandCursor)
+        self.btn_diagnostico.setToolTip("Tiempos, contadores y operaciones lentas registradas (F12)")
+        sb_layout.addWidget(self.btn_diagnostico)
 
 
         # Main area (splitter: form / table)
@@ -170,7 +571,10 @@ class BibliotecaWindow(QWidget):
         self.clear_btn = QPushButton("Limpiar campos")
         self.reload_btn = QPushButton("Recargar archivo")
         self.btn_importar_pdf = QPushButton("Importar PDF")
-        btns = [self.add_btn, self.edit_btn, self.delete_btn, self.clear_btn, self.reload_btn, self.btn_importar_pdf]
+        self.undo_btn = QPushButton("Deshacer")
+        self.redo_btn = QPushButton("Rehacer")
+        btns = [self.add_btn, self.edit_btn, self.delete_btn, self.clear_btn, self.reload_btn, self.btn_importar_pdf,
+                self.undo_btn, self.redo_btn]
         for b in btns:
             b.setCursor(Qt.PointingHandCursor)
             b.setMinimumHeight(34)
@@ -229,11 +633,13 @@ class BibliotecaWindow(QWidget):
 
         # Table
         self.table = QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels(["ISBN", "Título", "Autor", "Editorial", "Fecha de Publicación"])
+        # los encabezados son los nombres de campo del esquema (el orden por columna los usa)
+        self.table.setHorizontalHeaderLabels(["ISBN", *esquema.CAMPOS_LIBRO])
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
-        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        # selección múltiple (Ctrl/Shift) para eliminar varios libros en una sola transacción
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setAlternatingRowColors(True)
         self.table.setShowGrid(False)
@@ -245,6 +651,16 @@ class BibliotecaWindow(QWidget):
         # Status bar
         self.status = QStatusBar()
         self.status.setSizeGripEnabled(False)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(220)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.hide()
+        self.status.addPermanentWidget(self.progress_bar)
+        self.btn_cancelar_tarea = QToolButton()
+        self.btn_cancelar_tarea.setText("Cancelar")
+        self.btn_cancelar_tarea.setCursor(Qt.PointingHandCursor)
+        self.btn_cancelar_tarea.hide()
+        self.status.addPermanentWidget(self.btn_cancelar_tarea)
         main_frame_layout.addWidget(self.status)
 
         # Splitter to allow resizing between sidebar and main
@@ -267,15 +683,25 @@ class BibliotecaWindow(QWidget):
         self.mode_combo.currentIndexChanged.connect(self._on_mode_changed)
         self.date_edit.dateChanged.connect(self._on_date_changed)
         self.search_input.textChanged.connect(self._on_search_text_changed)
-        self.btn_list_files.clicked.connect(self._on_list_files)
-        self.btn_importar_pdf.clicked.connect(lambda: pdf_reader.importar_pdf(self))
-        self.btn_procesar_lote.clicked.connect(lambda: pdf_reader.procesar_lote(self))
+        self.chk_difusa.toggled.connect(self._on_difusa_toggled)
+        self.btn_facetas.toggled.connect(self._on_facetas_toggled)
+        self.arbol_facetas.itemChanged.connect(self._on_faceta_marcada)
+        self.lista_archivos.itemDoubleClicked.connect(self._on_archivo_lista_activado)
+        self.btn_importar_pdf.clicked.connect(self._on_btn_importar_pdf)
+        self.btn_procesar_lote.clicked.connect(self._on_btn_procesar_lote)
+        self.btn_importar_catalogo.clicked.connect(self._on_importar_catalogo)
+        self.btn_cancelar_tarea.clicked.connect(self._on_cancelar_tarea)
         self.btn_portada.clicked.connect(self._asignar_portada_manual)
+        self.btn_duplicados.clicked.connect(self._on_buscar_duplicados)
+        self.btn_estadisticas.clicked.connect(self._on_estadisticas)
+        self.btn_enlaces.clicked.connect(lambda: self._on_enlaces())
+        self.btn_diagnostico.clicked.connect(self._on_diagnostico)
+        QShortcut(QKeySequence("F12"), self, activated=self._on_diagnostico)
 
         # Quick actions
         self.quick_edit_btn.clicked.connect(self._on_quick_edit)
         self.quick_delete_btn.clicked.connect(self._on_quick_delete)
-        self.quick_export_btn.clicked.connect(lambda: ux.exportar_csv(self, self.biblioteca))
+        self.quick_export_btn.clicked.connect(self._on_exportar)
 
         # Toolbar buttons
         self.add_btn.clicked.connect(self._on_add)
@@ -287,19 +713,63 @@ class BibliotecaWindow(QWidget):
         # Table interactions
         self.table.cellDoubleClicked.connect(self._on_table_double_clicked)
         self.table.itemSelectionChanged.connect(self._on_table_selection_changed)
+        self.table.horizontalHeader().sectionClicked.connect(self._on_ordenar)
 
         # Autosave controls
         self.autosave_checkbox.toggled.connect(self._on_autosave_toggled)
 
+        # Deshacer / rehacer
+        self.undo_btn.clicked.connect(self._on_deshacer)
+        self.redo_btn.clicked.connect(self._on_rehacer)
+        QShortcut(QKeySequence.Undo, self, activated=self._on_deshacer)
+        QShortcut(QKeySequence.Redo, self, activated=self._on_rehacer)
+
     #UI ACTIONS
     def _on_mode_changed(self, idx):
         self.use_global = (idx == 1)
+        self._vigilar_archivo_activo()
         self.status.showMessage("Modo cambiado a global." if self.use_global else "Modo cambiado a diario.", 3000)
 
     def _on_date_changed(self, qdate):
         self.selected_date = date(qdate.year(), qdate.month(), qdate.day())
+        self._vigilar_archivo_activo()
         self.status.showMessage(f"Fecha seleccionada: {self.selected_date.isoformat()}", 2500)
 
+    #Recarga en vivo
+    def _vigilar_archivo_activo(self):
+        if hasattr(self, "vigilante"):
+            self.vigilante.vigilar(database.ruta_para(self.selected_date, self.use_global))
+
+    def _on_archivo_externo(self, ruta):
+        """El archivo activo cambió en disco: se incorporan sólo los registros que cambió otra estación."""
+        if getattr(self, "_tarea_actual", None) is not None or self._tarea_carga is not None:
+            self.vigilante.posponer()
+            return
+        if os.path.abspath(ruta) != self.ruta_datos or not database.cambio_externo(ruta):
+            return
+        try:
+            resultado = database.fusionar_externo(self.biblioteca, ruta)
+        except Exception as e:
+            log.warning("No se pudieron leer los cambios externos de %s: %s", ruta, e)
+            return
+        self._mostrar_fusion(ruta, resultado, avisar_conflictos=False)
+
+    def _actualizar_lista_archivos(self, *_):
+        archivos = database.listar_archivos_diarios()
+        actuales = [self.lista_archivos.item(i).text() for i in range(self.lista_archivos.count())]
+        if archivos != actuales:
+            self.lista_archivos.clear()
+            self.lista_archivos.addItems(archivos)
+
+    def _on_archivo_lista_activado(self, item):
+        iso = item.text()[len(database.DAILY_PREFIX):-5]
+        qdate = QDate.fromString(iso, "yyyy-MM-dd")
+        if not qdate.isValid():
+            return
+        self.mode_combo.setCurrentIndex(0)
+        self.date_edit.setDate(qdate)
+        self._on_reload_from_disk()
+
     def _on_load_clicked(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self,
@@ -315,18 +785,14 @@ class BibliotecaWindow(QWidget):
             return
         
         try:
-            with open(file_path, "r", encouding = "utf-8") as f:
-                data = json.load(f)
-                #Normaliza claves antiguas de ser necesario
-                for isbn, datos in list(data.items()):
-                    if "Titulo" in datos and "Título" not in datos:
-                        datos["Título"] = datos.pop("Titulo")
-                    if "Fecha de publicacion" in datos and "Fecha de Publicación" not in datos:
-                        datos["Fecha de Publicación"] = datos.pop("Fecha de publicacion")
-                data = database.cargar_biblioteca(path=file_path)
-                self.biblioteca = data
-                self._actualizar_tabla()
-                self.status.showMessage(f"Archivo cargado: {os.path.basename(file_path)}", 3000)
+            # los archivos de versiones anteriores se migran al esquema actual en memoria; en disco sólo
+            # se reescriben los de data/ (uno elegido en otra carpeta no se modifica al abrirlo)
+            self.biblioteca = database.cargar_biblioteca(path=file_path)
+            self._vincular_historial(file_path)
+            self._actualizar_tabla()
+            self.status.showMessage(f"Archivo cargado: {os.path.basename(file_path)}", 3000)
+            self._avisar_restaurados()
+            self._revisar_enlaces()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"No se pudo cargar el archivo.\n\nDetalles: {e}")
 
@@ -339,91 +805,210 @@ class BibliotecaWindow(QWidget):
         QMessageBox.information(self, "Archivos diarios", msg)
 
     def _on_reload_from_disk(self):
-        #Recargar desde disco el archivo activo (ignora lo que haya en memoria) según modo: global o diario.
-        #Evira referenciar variables no inicializadas (como fecha_str) en modo global.
-        import os, json
-        from datetime import datetime
-
+        """
+        Trae del disco los cambios del archivo activo (diario o global). Si otra estación lo modificó,
+        sólo se incorporan los registros que cambió; los cambios locales sin guardar se conservan.
+        """
+        path = database.ruta_para(self.selected_date, self.use_global)
+        if not os.path.exists(path):
+            QMessageBox.information(self, "Archivo no encontrado",
+                                    f"No existe el archivo en disco:\n{os.path.basename(path)}")
+            return
         try:
-            #Determinar ruta según modo
-            if self.use_global:
-                path = os.path.join(os.path.dirname(__file__), "data", "biblioteca_global.json")
-                fecha_str = None
-
-            else:
-                #Obtener fecha en formato: YYYY-MM-DD de self.selected_date
-                fecha_str = None
-                #Si selected_date es QDate
-                if hasattr(self, "selected_date") and hasattr(self.selected_date, "toString"):
-                    try:
-                        fecha_str = self.selected_date.toString("yyyy-MM-dd")
-                    except Exception:
-                        fecha_str = None
-                else:
-                    #si es datatime.date u otro objeto con isoformat
-                    try:
-                        fecha_str = (self.selected_date.isoformat()
-                                     if hasattr(self.selected_date, "isoformat")
-                                     else str(self.selected_date))
-                    except Exception:
-                        fecha_str = None
-
-                if not fecha_str:
-                    QMessageBox.warning(self, "Fecha inválida", "No se ha seleccionado una fecha válida para recargar el archivo.")
+            if database.version_conocida(path) and os.path.abspath(path) == self.ruta_datos:
+                if not database.cambio_externo(path):
+                    self.status.showMessage(f"Sin cambios en disco: {os.path.basename(path)}", 3000)
                     return
-                filename = f"biblioteca_{fecha_str}.json"
-                path = os.path.join(os.path.dirname(__file__), "data", filename)
-            #comprobar existencia
-            if not os.path.exists(path):
-                QMessageBox.information(self, "Archivo no encontrado",
-                                        f"No existe el archivo en disco:\n{os.path.basename(path)}")
+                resultado = database.fusionar_externo(self.biblioteca, path)
+                self._mostrar_fusion(path, resultado)
                 return
-            #Intentar usar database.cargar_biblioteca(path=...) si existe y si la función acepta "path"
-            try:
-                #llamar con keyword "path" si la función lo soporta
-                data = database.cargar_biblioteca(path=path)
-            except TypeError:
-                #fallback: lectura directa
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            #Normalizar claves antiguas si existen
-            for isbn, datos in list(data.items()):
-                if isinstance(datos, dict):
-                    if "Titulo" in datos and "Título" not in datos:
-                        datos["Título"] = datos.pop("Titulo")
-                    if "Fecha de publicacion" in datos and "Fecha de Publicación" not in datos:
-                        datos["Fecha de Publicación"] = datos.pop("Fecha de publicacion")
-                    data[isbn] = datos
-            #Actualizar la memoria y UI        
-            self.biblioteca = data
+            # otro archivo (o nunca leído en esta sesión): carga completa
+            self.biblioteca = database.cargar_biblioteca(path=path)
+            self._vincular_historial(path)
             self._actualizar_tabla()
-            #Si recargamos un archivo diario, sincronizar date_edit y selected_date
-            if fecha_str:
-                try:
-                    qdate = QDate.fromString(fecha_str, "yyyy-MM-dd")
-                    if qdate.isValid():
-                        self.date_edit.setDate(qdate)
-                        self.selected_date = date(qdate.year(), qdate.month(), qdate.day())
-                        self.mode_combo.setCurrentIndex(0)
-                        self.use_global = False
-                except Exception:
-                    #no es critico, si falla, no abortamos
-                    pass
             self.status.showMessage(f"Recargado desde disco: {os.path.basename(path)}", 3500)
-
+            self._avisar_restaurados()
+            self._revisar_enlaces()
         except Exception as e:
-            #Muestra excepción completa para depuración
+            log.exception("Error al recargar %s", path)
             QMessageBox.critical(self, "Error al recargar", f"No se pudo recargar el archivo:\n{e}")
 
+    def _mostrar_fusion(self, path, resultado, avisar_conflictos=True):
+        """Refresca la vista tras incorporar cambios de otra estación e informa los conflictos."""
+        if resultado is None or not resultado.hay_cambios():
+            if avisar_conflictos:
+                self.status.showMessage(f"Sin cambios en disco: {os.path.basename(path)}", 3000)
+            return
+        self._marcar_cambiados(resultado.isbns())
+        self._aplicar_diferencias_vista(resultado)
+        self.status.showMessage(f"Cambios de otra estación: {resultado.resumen()}", 6000)
+        if resultado.conflictos and avisar_conflictos:
+            QMessageBox.warning(
+                self, "Cambios en conflicto",
+                "Otra estación modificó libros que también cambiaron aquí. Se conserva la versión local "
+                "de estos ISBN (se escribirá en el próximo guardado):\n\n" + "\n".join(resultado.conflictos[:30]))
+
+    def _revisar_fusion_al_guardar(self):
+        """Si el último guardado incorporó cambios de otra estación, refresca la vista."""
+        path = database.ruta_para(self.selected_date, self.use_global)
+        resultado = database.tomar_fusion(path)
+        if resultado is not None:
+            self._mostrar_fusion(path, resultado)
+
+    #Índices de búsqueda
+    def _marcar_cambiados(self, isbns):
+        """Anota los ISBN que cambiaron en la biblioteca en memoria; cada índice los revisa en su próxima consulta."""
+        isbns = list(isbns)
+        for _, pendientes in self._estado_indices.values():
+            pendientes.update(isbns)
+
+    def _sincronizar_indice(self, indice):
+        """
+        Pone 'indice' al día: completo la primera vez o cuando self.biblioteca se reemplazó (otro archivo,
+        recarga completa); si no, sólo con los ISBN anotados por _marcar_cambiados.
+        """
+        base, pendientes = self._estado_indices.get(indice, (None, None))
+        if base is not self.biblioteca:
+            indice.sincronizar(self.biblioteca)
+            self._estado_indices[indice] = (self.biblioteca, set())
+        elif pendientes:
+            indice.actualizar(self.biblioteca, pendientes)
+            pendientes.clear()
+        return indice
+
     def _on_search_text_changed(self, txt):
-        txt = txt.strip().lower()
+        if consulta.es_consulta(txt):
+            self._buscar_consulta(txt)
+            return
+        # "garcia" encuentra "García": se compara contra las claves plegadas de cada libro
+        txt = normalizacion.plegar(txt)
         if not txt:
             self._actualizar_tabla()
             return
-        filtrado = {isbn: d for isbn, d in self.biblioteca.items()
-                    if txt in d.get("Título", "").lower() or txt in d.get("Autor", "").lower()}
+        if self.chk_difusa.isChecked():
+            # resultados del más parecido al menos (salvo que se haya elegido un orden por columna)
+            with metricas.medir("ui.busqueda_difusa", txt):
+                self._sincronizar_indice(self.indice_difuso)
+                filtrado = {isbn: self.biblioteca[isbn] for isbn in self.indice_difuso.buscar(txt)}
+        else:
+            with metricas.medir("ui.busqueda", txt):
+                filtrado = self.claves.filtrar(self.biblioteca, txt)
         self._actualizar_tabla(datos=filtrado)
 
+    def _buscar_consulta(self, texto):
+        """Consulta con campos y operadores (autor:borges año:1990..2000...), resuelta con los índices."""
+        try:
+            with metricas.medir("ui.consulta", texto):
+                isbns = self._sincronizar_indice(self.indice_consulta).buscar(texto)
+        except consulta.ErrorConsulta as e:
+            # mientras se escribe la consulta suele estar incompleta: se avisa y se busca el texto tal cual
+            self.status.showMessage(f"Consulta: {e}", 3000)
+            with metricas.medir("ui.busqueda", texto):
+                filtrado = self.claves.filtrar(self.biblioteca, normalizacion.plegar(texto))
+            self._actualizar_tabla(datos=filtrado)
+            return
+        self._actualizar_tabla(datos={isbn: self.biblioteca[isbn] for isbn in isbns})
+
+    def _on_difusa_toggled(self, activa):
+        if not activa or len(self.indice_difuso):
+            self._on_search_text_changed(self.search_input.text())
+            return
+        # la primera vez se indexa el vocabulario completo en segundo plano; después sólo lo que cambia
+        indice, biblioteca = self.indice_difuso, self.biblioteca
+        self._estado_indices[indice] = (biblioteca, set())
+        tarea = TareaSegundoPlano(lambda progreso, cancelado: indice.sincronizar(biblioteca), parent=self)
+        self._iniciar_tarea(tarea, "Preparando búsqueda difusa...",
+                            lambda _: self._on_search_text_changed(self.search_input.text()))
+
+    #Facetas
+    def _on_facetas_toggled(self, visible):
+        self.btn_facetas.setArrowType(Qt.DownArrow if visible else Qt.RightArrow)
+        self.arbol_facetas.setVisible(visible)
+        if not visible:
+            # con el panel cerrado no quedan filtros ocultos aplicados
+            self._seleccion_facetas = {}
+        if not visible or len(self.indice_facetas) or not self.biblioteca:
+            self._on_search_text_changed(self.search_input.text())
+            return
+        # la primera vez se indexa todo en segundo plano; después sólo lo que cambia
+        indice, biblioteca = self.indice_facetas, self.biblioteca
+        self._estado_indices[indice] = (biblioteca, set())
+        tarea = TareaSegundoPlano(lambda progreso, cancelado: indice.sincronizar(biblioteca), parent=self)
+        self._iniciar_tarea(tarea, "Preparando filtros...",
+                            lambda _: self._on_search_text_changed(self.search_input.text()))
+
+    def _on_faceta_marcada(self, item, columna):
+        valor = item.data(0, Qt.UserRole)
+        if valor is None:
+            return
+        faceta, clave = valor
+        elegidas = self._seleccion_facetas.setdefault(faceta, set())
+        if item.checkState(0) == Qt.Checked:
+            elegidas.add(clave)
+        else:
+            elegidas.discard(clave)
+        if not elegidas:
+            del self._seleccion_facetas[faceta]
+        # el árbol se reconstruye al filtrar: no se hace dentro de la señal del propio item
+        QTimer.singleShot(0, lambda: self._on_search_text_changed(self.search_input.text()))
+
+    def _filtrar_facetas(self, datos):
+        """
+        Aplica los valores marcados a 'datos' (toda la biblioteca o el resultado de una búsqueda) y
+        actualiza los conteos del panel, que se calculan sobre esos mismos datos.
+        """
+        indice = self.indice_facetas
+        with metricas.medir("ui.facetas", f"{len(datos)} libros"):
+            self._sincronizar_indice(indice)
+            base = None if datos is self.biblioteca else indice.mapa_de(datos)
+            self._mostrar_conteos_facetas(base)
+            mapa = indice.filtrar(self._seleccion_facetas)
+            if mapa is None:
+                return datos
+            if base is None:
+                return {isbn: self.biblioteca[isbn] for isbn in indice.isbns(mapa)}
+            # se conserva el orden de la búsqueda (ej. por similitud en la búsqueda difusa)
+            elegidos = set(indice.isbns(mapa & base))
+            return {isbn: d for isbn, d in datos.items() if isbn in elegidos}
+
+    def _mostrar_conteos_facetas(self, base):
+        arbol = self.arbol_facetas
+        for i in range(arbol.topLevelItemCount()):
+            grupo = arbol.topLevelItem(i)
+            faceta = grupo.data(0, Qt.UserRole + 1)
+            if grupo.isExpanded():
+                self._facetas_plegadas.discard(faceta)
+            else:
+                self._facetas_plegadas.add(faceta)
+        arbol.blockSignals(True)
+        try:
+            arbol.clear()
+            for faceta, titulo in facetas.FACETAS.items():
+                grupo = QTreeWidgetItem([titulo])
+                grupo.setData(0, Qt.UserRole + 1, faceta)
+                grupo.setFlags(Qt.ItemIsEnabled)
+                elegidas = self._seleccion_facetas.get(faceta, ())
+                for clave, etiqueta, n in self.indice_facetas.conteos(faceta, self._seleccion_facetas, base):
+                    hijo = QTreeWidgetItem([f"{etiqueta} ({n})"])
+                    hijo.setData(0, Qt.UserRole, (faceta, clave))
+                    hijo.setFlags(Qt.ItemIsEnabled | Qt.ItemIsUserCheckable)
+                    hijo.setCheckState(0, Qt.Checked if clave in elegidas else Qt.Unchecked)
+                    grupo.addChild(hijo)
+                arbol.addTopLevelItem(grupo)
+                grupo.setExpanded(faceta not in self._facetas_plegadas)
+        finally:
+            arbol.blockSignals(False)
+
+    def _on_ordenar(self, columna):
+        """Clic en un encabezado: ordena por esa columna (sin tildes ni mayúsculas); otro clic invierte el orden."""
+        campo = self.table.horizontalHeaderItem(columna).text()
+        descendente = self._orden is not None and self._orden == (campo, False)
+        self._orden = (campo, descendente)
+        header = self.table.horizontalHeader()
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(columna, Qt.DescendingOrder if descendente else Qt.AscendingOrder)
+        self._on_search_text_changed(self.search_input.text())
+
     # Quick actions map to main actions
 
     def _on_quick_edit(self):
@@ -450,7 +1035,9 @@ class BibliotecaWindow(QWidget):
             return None
 
         if not utils.validar_isbn(isbn):
-            QMessageBox.warning(self, "Validación", "ISBN inválido. Use solo números y guiones (5-20 chars).")
+            QMessageBox.warning(self, "Validación", "ISBN inválido. Use solo números y guiones (5-20 chars); "
+                                                  "en un ISBN-10/13 el dígito de control (o la X final "
+                                                  "del ISBN-10) debe coincidir.")
             self.isbn_input.setStyleSheet("border: 1px solid #ff6666;")
             return None
 
@@ -459,7 +1046,8 @@ class BibliotecaWindow(QWidget):
             self.fecha_input.setStyleSheet("border: 1px solid #ff6666;")
             return None
 
-        return Libro(isbn, titulo, autor, editorial, fecha_pub)
+        # se guarda con la clave canónica (ISBN-13 sin guiones) si es un ISBN válido
+        return Libro(isbn_canonico.clave(isbn), titulo, autor, editorial, fecha_pub)
 
     def _mark_empty_fields(self, field_values):
         # field_values: list of tuples (name, value)
@@ -480,25 +1068,36 @@ class BibliotecaWindow(QWidget):
         libro = self._validate_form()
         if libro is None:
             return
-        if libro.isbn in self.biblioteca:
-            QMessageBox.warning(self, "Duplicado", "El ISBN ya existe en la biblioteca actual.")
+        existente = self._indice_isbn().buscar(libro.isbn)
+        if existente is not None:
+            QMessageBox.warning(self, "Duplicado", f"El ISBN ya existe en la biblioteca actual ({existente}).")
             return
-        self.biblioteca[libro.isbn] = libro.to_dict()
-        try:
-            database.guardar_biblioteca(self.biblioteca, fecha=self.selected_date, global_file=self.use_global)
-            self.status.showMessage("Libro guardado.", 3000)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo guardar: {e}")
-        self._actualizar_tabla()
-        self._on_clear()
 
         data = libro.to_dict()
-        if hasattr(self, "current_pdf_path"):
-            data["Archivo PDF"] = self.current_pdf_path
-        if hasattr(self, "current_pdf_preview"):
-            data["Portada"] = self.current_pdf_preview
+        if getattr(self, "current_pdf_path", None):
+            data[esquema.PDF] = self.current_pdf_path
+        if getattr(self, "current_pdf_preview", None):
+            data[esquema.PORTADA] = self.current_pdf_preview
+        if getattr(self, "current_pdf_huella", None):
+            data[duplicados.CAMPO_HUELLA_PDF] = self.current_pdf_huella
+        if getattr(self, "current_portada_huella", None):
+            data[portadas.CAMPO_HUELLA_PORTADA] = self.current_portada_huella
+
+        coincidencias = self._indice_duplicados().buscar(data)
+        if coincidencias and not _ux().confirmar(self, "Posible duplicado", self._describir_coincidencias(coincidencias)
+                                                 + "\n\n¿Agregar el libro de todos modos?"):
+            return
 
-        self.biblioteca[libro.isbn] = data
+        if not self._aplicar_cambios(f"Agregar {libro.isbn}", lambda tx: tx.upsert(libro.isbn, data)):
+            return
+        # el PDF importado se asocia sólo a este libro
+        self.current_pdf_path = None
+        self.current_pdf_preview = None
+        self.current_pdf_huella = None
+        self.current_portada_huella = None
+        self.status.showMessage("Libro guardado.", 3000)
+        self._actualizar_tabla()
+        self._on_clear()
 
     def _on_edit(self):
         selected = self.table.selectionModel().selectedRows()
@@ -511,20 +1110,21 @@ class BibliotecaWindow(QWidget):
         if libro is None:
             return
         # check duplicate isbn if changed
-        if libro.isbn != isbn_original and libro.isbn in self.biblioteca:
-            QMessageBox.warning(self, "Validación", "El nuevo ISBN ya existe.")
+        existente = self._indice_isbn().buscar(libro.isbn)
+        if existente is not None and existente != isbn_original:
+            QMessageBox.warning(self, "Validación", f"El nuevo ISBN ya existe ({existente}).")
             return
-        # replace key if isbn changed
-        if libro.isbn != isbn_original:
-            self.biblioteca.pop(isbn_original, None)
-        self.biblioteca[libro.isbn] = libro.to_dict()
-        try:
-            # fecha_guardado -> Agregado para asegurar el guardado en data como Biblioteca_YYYY_MM_DD en JSON
-            fecha_guardado = self.selected_date.toString("yyyy-MM-dd") if isinstance(self.selected_date, QDate) else self.selected_date
-            database.guardar_biblioteca(self.biblioteca, fecha=self.selected_date, global_file=self.use_global)
-            self.status.showMessage("Libro editado y guardado.", 3000)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo guardar: {e}")
+        def editar(tx):
+            # conservar los campos que no están en el formulario (Archivo PDF, Portada...)
+            anterior = self.biblioteca.get(isbn_original, {})
+            # replace key if isbn changed
+            if libro.isbn != isbn_original:
+                tx.eliminar(isbn_original)
+            tx.upsert(libro.isbn, {**anterior, **libro.to_dict()})
+
+        if not self._aplicar_cambios(f"Editar {libro.isbn}", editar):
+            return
+        self.status.showMessage("Libro editado y guardado.", 3000)
         self._actualizar_tabla()
         self._on_clear()
 
@@ -533,20 +1133,23 @@ class BibliotecaWindow(QWidget):
         if not selected:
             QMessageBox.warning(self, "Eliminar", "Selecciona la fila a eliminar.")
             return
-        row = selected[0].row()
-        isbn = self.table.item(row, 0).text()
-        if QMessageBox.question(self, "Confirmar eliminación", f"Eliminar libro con ISBN {isbn}?", QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
-            self.biblioteca.pop(isbn, None)
-            try:
-                database.guardar_biblioteca(self.biblioteca, fecha=self.selected_date, global_file=self.use_global)
-                self.status.showMessage("Libro eliminado y archivo actualizado.", 3000)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"No se pudo guardar después de eliminar: {e}")
-            self._actualizar_tabla()
-            self._on_clear()
+        isbns = [self.table.item(idx.row(), 0).text() for idx in selected]
+        if len(isbns) == 1:
+            pregunta, descripcion = f"Seguro que desea eliminar libro con ISBN {isbns[0]}?", f"Eliminar {isbns[0]}"
+        else:
+            pregunta, descripcion = f"Seguro que desea eliminar {len(isbns)} libros?", f"Eliminar {len(isbns)} libros"
+        if not _ux().confirmar(self, "Confirmar eliminación", pregunta):
+            return
+
+        def eliminar(tx):
+            for isbn in isbns:
+                tx.eliminar(isbn)
 
-        if not ux.confirmar(self, "Confirmar eliminación", f"Seguro que desea eliminar libro con ISBN {isbn}?"):
+        if not self._aplicar_cambios(descripcion, eliminar, "No se pudo guardar después de eliminar"):
             return
+        self.status.showMessage("Libro(s) eliminado(s) y archivo actualizado (Ctrl+Z para deshacer).", 3000)
+        self._actualizar_tabla()
+        self._on_clear()
 
     def _on_clear(self):
         self.isbn_input.clear()
@@ -565,10 +1168,10 @@ class BibliotecaWindow(QWidget):
         isbn = self.table.item(row, 0).text()
         datos = self.biblioteca.get(isbn, {})
         self.isbn_input.setText(isbn)
-        self.titulo_input.setText(datos.get("Título", ""))
-        self.autor_input.setText(datos.get("Autor", ""))
-        self.editorial_input.setText(datos.get("Editorial", ""))
-        self.fecha_input.setText(datos.get("Fecha de Publicación", ""))
+        self.titulo_input.setText(datos.get(esquema.TITULO, ""))
+        self.autor_input.setText(datos.get(esquema.AUTOR, ""))
+        self.editorial_input.setText(datos.get(esquema.EDITORIAL, ""))
+        self.fecha_input.setText(datos.get(esquema.FECHA, ""))
 
     def _on_table_selection_changed(self):
         selected = self.table.selectionModel().selectedRows()
@@ -583,16 +1186,18 @@ class BibliotecaWindow(QWidget):
             if not getattr(self, "biblioteca", None):
                 return
             
-            database.guardar_biblioteca(self.biblioteca, fecha=self.selected_date, global_file=self.use_global)
+            with metricas.medir("ui.autoguardado"):
+                database.guardar_biblioteca(self.biblioteca, fecha=self.selected_date, global_file=self.use_global)
             self.status.showMessage("Auto-guardado: cambios guardados.", 2000)
+            self._revisar_fusion_al_guardar()
 
             if hasattr(database, "DB_PATH") and database.DB_PATH and os.path.exists(database.DB_PATH):
-                backup_path = ux.crear_backup(database.DB_PATH)
+                backup_path = _ux().crear_backup(database.DB_PATH)
                 if backup_path:
-                    print(f"🗂️ Backup creado correctamente: {backup_path}")
+                    log.info("Backup creado correctamente: %s", backup_path)
         except Exception as e:
             self.status.showMessage(f"Error en auto-guardado: {e}", 4000)
-            print(f"Error en auto-guardado: {e}")
+            log.exception("Error en auto-guardado")
 
     def _on_autosave_toggled(self, checked):
         if checked:
@@ -607,44 +1212,362 @@ class BibliotecaWindow(QWidget):
     def _actualizar_tabla(self, datos=None):
         if datos is None:
             datos = self.biblioteca
+        if self.btn_facetas.isChecked():
+            datos = self._filtrar_facetas(datos)
+        with metricas.medir("ui.actualizar_tabla", f"{len(datos)} filas"):
+            if self._orden is not None:
+                datos = self.claves.ordenar(datos, *self._orden)
+            self._llenar_tabla(datos)
+
+    def _llenar_tabla(self, datos):
         self.table.setRowCount(0)
         for row_idx, (isbn, d) in enumerate(datos.items()):
             self.table.insertRow(row_idx)
-            self.table.setItem(row_idx, 0, QTableWidgetItem(isbn))
-            self.table.setItem(row_idx, 1, QTableWidgetItem(d.get("Título", "")))
-            self.table.setItem(row_idx, 2, QTableWidgetItem(d.get("Autor", "")))
-            self.table.setItem(row_idx, 3, QTableWidgetItem(d.get("Editorial", "")))
-            self.table.setItem(row_idx, 4, QTableWidgetItem(d.get("Fecha de Publicación", "")))
+            self._escribir_fila(row_idx, isbn, d)
+        self._filas = {isbn: r for r, isbn in enumerate(datos)}
 
+    def _escribir_fila(self, row_idx, isbn, d):
         # Ajustes de fuente y alineación para legibilidad
-        font = QFont("Segoe UI", 10)
-        for r in range(self.table.rowCount()):
-            for c in range(self.table.columnCount()):
-                item = self.table.item(r, c)
-                if item:
-                    item.setFont(font)
-                    item.setTextAlignment(Qt.AlignVCenter | Qt.AlignLeft)
+        font = getattr(self, "_fuente_tabla", None)
+        if font is None:
+            font = self._fuente_tabla = QFont("Segoe UI", 10)
+        valores = (isbn, *(d.get(campo, "") for campo in esquema.CAMPOS_LIBRO))
+        rotos = self.enlaces.rotos(d)
+        for c, valor in enumerate(valores):
+            item = QTableWidgetItem(valor)
+            item.setFont(font)
+            item.setTextAlignment(Qt.AlignVCenter | Qt.AlignLeft)
+            if rotos:
+                item.setForeground(COLOR_ENLACE_ROTO)
+                item.setToolTip("Archivo no encontrado:\n" + "\n".join(f"{campo}: {d[campo]}" for campo in rotos))
+            self.table.setItem(row_idx, c, item)
+
+    def _aplicar_diferencias_vista(self, resultado):
+        """Actualiza sólo las filas de los ISBN que cambiaron (sin reconstruir la tabla completa)."""
+        if self.search_input.text().strip() or self._orden is not None or self._seleccion_facetas:
+            # con un filtro activo un registro cambiado puede entrar o salir de la vista; con un orden, moverse
+            self._on_search_text_changed(self.search_input.text())
+            return
+        with metricas.medir("ui.aplicar_diferencias", resultado.resumen()):
+            filas = getattr(self, "_filas", {})
+            eliminadas = sorted((filas[isbn] for isbn in resultado.eliminados if isbn in filas), reverse=True)
+            for r in eliminadas:
+                self.table.removeRow(r)
+            if eliminadas:
+                filas = {self.table.item(r, 0).text(): r for r in range(self.table.rowCount())}
+            for isbn in resultado.modificados:
+                if isbn in filas:
+                    self._escribir_fila(filas[isbn], isbn, self.biblioteca[isbn])
+            for isbn in resultado.agregados:
+                if isbn in filas or isbn not in self.biblioteca:
+                    continue
+                r = self.table.rowCount()
+                self.table.insertRow(r)
+                self._escribir_fila(r, isbn, self.biblioteca[isbn])
+                filas[isbn] = r
+            self._filas = filas
+        if self.btn_facetas.isChecked():
+            self._filtrar_facetas(self.biblioteca)   # sólo para poner al día los conteos
+
+    #Duplicados
+    def _indice_isbn(self):
+        """Índice ISBN canónico -> clave guardada, al día con la biblioteca en memoria (sólo revisa lo que cambió)."""
+        return self._sincronizar_indice(self.indice_isbn)
+
+    def _indice_duplicados(self):
+        """Índice de duplicados al día con la biblioteca en memoria (sólo revisa los ISBN que cambiaron)."""
+        return self._sincronizar_indice(self.indice_duplicados)
+
+    def _describir_coincidencias(self, coincidencias, maximo=5):
+        lineas = []
+        for c in coincidencias[:maximo]:
+            d = self.biblioteca.get(c.isbn, {})
+            if c.motivo == "contenido":
+                motivo = "mismo PDF"
+            elif c.motivo == "portada":
+                motivo = "portada igual" if c.similitud == 1 else "portada parecida"
+            else:
+                motivo = f"título/autor {c.similitud:.0%} parecido"
+            lineas.append(f"• {c.isbn} — {d.get('Título', '')} / {d.get('Autor', '')} ({motivo})")
+        if len(coincidencias) > maximo:
+            lineas.append(f"... y {len(coincidencias) - maximo} más")
+        return "Ya existen libros que parecen el mismo:\n" + "\n".join(lineas)
+
+    def _on_buscar_duplicados(self):
+        indice, biblioteca = self.indice_duplicados, self.biblioteca
+        # lo que cambie mientras corre la tarea queda anotado para la próxima consulta
+        self._estado_indices[indice] = (biblioteca, set())
+
+        def buscar(progreso, cancelado):
+            with metricas.medir("duplicados.buscar", f"{len(self.biblioteca)} libros"):
+                indice.sincronizar(biblioteca, progreso=progreso, cancelado=cancelado)
+                return None if cancelado() else indice.grupos()
+
+        def terminado(grupos):
+            if grupos is None:
+                # quedó a medio indexar: la próxima consulta lo sincroniza completo
+                self._estado_indices.pop(indice, None)
+                return
+            if not grupos:
+                QMessageBox.information(self, "Duplicados", "No se encontraron libros duplicados.")
+                return
+            self._mostrar_duplicados(grupos)
+
+        tarea = TareaSegundoPlano(buscar, parent=self)
+        tarea.fallo.connect(lambda _: self._estado_indices.pop(indice, None))
+        self._iniciar_tarea(tarea, "Buscando duplicados...", terminado)
+
+    def _mostrar_duplicados(self, grupos):
+        """
+        Revisa los grupos uno por uno: se elige el libro que se conserva y los demás se fusionan en él
+        (sus campos completan los vacíos del elegido) y se eliminan. Cada fusión se puede deshacer.
+        """
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Libros duplicados")
+        dialog.resize(900, 420)
+        layout = QVBoxLayout(dialog)
+        etiqueta = QLabel()
+        layout.addWidget(etiqueta)
+
+        columnas = ["ISBN", *esquema.CAMPOS_LIBRO, esquema.PDF]
+        tabla = QTableWidget(0, len(columnas))
+        tabla.setHorizontalHeaderLabels(columnas)
+        tabla.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        tabla.setSelectionBehavior(QAbstractItemView.SelectRows)
+        tabla.setSelectionMode(QAbstractItemView.SingleSelection)
+        tabla.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(tabla)
+
+        pendientes = list(grupos)
+        fusionados = 0
+
+        def mostrar_grupo():
+            # un grupo puede haber quedado incompleto por una fusión o eliminación anterior
+            while pendientes and len([i for i in pendientes[0] if i in self.biblioteca]) < 2:
+                pendientes.pop(0)
+            if not pendientes:
+                dialog.accept()
+                return
+            grupo = [i for i in pendientes[0] if i in self.biblioteca]
+            etiqueta.setText(f"{len(pendientes)} grupo(s) pendiente(s). Seleccione el libro que se conserva:")
+            tabla.setRowCount(len(grupo))
+            for r, isbn in enumerate(grupo):
+                d = self.biblioteca[isbn]
+                valores = [isbn] + [d.get(c, "") for c in columnas[1:]]
+                for c, valor in enumerate(valores):
+                    tabla.setItem(r, c, QTableWidgetItem(valor))
+            tabla.selectRow(0)
+
+        def fusionar():
+            nonlocal fusionados
+            filas = tabla.selectionModel().selectedRows()
+            if not filas:
+                return
+            grupo = [tabla.item(r, 0).text() for r in range(tabla.rowCount())]
+            conservar = grupo[filas[0].row()]
+            otros = [i for i in grupo if i != conservar]
+            combinado = duplicados.fusionar_registros([self.biblioteca[i] for i in [conservar] + otros])
+
+            def aplicar(tx):
+                for isbn in otros:
+                    tx.eliminar(isbn)
+                tx.upsert(conservar, combinado)
+
+            if self._aplicar_cambios(f"Fusionar duplicados en {conservar}", aplicar):
+                fusionados += len(otros)
+                pendientes.pop(0)
+                mostrar_grupo()
+
+        def omitir():
+            pendientes.pop(0)
+            mostrar_grupo()
+
+        botones = QHBoxLayout()
+        for nombre, accion in (("Fusionar en el seleccionado", fusionar), ("Omitir grupo", omitir),
+                               ("Cerrar", dialog.reject)):
+            btn = QPushButton(nombre)
+            btn.clicked.connect(accion)
+            botones.addWidget(btn)
+        layout.addLayout(botones)
+
+        mostrar_grupo()
+        if pendientes:
+            dialog.exec()
+        if fusionados:
+            self._actualizar_tabla()
+            self.status.showMessage(f"Fusionados {fusionados} libro(s) duplicado(s) (Ctrl+Z para deshacer).", 4000)
+
+    #Enlaces a archivos
+    def _revisar_enlaces(self):
+        """Revisa en segundo plano, sin bloquear la interfaz, que existan los PDFs y portadas de la biblioteca."""
+        if self._tarea_enlaces is not None:
+            return
+        rutas = list(enlaces.referencias(self.biblioteca))
+        if not rutas:
+            return
+        self._tarea_enlaces = TareaSegundoPlano(self.enlaces.revisar, rutas, parent=self)
+
+        def terminado(cambio):
+            self._tarea_enlaces = None
+            if cambio:
+                # sólo se repinta si algún archivo apareció o desapareció desde la última revisión
+                self._actualizar_tabla()
+
+        def fallo(mensaje):
+            self._tarea_enlaces = None
+            log.warning("No se pudieron revisar los enlaces: %s", mensaje)
+
+        self._tarea_enlaces.terminado.connect(terminado)
+        self._tarea_enlaces.fallo.connect(fallo)
+        self._tarea_enlaces.start()
+
+    def _on_enlaces(self, raices=None):
+        """Revisa todos los enlaces y busca los PDFs movidos bajo las carpetas raíz."""
+        copia = dict(self.biblioteca)
+        tarea = TareaSegundoPlano(enlaces.escanear, copia, self.enlaces, raices, parent=self)
+        self._iniciar_tarea(tarea, "Revisando archivos de PDFs y portadas...",
+                            lambda informe: self._mostrar_enlaces(informe, copia))
+
+    def _mostrar_enlaces(self, informe, copia):
+        if informe.sin_ubicar() and not informe.raices:
+            respuesta = QMessageBox.question(
+                self, "PDFs faltantes",
+                f"Faltan {len(informe.sin_ubicar())} PDF(s). ¿Buscarlos en una carpeta?\n"
+                "(Para no preguntar, configure BIBLIOTECH_RAICES_PDF con las carpetas de PDFs.)")
+            if respuesta == QMessageBox.Yes:
+                carpeta = QFileDialog.getExistingDirectory(self, "Carpeta donde buscar los PDFs movidos")
+                if carpeta:
+                    self._on_enlaces([carpeta])
+                    return
+
+        # sólo se reubican los libros que no cambiaron mientras se buscaba
+        reubicados = {isbn: nueva for isbn, (vieja, nueva) in informe.reubicados.items()
+                      if self.biblioteca.get(isbn) is copia.get(isbn)}
+        if reubicados:
+            def aplicar(tx):
+                for isbn, nueva in reubicados.items():
+                    tx.actualizar(isbn, {esquema.PDF: nueva})
+            if self._aplicar_cambios(f"Reubicar {len(reubicados)} PDF(s)", aplicar):
+                self._actualizar_tabla()
+        elif informe.hay_faltantes():
+            self._actualizar_tabla()
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Enlaces a archivos")
+        dialog.resize(820, 560)
+        layout = QVBoxLayout(dialog)
+
+        texto = QPlainTextEdit()
+        texto.setReadOnly(True)
+        texto.setFont(QFont("Consolas", 9))
+        texto.setPlainText(informe.informe())
+        layout.addWidget(texto)
+
+        btn_cerrar = QPushButton("Cerrar")
+        btn_cerrar.clicked.connect(dialog.accept)
+        layout.addWidget(btn_cerrar, alignment=Qt.AlignRight)
+        dialog.exec()
+
+    #Diagnóstico
+    def _on_estadisticas(self):
+        """Panel de estadísticas: sale de los agregados guardados; sólo se leen los archivos que cambiaron."""
+        servicio = estadisticas.servicio()
+        if not servicio.pendientes():
+            self._mostrar_estadisticas(servicio.resumen())
+            return
+        tarea = TareaSegundoPlano(servicio.actualizar, parent=self)
+        self._iniciar_tarea(tarea, "Calculando estadísticas...", self._mostrar_estadisticas)
+
+    def _mostrar_estadisticas(self, resumen):
+        if resumen is None:
+            self.status.showMessage("Cálculo de estadísticas cancelado.", 3000)
+            return
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Estadísticas del catálogo")
+        dialog.resize(720, 560)
+        layout = QVBoxLayout(dialog)
+
+        texto = QPlainTextEdit()
+        texto.setReadOnly(True)
+        texto.setFont(QFont("Consolas", 9))
+        texto.setPlainText(resumen.informe())
+        layout.addWidget(texto)
+
+        btn_cerrar = QPushButton("Cerrar")
+        btn_cerrar.clicked.connect(dialog.accept)
+        layout.addWidget(btn_cerrar, alignment=Qt.AlignRight)
+        dialog.exec()
+
+    def _on_diagnostico(self):
+        """Muestra las métricas internas (tiempos, contadores, operaciones lentas)."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Diagnóstico de rendimiento")
+        dialog.resize(820, 560)
+        layout = QVBoxLayout(dialog)
+
+        chk_activas = QCheckBox("Registrar métricas")
+        chk_activas.setChecked(metricas.activo())
+        layout.addWidget(chk_activas)
+
+        texto = QPlainTextEdit()
+        texto.setReadOnly(True)
+        texto.setFont(QFont("Consolas", 9))
+        layout.addWidget(texto)
+
+        def refrescar():
+            texto.setPlainText(metricas.informe())
+
+        def reiniciar():
+            metricas.reiniciar()
+            refrescar()
+
+        def guardar():
+            ruta = metricas.volcar()
+            if ruta:
+                self.status.showMessage(f"Métricas guardadas en {ruta}", 4000)
+            else:
+                self.status.showMessage("Las métricas están desactivadas: no hay nada que guardar.", 4000)
+
+        def cambiar_estado(activas):
+            metricas.activar(activas)
+            refrescar()
+
+        chk_activas.toggled.connect(cambiar_estado)
+        botones = QHBoxLayout()
+        for nombre, accion in (("Actualizar", refrescar), ("Reiniciar", reiniciar),
+                               ("Guardar en archivo", guardar), ("Cerrar", dialog.accept)):
+            btn = QPushButton(nombre)
+            btn.clicked.connect(accion)
+            botones.addWidget(btn)
+        layout.addLayout(botones)
+
+        refrescar()
+        dialog.exec()
+
+    def closeEvent(self, event):
+        metricas.volcar()
+        super().closeEvent(event)
 
     def _on_btn_importar_pdf(self):
         try:
+            pdf_reader = _pdf_reader()
             if not hasattr(pdf_reader, "importar_pdf"):
                 QMessageBox.critical(self, "Error", "La función pdf_reader.importar_pdf no existe o no se encuentra.")
                 return
             pdf_reader.importar_pdf(self)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            log.exception("Error al importar el PDF")
             QMessageBox.critical(self, "Error al importar el PDF", f"Ocurrió un error en:\n{e}")
 
     def _on_btn_procesar_lote(self):
         try:
+            pdf_reader = _pdf_reader()
             if not hasattr(pdf_reader, "procesar_lote"):
                 QMessageBox.critical(self, "Error", "La función pdf_reader.procesar_lote no existe o no se encuentra.")
                 return
             pdf_reader.procesar_lote(self)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            log.exception("Error al procesar lote")
             QMessageBox.critical(self, "Error al procesar lote", f"Ocurrio un error en:\n{e}")
 
     def _on_table_selection(self):
@@ -657,15 +1580,13 @@ class BibliotecaWindow(QWidget):
         row = selected_rows[0].row()
         isbn = self.table.item(row, 0).text().strip()
 
-        import pdf_reader
-        pdf_reader.mostrar_portada(self, isbn)
+        _pdf_reader().mostrar_portada(self, isbn)
 
     def _on_table_double_click(self, item):
         row = item.row()
         isbn = self.table.item(row, 0).text().strip()
 
-        import pdf_reader
-        pdf_reader.abrir_pdf_externo(self, isbn)
+        _pdf_reader().abrir_pdf_externo(self, isbn)
 
 
     def _setup_context_menu(self):
@@ -707,7 +1628,7 @@ class BibliotecaWindow(QWidget):
         abrir_carpeta_action = QAction("📂  Abrir carpeta del PDF", self)
         eliminar_action = QAction("🗑️  Eliminar registro", self)
 
-        abrir_pdf_action.triggered.connect(lambda: pdf_reader.abrir_pdf_externo(self, isbn))
+        abrir_pdf_action.triggered.connect(lambda: _pdf_reader().abrir_pdf_externo(self, isbn))
         ver_portada_action.triggered.connect(lambda: self._mostrar_portada_ventana(isbn))
         abrir_carpeta_action.triggered.connect(lambda: self._abrir_carpeta_pdf(isbn))
         eliminar_action.triggered.connect(lambda: self._eliminar_registro(isbn))
@@ -724,7 +1645,7 @@ class BibliotecaWindow(QWidget):
     def _mostrar_portada_ventana(self, isbn):
         """Abre la portada en una ventana emergente más grande."""
         datos = self.biblioteca.get(isbn, {})
-        portada = datos.get("Portada", "")
+        portada = datos.get(esquema.PORTADA, "")
 
         if not portada or not os.path.exists(portada):
             from PySide6.QtWidgets import QMessageBox
@@ -749,7 +1670,7 @@ class BibliotecaWindow(QWidget):
     def _abrir_carpeta_pdf(self, isbn):
         """Abre la carpeta donde está el PDF asociado."""
         datos = self.biblioteca.get(isbn, {})
-        pdf_path = datos.get("Archivo PDF", "")
+        pdf_path = datos.get(esquema.PDF, "")
         if not pdf_path or not os.path.exists(pdf_path):
             from PySide6.QtWidgets import QMessageBox
             QMessageBox.warning(self, "Archivo no encontrado", "No se encontró el PDF asociado.")
@@ -776,7 +1697,9 @@ class BibliotecaWindow(QWidget):
         )
         if respuesta == QMessageBox.Yes:
             if isbn in self.biblioteca:
-                del self.biblioteca[isbn]
+                if not self._aplicar_cambios(f"Eliminar {isbn}", lambda tx: tx.eliminar(isbn),
+                                             "No se pudo guardar después de eliminar"):
+                    return
                 self._actualizar_tabla()
                 self.status.showMessage("Registro eliminado.", 3000)
 
@@ -804,11 +1727,19 @@ class BibliotecaWindow(QWidget):
             os.makedirs(cache_dir, exist_ok = True)
             
             import uuid
+            import shutil
             dest_path = os.path.join(cache_dir, f"{isbn}_custom_{uuid.uuid4().hex[:6]}.jpg")
             shutil.copyfile(file_path, dest_path)
+            try:
+                huella = portadas.huella_imagen(dest_path)
+            except Exception as e:
+                log.warning("No se pudo calcular la huella de la portada %s: %s", dest_path, e)
+                huella = None
+            campos = {esquema.PORTADA: dest_path,
+                      portadas.CAMPO_HUELLA_PORTADA: portadas.a_texto(huella) if huella is not None else ""}
 
-            self.biblioteca[isbn]["Portada"] = dest_path
-            database.guardar_biblioteca(self.biblioteca, fecha = self.selected_date, global_file = self.use_global)
+            if not self._aplicar_cambios(f"Portada {isbn}", lambda tx: tx.actualizar(isbn, campos)):
+                return
 
             self._actualizar_tabla()
             self.lblPreview.setPixmap(QPixmap(dest_path).scaledToWidth(220, Qt.SmoothTransformation))
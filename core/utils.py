@@ -1,12 +1,21 @@
 import re
 from datetime import datetime
 
+import isbn_canonico
+
 ISBN_RE = re.compile(r'^[0-9\-]{5,20}$')
 
 def validar_isbn(isbn: str) -> bool:
     isbn = isbn.strip()
     if not isbn:
         return False
+    if isbn_canonico.es_clave_sin_isbn(isbn):
+        # PDF importado sin ISBN: se guarda como NOISBN_<archivo> hasta que alguien lo complete
+        return True
+    if isbn_canonico.parece_isbn(isbn):
+        # con forma de ISBN-10/13 decide el dígito de control (admite la X final del ISBN-10
+        # y evita guardar un ISBN mal tipeado)
+        return isbn_canonico.canonico(isbn) is not None
     return bool(ISBN_RE.match(isbn))
 
 def validar_fecha_iso(fecha: str) -> bool:
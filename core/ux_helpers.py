@@ -5,7 +5,6 @@ Complementa ui.py: confirmaciones, alertas, exportaciones y backups automáticos
 
 import os
 import shutil
-import csv
 from datetime import datetime
 from PySide6.QtWidgets import QMessageBox, QFileDialog
 
@@ -32,8 +31,11 @@ def error(parent, titulo, mensaje):
 
 #Exportación
 
-def exportar_csv(parent, biblioteca_dict, ruta_default="biblioteca_export.csv"):
-    """Exporta la biblioteca a CSV."""
+def exportar_csv(parent, biblioteca_dict, ruta_default="biblioteca_export.csv", isbns=None):
+    """
+    Exporta la biblioteca a CSV de forma síncrona (para exportaciones pequeñas).
+    La ventana principal usa exportador.exportar en segundo plano.
+    """
     if not biblioteca_dict:
         alerta(parent, "Exportar CSV", "No hay datos para exportar.")
         return
@@ -43,17 +45,8 @@ def exportar_csv(parent, biblioteca_dict, ruta_default="biblioteca_export.csv"):
         return
 
     try:
-        with open(ruta, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["ISBN", "Título", "Autor", "Editorial", "Fecha de publicación"])
-            for isbn, datos in biblioteca_dict.items():
-                writer.writerow([
-                    isbn,
-                    datos.get("Título", ""),
-                    datos.get("Autor", ""),
-                    datos.get("Editorial", ""),
-                    datos.get("Fecha de publicación", "")
-                ])
+        import exportador
+        exportador.exportar(ruta, biblioteca_dict, isbns=isbns, formato="csv")
         info(parent, "Exportar CSV", f"Archivo exportado correctamente en:\n{ruta}")
     except Exception as e:
         error(parent, "Error", f"No se pudo exportar el archivo:\n{e}")
@@ -72,24 +65,3 @@ def crear_backup(ruta_archivo):
     copia = os.path.join(backups_dir, f"{nombre}_{timestamp}.bak")
     shutil.copy2(ruta_archivo, copia)
     return copia
-
-
-#Undo simple (una acción)
-
-class UndoBuffer:
-    """Buffer simple para deshacer la última eliminación o edición."""
-    def __init__(self):
-        self.stack = []
-
-    def push(self, data_type, data):
-        """Guarda una acción ('delete' o 'edit') con los datos previos."""
-        self.stack.append((data_type, data))
-
-    def pop(self):
-        if not self.stack:
-            return None
-        return self.stack.pop()
-
-    def clear(self):
-        self.stack.clear()
-undo_buffer = UndoBuffer()
\ No newline at end of file
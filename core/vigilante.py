@@ -0,0 +1,76 @@
+"""
+Vigilancia de los archivos de biblioteca para recarga en vivo.
+Envuelve un QFileSystemWatcher sobre el archivo activo (diario o global) y la carpeta data/.
+Los eventos se agrupan con un temporizador (un guardado genera varios avisos seguidos:
+escritura del temporal, reemplazo, .gen...) y se emiten una sola vez cuando el disco se calma.
+"""
+
+import os
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+ESPERA_MS = 400
+
+
+class VigilanteArchivos(QObject):
+    """
+    archivo_cambiado(ruta): el archivo vigilado cambió (o fue reemplazado) en disco.
+    carpeta_cambiada(ruta): se agregó, eliminó o renombró algo en la carpeta vigilada.
+    """
+    archivo_cambiado = Signal(str)
+    carpeta_cambiada = Signal(str)
+
+    def __init__(self, carpeta, parent=None, espera_ms=ESPERA_MS):
+        super().__init__(parent)
+        self.carpeta = carpeta
+        self.archivo = None
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_archivo)
+        self._watcher.directoryChanged.connect(self._on_carpeta)
+
+        self._timer_archivo = QTimer(self, singleShot=True, interval=espera_ms)
+        self._timer_archivo.timeout.connect(self._emitir_archivo)
+        self._timer_carpeta = QTimer(self, singleShot=True, interval=espera_ms)
+        self._timer_carpeta.timeout.connect(self._emitir_carpeta)
+
+        if os.path.isdir(carpeta):
+            self._watcher.addPath(carpeta)
+
+    def vigilar(self, ruta):
+        """Cambia el archivo vigilado (al cambiar de fecha, de modo o cargar otro archivo)."""
+        ruta = os.path.abspath(ruta)
+        if ruta == self.archivo:
+            self._asegurar_archivo()
+            return
+        if self.archivo and self.archivo in self._watcher.files():
+            self._watcher.removePath(self.archivo)
+        self.archivo = ruta
+        self._timer_archivo.stop()
+        self._asegurar_archivo()
+
+    def _asegurar_archivo(self):
+        # guardar_biblioteca reemplaza el archivo con os.replace: el watcher pierde la ruta y hay que volver a agregarla
+        if self.archivo and os.path.exists(self.archivo) and self.archivo not in self._watcher.files():
+            self._watcher.addPath(self.archivo)
+
+    def _on_archivo(self, ruta):
+        self._timer_archivo.start()
+
+    def _on_carpeta(self, ruta):
+        # el archivo activo puede haberse creado recién (primer guardado del día en otra estación)
+        if self.archivo and os.path.dirname(self.archivo) == os.path.abspath(ruta):
+            if self.archivo not in self._watcher.files() and os.path.exists(self.archivo):
+                self._timer_archivo.start()
+        self._timer_carpeta.start()
+
+    def _emitir_archivo(self):
+        self._asegurar_archivo()
+        if self.archivo:
+            self.archivo_cambiado.emit(self.archivo)
+
+    def _emitir_carpeta(self):
+        self.carpeta_cambiada.emit(self.carpeta)
+
+    def posponer(self):
+        """Reprograma el aviso pendiente del archivo (ej. mientras corre una tarea que escribe)."""
+        self._timer_archivo.start()
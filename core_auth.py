@@ -1,8 +1,24 @@
-import jwt
-
-def login_user(username, password, db):
-    # Bug: Se nos olvidó hacer hash de la contraseña en esta versión
-    user = db.query(username=username, password=password)
-    if user:
-        return jwt.encode({"user": username}, "secret_key")
-    return None
+"""
+Compatibilidad con la versión anterior del inicio de sesión.
+Las cuentas y los tokens viven ahora en core/autenticacion.py: contraseñas con scrypt en
+data/usuarios.json, tokens firmados con el secreto configurado (BIBLIOTECH_SECRETO).
+"""
+
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core")
+if os.path.isdir(_CORE_DIR) and _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import autenticacion
+
+
+def login_user(username, password, db=None):
+    """
+    Token de sesión para 'username', o None si la contraseña no corresponde.
+    'db' ya no se usa (las cuentas están en el almacén local); se acepta para no romper llamadas viejas.
+    Bloquea hasta terminar el scrypt: desde la interfaz o el servidor use
+    autenticacion.servicio().iniciar_sesion(), que devuelve un Future.
+    """
+    return autenticacion.servicio().iniciar_sesion(username, password).result()
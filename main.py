@@ -1,10 +1,8 @@
+import time
+_INICIO_PROCESO = time.perf_counter()
+
 import sys
 import os
-from PySide6.QtWidgets import QApplication, QMessageBox 
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import Qt
-from core.ui import BibliotecaWindow
-from core.database import asegurar_directorios
 
 
 def resource_path(relative_path):
@@ -15,6 +13,16 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# Los módulos de core se importan entre sí sin prefijo (import database, import utils...),
+# igual que en el ejecutable donde build_exe.bat los copia a la raíz.
+_CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "core")
+if os.path.isdir(_CORE_DIR) and _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import registro
+
+log = registro.obtener(__name__)
+
 def preparar_directorios():
     """
     Crea automáticamente la estructura base del programa
@@ -31,54 +39,83 @@ def preparar_directorios():
             os.makedirs(ruta, exist_ok=True)
         except Exception as e:
             # En caso de error (permisos, disco lleno, etc.)
-            print(f"⚠️ No se pudo crear la carpeta '{ruta}': {e}")
+            from PySide6.QtWidgets import QMessageBox
+            log.error("No se pudo crear la carpeta '%s': %s", ruta, e)
             QMessageBox.warning(
                 None,
                 "Error de inicialización",
                 f"No se pudo crear la carpeta requerida:\n{ruta}\n\nDetalles: {e}"
             )
 
-    print("📁 Estructura de carpetas verificada correctamente.")
+    log.info("Estructura de carpetas verificada correctamente.")
+
+def cargar_estilo(app):
+    """Elige la hoja de estilos según la escala de pantalla y la aplica a la aplicación."""
+    try:
+        import ctypes
+        scale_factor = ctypes.windll.shcore.GetScaleFactorForDevice(0)
+        if scale_factor > 125:
+            style_path = resource_path("assets/styles_fluent.qss")
+            log.info("Pantalla HiDPI detectada (%s%%) — usando estilo escalado.", scale_factor)
+        else:
+            style_path = resource_path("assets/styles_default.qss")
+            log.info("Pantalla estándar detectada (%s%%) — usando estilo normal.", scale_factor)
+    except Exception as e:
+        log.warning("No se pudo detectar la escala de la pantalla: %s", e)
+        style_path = resource_path("assets/styles_default.qss")
+
+    try:
+        with open(style_path, "r", encoding="utf-8") as f:
+            app.setStyleSheet(f.read())
+    except Exception as e:
+        log.warning("No se pudo cargar el estilo: %s", e)
 
 def main():
-    
+    """
+    Arranque en etapas: la ventana se muestra en cuanto está construida y la biblioteca
+    se carga después en segundo plano. PyMuPDF y el lector de PDF se importan recién
+    con la primera acción sobre un PDF.
+    """
+    from arranque import InformeArranque
+    informe = InformeArranque(inicio=_INICIO_PROCESO)
+
     preparar_directorios()
+    registro.configurar()
 
     try:
+        with informe.medir("importación Qt"):
+            from PySide6.QtWidgets import QApplication
+            from PySide6.QtGui import QIcon
+            from PySide6.QtCore import QTimer
+
         app = QApplication(sys.argv)
         app.setStyle("Fusion")
-        import ctypes
-        try:
-            scale_factor = ctypes.windll.shcore.GetScaleFactorForDevice(0)
-            if scale_factor > 125:
-                style_path = resource_path("assets/styles_fluent.qss")
-                print(f"🔍 Pantalla HiDPI detectada ({scale_factor}%) — usando estilo escalado.")
-            else:
-                style_path = resource_path("assets/styles_default.qss")
-                print(f"🔍 Pantalla estándar detectada ({scale_factor}%) — usando estilo normal.")
-        except Exception as e:
-            print(f"⚠️ No se pudo detectar la escala de la pantalla: {e}")
-            style_path = resource_path("assets/styles_default.qss")
 
-        try:
-            with open(style_path, "r", encoding="utf-8") as f:
-                app.setStyleSheet(f.read())
-        except Exception as e:
-            print(f"⚠️ No se pudo cargar el estilo: {e}")
+        with informe.medir("carga QSS"):
+            cargar_estilo(app)
 
-        ventana = BibliotecaWindow()
+        with informe.medir("importación módulos"):
+            from ui import BibliotecaWindow
+            from database import asegurar_directorios
 
-        icon_path = resource_path("assets/icon.ico")
-        ventana.setWindowIcon(QIcon(icon_path))
+        with informe.medir("construcción UI"):
+            ventana = BibliotecaWindow(informe_arranque=informe, carga_diferida=True)
+            icon_path = resource_path("assets/icon.ico")
+            ventana.setWindowIcon(QIcon(icon_path))
+            asegurar_directorios()
 
-        asegurar_directorios()
         ventana.show()
+        informe.marcar("ventana visible")
+        # La carga de datos arranca al entrar al bucle de eventos (la ventana ya está pintada)
+        QTimer.singleShot(0, ventana.iniciar_carga_diferida)
 
         sys.exit(app.exec())
     
     except Exception as e:
+        log.exception("Error crítico al iniciar la aplicación")
+        from PySide6.QtWidgets import QMessageBox
         QMessageBox.critical(None, "Error crítico", f"Ocurrió un error inesperado al iniciar la aplicación:\n{str(e)}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,57 @@
+"""Lenguaje de consulta: búsqueda exacta por ISBN en cualquier forma."""
+
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import consulta
+import esquema
+
+
+def test_isbn_exacto_con_clave_sin_migrar():
+    # guardado como ISBN-10 (archivo que no pasó por migrar-isbn)
+    bib = {"8420471836": {esquema.TITULO: "Rayuela"}, "9780000000002": {esquema.TITULO: "Otro"}}
+    indice = consulta.IndiceConsulta()
+    indice.sincronizar(bib)
+    for forma in ("8420471836", "84-204-7183-6", "978-84-204-7183-9", "9788420471839"):
+        assert indice.buscar(f"isbn:{forma}") == ["8420471836"]
+    assert indice.buscar("isbn:978-84-204-7183-9 rayuela") == ["8420471836"]
+    assert indice.buscar("-isbn:9788420471839") == ["9780000000002"]
+
+
+def test_solo_campos_conocidos_activan_la_consulta():
+    assert consulta.es_consulta("autor:borges")
+    assert consulta.es_consulta("rayuela -Título:aleph")
+    # títulos con dos puntos, paréntesis u operadores siguen siendo búsqueda simple
+    assert not consulta.es_consulta("Harry Potter: la piedra filosofal")
+    assert not consulta.es_consulta("Cien años (edición conmemorativa) - Tomo 1")
+    assert not consulta.es_consulta("Crimen AND castigo")
+
+
+def test_prefijo_isbn_con_claves_sin_migrar():
+    bib = {"8420471836": {esquema.TITULO: "Rayuela"}, "978-0-00-000000-2": {esquema.TITULO: "Otro"},
+           "9798420471834": {esquema.TITULO: "Tercero"}}
+    indice = consulta.IndiceConsulta()
+    indice.sincronizar(bib)
+    assert indice.buscar("isbn:978*") == ["8420471836", "978-0-00-000000-2"]
+    assert indice.buscar("isbn:978-84*") == ["8420471836"]
+    # verificado libro a libro (cuando la otra condición es mucho más selectiva) da lo mismo que por índice
+    assert indice.cumple(consulta.analizar("isbn:978842*"), "8420471836")
+    assert not indice.cumple(consulta.analizar("isbn:978842*"), "9798420471834")
+    assert indice.buscar("-isbn:97884*") == ["978-0-00-000000-2", "9798420471834"]
+
+
+def test_actualizar_solo_revisa_los_isbn_indicados():
+    bib = {"9788420471839": {esquema.TITULO: "Rayuela"}, "9780000000002": {esquema.TITULO: "Ficciones"}}
+    indice = consulta.IndiceConsulta()
+    indice.sincronizar(bib)
+    bib["9788420471839"] = {esquema.TITULO: "Los premios"}
+    del bib["9780000000002"]
+    bib["9798420471834"] = {esquema.TITULO: "Ficciones"}
+    indice.actualizar(bib, ["9788420471839", "9780000000002", "9798420471834"])
+    assert indice.buscar("titulo:premios") == ["9788420471839"]
+    assert indice.buscar("titulo:rayuela") == []
+    assert indice.buscar("titulo:ficciones") == ["9798420471834"]
@@ -0,0 +1,46 @@
+"""Carga de archivos de biblioteca: migración del esquema sólo dentro de data/."""
+
+import json
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import database
+import esquema
+
+ISBN = "9788420471839"
+
+
+def _escribir_v1(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({ISBN: {"Titulo": "Rayuela", esquema.AUTOR: "Julio Cortázar"}}, f)
+
+
+def test_archivo_fuera_de_data_no_se_reescribe_al_cargarlo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    externo = tmp_path / "descargas"
+    externo.mkdir()
+    path = str(externo / "catalogo_viejo.json")
+    _escribir_v1(path)
+    with open(path, "rb") as f:
+        original = f.read()
+
+    biblioteca = database.cargar_biblioteca(path=path)
+    assert biblioteca[ISBN][esquema.TITULO] == "Rayuela"
+    with open(path, "rb") as f:
+        assert f.read() == original
+    assert os.listdir(externo) == ["catalogo_viejo.json"]
+    assert not os.path.exists(database.BACKUP_DIR)
+
+
+def test_archivo_de_data_se_migra_una_vez(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = database.ruta_para(global_file=True)
+    _escribir_v1(path)
+
+    database.cargar_biblioteca(global_file=True)
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == esquema.envolver({ISBN: {esquema.TITULO: "Rayuela", esquema.AUTOR: "Julio Cortázar"}})
@@ -0,0 +1,32 @@
+"""Índice de duplicados mantenido con los ISBN que cambiaron."""
+
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import duplicados
+import esquema
+
+
+def _libro(titulo, autor="Julio Cortázar"):
+    return {esquema.TITULO: titulo, esquema.AUTOR: autor}
+
+
+def test_actualizar_solo_revisa_los_isbn_indicados():
+    bib = {"9788420471839": _libro("Rayuela edición conmemorativa"),
+           "9780000000002": _libro("Ficciones", "Jorge Luis Borges")}
+    indice = duplicados.IndiceDuplicados()
+    indice.sincronizar(bib)
+    nuevo = _libro("Rayuela edición conmemorativa")
+    assert [c.isbn for c in indice.buscar(nuevo)] == ["9788420471839"]
+
+    bib["9798420471834"] = nuevo
+    bib["9788420471839"] = _libro("Los premios")
+    del bib["9780000000002"]
+    indice.actualizar(bib, ["9798420471834", "9788420471839", "9780000000002"])
+    assert len(indice) == 2 and "9780000000002" not in indice
+    assert [c.isbn for c in indice.buscar(_libro("Rayuela edición conmemorativa"))] == ["9798420471834"]
+    assert indice.buscar(_libro("Ficciones", "Jorge Luis Borges")) == []
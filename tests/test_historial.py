@@ -0,0 +1,208 @@
+"""Deshacer/rehacer y los índices que se sincronizan por identidad de registro."""
+
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import esquema
+import historial
+from normalizacion import ClavesNormalizadas
+
+ISBN = "9788420471839"
+
+
+def _editar(biblioteca, hist, campos):
+    """Edita como una transacción (registro nuevo) y lo registra en el historial."""
+    antes = biblioteca[ISBN]
+    biblioteca[ISBN] = {**antes, **campos}
+    hist.registrar("Editar", [historial.diferencia(ISBN, antes, biblioteca[ISBN])])
+
+
+def _biblioteca():
+    return {ISBN: {esquema.TITULO: "Ficciones", esquema.AUTOR: "Jorge Luis Borges",
+                   esquema.EDITORIAL: "Sur", esquema.FECHA: "1944-01-01"}}
+
+
+def test_deshacer_reemplaza_el_registro():
+    bib, hist = _biblioteca(), historial.HistorialCambios()
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    editado = bib[ISBN]
+    hist.deshacer(bib)
+    assert bib[ISBN] is not editado
+    assert bib[ISBN][esquema.TITULO] == "Ficciones"
+
+
+def test_busqueda_tras_deshacer_y_rehacer():
+    bib, hist, claves = _biblioteca(), historial.HistorialCambios(), ClavesNormalizadas()
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    assert list(claves.filtrar(bib, "aleph")) == [ISBN]
+    hist.deshacer(bib)
+    assert list(claves.filtrar(bib, "ficciones")) == [ISBN]
+    assert list(claves.filtrar(bib, "aleph")) == []
+    hist.rehacer(bib)
+    assert list(claves.filtrar(bib, "aleph")) == [ISBN]
+
+
+def test_consulta_tras_deshacer():
+    import consulta
+
+    bib, hist = _biblioteca(), historial.HistorialCambios()
+    indice = consulta.IndiceConsulta()
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    indice.sincronizar(bib)
+    assert indice.buscar("titulo:aleph") == [ISBN]
+    # como la ventana: sólo se revisan los ISBN del comando deshecho
+    indice.actualizar(bib, hist.deshacer(bib).isbns())
+    assert indice.buscar("titulo:ficciones") == [ISBN]
+    assert indice.buscar("titulo:aleph") == []
+
+
+def test_facetas_y_difusa_tras_deshacer():
+    import busqueda_difusa
+    import facetas
+
+    bib, hist = _biblioteca(), historial.HistorialCambios()
+    indice, difuso = facetas.IndiceFacetas(), busqueda_difusa.IndiceDifuso()
+    _editar(bib, hist, {esquema.EDITORIAL: "Losada", esquema.TITULO: "Aleph"})
+    indice.sincronizar(bib)
+    difuso.sincronizar(bib)
+    assert [c[:2] for c in indice.conteos("editorial", {})] == [("losada", "Losada")]
+    isbns = hist.deshacer(bib).isbns()
+    indice.actualizar(bib, isbns)
+    difuso.actualizar(bib, isbns)
+    assert [c[:2] for c in indice.conteos("editorial", {})] == [("sur", "Sur")]
+    assert difuso.buscar("ficciones") == [ISBN]
+    assert difuso.buscar("aleph") == []
+
+
+def test_deshacer_no_pisa_cambios_de_otra_estacion():
+    import pytest
+
+    bib, hist = _biblioteca(), historial.HistorialCambios()
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    # la recarga en vivo trae otro título guardado por otra estación
+    bib[ISBN] = {**bib[ISBN], esquema.TITULO: "El Aleph"}
+    with pytest.raises(historial.ConflictoHistorial):
+        hist.deshacer(bib)
+    assert bib[ISBN][esquema.TITULO] == "El Aleph"
+    assert not hist.puede_deshacer() and not hist.puede_rehacer()
+
+
+def test_deshacer_con_guardado_fallido_no_mueve_el_historial(tmp_path, monkeypatch):
+    import pytest
+
+    import database
+
+    monkeypatch.chdir(tmp_path)
+    bib, hist = _biblioteca(), historial.HistorialCambios()
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+
+    def falla(*args, **kwargs):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(database, "guardar_biblioteca", falla)
+    with pytest.raises(OSError):
+        hist.deshacer(bib, tx=database.transaccion(bib, global_file=True))
+    assert bib[ISBN][esquema.TITULO] == "Aleph"
+    assert hist.puede_deshacer() and not hist.puede_rehacer()
+
+
+def _lineas(ruta):
+    import compresion
+
+    with compresion.Lectura(ruta) as f:
+        return [linea for linea in f if linea.strip()]
+
+
+def test_historial_persistido_deshacer_rehacer(tmp_path):
+    ruta = str(tmp_path / "bib.historial.json")
+    bib, hist = _biblioteca(), historial.HistorialCambios(ruta=ruta)
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    _editar(bib, hist, {esquema.EDITORIAL: "Emecé"})
+    hist.deshacer(bib)
+    # la primera acción crea el archivo; las siguientes sólo agregan una línea cada una
+    assert len(_lineas(ruta)) == 3
+
+    otra = historial.HistorialCambios(ruta=ruta)
+    assert otra.descripcion_deshacer() == "Editar" and otra.puede_rehacer()
+    otra.rehacer(bib)
+    assert bib[ISBN][esquema.EDITORIAL] == "Emecé"
+    otra.deshacer(bib)
+    otra.deshacer(bib)
+    assert bib[ISBN] == _biblioteca()[ISBN]
+
+    tercera = historial.HistorialCambios(ruta=ruta)
+    assert not tercera.puede_deshacer()
+    tercera.rehacer(bib)
+    assert bib[ISBN][esquema.TITULO] == "Aleph"
+
+
+def test_historial_se_compacta_y_respeta_la_profundidad(tmp_path, monkeypatch):
+    monkeypatch.setattr(historial, "COMPACTAR_CADA", 5)
+    ruta = str(tmp_path / "bib.historial.json")
+    bib, hist = _biblioteca(), historial.HistorialCambios(profundidad=3, ruta=ruta)
+    for i in range(12):
+        _editar(bib, hist, {esquema.TITULO: f"Título {i}"})
+    assert len(_lineas(ruta)) <= 6
+
+    otra = historial.HistorialCambios(profundidad=3, ruta=ruta)
+    deshechos = 0
+    while otra.puede_deshacer():
+        otra.deshacer(bib)
+        deshechos += 1
+    assert deshechos == 3
+    assert bib[ISBN][esquema.TITULO] == "Título 8"
+
+
+def test_historial_con_linea_cortada_conserva_lo_anterior(tmp_path):
+    ruta = str(tmp_path / "bib.historial.json")
+    bib, hist = _biblioteca(), historial.HistorialCambios(ruta=ruta)
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    with open(ruta, "a", encoding="utf-8") as f:
+        f.write('{"op": "apilar", "comando": {"descr')
+
+    otra = historial.HistorialCambios(ruta=ruta)
+    assert otra.puede_deshacer()
+    _editar(bib, otra, {esquema.TITULO: "El Aleph"})
+    # tras una línea dañada el archivo se reescribe entero
+    assert len(_lineas(ruta)) == 1
+    assert len(historial.HistorialCambios(ruta=ruta)._deshacer) == 2
+
+
+def test_historial_comprimido(tmp_path, monkeypatch):
+    import compresion
+
+    monkeypatch.setattr(compresion, "_codec", compresion.GZIP)
+    ruta = str(tmp_path / "bib.historial.json")
+    bib, hist = _biblioteca(), historial.HistorialCambios(ruta=ruta)
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    _editar(bib, hist, {esquema.TITULO: "El Aleph"})
+    hist.deshacer(bib)
+    assert compresion.detectar(ruta) == compresion.GZIP
+    otra = historial.HistorialCambios(ruta=ruta)
+    assert len(otra._deshacer) == 1 and len(otra._rehacer) == 1
+
+
+def test_comando_demasiado_grande_no_vacia_el_historial(tmp_path):
+    ruta = str(tmp_path / "bib.historial.json")
+    bib = _biblioteca()
+    hist = historial.HistorialCambios(ruta=ruta, limite_bytes=4096)
+    _editar(bib, hist, {esquema.TITULO: "Aleph"})
+    _editar(bib, hist, {esquema.TITULO: "El hacedor"})
+    hist.deshacer(bib)
+    assert hist.puede_rehacer()
+
+    # una importación que no entra en el límite: queda sin deshacer, lo anterior se conserva
+    nuevos = {f"97800000{i:05d}": {esquema.TITULO: f"Libro {i}"} for i in range(100)}
+    bib.update(nuevos)
+    assert hist.registrar("Importar", [historial.diferencia(isbn, None, r) for isbn, r in nuevos.items()]) is False
+    assert hist.descripcion_deshacer() == "Editar"
+    assert not hist.puede_rehacer()
+
+    recargado = historial.HistorialCambios(ruta=ruta, limite_bytes=4096)
+    assert not recargado.puede_rehacer()
+    recargado.deshacer(bib)
+    assert bib[ISBN][esquema.TITULO] == "Ficciones"
+    assert len(bib) == 101
@@ -0,0 +1,39 @@
+"""PDFs sin ISBN: la clave NOISBN_<archivo> que comparten la ingesta y la importación manual."""
+
+import os
+import sys
+
+import pytest
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import isbn_canonico
+import utils
+
+
+def test_clave_sin_isbn_pasa_la_validacion_del_formulario():
+    clave = isbn_canonico.clave_sin_isbn(os.path.join("pdfs", "Manual de uso.pdf"))
+    assert clave == "NOISBN_Manual de uso"
+    assert utils.validar_isbn(clave)
+    # se guarda tal cual: no es un ISBN que canonicalizar
+    assert isbn_canonico.clave(clave) == clave
+    assert not utils.validar_isbn(isbn_canonico.PREFIJO_SIN_ISBN)
+
+
+def test_pdf_sin_isbn(tmp_path):
+    fitz = pytest.importorskip("fitz")
+    import esquema
+    import ingesta
+
+    ruta = str(tmp_path / "Apuntes sueltos.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Texto sin ningún ISBN, sólo el número 1234567890.")
+    doc.save(ruta)
+    doc.close()
+
+    isbn, registro = ingesta.extraer_registro(ruta, cache_dir=str(tmp_path), con_portada=False)
+    assert isbn == "NOISBN_Apuntes sueltos"
+    assert utils.validar_isbn(isbn)
+    assert registro[esquema.PDF] == ruta
@@ -0,0 +1,27 @@
+"""Índice ISBN canónico -> clave guardada, mantenido con los ISBN que cambiaron."""
+
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import isbn_canonico
+
+
+def test_actualizar_solo_revisa_las_claves_indicadas():
+    bib = {"84-376-0494-X": {}, "9780000000002": {}}
+    indice = isbn_canonico.IndiceISBN()
+    indice.sincronizar(bib)
+    assert indice.buscar("978-84-376-0494-7") == "84-376-0494-X"
+
+    del bib["84-376-0494-X"]
+    bib["9788437604947"] = {}
+    bib["9798420471834"] = {}
+    # sin avisar del cambio no se recorre la biblioteca
+    assert "9798420471834" not in indice
+    indice.actualizar(bib, ["84-376-0494-X", "9788437604947", "9798420471834"])
+    assert indice.claves("843760494x") == ["9788437604947"]
+    assert "9798420471834" in indice
+    assert len(indice) == 3
@@ -0,0 +1,72 @@
+"""Servidor de sólo lectura: leer el catálogo no escribe nada en disco."""
+
+import asyncio
+import json
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import database
+import esquema
+import servidor
+
+ISBN = "9788420471839"
+
+
+def _archivos(raiz):
+    return sorted(os.path.relpath(os.path.join(d, f), raiz) for d, _, fs in os.walk(raiz) for f in fs)
+
+
+def _pedir(path, destino):
+    async def pedir():
+        srv = servidor.ServidorCatalogo(path, puerto=0)
+        puerto = await srv.iniciar()
+        try:
+            reader, writer = await asyncio.open_connection(servidor.HOST, puerto)
+            writer.write(f"GET {destino} HTTP/1.1\r\nConnection: close\r\n\r\n".encode("latin-1"))
+            respuesta = await reader.read()
+            writer.close()
+        finally:
+            await srv.cerrar()
+        cabecera, _, cuerpo = respuesta.partition(b"\r\n\r\n")
+        return int(cabecera.split()[1]), json.loads(cuerpo)
+    return asyncio.run(pedir())
+
+
+def test_archivo_v1_no_se_migra_en_disco(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(database.DATA_DIR)
+    path = os.path.join(database.DATA_DIR, database.GLOBAL_FILENAME)
+    # formato de la versión 1: sin cabecera y con claves antiguas
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({ISBN: {"Titulo": "Rayuela", esquema.AUTOR: "Julio Cortázar"}}, f)
+    with open(path, "rb") as f:
+        original = f.read()
+    antes = _archivos(tmp_path)
+
+    estado, libro = _pedir(path, f"/api/isbn/{ISBN}")
+    assert estado == 200
+    assert libro[esquema.TITULO] == "Rayuela"
+    with open(path, "rb") as f:
+        assert f.read() == original
+    assert _archivos(tmp_path) == antes
+
+
+def test_archivo_danado_responde_503_sin_restaurar(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(database.BACKUP_DIR)
+    path = os.path.join(database.DATA_DIR, database.GLOBAL_FILENAME)
+    with open(os.path.join(database.BACKUP_DIR, database.GLOBAL_FILENAME + ".bak.20260101_000000"), "w",
+              encoding="utf-8") as f:
+        json.dump(esquema.envolver({ISBN: {esquema.TITULO: "Rayuela"}}), f)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"esquema": 2, "libros": {"978')
+    antes = _archivos(tmp_path)
+
+    estado, cuerpo = _pedir(path, "/api/libros")
+    assert estado == 503
+    assert "no se puede leer" in cuerpo["error"]
+    assert _archivos(tmp_path) == antes
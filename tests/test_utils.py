@@ -0,0 +1,30 @@
+"""Validación de ISBN del formulario y del importador."""
+
+import os
+import sys
+
+_CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core")
+if _CORE_DIR not in sys.path:
+    sys.path.insert(0, _CORE_DIR)
+
+import isbn_canonico
+import utils
+
+
+def test_isbn10_con_x_final_es_valido():
+    for isbn in ("84-376-0494-X", "080442957X", "0-8044-2957-x"):
+        assert utils.validar_isbn(isbn), isbn
+    assert isbn_canonico.canonico("84-376-0494-X") == "9788437604947"
+
+
+def test_digito_de_control_equivocado_no_es_valido():
+    assert utils.validar_isbn("978-84-376-0494-7")
+    assert not utils.validar_isbn("978-84-376-0494-8")
+    assert not utils.validar_isbn("84-376-0494-2")
+
+
+def test_codigos_que_no_son_isbn():
+    # códigos internos: sólo números y guiones, 5-20 caracteres
+    assert utils.validar_isbn("12-345")
+    assert not utils.validar_isbn("12X45")
+    assert not utils.validar_isbn("")